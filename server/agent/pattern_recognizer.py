@@ -9,6 +9,7 @@ import re
 import hashlib
 from pathlib import Path
 
+from db_snapshot import replicas
 from logger_config import get_logger
 
 logger = get_logger("pattern_recognizer")
@@ -108,7 +109,8 @@ class PatternRecognizer:
         try:
             cutoff_time = datetime.now(timezone.utc) - timedelta(days=days)
             
-            with sqlite3.connect(AMBIENT_DB_PATH) as conn:
+            # Läsreplik av ambient.db: analysen ska inte störa ambient-inläsningen
+            with replicas.connect(AMBIENT_DB_PATH) as conn:
                 cursor = conn.execute("""
                     SELECT id, text, created_at, meta_json
                     FROM memory 
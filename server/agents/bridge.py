@@ -28,6 +28,8 @@ from core.agent_planner import AgentPlanner
 from memory import MemoryStore
 from prompts.system_prompts import system_prompt, developer_prompt
 from deps import OpenAISettings, get_global_openai_settings
+from http_pool import http_clients
+from llm.scheduler import Priority, llm_scheduler
 
 logger = logging.getLogger("alice.agents.bridge")
 
@@ -105,6 +107,8 @@ class AliceAgentBridge:
         self.use_harmony = os.getenv("USE_HARMONY", "true").lower() == "true"
         self.use_tools = os.getenv("USE_TOOLS", "true").lower() == "true"
         self.harmony_temperature = float(os.getenv("HARMONY_TEMPERATURE_COMMANDS", "0.15"))
+        # Längsta tystnad mellan chunkar: en fastnad ström avbryts och släpper sin schemaläggarslot
+        self.stream_idle_timeout_s = float(os.getenv("AGENT_STREAM_IDLE_TIMEOUT_S", "30"))
         
         # Track active streams
         self.active_streams: Dict[str, bool] = {}
@@ -178,11 +182,8 @@ class AliceAgentBridge:
     async def _get_rag_context(self, query: str) -> List[Dict[str, Any]]:
         """Hämta RAG-kontext från Alice's memory system"""
         try:
-            # Använd Alice's befintliga retrieval system
-            contexts = self.memory.retrieve_text_memories(query, limit=5)
-            if not contexts:
-                # Fallback till BM25 
-                contexts = self.memory.retrieve_text_bm25_recency(query, limit=5)
+            # Samma hybrid-retriever (BM25 + RRF + recency) som /api/chat, utanför event-loopen
+            contexts = await asyncio.to_thread(self.memory.retrieve_hybrid, query, limit=5)
             return contexts or []
         except Exception as e:
             logger.warning(f"RAG retrieval failed: {e}")
@@ -323,7 +324,7 @@ class AliceAgentBridge:
                 }
             }
             
-            async with httpx.AsyncClient(timeout=None) as client:
+            async with llm_scheduler.slot("ollama", Priority.CHAT), http_clients.session("ollama", timeout=self._stream_timeout()) as client:
                 async with client.stream("POST", self.ollama_url, json=payload) as response:
                     if response.status_code != 200:
                         yield StreamChunk(type=StreamChunkType.ERROR, 
@@ -414,7 +415,7 @@ class AliceAgentBridge:
                 "max_tokens": 256
             }
             
-            async with httpx.AsyncClient(timeout=None) as client:
+            async with llm_scheduler.slot("openai", Priority.CHAT), http_clients.session("openai", timeout=self._stream_timeout()) as client:
                 async with client.stream("POST", "https://api.openai.com/v1/chat/completions", 
                                        headers=headers, json=payload) as response:
                     if response.status_code != 200:
@@ -445,6 +446,10 @@ class AliceAgentBridge:
             yield StreamChunk(type=StreamChunkType.ERROR, 
                             content=f"OpenAI streaming error: {str(e)}")
     
+    def _stream_timeout(self) -> httpx.Timeout:
+        """Read timeout per chunk (idle deadline), not for the whole generation"""
+        return httpx.Timeout(self.stream_idle_timeout_s, connect=5.0)
+    
     def _extract_harmony_content(self, buffer_text: str, force_extract: bool = False) -> str:
         """Extrahera content mellan [FINAL]...[/FINAL] tags"""
         if not self.use_harmony:
@@ -619,7 +624,7 @@ class AliceAgentBridge:
         
         # Test Ollama connection
         try:
-            async with httpx.AsyncClient(timeout=5.0) as client:
+            async with http_clients.session("ollama", timeout=5.0) as client:
                 response = await client.get("http://127.0.0.1:11434/api/version")
                 status["ollama_available"] = response.status_code == 200
         except:
@@ -0,0 +1,398 @@
+"""
+IVFIndex - approximativ närmaste-granne-sökning (IVF) för stora minnesbutiker.
+
+Vektorerna klustras med sfärisk k-means till ``nlist`` centroider. En
+fråga jämförs först mot centroiderna och söker sedan bara i de ``nprobe``
+närmaste listorna. API:t är detsamma som ``vector_index.VectorIndex``
+så MemoryStore kan byta läge utan att anroparna märker något.
+
+Persistens: ``<model>.ivf.npz`` (centroider + levande vektorer) skrivs
+atomiskt vid flush, och raderingar loggas direkt som tombstones i
+``<model>.ivf.tombstones`` så att glömda minnen aldrig återuppstår efter
+en omstart. Tombstonade rader nollställs i RAM och skrivs aldrig till disk.
+
+Omträning (när samlingen vuxit ``retrain_factor`` gånger) körs i en
+bakgrundstråd på ett urval av vektorerna; de gamla centroiderna fortsätter
+svara tills de nya listorna byts in under låset.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from vector_index import VectorLike, _normalize, as_float32
+
+logger = logging.getLogger("alice.memory.ann")
+
+
+def _kmeans(data: np.ndarray, nlist: int, iters: int = 10, seed: int = 0) -> np.ndarray:
+    """Spherical k-means on normalized rows, returns normalized centroids"""
+    rng = np.random.default_rng(seed)
+    centroids = data[rng.choice(len(data), size=nlist, replace=False)].copy()
+    for _ in range(iters):
+        assign = _assign(data, centroids)
+        counts = np.bincount(assign, minlength=nlist)
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+        nonempty = counts > 0
+        sums = np.zeros_like(centroids)
+        sums[nonempty] = np.add.reduceat(data[np.argsort(assign, kind="stable")], starts[nonempty], axis=0)
+        empty = ~nonempty
+        if empty.any():
+            # Återså tomma kluster med slumpvisa punkter
+            sums[empty] = data[rng.choice(len(data), size=int(empty.sum()), replace=False)]
+        centroids = _normalize(sums)
+    return centroids.astype(np.float32)
+
+
+def _assign(data: np.ndarray, centroids: np.ndarray, block: int = 65536) -> np.ndarray:
+    out = np.empty(len(data), dtype=np.int32)
+    for start in range(0, len(data), block):
+        out[start:start + block] = np.argmax(data[start:start + block] @ centroids.T, axis=1)
+    return out
+
+
+class IVFIndex:
+    """Inverted-file cosine index with incremental inserts and tombstone deletes.
+
+    Below ``train_min`` vectors the index answers exactly (brute force);
+    once it grows past that it trains ``nlist ~ 4*sqrt(N)`` centroids and
+    retrains when the collection has grown ``retrain_factor`` times. With
+    ``background_train`` that training runs off the caller's thread.
+    """
+
+    def __init__(
+        self,
+        dim: int,
+        nprobe: int = 8,
+        nlist: Optional[int] = None,
+        train_min: int = 10000,
+        retrain_factor: float = 4.0,
+        path: Optional[str] = None,
+        capacity: int = 1024,
+        background_train: bool = True,
+    ) -> None:
+        self.dim = dim
+        self.nprobe = nprobe
+        self.fixed_nlist = nlist
+        self.train_min = train_min
+        self.retrain_factor = retrain_factor
+        self.path = path
+        self.background_train = background_train
+        self._lock = threading.RLock()
+        self._size = 0  # rows used, including tombstones
+        self._vecs = np.zeros((capacity, dim), dtype=np.float32)
+        self._ids = np.zeros(capacity, dtype=np.int64)
+        self._alive = np.zeros(capacity, dtype=bool)
+        self._row_of: Dict[int, int] = {}
+        self._centroids: Optional[np.ndarray] = None
+        self._trained_size = 0
+        self._lists: List[List[int]] = []
+        self._list_cache: List[Optional[np.ndarray]] = []
+        self._tombstones = 0
+        self._layout = 0  # ökas när compaction numrerar om raderna
+        self._trainer: Optional[threading.Thread] = None
+        self.trainings = 0
+
+    # --- properties shared with VectorIndex ---
+    def __len__(self) -> int:
+        return len(self._row_of)
+
+    def __contains__(self, mem_id: int) -> bool:
+        return int(mem_id) in self._row_of
+
+    @property
+    def trained(self) -> bool:
+        return self._centroids is not None
+
+    # --- mutation ---
+    def _grow(self, needed: int) -> None:
+        cap = self._vecs.shape[0]
+        if needed <= cap:
+            return
+        new_cap = max(needed, cap * 2)
+        vecs = np.zeros((new_cap, self.dim), dtype=np.float32)
+        vecs[: self._size] = self._vecs[: self._size]
+        ids = np.zeros(new_cap, dtype=np.int64)
+        ids[: self._size] = self._ids[: self._size]
+        alive = np.zeros(new_cap, dtype=bool)
+        alive[: self._size] = self._alive[: self._size]
+        self._vecs, self._ids, self._alive = vecs, ids, alive
+
+    def add(self, ids: Iterable[int], vectors: Union[np.ndarray, Sequence[VectorLike]]) -> None:
+        ids = [int(i) for i in ids]
+        if not ids:
+            return
+        if isinstance(vectors, np.ndarray) and vectors.ndim == 2:
+            mat = vectors.astype(np.float32, copy=False)
+        else:
+            mat = np.stack([as_float32(v) for v in vectors])
+        if mat.shape[1] != self.dim:
+            raise ValueError(f"Vector dim {mat.shape[1]} != index dim {self.dim}")
+        mat = _normalize(mat)
+        with self._lock:
+            replaced = [i for i in ids if i in self._row_of]
+            self._tombstone_rows([self._row_of[i] for i in replaced])
+            # Den gamla vektorn ligger kvar i filen tills nästa save: logga den som död
+            self._log_tombstones(replaced)
+            start = self._size
+            self._grow(start + len(ids))
+            end = start + len(ids)
+            self._vecs[start:end] = mat
+            self._ids[start:end] = ids
+            self._alive[start:end] = True
+            self._size = end
+            for offset, mem_id in enumerate(ids):
+                self._row_of[mem_id] = start + offset
+            if self.trained:
+                assign = _assign(mat, self._centroids)
+                for offset, lst in enumerate(assign):
+                    self._lists[lst].append(start + offset)
+                    self._list_cache[lst] = None
+            self._maybe_train()
+
+    def _tombstone_rows(self, rows: List[int]) -> None:
+        for row in rows:
+            if self._alive[row]:
+                self._alive[row] = False
+                self._vecs[row] = 0.0  # glömda vektorer ska inte ligga kvar i RAM
+                self._row_of.pop(int(self._ids[row]), None)
+                self._tombstones += 1
+
+    def remove(self, ids: Iterable[int]) -> int:
+        """Tombstone vectors; logged to disk immediately when persisted"""
+        with self._lock:
+            hits = [int(i) for i in ids if int(i) in self._row_of]
+            self._tombstone_rows([self._row_of[i] for i in hits])
+            self._log_tombstones(hits)
+            if self._tombstones > max(1000, self._size // 5):
+                self._compact()
+            return len(hits)
+
+    def _log_tombstones(self, ids: List[int]) -> None:
+        if self.path:
+            self.log_tombstones(self.path, ids)
+
+    @staticmethod
+    def log_tombstones(path: str, ids: Iterable[int]) -> None:
+        """Append ids to the tombstone log of the index saved at ``path`` (replayed on load)"""
+        ids = [int(i) for i in ids]
+        if not ids:
+            return
+        with open(path + ".tombstones", "a", encoding="utf-8") as f:
+            f.write("".join(f"{i}\n" for i in ids))
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _compact(self) -> None:
+        live = np.flatnonzero(self._alive[: self._size])
+        n = len(live)
+        self._vecs[:n] = self._vecs[live]
+        self._ids[:n] = self._ids[live]
+        self._alive[:n] = True
+        self._alive[n: self._size] = False
+        self._vecs[n: self._size] = 0.0
+        self._size = n
+        self._row_of = {int(m): r for r, m in enumerate(self._ids[:n])}
+        self._tombstones = 0
+        self._layout += 1
+        if self.trained:
+            self._rebuild_lists(_assign(self._vecs[:n], self._centroids))
+
+    def _rebuild_lists(self, assign: np.ndarray) -> None:
+        nlist = len(self._centroids)
+        order = np.argsort(assign, kind="stable")
+        bounds = np.searchsorted(assign[order], np.arange(nlist + 1))
+        self._lists = [order[bounds[i]:bounds[i + 1]].tolist() for i in range(nlist)]
+        self._list_cache = [None] * nlist
+
+    def _maybe_train(self) -> None:
+        live = len(self._row_of)
+        if live < self.train_min:
+            return
+        if self.trained and live < self._trained_size * self.retrain_factor:
+            return
+        if not self.background_train:
+            self.train()
+        elif self._trainer is None:
+            self._trainer = threading.Thread(target=self._train_in_background, name="ivf-train", daemon=True)
+            self._trainer.start()
+
+    def train(self) -> None:
+        """(Re)build centroids and inverted lists from the live vectors, blocking searches meanwhile"""
+        with self._lock:
+            if self._tombstones:
+                self._compact()
+            job = self._training_job()
+            if job is not None:
+                self._fit(*job)
+
+    def wait_for_training(self, timeout: Optional[float] = None) -> None:
+        """Block until a background retrain (if any) has been swapped in"""
+        trainer = self._trainer
+        if trainer is not None:
+            trainer.join(timeout)
+
+    def _train_in_background(self) -> None:
+        try:
+            with self._lock:
+                job = self._training_job()
+            if job is not None:
+                self._fit(*job)
+        except Exception as e:
+            logger.warning(f"IVF background training failed: {e}")
+        finally:
+            self._trainer = None
+
+    def _training_job(self) -> Optional[Tuple[np.ndarray, int, np.ndarray, int, int]]:
+        """Under the lock: what training needs, copying only the k-means sample"""
+        n = self._size
+        live = np.flatnonzero(self._alive[:n])
+        if len(live) == 0:
+            return None
+        nlist = self.fixed_nlist or int(np.clip(4 * np.sqrt(len(live)), 16, 4096))
+        nlist = min(nlist, len(live))
+        if len(live) > 64 * nlist:
+            rng = np.random.default_rng(0)
+            live = np.sort(rng.choice(live, size=64 * nlist, replace=False))
+        # Fancy indexing kopierar urvalet; hela matrisen delas bara som referens
+        return self._vecs, n, self._vecs[live], nlist, self._layout
+
+    def _fit(self, vecs: np.ndarray, n: int, sample: np.ndarray, nlist: int, layout: int) -> None:
+        """k-means and list assignment outside the lock, then swap in under it"""
+        centroids = _kmeans(sample, nlist)
+        # Rader < n ändras bara av tombstones (som filtreras på _alive) eller compaction (se layout)
+        assign = _assign(vecs[:n], centroids)
+        with self._lock:
+            if layout != self._layout:
+                logger.info("IVF training discarded: index was compacted meanwhile, retrying on next add")
+                return
+            if self._size > n:
+                # Vektorer som lades till under träningen
+                assign = np.concatenate((assign, _assign(self._vecs[n: self._size], centroids)))
+            self._centroids = centroids
+            self._trained_size = len(self._row_of)
+            self._rebuild_lists(assign)
+            self.trainings += 1
+        logger.info(f"IVF index trained: {n} vectors, nlist={nlist}")
+
+    # --- query ---
+    def _list_rows(self, lst: int) -> np.ndarray:
+        arr = self._list_cache[lst]
+        if arr is None:
+            arr = np.asarray(self._lists[lst], dtype=np.int64)
+            self._list_cache[lst] = arr
+        return arr
+
+    def search(
+        self, query: VectorLike, k: int = 5, nprobe: Optional[int] = None, ids: Optional[Iterable[int]] = None
+    ) -> List[Tuple[int, float]]:
+        q = as_float32(query)
+        if q.shape[0] != self.dim:
+            raise ValueError(f"Query dim {q.shape[0]} != index dim {self.dim}")
+        norm = float(np.linalg.norm(q))
+        if norm == 0 or k <= 0:
+            return []
+        q = q / norm
+        with self._lock:
+            if not self._row_of:
+                return []
+            if ids is not None:
+                # Filtrerad sökning: exakt över de tillåtna raderna, inga listor probas
+                rows = np.fromiter((p for p in (self._row_of.get(int(i)) for i in ids) if p is not None), np.int64)
+                rows = rows[self._alive[rows]]
+            elif self.trained:
+                probe = min(nprobe or self.nprobe, len(self._centroids))
+                cs = self._centroids @ q
+                lists = np.argpartition(-cs, probe - 1)[:probe]
+                rows = np.concatenate([self._list_rows(int(i)) for i in lists])
+                rows = rows[self._alive[rows]]
+            else:
+                rows = np.flatnonzero(self._alive[: self._size])
+            if len(rows) == 0:
+                return []
+            scores = self._vecs[rows] @ q
+            k = min(k, len(rows))
+            top = np.argpartition(-scores, k - 1)[:k] if k < len(rows) else np.arange(len(rows))
+            top = top[np.argsort(-scores[top])]
+            return [(int(self._ids[rows[i]]), float(scores[i])) for i in top]
+
+    # --- persistence ---
+    def save(self, path: Optional[str] = None) -> None:
+        """Atomically write live vectors + centroids, then clear the tombstone log"""
+        path = path or self.path
+        if not path:
+            return
+        with self._lock:
+            if self._tombstones:
+                self._compact()
+            n = self._size
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            tmp = path + ".tmp"
+            with open(tmp, "wb") as f:
+                np.savez(
+                    f,
+                    ids=self._ids[:n],
+                    vecs=self._vecs[:n],
+                    centroids=self._centroids if self.trained else np.zeros((0, self.dim), dtype=np.float32),
+                    meta=np.array([self.dim, self._trained_size], dtype=np.int64),
+                )
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, path)
+            try:
+                os.remove(path + ".tombstones")
+            except FileNotFoundError:
+                pass
+
+    @classmethod
+    def load(cls, path: str, **kwargs: Any) -> Optional["IVFIndex"]:
+        """Load a saved index and replay its tombstone log; None if missing/corrupt"""
+        if not os.path.exists(path):
+            return None
+        try:
+            with np.load(path) as data:
+                dim, trained_size = (int(x) for x in data["meta"])
+                index = cls(dim, path=path, capacity=max(1024, len(data["ids"])), **kwargs)
+                ids, vecs, centroids = data["ids"], data["vecs"], data["centroids"]
+        except Exception as e:
+            logger.warning(f"Could not load IVF index {path}: {e}")
+            return None
+        n = len(ids)
+        index._vecs[:n] = vecs
+        index._ids[:n] = ids
+        index._alive[:n] = True
+        index._size = n
+        index._row_of = {int(m): r for r, m in enumerate(ids)}
+        if len(centroids):
+            index._centroids = centroids.astype(np.float32)
+            index._trained_size = trained_size
+            index._rebuild_lists(_assign(index._vecs[:n], index._centroids))
+        tomb = path + ".tombstones"
+        if os.path.exists(tomb):
+            with open(tomb, "r", encoding="utf-8") as f:
+                dead = [int(line) for line in f if line.strip()]
+            index._tombstone_rows([index._row_of[i] for i in dead if i in index._row_of])
+        return index
+
+    def ids(self) -> List[int]:
+        with self._lock:
+            return list(self._row_of)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "mode": "ivf",
+                "vectors": len(self._row_of),
+                "tombstones": self._tombstones,
+                "dim": self.dim,
+                "trained": self.trained,
+                "nlist": len(self._centroids) if self.trained else 0,
+                "training": self._trainer is not None,
+                "nprobe": self.nprobe,
+                "bytes": int(self._vecs[: self._size].nbytes),
+            }
@@ -14,6 +14,8 @@ from urllib.parse import urlencode
 import json
 from contextlib import asynccontextmanager
 
+from http_pool import http_clients
+
 logger = logging.getLogger("alice.api_client_manager")
 
 class ServiceStatus(Enum):
@@ -76,6 +78,14 @@ class CircuitBreaker:
     last_failure_time: Optional[datetime] = None
     next_attempt_time: Optional[datetime] = None
 
+# Tjänst -> delad pool i http_pool (okända tjänster använder "default")
+SERVICE_POOLS: Dict[str, str] = {
+    "google_calendar": "google",
+    "gmail": "google",
+    "spotify": "spotify",
+    "openai": "openai",
+}
+
 class APIClientManager:
     """
     Centralized API client manager with rate limiting, circuit breaking, and graceful degradation
@@ -83,7 +93,7 @@ class APIClientManager:
     
     def __init__(self):
         self.services: Dict[str, ServiceConfig] = {}
-        self.clients: Dict[str, httpx.AsyncClient] = {}
+        self.clients: Dict[str, Any] = {}
         self.metrics: Dict[str, ServiceMetrics] = {}
         self.circuit_breakers: Dict[str, CircuitBreaker] = {}
         self.rate_limiters: Dict[str, Dict] = {}  # Service-specific rate limiters
@@ -161,12 +171,9 @@ class APIClientManager:
             "last_reset": time.time()
         }
         
-        # Create HTTP client for service
-        self.clients[config.name] = httpx.AsyncClient(
-            base_url=config.base_url,
-            timeout=config.timeout,
-            limits=httpx.Limits(max_connections=20, max_keepalive_connections=10)
-        )
+        # Delad klient per tjänstetyp (http_pool) med tjänstens bas-URL och timeout
+        pool = SERVICE_POOLS.get(config.name, config.name if config.name in http_clients.pools else "default")
+        self.clients[config.name] = http_clients.bind(pool, timeout=config.timeout, base_url=config.base_url)
         
         logger.info(f"Registered service: {config.name} ({config.base_url})")
     
@@ -613,9 +620,7 @@ class APIClientManager:
         if self._health_check_task:
             self._health_check_task.cancel()
         
-        # Close all HTTP clients
-        for client in self.clients.values():
-            await client.aclose()
+        # HTTP-klienterna är delade och stängs av http_clients.aclose()
         
         # Clear caches
         self.cache.clear()
@@ -9,7 +9,7 @@ import tempfile
 import base64
 import hashlib
 from datetime import datetime, timedelta
-from typing import Any, AsyncGenerator, Dict, Optional, Set, List
+from typing import Any, AsyncGenerator, Dict, Optional, Set, List, Union
 
 # Additional imports for enhanced metrics
 try:
@@ -27,10 +27,23 @@ from dotenv import load_dotenv
 import httpx
 
 from memory import MemoryStore
+from memory_async import AsyncMemoryStore
+from query_cache import QueryCache
+from event_journal import EventJournal
+from tool_stats import ToolStatsCounters
+from memory_tiers import HotTier
+from http_pool import http_clients
+from llm.hedging import HedgePolicy, prompt_class
+from llm.scheduler import Priority, llm_scheduler
+from db_maintenance import ActivityMiddleware, ActivityTracker, DatabaseMaintenance
+from db_snapshot import replicas
+from telemetry import parse_time
+from embedding_pipeline import EmbeddingPipeline
+from embedding_backfill import EmbeddingBackfill
 from decision import EpsilonGreedyBandit, simulate_first
 from prompts.system_prompts import system_prompt as SP, developer_prompt as DP
 from metrics import metrics
-from training import stream_dataset
+from training import FORMATS as TRAINING_FORMATS, stream_dataset
 from core import (
     list_tool_specs, 
     validate_and_execute_tool,
@@ -47,11 +60,11 @@ from harmony_test_endpoint import HarmonyTestBatchRequest, HarmonyTestBatchRespo
 # from intent_router import get_intent_router
 # from voice_stt import transcribe_audio_file, get_stt_status
 # from audio_processor import audio_processor, voice_gateway_audio_processor
-from deps import get_global_openai_settings, OpenAIClient, validate_openai_config
+from deps import get_global_openai_settings, validate_openai_config
 from services import probe_api
 # from b3_ambient_voice import get_b3_ambient_manager
 from b3_barge_in_controller import router as barge_in_router
-from b3_privacy_hooks import router as privacy_router
+from b3_privacy_hooks import router as privacy_router, get_b3_privacy_hooks
 from b3_metrics import router as metrics_router
 from services import voice_gateway as voice_gateway_service
 from services import ambient_memory, realtime_asr, reflection
@@ -359,7 +372,15 @@ app.add_middleware(RequestIDMiddleware)
 rate_limiter = create_alice_rate_limiter()
 app.add_middleware(type(rate_limiter), rules=rate_limiter.rules)
 
+# Förfrågningstakt (HTTP + websocket-meddelanden) avgör när databasunderhåll får köras
+activity = ActivityTracker()
+app.add_middleware(ActivityMiddleware, tracker=activity)
+
 MINIMAL_MODE = os.getenv("ALICE_MINIMAL", "0") == "1"
+# Vektorkandidater i chat-RAG (kräver OPENAI_API_KEY; ett embedding-anrop per fråga, av som default)
+RAG_VECTOR_SEARCH = (os.getenv("RAG_VECTOR_SEARCH", "false").lower() == "true")
+# Minsta relevans (nyckelordsträffar) för att ett minne ska räknas som bra kontext
+RAG_MIN_RELEVANCE = float(os.getenv("RAG_MIN_RELEVANCE", "2"))
 # Harmony feature flags (Fas 1 – adapter bakom flaggor)
 USE_HARMONY = (os.getenv("USE_HARMONY", "false").lower() == "true")
 USE_TOOLS = (os.getenv("USE_TOOLS", "false").lower() == "true")
@@ -465,7 +486,7 @@ async def _router_first_try(prompt: str) -> Optional[Dict[str, Any]]:
             }
         
         # Fallback till NLU/Agent-routern
-        async with httpx.AsyncClient(timeout=2.5) as client:
+        async with http_clients.session("local", timeout=2.5) as client:
             r = await client.post(f"{NLU_AGENT_URL}/agent/route", json={"text": prompt})
             if r.status_code != 200:
                 return None
@@ -817,10 +838,100 @@ async def startup_event():
 DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
 os.makedirs(DATA_DIR, exist_ok=True)
 MEMORY_PATH = os.path.join(DATA_DIR, "alice.db")
-memory = MemoryStore(MEMORY_PATH)
+memory = MemoryStore(
+    MEMORY_PATH,
+    vector_quantize=os.getenv("MEMORY_VECTOR_QUANT") or None,
+    vector_index_mode=os.getenv("MEMORY_VECTOR_INDEX", "exact"),  # 'exact' | 'ivf'
+    ann_nprobe=int(os.getenv("MEMORY_ANN_NPROBE", "8")),
+    # LRU+TTL-cache för upprepade RAG-frågor (HUD/röst); 0 stänger av
+    query_cache=QueryCache(
+        max_entries=int(os.getenv("MEMORY_QUERY_CACHE_SIZE", "1024")),
+        ttl_s=float(os.getenv("MEMORY_QUERY_CACHE_TTL", "60")),
+        metrics=metrics,
+    ) if int(os.getenv("MEMORY_QUERY_CACHE_SIZE", "1024")) > 0 else None,
+    # Dubbletter (exakt SHA-256 eller MinHash-likhet >= tröskeln) slås ihop i stället för att lagras igen
+    dedup=os.getenv("MEMORY_DEDUP", "true").lower() == "true",
+    dedup_threshold=float(os.getenv("MEMORY_DEDUP_THRESHOLD", "0.85")),
+)
+# Write-behind för append_event (chat.in/out, ws_in, ...): ringbuffert + gruppcommit i bakgrundstråd
+if os.getenv("MEMORY_EVENT_JOURNAL", "true").lower() == "true":
+    memory.event_journal = EventJournal(
+        memory,
+        max_queue=int(os.getenv("MEMORY_EVENT_QUEUE", "100000")),
+        batch_size=int(os.getenv("MEMORY_EVENT_BATCH", "4096")),
+        flush_interval_s=float(os.getenv("MEMORY_EVENT_FLUSH_MS", "50")) / 1000.0,
+        durability=os.getenv("MEMORY_EVENT_DURABILITY", "normal"),  # 'off' | 'normal' | 'full'
+    )
+# tool_stats i minnet: bandit/pick_tool och /api/tools/stats utan SQLite, deltan skrivs periodiskt
+if os.getenv("TOOL_STATS_IN_MEMORY", "true").lower() == "true":
+    memory.tool_counters = ToolStatsCounters(
+        memory,
+        flush_interval_s=float(os.getenv("TOOL_STATS_FLUSH_S", "5")),
+        batch_size=int(os.getenv("TOOL_STATS_FLUSH_BATCH", "256")),
+    )
+# Het nivå: senaste dagarna + högt poängsatta minnen i in-memory SQLite, disk bara när den inte räcker
+if os.getenv("MEMORY_HOT_TIER", "true").lower() == "true":
+    memory.hot_tier = HotTier(
+        memory,
+        recent_days=float(os.getenv("MEMORY_HOT_DAYS", "14")),
+        min_score=float(os.getenv("MEMORY_HOT_MIN_SCORE", "2.0")),
+        max_items=int(os.getenv("MEMORY_HOT_MAX_ITEMS", "50000")),
+        promote_hits=float(os.getenv("MEMORY_HOT_PROMOTE_HITS", "3")),
+        rebalance_interval_s=float(os.getenv("MEMORY_HOT_REBALANCE_S", "600")),
+    )
+# auto-provider: lokal först, OpenAI bara som hedge när lokalt dröjer över inlärd p90 (med minutbudget)
+llm_hedge = HedgePolicy.from_env()
+# Awaitable facade: håller SQLite borta från event-loopen i async-handlers
+amemory = AsyncMemoryStore(memory, readers=int(os.getenv("MEMORY_READER_THREADS", "4")))
+# "Glöm det där" ska radera ur samma store (och dess vektorindex) som chatten skriver till
+get_b3_privacy_hooks(amemory)
+# Multi-input embeddings med begränsad samtidighet (OPENAI_EMBED_BASE_URL för lokal server)
+embedder = EmbeddingPipeline.from_env()
+# Bakgrunds-backfill för minnen utan embedding (t.ex. från respond()), återupptas vid omstart
+embedding_backfill = EmbeddingBackfill(
+    amemory,
+    embedder,
+    batch_size=int(os.getenv("EMBED_BACKFILL_BATCH", "64")),
+    rate_per_s=float(os.getenv("EMBED_BACKFILL_RATE", "20")),
+    max_attempts=int(os.getenv("EMBED_BACKFILL_MAX_ATTEMPTS", "3")),
+)
 bandit = EpsilonGreedyBandit(memory)
 
 
+def _maintenance_databases() -> Dict[str, str]:
+    dbs = {
+        "alice": MEMORY_PATH,
+        "ambient": os.path.join(DATA_DIR, "ambient.db"),
+        "patterns": os.path.join(DATA_DIR, "patterns.db"),
+        "triggers": os.path.join(DATA_DIR, "triggers.db"),
+        "proactive": os.path.abspath("proactive.db"),
+    }
+    auth_url = os.getenv("DATABASE_URL", "sqlite:///./data/alice_auth.db")
+    if auth_url.startswith("sqlite:///"):
+        dbs["auth"] = os.path.abspath(auth_url[len("sqlite:///"):])
+    return dbs
+
+
+# PRAGMA optimize, FTS5 merge, incremental vacuum och WAL-checkpoint i korta steg när servern är ledig
+db_maintenance = DatabaseMaintenance(
+    _maintenance_databases(),
+    activity,
+    interval_s=float(os.getenv("DB_MAINTENANCE_INTERVAL_S", "3600")),
+    quiet_s=float(os.getenv("DB_MAINTENANCE_QUIET_S", "60")),
+    max_rate_per_min=float(os.getenv("DB_MAINTENANCE_MAX_RATE", "6")),
+)
+
+# Läsrepliker för analysvägar (träningsexport, KPI:er, mönsteranalys, B1/B2-räkningar)
+if os.getenv("DB_SNAPSHOTS", "true").lower() == "true":
+    _maintenance_dbs = _maintenance_databases()
+    for _name in ("alice", "ambient", "proactive"):
+        replicas.register(
+            _maintenance_dbs[_name],
+            replica_dir=os.path.join(DATA_DIR, "replicas"),
+            max_age_s=float(os.getenv("DB_SNAPSHOT_MAX_AGE_S", "300")),
+        )
+
+
 class AliceCommand(BaseModel):
     type: str = Field(..., description="Command type, e.g., SHOW_MODULE, HIDE_OVERLAY, OPEN_VIDEO")
     payload: Optional[Dict[str, Any]] = None
@@ -896,7 +1007,8 @@ async def health() -> Dict[str, Any]:
             "version": "2.0.0",
             "database": {
                 "status": "ok" if db_status else "error",
-                "ping": db_status
+                "ping": db_status,
+                "pool": memory.pool_stats()
             },
             "features": {
                 "harmony": USE_HARMONY,
@@ -961,6 +1073,28 @@ async def get_metrics() -> Dict[str, Any]:
             "timestamp": datetime.utcnow().isoformat() + "Z",
             "application": app_metrics,
             "system": system_metrics,
+            "memory_store": {
+                "pool": memory.pool_stats(),
+                "async_latency_ms": amemory.stats(),
+                "vector_indexes": memory.vector_stats(),
+                "query_cache": memory.query_cache.stats() if memory.query_cache else None,
+                "embeddings": embedder.stats(),
+                "embedding_backfill": embedding_backfill.stats(),
+                "event_journal": memory.event_journal.stats() if memory.event_journal else None,
+                "tool_counters": memory.tool_counters.stats() if memory.tool_counters else None,
+                "hot_tier": memory.hot_tier.stats() if memory.hot_tier else None,
+                "partitions": memory.partition_stats(),
+                "dedup": memory.dedup_stats()
+            },
+            # Storlek/fragmentering före och efter senaste underhåll, per SQLite-fil
+            "db_maintenance": db_maintenance.stats(),
+            "db_snapshots": replicas.stats(),
+            # Poolträffar och uppkopplingstid (TCP + TLS) per utgående tjänst
+            "http_pools": http_clients.stats(),
+            # auto-provider: hedge-andel, vinster per sida och sparade molnanrop
+            "llm_hedge": llm_hedge.stats(),
+            # Kötid per prioritetsklass och beläggning per LLM-backend
+            "llm_scheduler": llm_scheduler.stats(),
             "features": {
                 "harmony_enabled": USE_HARMONY,
                 "tools_enabled": USE_TOOLS
@@ -1221,6 +1355,47 @@ async def tools_enabled() -> Dict[str, Any]:
     return {"ok": True, "enabled": enabled_tools()}
 
 
+async def _embed_query(text: str, timeout: float = 5.0) -> Optional[Any]:
+    """Embedding för en sökfråga, None om nyckel saknas eller anropet misslyckas"""
+    if not embedder.enabled or not (text or "").strip():
+        return None
+    try:
+        return (await asyncio.wait_for(embedder.embed([text]), timeout))[0]
+    except Exception as e:
+        logger.warning(f"Query embedding failed: {e}")
+    return None
+
+
+async def _rag_query_vector(text: str) -> Optional[Any]:
+    """Frågevektor för chat-RAG; hoppar över embed-anropet när indexet är tomt"""
+    if not RAG_VECTOR_SEARCH or not embedder.enabled:
+        return None
+    try:
+        index = await amemory.vector_index(embedder.model)
+    except Exception as e:
+        logger.warning(f"Vector index unavailable for RAG: {e}")
+        return None
+    if index is None or len(index) == 0:
+        return None
+    return await _embed_query(text)
+
+
+def _rag_relevance(ctx: Dict[str, Any], prompt: str, key_words: List[str], expanded_words: Set[str]) -> float:
+    """Termbaserad relevans för en RAG-kandidat (exakt fråga, nyckelord, synonymer, struktur)"""
+    text_lower = (ctx.get('text') or '').lower()
+    score = 0.0
+    if prompt.lower() in text_lower:
+        score += 10
+    score += 2 * sum(1 for word in key_words if word in text_lower)
+    score += sum(1 for word in expanded_words if word.lower() in text_lower)
+    if any(marker in text_lower for marker in ['#', '<h', '**', 'viktigt', 'exempel']):
+        score += 1
+    # Närmaste semantiska granne väger som en nyckelordsträff
+    if ctx.get('vector_rank') == 1:
+        score += 2
+    return score + (ctx.get('score') or 0)
+
+
 class ChatBody(BaseModel):
     prompt: str
     model: Optional[str] = "gpt-oss:20b"
@@ -1240,9 +1415,14 @@ async def chat(body: ChatBody) -> Dict[str, Any]:
     import hashlib
     session_id = hashlib.md5(f"{body.model or 'default'}_{int(t_request/3600)}".encode()).hexdigest()[:8]
     
+    # Frågevektorn hämtas parallellt med konversationsskrivning och synonymexpansion
+    rag_vector_task = None
+    if not (MINIMAL_MODE or bool(body.raw)):
+        rag_vector_task = asyncio.create_task(_rag_query_vector(body.prompt))
+
     # Track user message in conversation context
     try:
-        memory.add_conversation_turn(session_id, "user", body.prompt or "")
+        await amemory.add_conversation_turn(session_id, "user", body.prompt or "")
     except Exception:
         pass
     
@@ -1284,52 +1464,20 @@ async def chat(body: ChatBody) -> Dict[str, Any]:
                         expanded_words.add(key)
                         expanded_words.update(values)
             
-            # Search with expanded terms (increased limit for reranking)
-            contexts = []
-            for word in expanded_words:
-                if len(word) > 2:  # Skip short words
-                    word_results = memory.retrieve_text_memories(word, limit=10)  # Increased from 2 to 10
-                    contexts.extend(word_results)
-            
-            # Remove duplicates and score by relevance
-            seen_ids = set()
-            scored_contexts = []
-            
-            for ctx in contexts:
-                if ctx['id'] not in seen_ids:
-                    seen_ids.add(ctx['id'])
-                    
-                    # Calculate relevance score based on term frequency
-                    text_lower = ctx['text'].lower()
-                    score = 0
-                    
-                    # Boost for exact query matches
-                    if body.prompt.lower() in text_lower:
-                        score += 10
-                    
-                    # Boost for individual key words
-                    for word in key_words:
-                        if word in text_lower:
-                            score += 2
-                    
-                    # Boost for synonyms
-                    for word in expanded_words:
-                        if word.lower() in text_lower:
-                            score += 1
-                    
-                    # Boost for headers and structured content
-                    if any(marker in text_lower for marker in ['#', '<h', '**', 'viktigt', 'exempel']):
-                        score += 1
-                        
-                    ctx['relevance_score'] = score + ctx.get('score', 0)
-                    scored_contexts.append(ctx)
-            
-            # Sort by relevance and apply quality threshold
-            scored_contexts.sort(key=lambda x: x['relevance_score'], reverse=True)
+            # Hybrid: FTS5 BM25 över hela termmängden + vektorkandidater, RRF-fusion i MemoryStore
+            query_vector = await rag_vector_task
+            candidates = await amemory.retrieve_hybrid(
+                expanded_words,
+                query_vector=query_vector,
+                model=embedder.model,
+                limit=10,  # fler kandidater för relevansfiltrering
+            )
             
-            # Quality threshold - only include contexts with decent relevance
-            MIN_RELEVANCE_SCORE = 2  # Require at least some keyword matches
-            high_quality_contexts = [ctx for ctx in scored_contexts if ctx['relevance_score'] >= MIN_RELEVANCE_SCORE]
+            # Score by relevance and apply quality threshold
+            for ctx in candidates:
+                ctx['relevance_score'] = _rag_relevance(ctx, body.prompt, key_words, expanded_words)
+            scored_contexts = sorted(candidates, key=lambda x: x['relevance_score'], reverse=True)
+            high_quality_contexts = [ctx for ctx in scored_contexts if ctx['relevance_score'] >= RAG_MIN_RELEVANCE]
             
             if len(high_quality_contexts) >= 2:
                 contexts = high_quality_contexts[:5]  # Use high-quality matches
@@ -1343,14 +1491,16 @@ async def chat(body: ChatBody) -> Dict[str, Any]:
             logger.info(f"RAG memory retrieval found {len(contexts)} contexts (from {len(scored_contexts)} candidates, {len(high_quality_contexts)} high-quality) for query: {body.prompt[:50]}")
         except Exception as e:
             logger.warning(f"Primary memory retrieval failed: {e}")
+            if not rag_vector_task.done():
+                rag_vector_task.cancel()
             try:
                 # Enhanced: använd conversation context för bättre retrieval
-                contexts = memory.get_related_memories_from_context(session_id, body.prompt, limit=5)
+                contexts = await amemory.get_related_memories_from_context(session_id, body.prompt, limit=5)
                 logger.info(f"Context-based retrieval found {len(contexts)} contexts")
             except Exception as e2:
                 logger.warning(f"Context-based retrieval failed: {e2}")
                 try:
-                    contexts = memory.retrieve_text_bm25_recency(body.prompt, limit=5)
+                    contexts = await amemory.retrieve_text_bm25_recency(body.prompt, limit=5)
                     logger.info(f"BM25 retrieval found {len(contexts)} contexts")
                 except Exception as e3:
                     logger.warning(f"BM25 retrieval failed: {e3}")
@@ -1381,7 +1531,7 @@ async def chat(body: ChatBody) -> Dict[str, Any]:
         ) + f"Använd relevant kontext ovan vid behov. Besvara på svenska.\n\nFråga: {body.prompt}\nSvar:"
         logger.info(f"Final full_prompt length: {len(full_prompt)}, includes RAG: {bool(ctx_text)}")
     try:
-        memory.append_event("chat.in", json.dumps({"prompt": body.prompt}, ensure_ascii=False))
+        await amemory.append_event("chat.in", json.dumps({"prompt": body.prompt}, ensure_ascii=False))
     except Exception:
         pass
     # Välj provider
@@ -1391,10 +1541,10 @@ async def chat(body: ChatBody) -> Dict[str, Any]:
         mem_id: Optional[int] = None
         try:
             tags = {"source": "chat", "model": body.model or "gpt-oss:20b", "provider": used_provider, "engine": engine}
-            mem_id = memory.upsert_text_memory_single(text, score=0.0, tags_json=json.dumps(tags, ensure_ascii=False))
-            memory.append_event("chat.out", json.dumps({"text": text, "memory_id": mem_id}, ensure_ascii=False))
+            mem_id = await amemory.upsert_text_memory_single(text, score=0.0, tags_json=json.dumps(tags, ensure_ascii=False))
+            await amemory.append_event("chat.out", json.dumps({"text": text, "memory_id": mem_id}, ensure_ascii=False))
             # Track assistant message in conversation context
-            memory.add_conversation_turn(session_id, "assistant", text, mem_id)
+            await amemory.add_conversation_turn(session_id, "assistant", text, mem_id)
         except Exception:
             pass
         return {"ok": True, "text": text, "memory_id": mem_id, "provider": used_provider, "engine": engine}
@@ -1403,7 +1553,7 @@ async def chat(body: ChatBody) -> Dict[str, Any]:
     async def try_local():
         try:
             t0 = time.time()
-            async with httpx.AsyncClient(timeout=60.0) as client:
+            async with llm_scheduler.slot("ollama", Priority.CHAT), http_clients.session("ollama", timeout=60.0) as client:
                 r = await client.post(
                     "http://127.0.0.1:11434/api/generate",
                     json={
@@ -1468,7 +1618,7 @@ async def chat(body: ChatBody) -> Dict[str, Any]:
             return RuntimeError("openai_key_missing")
         try:
             t0 = time.time()
-            async with httpx.AsyncClient(timeout=25.0) as client:
+            async with llm_scheduler.slot("openai", Priority.CHAT), http_clients.session("openai", timeout=25.0) as client:
                 r = await client.post(
                     "https://api.openai.com/v1/chat/completions",
                     headers={"Authorization": f"Bearer {api_key}"},
@@ -1574,31 +1724,19 @@ async def chat(body: ChatBody) -> Dict[str, Any]:
             if isinstance(res, dict):
                 return res
             last_error = res
-        else:  # auto: race local vs openai
-            t_local = asyncio.create_task(try_local())
-            t_openai = asyncio.create_task(try_openai())
-            done, pending = await asyncio.wait({t_local, t_openai}, return_when=asyncio.FIRST_COMPLETED)
-            for d in done:
-                res = d.result()
-                if isinstance(res, dict) and (res.get("text") or "").strip():
-                    # cancel the slower one
-                    for p in pending:
-                        p.cancel()
-                    metrics.record_llm_hit()
-                    metrics.record_final_latency((time.time() - t_request) * 1000)
-                    return res
-                last_error = res
-            # if first completed wasn't dict, wait the other
-            for p in pending:
-                try:
-                    res = await p
-                    if isinstance(res, dict) and (res.get("text") or "").strip():
-                        metrics.record_llm_hit()
-                        metrics.record_final_latency((time.time() - t_request) * 1000)
-                        return res
-                    last_error = res
-                except asyncio.CancelledError:
-                    pass
+        else:  # auto: lokal först, OpenAI som hedge/failover
+            # race() lär sig latensen från try_locals beviljade ollama-slot; kötid bakom röst räknas inte
+            hedged = await llm_hedge.race(
+                try_local,
+                try_openai if os.getenv("OPENAI_API_KEY") else None,
+                prompt_class("chat", full_prompt),
+                accept=lambda r: isinstance(r, dict) and bool((r.get("text") or "").strip()),
+            )
+            if hedged.winner:
+                metrics.record_llm_hit()
+                metrics.record_final_latency((time.time() - t_request) * 1000)
+                return hedged.value
+            last_error = hedged.value
     except Exception:
         logger.exception("/api/chat error")
     # Stub: visa vilken kontext som skulle ha använts, för verifiering i UI
@@ -1667,7 +1805,7 @@ async def chat_stream(body: ChatBody):
             if not api_key:
                 return
             try:
-                async with httpx.AsyncClient(timeout=None) as client:
+                async with llm_scheduler.slot("openai", Priority.CHAT), http_clients.session("openai", timeout=None) as client:
                     r = await client.post(
                         "https://api.openai.com/v1/chat/completions",
                         headers={"Authorization": f"Bearer {api_key}"},
@@ -1805,7 +1943,7 @@ async def chat_stream(body: ChatBody):
 
         async def local_stream():
             try:
-                async with httpx.AsyncClient(timeout=None) as client:
+                async with llm_scheduler.slot("ollama", Priority.CHAT), http_clients.session("ollama", timeout=None) as client:
                     r = await client.post(
                         "http://127.0.0.1:11434/api/generate",
                         json={
@@ -2231,7 +2369,7 @@ async def ai_act(body: ActBody) -> Dict[str, Any]:
     async def try_local():
         try:
             t0 = time.time()
-            async with httpx.AsyncClient(timeout=15.0) as client:
+            async with llm_scheduler.slot("ollama", Priority.TOOLS), http_clients.session("ollama", timeout=15.0) as client:
                 r = await client.post(
                     "http://127.0.0.1:11434/api/generate",
                     json={
@@ -2256,7 +2394,7 @@ async def ai_act(body: ActBody) -> Dict[str, Any]:
             return None
         try:
             t0 = time.time()
-            async with httpx.AsyncClient(timeout=20.0) as client:
+            async with llm_scheduler.slot("openai", Priority.TOOLS), http_clients.session("openai", timeout=20.0) as client:
                 r = await client.post(
                     "https://api.openai.com/v1/chat/completions",
                     headers={"Authorization": f"Bearer {api_key}"},
@@ -2286,25 +2424,9 @@ async def ai_act(body: ActBody) -> Dict[str, Any]:
     elif provider == "openai":
         proposed = await try_openai()
     else:
-        # auto: race
-        t_local = asyncio.create_task(try_local())
-        t_openai = asyncio.create_task(try_openai())
-        done, pending = await asyncio.wait({t_local, t_openai}, return_when=asyncio.FIRST_COMPLETED)
-        proposed = None
-        for d in done:
-            val = d.result()
-            if val:
-                proposed = val
-                break
-        if proposed is None:
-            for p in pending:
-                try:
-                    val = await p
-                    if val:
-                        proposed = val
-                        break
-                except asyncio.CancelledError:
-                    pass
+        # auto: lokal först, OpenAI som hedge/failover
+        hedged = await llm_hedge.race(try_local, try_openai if os.getenv("OPENAI_API_KEY") else None, prompt_class("ai_act", full_prompt), accept=bool)
+        proposed = hedged.value if hedged.winner else None
     # Fallback: enkel regelbaserad tolkning
     if proposed is None:
         low = (user or "").lower()
@@ -2380,18 +2502,89 @@ class SensorBody(BaseModel):
 @app.post("/api/sensor/telemetry")
 async def sensor_telemetry(body: SensorBody) -> Dict[str, Any]:
     meta_json = json.dumps(body.meta) if body.meta is not None else None
-    sid = memory.add_sensor_telemetry(body.sensor, body.value, meta_json=meta_json)
-    memory.append_event("sensor.telemetry", json.dumps({"id": sid, "sensor": body.sensor}))
+    sid = await amemory.add_sensor_telemetry(body.sensor, body.value, meta_json=meta_json)
+    await amemory.append_event("sensor.telemetry", json.dumps({"id": sid, "sensor": body.sensor}))
     return {"ok": True, "id": sid}
 
 
+class SensorReading(SensorBody):
+    ts: Optional[Union[float, str]] = None  # epoch-sekunder eller ISO; None = nu
+
+
+class SensorBatchBody(BaseModel):
+    readings: List[SensorReading]
+
+
+@app.post("/api/sensor/telemetry/batch")
+async def sensor_telemetry_batch(body: SensorBatchBody) -> Dict[str, Any]:
+    # En transaktion för alla mätningar, rollups (1m/1h/1d) uppdateras i samma commit
+    try:
+        readings = [
+            (r.sensor, r.value, json.dumps(r.meta) if r.meta is not None else None,
+             parse_time(r.ts) if r.ts not in (None, "") else None)
+            for r in body.readings
+        ]
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    ids = await amemory.add_sensor_telemetry_batch(readings)
+    await amemory.append_event("sensor.telemetry", json.dumps({"count": len(ids), "sensors": sorted({r[0] for r in readings})}))
+    return {"ok": True, "ids": ids}
+
+
+@app.get("/api/sensor/telemetry")
+async def sensor_telemetry_range(
+    sensor: str,
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    max_points: int = 500,
+    resolution: Optional[str] = None,
+) -> Dict[str, Any]:
+    """Downsampled series; reads the coarsest rollup that satisfies max_points/resolution"""
+    try:
+        return await amemory.query_sensor_telemetry(
+            sensor, start=start, end=end, max_points=max(1, min(max_points, 10000)), resolution=resolution
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
 @app.get("/api/training/dump")
-async def training_dump():
-    # Stream newline-delimited JSON for offline training pipeline
-    async def gen():
-        for chunk in stream_dataset(MEMORY_PATH):
-            yield chunk
-    return ORJSONResponse(gen(), media_type="application/x-ndjson")
+async def training_dump(
+    since: Optional[str] = None,
+    tables: Optional[str] = None,
+    topics: Optional[str] = None,
+    min_score: Optional[float] = None,
+    format: str = "ndjson",
+    compression: str = "none",
+):
+    """Stream the training dataset (NDJSON, or Arrow/Parquet for one table).
+
+    ``since`` is the last ``cursor`` value from an earlier (possibly interrupted)
+    export; only rows after it are sent. ``tables``/``topics`` are comma lists.
+    """
+    flushed_at = None
+    if memory.tool_counters is not None:
+        # Exporten läser tool_stats direkt ur databasen
+        await asyncio.to_thread(memory.tool_counters.flush)
+        flushed_at = memory.tool_counters.last_flush_at
+    # Exporten skannar hela tabeller: läs från repliken (högst DB_SNAPSHOT_MAX_AGE_S gammal),
+    # men aldrig en som togs före senaste tool_stats-flush
+    export_path = await asyncio.to_thread(replicas.fresh_path, MEMORY_PATH, flushed_at)
+    try:
+        chunks = stream_dataset(
+            export_path,
+            tables=[t.strip() for t in tables.split(",") if t.strip()] if tables else None,
+            cursor=since,
+            topics=[t.strip() for t in topics.split(",") if t.strip()] if topics else None,
+            min_score=min_score,
+            fmt=format,
+            compression=compression,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    headers = {"Content-Encoding": compression} if compression != "none" else {}
+    # Synkron iterator: Starlette läser den i trådpoolen, event-loopen blockeras inte
+    return StreamingResponse(chunks, media_type=TRAINING_FORMATS[format], headers=headers)
 
 
 class WeatherQuery(BaseModel):
@@ -2407,7 +2600,7 @@ async def weather_current(body: WeatherQuery) -> Dict[str, Any]:
         f"latitude={body.lat}&longitude={body.lon}&current=temperature_2m,weather_code"
     )
     try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
+        async with http_clients.session("weather", timeout=10.0) as client:
             r = await client.get(url)
             r.raise_for_status()
             data = r.json()
@@ -2430,7 +2623,7 @@ async def weather_openweather(body: WeatherQuery) -> Dict[str, Any]:
         f"lat={body.lat}&lon={body.lon}&units=metric&appid={api_key}"
     )
     try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
+        async with http_clients.session("weather", timeout=10.0) as client:
             r = await client.get(url)
             r.raise_for_status()
             data = r.json()
@@ -2458,7 +2651,7 @@ async def weather_by_city(body: CityQuery) -> Dict[str, Any]:
             "https://geocoding-api.open-meteo.com/v1/search?"\
             f"name={httpx.QueryParams({'name': body.city})['name']}&count=1&language=sv&format=json"
         )
-        async with httpx.AsyncClient(timeout=10.0) as client:
+        async with http_clients.session("weather", timeout=10.0) as client:
             gr = await client.get(geo_url)
             gr.raise_for_status()
             g = gr.json() or {}
@@ -2491,7 +2684,7 @@ async def geo_reverse(body: ReverseQuery) -> Dict[str, Any]:
             "https://geocoding-api.open-meteo.com/v1/reverse?"
             f"latitude={body.lat}&longitude={body.lon}&language=sv&format=json"
         )
-        async with httpx.AsyncClient(timeout=10.0) as client:
+        async with http_clients.session("weather", timeout=10.0) as client:
             r = await client.get(url)
             if r.status_code == 200:
                 data = r.json() or {}
@@ -2538,21 +2731,11 @@ class MemoryUpsert(BaseModel):
 @app.post("/api/memory/upsert")
 async def memory_upsert(body: MemoryUpsert) -> Dict[str, Any]:
     tags_json = json.dumps(body.tags) if body.tags is not None else None
-    mem_id = memory.upsert_text_memory_single(body.text, score=body.score or 0.0, tags_json=tags_json)
+    mem_id = await amemory.upsert_text_memory_single(body.text, score=body.score or 0.0, tags_json=tags_json)
     # Skapa embeddings (OpenAI) om nyckel finns
     try:
-        api_key = os.getenv("OPENAI_API_KEY")
-        if api_key and (body.text or "").strip():
-            async with httpx.AsyncClient(timeout=20.0) as client:
-                r = await client.post(
-                    "https://api.openai.com/v1/embeddings",
-                    headers={"Authorization": f"Bearer {api_key}"},
-                    json={"input": body.text, "model": os.getenv("OPENAI_EMBED_MODEL", "text-embedding-3-small")},
-                )
-                if r.status_code == 200:
-                    d = r.json() or {}
-                    vec = ((d.get("data") or [{}])[0].get("embedding") or [])
-                    memory.upsert_embedding(mem_id, model=os.getenv("OPENAI_EMBED_MODEL", "text-embedding-3-small"), dim=len(vec), vector_json=json.dumps(vec))
+        if (body.text or "").strip():
+            await embedder.embed_and_store(amemory, [mem_id], [body.text])
     except Exception:
         logger.exception("embedding upsert failed")
     return {"ok": True, "id": mem_id}
@@ -2561,60 +2744,38 @@ async def memory_upsert(body: MemoryUpsert) -> Dict[str, Any]:
 class MemoryQuery(BaseModel):
     query: str
     limit: Optional[int] = 5
+    # Taggfilter i SQL, t.ex. {"source": "document_upload", "filename": "rapport.pdf"}
+    tags: Optional[Dict[str, Any]] = None
 
 
 @app.post("/api/memory/retrieve")
 async def memory_retrieve(body: MemoryQuery) -> Dict[str, Any]:
-    # Hybrid: BM25/LIKE + semantisk (cosine)
-    like_items = memory.retrieve_text_memories(body.query, limit=(body.limit or 5))
-    results = list(like_items)
+    # Hybrid: FTS5 BM25 + semantisk (cosine), fuserade med RRF
+    query_vector = await _embed_query(body.query, timeout=20.0)
     try:
-        api_key = os.getenv("OPENAI_API_KEY")
-        if api_key and (body.query or "").strip():
-            async with httpx.AsyncClient(timeout=20.0) as client:
-                rq = await client.post(
-                    "https://api.openai.com/v1/embeddings",
-                    headers={"Authorization": f"Bearer {api_key}"},
-                    json={"input": body.query, "model": os.getenv("OPENAI_EMBED_MODEL", "text-embedding-3-small")},
-                )
-                if rq.status_code == 200:
-                    qv = ((rq.json().get("data") or [{}])[0].get("embedding") or [])
-                    rows = memory.get_all_embeddings(model=os.getenv("OPENAI_EMBED_MODEL", "text-embedding-3-small"))
-                    # Cosine similarity
-                    def cos(a,b):
-                        if not a or not b:
-                            return 0.0
-                        num = sum(x*y for x,y in zip(a,b))
-                        da = math.sqrt(sum(x*x for x in a))
-                        db = math.sqrt(sum(y*y for y in b))
-                        return (num/(da*db)) if da>0 and db>0 else 0.0
-                    sims = []
-                    for mem_id, dim, vec_json in rows:
-                        try:
-                            v = json.loads(vec_json)
-                            sims.append((mem_id, cos(qv, v)))
-                        except Exception:
-                            continue
-                    sims.sort(key=lambda x: x[1], reverse=True)
-                    top_ids = [mid for mid,_ in sims[: (body.limit or 5)]]
-                    id_to_text = memory.get_texts_for_mem_ids(top_ids)
-                    for mid in top_ids:
-                        txt = id_to_text.get(mid)
-                        if txt and all(x.get('text') != txt for x in results):
-                            results.append({"id": mid, "text": txt, "kind": "text", "score": 0.0, "ts": ""})
-    except Exception:
-        logger.exception("hybrid retrieve failed")
-    # Trim till limit*2 för att undvika för stor retur
-    return {"ok": True, "items": results[: max(1,(body.limit or 5))]}
+        items = await amemory.retrieve_hybrid(
+            body.query,
+            query_vector=query_vector,
+            model=embedder.model,
+            limit=max(1, body.limit or 5),
+            tags=body.tags,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"ok": True, "items": items}
 
 
 class MemoryRecentBody(BaseModel):
     limit: Optional[int] = 10
+    tags: Optional[Dict[str, Any]] = None
 
 
 @app.post("/api/memory/recent")
 async def memory_recent(body: MemoryRecentBody) -> Dict[str, Any]:
-    items = memory.get_recent_text_memories(limit=body.limit or 10)
+    try:
+        items = await amemory.get_recent_text_memories(limit=body.limit or 10, tags=body.tags)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     return {"ok": True, "items": items}
 
 
@@ -2634,14 +2795,23 @@ class FeedbackBody(BaseModel):
 @app.post("/api/feedback")
 async def feedback(body: FeedbackBody) -> Dict[str, Any]:
     if body.kind == "memory" and body.id is not None:
-        memory.update_memory_score(body.id, 1.0 if body.up else -1.0)
+        await amemory.update_memory_score(body.id, 1.0 if body.up else -1.0)
         return {"ok": True}
     if body.kind == "tool" and body.tool:
-        memory.update_tool_stats(body.tool, success=body.up)
+        await amemory.update_tool_stats(body.tool, success=body.up)
         return {"ok": True}
     return {"ok": False, "error": "invalid feedback payload"}
 
 
+def _text_preview(pieces: List[str], limit: int = 200) -> str:
+    head = ""
+    for piece in pieces:
+        head += piece[: limit + 1 - len(head)]
+        if len(head) > limit:
+            return head[:limit] + "..."
+    return head
+
+
 @app.post("/api/documents/upload")
 async def upload_document(
     file: UploadFile = File(...),
@@ -2686,9 +2856,10 @@ async def upload_document(
                 import PyPDF2
                 import io
                 pdf_reader = PyPDF2.PdfReader(io.BytesIO(content_bytes))
-                text_content = ""
-                for page in pdf_reader.pages:
-                    text_content += page.extract_text() + "\n"
+                # En bit per sida, extraherad utanför event-loopen; chunkern konsumerar sidorna i tur och ordning
+                text_pieces = await asyncio.to_thread(
+                    lambda: [page.extract_text() + "\n" for page in pdf_reader.pages]
+                )
             except ImportError:
                 return {"ok": False, "error": "PyPDF2 krävs för PDF-stöd. Installera: pip install PyPDF2"}
             except Exception as e:
@@ -2699,7 +2870,9 @@ async def upload_document(
                 import docx
                 import io
                 doc = docx.Document(io.BytesIO(content_bytes))
-                text_content = "\n".join([paragraph.text for paragraph in doc.paragraphs])
+                text_pieces = [
+                    ("\n" if i else "") + paragraph.text for i, paragraph in enumerate(doc.paragraphs)
+                ]
             except ImportError:
                 return {"ok": False, "error": "python-docx krävs för Word-stöd. Installera: pip install python-docx"}
             except Exception as e:
@@ -2708,15 +2881,15 @@ async def upload_document(
         else:
             # Plain text, markdown, HTML
             try:
-                text_content = content_bytes.decode('utf-8')
+                text_pieces = [content_bytes.decode('utf-8')]
             except UnicodeDecodeError:
                 try:
-                    text_content = content_bytes.decode('latin1')
+                    text_pieces = [content_bytes.decode('latin1')]
                 except UnicodeDecodeError:
                     return {"ok": False, "error": "Kunde inte dekoda textinnehåll"}
         
         # Clean and validate content
-        if not text_content.strip():
+        if not any(piece.strip() for piece in text_pieces):
             return {"ok": False, "error": "Dokumentet innehåller ingen text"}
         
         # Prepare tags
@@ -2736,48 +2909,18 @@ async def upload_document(
             except json.JSONDecodeError:
                 pass  # Ignore invalid JSON tags
         
-        # Upsert to memory (will auto-chunk if large)
-        memory_ids = memory.upsert_text_memory(
-            text=text_content,
+        # Upsert to memory: strömmande chunkning rakt in i batchade inserts
+        memory_ids = await amemory.upsert_text_memory_stream(
+            text_pieces,
             score=2.0,  # Higher score for uploaded documents
             tags_json=json.dumps(document_tags, ensure_ascii=False),
-            auto_chunk=True
         )
         
-        # Create embeddings för semantisk sökning
+        # Create embeddings för semantisk sökning: multi-input-batcher, en executemany
         chunks_processed = 0
         try:
-            api_key = os.getenv("OPENAI_API_KEY")
-            if api_key:
-                # Get text chunks for embedding
-                for mem_id in memory_ids:
-                    text_data = memory.get_texts_for_mem_ids([mem_id])
-                    chunk_text = text_data.get(mem_id, "")
-                    if chunk_text.strip():
-                        try:
-                            async with httpx.AsyncClient(timeout=30.0) as client:
-                                r = await client.post(
-                                    "https://api.openai.com/v1/embeddings",
-                                    headers={"Authorization": f"Bearer {api_key}"},
-                                    json={
-                                        "input": chunk_text,
-                                        "model": os.getenv("OPENAI_EMBED_MODEL", "text-embedding-3-small")
-                                    },
-                                )
-                                if r.status_code == 200:
-                                    d = r.json() or {}
-                                    vec = ((d.get("data") or [{}])[0].get("embedding") or [])
-                                    if vec:
-                                        memory.upsert_embedding(
-                                            mem_id, 
-                                            model=os.getenv("OPENAI_EMBED_MODEL", "text-embedding-3-small"), 
-                                            dim=len(vec), 
-                                            vector_json=json.dumps(vec)
-                                        )
-                                        chunks_processed += 1
-                        except Exception as e:
-                            logger.warning(f"Embedding failed for chunk {mem_id}: {e}")
-                            
+            # Sammanslagna dubbletter kan förekomma flera gånger i memory_ids
+            chunks_processed = await embedder.embed_and_store(amemory, list(dict.fromkeys(memory_ids)))
         except Exception as e:
             logger.exception("Embedding processing failed")
         
@@ -2799,7 +2942,7 @@ async def upload_document(
             "chunks_created": len(memory_ids),
             "embeddings_created": chunks_processed,
             "file_size_kb": round(len(content_bytes) / 1024, 1),
-            "content_preview": text_content[:200] + "..." if len(text_content) > 200 else text_content
+            "content_preview": _text_preview(text_pieces)
         }
         
     except Exception as e:
@@ -2953,7 +3096,7 @@ async def process_voice_query_streaming(query: str, ws: WebSocket) -> str:
         
         print(f"🤖 Processing with gpt-oss via Ollama: {query}")
         
-        async with httpx.AsyncClient(timeout=30.0) as client:
+        async with llm_scheduler.slot("ollama", Priority.VOICE), http_clients.session("ollama", timeout=30.0) as client:
             response = await client.post(
                 "http://127.0.0.1:11434/api/generate", 
                 json=ollama_payload
@@ -3019,7 +3162,7 @@ async def stream_tts_response(text: str, ws: WebSocket) -> None:
                     "pitch": 1.0  # Fixed: API requires pitch >= 0.8
                 }
                 
-                async with httpx.AsyncClient(timeout=15.0) as client:
+                async with http_clients.session("local", timeout=15.0) as client:
                     response = await client.post(
                         "http://127.0.0.1:8000/api/tts/synthesize",
                         json=tts_payload
@@ -3066,7 +3209,7 @@ async def ws_alice(ws: WebSocket) -> None:
         await ws.send_text(json.dumps({"type": "hello", "ts": datetime.utcnow().isoformat() + "Z"}))
         while True:
             raw = await ws.receive_text()
-            memory.append_event("ws_in", raw)
+            await amemory.append_event("ws_in", raw)
             try:
                 msg = json.loads(raw)
             except Exception:
@@ -3097,10 +3240,44 @@ async def ai_autonomous_loop() -> AsyncGenerator[None, None]:
         await hub.broadcast({"type": "heartbeat", "ts": datetime.utcnow().isoformat() + "Z"})
 
 
+async def _backfill_memory_fingerprints() -> None:
+    # Minnen från före dedup saknar fingeravtryck; en batch i taget så writer-tråden inte blockeras
+    try:
+        while await amemory.backfill_fingerprints(limit=500):
+            await asyncio.sleep(0)
+    except Exception as e:
+        logger.warning(f"Fingerprint backfill failed: {e}")
+
+
 @app.on_event("startup")
 async def on_startup() -> None:
+    # Delade HTTP-klienter per tjänst (keep-alive, HTTP/2 mot HTTPS) innan något anropar ut
+    http_clients.start()
+
     # Start autonomous loop (non-blocking)
     asyncio.create_task(ai_autonomous_loop())
+
+    if memory.event_journal is not None:
+        memory.event_journal.start()
+
+    if memory.tool_counters is not None:
+        memory.tool_counters.start()
+
+    if memory.hot_tier is not None:
+        # Första ombalanseringen i tråden laddar den heta nivån; tills dess svarar disken
+        memory.hot_tier.start()
+
+    if memory.minhasher is not None:
+        asyncio.create_task(_backfill_memory_fingerprints())
+
+    if embedder.enabled and os.getenv("EMBED_BACKFILL", "true").lower() == "true":
+        embedding_backfill.start()
+
+    if os.getenv("DB_MAINTENANCE", "true").lower() == "true":
+        db_maintenance.start()
+
+    if os.getenv("DB_SNAPSHOTS", "true").lower() == "true":
+        replicas.start(interval_s=float(os.getenv("DB_SNAPSHOT_INTERVAL_S", "60")))
     
     # Start B4 proactive system if available
     if start_proactive_system:
@@ -3146,6 +3323,36 @@ async def on_shutdown() -> None:
         except Exception as e:
             logger.error(f"Error stopping voice system: {e}")
 
+    # Persist ANN indexes, drain the async writer thread and close pooled SQLite connections
+    try:
+        await embedding_backfill.stop()
+        await db_maintenance.stop()
+        await replicas.stop()
+        await embedder.aclose()
+        if memory.event_journal is not None:
+            # Töm journalens buffert innan uppkopplingarna stängs
+            await asyncio.to_thread(memory.event_journal.close)
+        if memory.tool_counters is not None:
+            await asyncio.to_thread(memory.tool_counters.close)
+        if memory.hot_tier is not None:
+            await asyncio.to_thread(memory.hot_tier.close)
+        await amemory.flush_vector_indexes()
+        await amemory.aclose()
+    except Exception as e:
+        logger.error(f"Error closing memory store: {e}")
+
+    # LLM-koordinatorns idle-prober kan vara mitt i en probe med en BACKGROUND-slot
+    try:
+        import llm_router as llm_coordination
+        await llm_coordination.shutdown()
+    except ImportError:
+        pass
+    except Exception as e:
+        logger.error(f"Error stopping LLM coordinator: {e}")
+
+    # Delade HTTP-pooler sist: stängningen ovan kan fortfarande anropa Ollama/OpenAI
+    await http_clients.aclose()
+
 
 # ────────────────────────────────────────────────────────────────────────────────
 # Spotify OAuth (Authorization Code)
@@ -3222,7 +3429,7 @@ async def spotify_callback(code: Optional[str] = None, state: Optional[str] = No
         "client_secret": client_secret,
     }
     try:
-        async with httpx.AsyncClient(timeout=15.0) as client:
+        async with http_clients.session("spotify", timeout=15.0) as client:
             r = await client.post(SPOTIFY_TOKEN_URL, data=data)
             r.raise_for_status()
             token = r.json()
@@ -3284,7 +3491,7 @@ async def spotify_callback(code: Optional[str] = None, state: Optional[str] = No
 @app.get("/api/spotify/me")
 async def spotify_me(access_token: str) -> Dict[str, Any]:
     try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
+        async with http_clients.session("spotify", timeout=10.0) as client:
             r = await client.get("https://api.spotify.com/v1/me", headers={"Authorization": f"Bearer {access_token}"})
             r.raise_for_status()
             return {"ok": True, "me": r.json()}
@@ -3305,7 +3512,7 @@ async def spotify_refresh(body: SpotifyRefreshBody) -> Dict[str, Any]:
     if not client_id or not client_secret:
         return {"ok": False, "error": "missing_client_config"}
     try:
-        async with httpx.AsyncClient(timeout=15.0) as client:
+        async with http_clients.session("spotify", timeout=15.0) as client:
             r = await client.post(
                 SPOTIFY_TOKEN_URL,
                 data={
@@ -3330,7 +3537,7 @@ async def spotify_refresh(body: SpotifyRefreshBody) -> Dict[str, Any]:
 @app.get("/api/spotify/devices")
 async def spotify_devices(access_token: str) -> Dict[str, Any]:
     try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
+        async with http_clients.session("spotify", timeout=10.0) as client:
             r = await client.get(
                 "https://api.spotify.com/v1/me/player/devices",
                 headers={"Authorization": f"Bearer {access_token}"},
@@ -3345,7 +3552,7 @@ async def spotify_devices(access_token: str) -> Dict[str, Any]:
 @app.get("/api/spotify/state")
 async def spotify_state(access_token: str) -> Dict[str, Any]:
     try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
+        async with http_clients.session("spotify", timeout=10.0) as client:
             r = await client.get(
                 "https://api.spotify.com/v1/me/player",
                 headers={"Authorization": f"Bearer {access_token}"},
@@ -3362,7 +3569,7 @@ async def spotify_state(access_token: str) -> Dict[str, Any]:
 @app.get("/api/spotify/current")
 async def spotify_current(access_token: str) -> Dict[str, Any]:
     try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
+        async with http_clients.session("spotify", timeout=10.0) as client:
             r = await client.get(
                 "https://api.spotify.com/v1/me/player/currently-playing",
                 headers={"Authorization": f"Bearer {access_token}"},
@@ -3386,7 +3593,7 @@ async def spotify_recommendations(access_token: str, seed_tracks: Optional[str]
             params["seed_artists"] = seed_artists
         if seed_genres:
             params["seed_genres"] = seed_genres
-        async with httpx.AsyncClient(timeout=10.0) as client:
+        async with http_clients.session("spotify", timeout=10.0) as client:
             r = await client.get(
                 "https://api.spotify.com/v1/recommendations",
                 headers={"Authorization": f"Bearer {access_token}"},
@@ -3403,7 +3610,7 @@ async def spotify_recommendations(access_token: str, seed_tracks: Optional[str]
 @app.get("/api/spotify/playlists")
 async def spotify_playlists(access_token: str, limit: Optional[int] = 20, offset: Optional[int] = 0) -> Dict[str, Any]:
     try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
+        async with http_clients.session("spotify", timeout=10.0) as client:
             r = await client.get(
                 f"https://api.spotify.com/v1/me/playlists?limit={int(limit or 20)}&offset={int(offset or 0)}",
                 headers={"Authorization": f"Bearer {access_token}"},
@@ -3497,7 +3704,7 @@ async def spotify_queue(body: SpotifyQueueBody) -> Dict[str, Any]:
         if body.device_id:
             params["device_id"] = body.device_id
         qp = str(httpx.QueryParams(params))
-        async with httpx.AsyncClient(timeout=10.0) as client:
+        async with http_clients.session("spotify", timeout=10.0) as client:
             r = await client.post(
                 f"https://api.spotify.com/v1/me/player/queue?{qp}",
                 headers={"Authorization": f"Bearer {body.access_token}"},
@@ -3540,7 +3747,7 @@ async def ai_media_act(body: MediaActBody) -> Dict[str, Any]:
 
     async def try_local():
         try:
-            async with httpx.AsyncClient(timeout=15.0) as client:
+            async with llm_scheduler.slot("ollama", Priority.TOOLS), http_clients.session("ollama", timeout=15.0) as client:
                 r = await client.post(
                     "http://127.0.0.1:11434/api/generate",
                     json={
@@ -3564,7 +3771,7 @@ async def ai_media_act(body: MediaActBody) -> Dict[str, Any]:
         if not api_key:
             return None
         try:
-            async with httpx.AsyncClient(timeout=20.0) as client:
+            async with llm_scheduler.slot("openai", Priority.TOOLS), http_clients.session("openai", timeout=20.0) as client:
                 r = await client.post(
                     "https://api.openai.com/v1/chat/completions",
                     headers={"Authorization": f"Bearer {api_key}"},
@@ -3594,20 +3801,8 @@ async def ai_media_act(body: MediaActBody) -> Dict[str, Any]:
     elif provider == "openai":
         parsed = await try_openai()
     else:
-        t1 = asyncio.create_task(try_openai())
-        t2 = asyncio.create_task(try_local())
-        done, pending = await asyncio.wait({t1, t2}, return_when=asyncio.FIRST_COMPLETED)
-        for d in done:
-            val = d.result()
-            if val:
-                parsed = val
-        for p in pending:
-            try:
-                val = await p
-                if not parsed and val:
-                    parsed = val
-            except asyncio.CancelledError:
-                pass
+        hedged = await llm_hedge.race(try_local, try_openai if os.getenv("OPENAI_API_KEY") else None, prompt_class("media_act", body.prompt), accept=bool)
+        parsed = hedged.value if hedged.winner else None
 
     if not isinstance(parsed, dict):
         # Heuristisk fallback: tolka "spela X med Y" → play_track
@@ -3628,7 +3823,7 @@ async def ai_media_act(body: MediaActBody) -> Dict[str, Any]:
 
     action = (parsed.get("action") or "").lower()
     try:
-        async with httpx.AsyncClient(timeout=15.0) as client:
+        async with http_clients.session("spotify", timeout=15.0) as client:
             if action == "play_track":
                 q = (parsed.get("track") or "").strip()
                 artist = (parsed.get("artist") or "").strip()
@@ -3728,7 +3923,7 @@ async def ai_route(body: RouteBody) -> Dict[str, Any]:
 
     async def classify_local():
         try:
-            async with httpx.AsyncClient(timeout=12.0) as client:
+            async with llm_scheduler.slot("ollama", Priority.TOOLS), http_clients.session("ollama", timeout=12.0) as client:
                 r = await client.post(
                     "http://127.0.0.1:11434/api/generate",
                     json={
@@ -3752,7 +3947,7 @@ async def ai_route(body: RouteBody) -> Dict[str, Any]:
         if not api_key:
             return None
         try:
-            async with httpx.AsyncClient(timeout=15.0) as client:
+            async with llm_scheduler.slot("openai", Priority.TOOLS), http_clients.session("openai", timeout=15.0) as client:
                 r = await client.post(
                     "https://api.openai.com/v1/chat/completions",
                     headers={"Authorization": f"Bearer {api_key}"},
@@ -3782,20 +3977,8 @@ async def ai_route(body: RouteBody) -> Dict[str, Any]:
     elif provider == "openai":
         parsed = await classify_openai()
     else:
-        t1 = asyncio.create_task(classify_openai())
-        t2 = asyncio.create_task(classify_local())
-        done, pending = await asyncio.wait({t1, t2}, return_when=asyncio.FIRST_COMPLETED)
-        for d in done:
-            v = d.result()
-            if v:
-                parsed = v
-        for p in pending:
-            try:
-                v = await p
-                if not parsed and v:
-                    parsed = v
-            except asyncio.CancelledError:
-                pass
+        hedged = await llm_hedge.race(classify_local, classify_openai if os.getenv("OPENAI_API_KEY") else None, prompt_class("route", body.prompt), accept=bool)
+        parsed = hedged.value if hedged.winner else None
 
     # Heuristik om LLM fallerar
     if not isinstance(parsed, dict):
@@ -3813,7 +3996,7 @@ async def ai_route(body: RouteBody) -> Dict[str, Any]:
         if not body.spotify_access_token:
             return {"ok": False, "error": "missing_spotify_token"}
         try:
-            async with httpx.AsyncClient(timeout=20.0) as client:
+            async with http_clients.session("local", timeout=20.0) as client:
                 rr = await client.post(
                     "http://127.0.0.1:8000/api/ai/media_act",
                     json={
@@ -3830,7 +4013,7 @@ async def ai_route(body: RouteBody) -> Dict[str, Any]:
 
     if intent == "hud":
         try:
-            async with httpx.AsyncClient(timeout=20.0) as client:
+            async with http_clients.session("local", timeout=20.0) as client:
                 rr = await client.post(
                     "http://127.0.0.1:8000/api/ai/act",
                     json={"prompt": body.prompt, "allow": body.hud_allow, "provider": provider},
@@ -3842,7 +4025,7 @@ async def ai_route(body: RouteBody) -> Dict[str, Any]:
 
     # default chat
     try:
-        async with httpx.AsyncClient(timeout=25.0) as client:
+        async with http_clients.session("local", timeout=25.0) as client:
             rr = await client.post(
                 "http://127.0.0.1:8000/api/chat",
                 json={"prompt": body.prompt, "provider": provider},
@@ -4227,12 +4410,12 @@ async def stream_openai_tts(request: OpenAITTSRequest):
             }
             
             # Stream from OpenAI TTS API
-            async with OpenAIClient(settings) as client:
+            async with http_clients.session("openai", timeout=float(settings.timeout_seconds)) as client:
                 async with client.stream(
                     "POST", 
-                    "/audio/speech",
+                    f"{settings.base_url}/audio/speech",
                     json=tts_payload,
-                    headers={"Accept": "audio/*"}
+                    headers={**settings.headers, "Accept": "audio/*"}
                 ) as response:
                     
                     if response.status_code != 200:
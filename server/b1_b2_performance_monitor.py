@@ -213,8 +213,8 @@ class B1PerformanceMonitor:
     def _get_database_counts(self) -> tuple:
         """Get count of raw chunks and summaries"""
         try:
-            import sqlite3
-            with sqlite3.connect(self.db_path) as conn:
+            from db_snapshot import replicas
+            with replicas.connect(self.db_path) as conn:
                 raw_count = conn.execute("SELECT COUNT(*) FROM ambient_raw").fetchone()[0]
                 summary_count = conn.execute(
                     "SELECT COUNT(*) FROM memory WHERE kind = 'ambient_summary'"
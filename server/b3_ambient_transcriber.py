@@ -262,7 +262,7 @@ class B3AmbientTranscriber:
             import os
             import tempfile
             import wave
-            import httpx
+            from http_pool import http_clients
             
             # Check if OpenAI API key is available
             api_key = os.getenv("OPENAI_API_KEY")
@@ -282,7 +282,7 @@ class B3AmbientTranscriber:
                     wav_file.writeframes(audio_int16.tobytes())
                 
                 # Send to OpenAI Whisper API
-                async with httpx.AsyncClient(timeout=10.0) as client:
+                async with http_clients.session("openai", timeout=10.0) as client:
                     with open(temp_file.name, 'rb') as audio_file:
                         files = {
                             'file': ('audio.wav', audio_file, 'audio/wav'),
@@ -7,16 +7,29 @@ import asyncio
 import time
 import logging
 from typing import Dict, Any, Optional, List, Set
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 import re
 import json
 
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
-from memory import MemoryStore
+from memory_async import AsyncMemoryStore
 
 logger = logging.getLogger("alice.b3_privacy")
 
+# "glöm det där om min kalender" -> "min kalender": bara ämnet matchas (som fras)
+FORGET_PREFIX_RE = re.compile(
+    r"^\s*(?:glöm(?:\s+bort)?|forget)(?:\s+|$)"
+    r"(?:(?:allt|det\s+där|det|vad\s+jag\s+(?:sa|sagt|nämnde)|what\s+i\s+said)(?:\s+|$))?"
+    r"(?:om\s+|about\s+)?",
+    re.IGNORECASE,
+)
+
+
+def forget_subject(query: str) -> str:
+    """Strip a leading forget command so only its subject is matched"""
+    return FORGET_PREFIX_RE.sub("", query or "", count=1).strip()
+
 class ForgetRequest(BaseModel):
     """Request to forget specific memories"""
     query: Optional[str] = None  # Natural language: "glöm vad jag sa om kakan"
@@ -46,7 +59,7 @@ class B3PrivacyHooks:
     Provides 'glöm det där' functionality and automatic cleanup
     """
     
-    def __init__(self, memory_store: MemoryStore = None):
+    def __init__(self, memory_store: AsyncMemoryStore = None):
         self.memory = memory_store
         self.privacy_settings = PrivacySettings()
         
@@ -88,14 +101,12 @@ class B3PrivacyHooks:
             
             # Get memories to delete
             memories_to_delete = await self._find_memories_to_forget(request)
+            ids = sorted({int(m['id']) for m in memories_to_delete if m.get('id') is not None})
             
-            # Delete memories
-            for memory in memories_to_delete:
-                try:
-                    await self.memory.delete(memory.get('id'))
-                    deleted_ids.append(memory.get('id', 'unknown'))
-                except Exception as e:
-                    logger.error(f"Error deleting memory {memory.get('id')}: {e}")
+            # Delete memories (embeddings and persisted vector indexes follow)
+            if ids:
+                await self.memory.delete_memories(ids)
+                deleted_ids = [str(i) for i in ids]
             
             processing_time = time.time() - start_time
             
@@ -124,59 +135,31 @@ class B3PrivacyHooks:
         all_memories = []
         
         try:
-            # Get all memories (this would be more efficient with proper querying)
-            # For now, we'll simulate getting recent memories
-            
             if request.memory_ids:
                 # Specific memory IDs
                 for memory_id in request.memory_ids:
                     try:
-                        memory = await self.memory.get(memory_id)
-                        if memory:
-                            all_memories.append(memory)
-                    except:
-                        pass
+                        all_memories.append({"id": int(memory_id)})
+                    except (TypeError, ValueError):
+                        logger.warning(f"Ignoring invalid memory id: {memory_id}")
             
             elif request.query or request.keywords:
-                # Search by content
-                search_terms = []
-                if request.query:
-                    search_terms.extend(request.query.split())
-                if request.keywords:
-                    search_terms.extend(request.keywords)
-                
-                # Real memory search implementation
-                try:
-                    from services.ambient_memory import get_ambient_memory_service
-                    memory_service = get_ambient_memory_service()
-                    all_memories = await memory_service.search_memories(
-                        search_terms=search_terms,
-                        limit=1000  # Get all matching for deletion
-                    )
-                except ImportError:
-                    logger.warning("Ambient memory service not available for privacy deletion")
-                    all_memories = []
-                except Exception as e:
-                    logger.error(f"Memory search failed for privacy deletion: {e}")
-                    all_memories = []
+                # Exakt matchning (frasen + alla nyckelord), aldrig sökningens prefix-OR:
+                # radering går inte att ångra
+                phrase = forget_subject(request.query) if request.query else None
+                if request.query and not phrase and not request.keywords:
+                    # Bara kommandot ("glöm det där") utan ämne: radera inget
+                    return []
+                ids = await self.memory.find_memory_ids_exact(phrase, request.keywords)
+                all_memories = [{"id": i} for i in ids]
                 
             elif request.time_range:
-                # Delete by time range
+                # Delete everything stored since the cutoff
                 cutoff_time = self._get_time_cutoff(request.time_range)
                 if cutoff_time:
-                    # Real time-based deletion implementation
-                    try:
-                        from services.ambient_memory import get_ambient_memory_service
-                        memory_service = get_ambient_memory_service()
-                        all_memories = await memory_service.get_memories_before_time(
-                            cutoff_time=cutoff_time
-                        )
-                    except ImportError:
-                        logger.warning("Ambient memory service not available for time-based privacy deletion")
-                        all_memories = []
-                    except Exception as e:
-                        logger.error(f"Time-based memory query failed for privacy deletion: {e}")
-                        all_memories = []
+                    since = cutoff_time.astimezone(timezone.utc).replace(tzinfo=None).isoformat() + "Z"
+                    ids = await self.memory.get_memory_ids_since(since)
+                    all_memories = [{"id": i} for i in ids]
             
         except Exception as e:
             logger.error(f"Error finding memories to forget: {e}")
@@ -314,6 +297,8 @@ def get_b3_privacy_hooks(memory_store=None):
     global _privacy_hooks
     if _privacy_hooks is None:
         _privacy_hooks = B3PrivacyHooks(memory_store)
+    elif memory_store is not None and _privacy_hooks.memory is None:
+        _privacy_hooks.memory = memory_store
     return _privacy_hooks
 
 # FastAPI router for privacy endpoints
@@ -0,0 +1,67 @@
+"""
+Benchmark: IVF (ANN) recall@k och latens mot exakt sökning.
+
+Data är en gaussisk blandning (embeddings från riktiga dokument är
+klustrade; likformigt brus är värsta fallet för IVF).
+
+Kör från server/:
+    python benchmarks/bench_ann_index.py --n 200000 --dim 384
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from ann_index import IVFIndex  # noqa: E402
+from vector_index import VectorIndex  # noqa: E402
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--n", type=int, default=200000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--clusters", type=int, default=500)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32])
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    centers = rng.standard_normal((args.clusters, args.dim)).astype(np.float32)
+    data = centers[rng.integers(0, args.clusters, args.n)]
+    data += 0.5 * rng.standard_normal(data.shape).astype(np.float32)
+    queries = centers[rng.integers(0, args.clusters, args.queries)]
+    queries += 0.5 * rng.standard_normal(queries.shape).astype(np.float32)
+    ids = np.arange(args.n)
+
+    exact = VectorIndex(args.dim, capacity=args.n)
+    exact.add(ids, data)
+    t0 = time.perf_counter()
+    truth = [{m for m, _ in exact.search(q, args.k)} for q in queries]
+    exact_ms = (time.perf_counter() - t0) * 1000 / args.queries
+
+    t0 = time.perf_counter()
+    ivf = IVFIndex(args.dim, train_min=0, capacity=args.n)
+    ivf.add(ids, data)
+    build_s = time.perf_counter() - t0
+
+    print(f"n={args.n} dim={args.dim} k={args.k} nlist={ivf.stats()['nlist']} build={build_s:.1f}s")
+    print(f"{'mode':<12}{'ms/query':>10}{'recall@k':>10}{'speedup':>10}")
+    print(f"{'exact':<12}{exact_ms:>10.2f}{1.0:>10.3f}{1.0:>9.1f}x")
+    for nprobe in args.nprobe:
+        t0 = time.perf_counter()
+        found = [{m for m, _ in ivf.search(q, args.k, nprobe=nprobe)} for q in queries]
+        ms = (time.perf_counter() - t0) * 1000 / args.queries
+        recall = float(np.mean([len(a & b) / args.k for a, b in zip(truth, found)]))
+        print(f"{'ivf/' + str(nprobe):<12}{ms:>10.2f}{recall:>10.3f}{exact_ms / ms:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
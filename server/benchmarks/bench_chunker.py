@@ -0,0 +1,116 @@
+"""
+Benchmark: chunkning och inläsning av ett stort dokument (standard 20 MB).
+
+Jämför den tidigare chunkern (referenskopian i tests/test_text_chunker.py)
+med den strömmande ``iter_semantic_chunks``, och inläsning via
+``upsert_text_memory`` mot ``upsert_text_memory_stream`` (sida för sida).
+
+Kör från server/:
+    python benchmarks/bench_chunker.py --mb 20
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from memory import MemoryStore  # noqa: E402
+from tests.test_text_chunker import legacy_chunk_text_semantically  # noqa: E402
+from text_chunker import iter_semantic_chunks  # noqa: E402
+
+WORDS = "alice minne kalender möte dokument sida rapport projekt musik vecka resultat analys".split()
+
+
+def make_pages(mb: float, page_chars: int = 3000, seed: int = 0):
+    rnd = random.Random(seed)
+    pages, total, section = [], 0, 0
+    while total < mb * 1_000_000:
+        paras = []
+        while sum(len(p) for p in paras) < page_chars:
+            if rnd.random() < 0.15:
+                section += 1
+                paras.append(f"# Avsnitt {section}: " + " ".join(rnd.choices(WORDS, k=3)))
+            else:
+                paras.append(" ".join(
+                    " ".join(rnd.choices(WORDS, k=rnd.randint(5, 20))).capitalize() + "."
+                    for _ in range(rnd.randint(2, 8))
+                ))
+        page = "\n\n".join(paras) + "\n"
+        pages.append(page)
+        total += len(page)
+    return pages
+
+
+def timed(fn):
+    t0 = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - t0
+
+
+def peak_mb(fn) -> float:
+    # Separat körning: tracemalloc gör koden flera gånger långsammare
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1] / 1e6
+    tracemalloc.stop()
+    return peak
+
+
+def legacy_ingest(store: MemoryStore, text: str):
+    # Som upsert_text_memory gjorde tidigare: hela chunklistan, sedan en INSERT per chunk
+    chunks = legacy_chunk_text_semantically(text)
+    tags = {"chunked": True, "total_chunks": len(chunks), "original_length": len(text)}
+    ids = []
+    with store._conn() as c:
+        for i, chunk in enumerate(chunks):
+            cur = c.execute(
+                "INSERT INTO memories (ts, kind, text, score, tags) VALUES ('', 'text', ?, 0.0, ?)",
+                (chunk, json.dumps(dict(tags, chunk_index=i), ensure_ascii=False)),
+            )
+            ids.append(int(cur.lastrowid))
+    return ids
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--mb", type=float, default=20.0)
+    parser.add_argument("--skip-legacy-ingest", action="store_true")
+    args = parser.parse_args()
+
+    pages = make_pages(args.mb)
+    text = "".join(pages)
+    print(f"document={len(text) / 1e6:.1f} MB pages={len(pages)}")
+    print(f"{'step':<32}{'seconds':>10}{'peak MB':>10}{'chunks':>10}")
+
+    legacy, s = timed(lambda: legacy_chunk_text_semantically(text))
+    mb = peak_mb(lambda: legacy_chunk_text_semantically(text))
+    print(f"{'chunk: legacy':<32}{s:>10.2f}{mb:>10.0f}{len(legacy):>10}")
+    stream, s = timed(lambda: list(iter_semantic_chunks(pages)))
+    # Strömmande konsument: chunkarna behålls inte
+    mb = peak_mb(lambda: sum(1 for _ in iter_semantic_chunks(pages)))
+    print(f"{'chunk: streaming (per page)':<32}{s:>10.2f}{mb:>10.0f}{len(stream):>10}")
+    print(f"identical output: {legacy == stream}")
+    del legacy, stream
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if not args.skip_legacy_ingest:
+            store = MemoryStore(os.path.join(tmp, "legacy.db"))
+            ids, s = timed(lambda: legacy_ingest(store, text))
+            print(f"{'ingest: legacy (row by row)':<32}{s:>10.2f}{'-':>10}{len(ids):>10}")
+            store.close()
+        store = MemoryStore(os.path.join(tmp, "stream.db"))
+        ids, s = timed(lambda: store.upsert_text_memory_stream(iter(pages)))
+        print(f"{'ingest: upsert_text_memory_stream':<32}{s:>10.2f}{'-':>10}{len(ids):>10}")
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
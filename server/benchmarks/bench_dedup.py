@@ -0,0 +1,118 @@
+"""
+Benchmark: dubblettsammanslagning vid inläsning på en återspelad korpus.
+
+Korpusen efterliknar produktion: assistentsvar från respond() (mallar där
+samma bekräftelse återkommer, ibland med små skillnader), användarfrågor
+och dokument som laddas upp flera gånger. Samma korpus läses in med och
+utan dedup; rapporterar rader, databasstorlek, inläsningstid och
+retrieval-latens (FTS och hybrid).
+
+Kör från server/:
+    python benchmarks/bench_dedup.py --replies 20000
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from memory import MemoryStore  # noqa: E402
+
+TEMPLATES = [
+    "Jag har lagt till {what} i kalendern på {day} klockan {hour}, och skickat en påminnelse till alla deltagare en timme innan.",
+    "Nu spelas {what} på Spotify i vardagsrummet. Säg till om du vill byta låt, höja volymen eller pausa musiken.",
+    "Du har {n} olästa mejl. Det viktigaste gäller {what} och kom från projektgruppen i morse, de vill ha svar före {day}.",
+    "Vädret i {city} blir {weather} i morgon med upp till {n} grader. Ta med en jacka om du ska ut på kvällen.",
+]
+WHAT = ["mötet med projektgruppen", "tandläkartiden", "budgetgenomgången", "lunchen med Anna", "träningen"]
+DAYS = ["måndag", "tisdag", "onsdag", "torsdag", "fredag"]
+CITIES = ["Göteborg", "Stockholm", "Malmö", "Umeå"]
+WEATHER = ["soligt", "molnigt", "regnigt", "blåsigt"]
+VOCAB = ("energi rapport styrelse budget kalender projekt leverans kund avtal faktura risk plan "
+         "resurs tidplan möte beslut uppföljning kvalitet säkerhet drift").split()
+
+
+def make_corpus(replies: int, docs: int, seed: int = 0):
+    rnd = random.Random(seed)
+    items = []
+    for _ in range(replies):
+        text = rnd.choice(TEMPLATES).format(
+            what=rnd.choice(WHAT), day=rnd.choice(DAYS), hour=rnd.choice(["9", "10", "14"]),
+            n=rnd.randint(1, 25), city=rnd.choice(CITIES), weather=rnd.choice(WEATHER),
+        )
+        if rnd.random() < 0.2:
+            text = text.replace(".", "!", 1)  # nästan-dubblett: bara skiljetecken
+        if rnd.random() < 0.3:
+            # Unikt innehåll (t.ex. sammanfattningar)
+            text = " ".join(rnd.choices(VOCAB, k=rnd.randint(20, 60))) + "."
+        items.append(("reply", text))
+    documents = [
+        "\n\n".join(" ".join(rnd.choices(VOCAB, k=rnd.randint(40, 120))) + "." for _ in range(rnd.randint(10, 40)))
+        for _ in range(docs)
+    ]
+    for doc in documents:
+        for _ in range(rnd.randint(1, 3)):  # samma dokument laddas upp igen
+            items.insert(rnd.randrange(len(items) + 1), ("document", doc))
+    return items
+
+
+def ingest(store: MemoryStore, items) -> float:
+    tags = json.dumps({"source": "document_upload"})
+    t0 = time.perf_counter()
+    for kind, text in items:
+        if kind == "document":
+            store.upsert_text_memory_stream([text], score=2.0, tags_json=tags)
+        else:
+            store.upsert_text_memory_single(text, tags_json=json.dumps({"source": "chat"}))
+    return time.perf_counter() - t0
+
+
+def retrieval_ms(store: MemoryStore, queries, method: str) -> float:
+    fn = getattr(store, method)
+    t0 = time.perf_counter()
+    for q in queries:
+        fn(q.split(), limit=5) if method == "retrieve_text_terms" else fn(q, limit=5)
+    return (time.perf_counter() - t0) * 1000 / len(queries)
+
+
+def db_mb(store: MemoryStore) -> float:
+    c = store._conn()
+    c.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    pages, size = c.execute("PRAGMA page_count").fetchone()[0], c.execute("PRAGMA page_size").fetchone()[0]
+    return pages * size / 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--replies", type=int, default=20000)
+    parser.add_argument("--docs", type=int, default=50)
+    parser.add_argument("--queries", type=int, default=300)
+    args = parser.parse_args()
+
+    items = make_corpus(args.replies, args.docs)
+    rnd = random.Random(1)
+    queries = [" ".join(rnd.choices(WHAT + CITIES + VOCAB, k=2)) for _ in range(args.queries)]
+    print(f"items={len(items)} (replies={args.replies}, document uploads={len(items) - args.replies})")
+    print(f"{'store':<10}{'rows':>9}{'DB MB':>9}{'ingest s':>10}{'fts ms':>9}{'hybrid ms':>11}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, dedup in (("plain", False), ("dedup", True)):
+            store = MemoryStore(os.path.join(tmp, f"{name}.db"), dedup=dedup)
+            s = ingest(store, items)
+            rows = store._conn().execute("SELECT COUNT(*) FROM memories").fetchone()[0]
+            fts = retrieval_ms(store, queries, "retrieve_text_terms")
+            hybrid = retrieval_ms(store, queries, "retrieve_hybrid")
+            print(f"{name:<10}{rows:>9}{db_mb(store):>9.1f}{s:>10.1f}{fts:>9.2f}{hybrid:>11.2f}")
+            if dedup:
+                print(f"merges: {json.dumps(store.dedup_stats())}")
+            store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+Benchmark: embeddings för en uppladdning - ett anrop per chunk mot EmbeddingPipeline.
+
+En lokal ersättningsserver simulerar API-latens (--latency-ms per anrop plus
+--per-input-ms per text). Den gamla vägen (ny klient, re-read och ett
+single-input-anrop per chunk) mäts på --legacy-sample chunkar och räknas upp.
+
+Kör från server/:
+    python benchmarks/bench_embedding_pipeline.py --pages 500
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from embedding_pipeline import EmbeddingPipeline  # noqa: E402
+from memory import MemoryStore  # noqa: E402
+from memory_async import AsyncMemoryStore  # noqa: E402
+
+DIM = 1536
+
+
+def make_server(latency_ms: float, per_input_ms: float) -> ThreadingHTTPServer:
+    vec = np.random.default_rng(0).standard_normal(DIM).round(5).tolist()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            inputs = body["input"] if isinstance(body["input"], list) else [body["input"]]
+            time.sleep((latency_ms + per_input_ms * len(inputs)) / 1000.0)
+            payload = json.dumps({"data": [{"index": i, "embedding": vec} for i in range(len(inputs))]}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+async def legacy(amemory: AsyncMemoryStore, url: str, mem_ids) -> None:
+    # Samma algoritm som upload_document hade tidigare
+    for mem_id in mem_ids:
+        chunk_text = (await amemory.get_texts_for_mem_ids([mem_id])).get(mem_id, "")
+        async with httpx.AsyncClient(timeout=30.0) as client:
+            r = await client.post(f"{url}/embeddings", json={"input": chunk_text, "model": "bench"})
+            vec = r.json()["data"][0]["embedding"]
+            await amemory.upsert_embedding(mem_id, model="bench-legacy", dim=len(vec), vector=vec)
+
+
+async def run(args) -> None:
+    server = make_server(args.latency_ms, args.per_input_ms)
+    url = f"http://127.0.0.1:{server.server_address[1]}/v1"
+    with tempfile.TemporaryDirectory() as tmp:
+        store = MemoryStore(os.path.join(tmp, "bench.db"))
+        amemory = AsyncMemoryStore(store)
+        chunks = args.pages * args.chunks_per_page
+        with store._conn() as c:
+            c.executemany(
+                "INSERT INTO memories (ts, kind, text, score, tags) VALUES ('', 'text', ?, 2.0, NULL)",
+                [(f"Stycke {i}: " + "lorem ipsum dolor sit amet " * 20,) for i in range(chunks)],
+            )
+            mem_ids = [r[0] for r in c.execute("SELECT id FROM memories ORDER BY id")]
+
+        t0 = time.perf_counter()
+        await legacy(amemory, url, mem_ids[: args.legacy_sample])
+        legacy_s = (time.perf_counter() - t0) * chunks / args.legacy_sample
+
+        pipe = EmbeddingPipeline(api_key="bench", model="bench", base_url=url,
+                                 batch_size=args.batch_size, concurrency=args.concurrency)
+        t0 = time.perf_counter()
+        written = await pipe.embed_and_store(amemory, mem_ids)
+        pipeline_s = time.perf_counter() - t0
+        await pipe.aclose()
+        await amemory.aclose()
+
+        print(f"pages={args.pages} chunks={chunks} dim={DIM} latency={args.latency_ms}ms+{args.per_input_ms}ms/input")
+        print(f"{'legacy (extrapolated)':<24}{legacy_s:>10.1f}s")
+        print(f"{'pipeline':<24}{pipeline_s:>10.1f}s  ({pipe.requests} requests, {written} vectors)")
+        print(f"{'speedup':<24}{legacy_s / pipeline_s:>10.1f}x")
+    server.shutdown()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--pages", type=int, default=500)
+    parser.add_argument("--chunks-per-page", type=int, default=5)
+    parser.add_argument("--latency-ms", type=float, default=150.0)
+    parser.add_argument("--per-input-ms", type=float, default=1.0)
+    parser.add_argument("--batch-size", type=int, default=128)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--legacy-sample", type=int, default=40)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
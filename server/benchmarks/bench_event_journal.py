@@ -0,0 +1,65 @@
+"""
+Benchmark: append_event via writer-tråden mot write-behind-journalen.
+
+Mäter händelser/s och latens i event-loopen per ``await append_event``
+för den tidigare vägen (en INSERT + commit per händelse på writer-tråden)
+och för ``EventJournal`` med respektive durability-nivå.
+
+Kör från server/:
+    python benchmarks/bench_event_journal.py --events 20000
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from event_journal import EventJournal  # noqa: E402
+from memory import MemoryStore  # noqa: E402
+from memory_async import AsyncMemoryStore  # noqa: E402
+
+PAYLOAD = '{"text": "hej alice, vad händer i kalendern idag?", "session": "bench"}'
+
+
+async def run(store: MemoryStore, events: int):
+    amemory = AsyncMemoryStore(store)
+    lat = []
+    t0 = time.perf_counter()
+    for _ in range(events):
+        s = time.perf_counter()
+        await amemory.append_event("ws_in", PAYLOAD)
+        lat.append((time.perf_counter() - s) * 1e6)
+    if store.event_journal is not None:
+        await asyncio.to_thread(store.event_journal.close)
+    elapsed = time.perf_counter() - t0
+    count = store._conn().execute("SELECT COUNT(*) FROM events").fetchone()[0]
+    await amemory.aclose()
+    lat.sort()
+    return events / elapsed, statistics.median(lat), lat[int(len(lat) * 0.99) - 1], count
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--events", type=int, default=20000)
+    args = parser.parse_args()
+
+    print(f"{'path':<24}{'events/s':>12}{'p50 us':>10}{'p99 us':>10}{'rows':>10}")
+    with tempfile.TemporaryDirectory() as tmp:
+        configs = [("writer thread", None)] + [(f"journal ({d})", d) for d in ("off", "normal", "full")]
+        for name, durability in configs:
+            store = MemoryStore(os.path.join(tmp, f"{durability or 'writer'}.db"))
+            if durability:
+                store.event_journal = EventJournal(store, durability=durability).start()
+            rate, p50, p99, count = asyncio.run(run(store, args.events))
+            print(f"{name:<24}{rate:>12.0f}{p50:>10.1f}{p99:>10.1f}{count:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+Benchmark: CPU-tid per fråga - gamla RAG-vägarna mot retrieve_hybrid.
+
+Gamla vägar:
+  * bm25_recency: 100 FTS-rader omräknade i en Python-loop (fromisoformat per rad)
+  * like+cosine:  /api/memory/retrieve - LIKE-träffar + vektorträffar, append och trunkering
+Ny väg: retrieve_hybrid - BM25- och vektorkandidater, RRF + recency/score i numpy.
+process_time räknar alla trådar, så BLAS-trådar i vektorsökningen syns här.
+
+Kör från server/:
+    python benchmarks/bench_hybrid_retrieval.py --rows 100000 --dim 256
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from memory import MemoryStore, build_fts_query  # noqa: E402
+
+VOCAB = (
+    "alice kalender möte boka schema musik spotify spela låt dokument fil upload "
+    "agent planner executor orchestrator embedding vektor semantisk chunking segment"
+).split()
+FILLER = [f"ord{i}" for i in range(5000)]
+QUERIES = ["kalender möte", "spotify musik", "embedding vektor", "agent planner"]
+
+
+def populate(store: MemoryStore, rows: int, dim: int, model: str) -> None:
+    rnd = random.Random(0)
+    rng = np.random.default_rng(0)
+    now = datetime.utcnow()
+    batch = []
+    for _ in range(rows):
+        words = [rnd.choice(FILLER) for _ in range(30)]
+        if rnd.random() < 0.1:
+            words[rnd.randrange(30)] = rnd.choice(VOCAB)
+        ts = (now - timedelta(hours=rnd.random() * 24 * 90)).isoformat() + "Z"
+        batch.append((ts, " ".join(words), rnd.random()))
+    with store._conn() as c:
+        c.executemany("INSERT INTO memories (ts, kind, text, score, tags) VALUES (?, 'text', ?, ?, NULL)", batch)
+        ids = [r[0] for r in c.execute("SELECT id FROM memories ORDER BY id")]
+    vecs = rng.standard_normal((len(ids), dim)).astype(np.float32)
+    with store._conn() as c:
+        c.executemany(
+            "INSERT INTO embeddings (mem_id, ts, model, dim, vector) VALUES (?, '', ?, ?, ?)",
+            [(i, model, dim, v.tobytes()) for i, v in zip(ids, vecs)],
+        )
+
+
+def legacy_like_cosine(store: MemoryStore, query: str, qv, model: str, limit: int) -> int:
+    results = list(store.retrieve_text_memories(query, limit=limit))
+    sims = store.search_embeddings(model, qv, limit=limit)
+    top_ids = [m for m, _ in sims]
+    texts = store.get_texts_for_mem_ids(top_ids)
+    for mid in top_ids:
+        txt = texts.get(mid)
+        if txt and all(x.get("text") != txt for x in results):
+            results.append({"id": mid, "text": txt, "kind": "text", "score": 0.0, "ts": ""})
+    return len(results[:limit])
+
+
+def cpu_ms(fn, repeat: int) -> float:
+    t0 = time.process_time()
+    for _ in range(repeat):
+        fn()
+    return (time.process_time() - t0) * 1000 / repeat
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--limit", type=int, default=5)
+    args = parser.parse_args()
+
+    model = "bench"
+    with tempfile.TemporaryDirectory() as tmp:
+        store = MemoryStore(os.path.join(tmp, "bench.db"))
+        populate(store, args.rows, args.dim, model)
+        store.vector_index(model)
+        qv = np.random.default_rng(1).standard_normal(args.dim).astype(np.float32)
+
+        print(f"rows={args.rows} dim={args.dim} limit={args.limit} (CPU ms/query)")
+        print(f"{'query':<20}{'bm25_recency':>14}{'like+cosine':>14}{'hybrid':>10}{'hybrid(text)':>14}")
+        for q in QUERIES:
+            # Samma MATCH-uttryck som hybriden, så båda ser samma kandidater
+            match = build_fts_query(q.split())
+            old_bm25 = cpu_ms(lambda: store.retrieve_text_bm25_recency(match, limit=args.limit), args.repeat)
+            old_like = cpu_ms(lambda: legacy_like_cosine(store, q, qv, model, args.limit), args.repeat)
+            hybrid = cpu_ms(
+                lambda: store.retrieve_hybrid(q, query_vector=qv, model=model, limit=args.limit), args.repeat
+            )
+            text_only = cpu_ms(lambda: store.retrieve_hybrid(q, limit=args.limit), args.repeat)
+            print(f"{q:<20}{old_bm25:>14.2f}{old_like:>14.2f}{hybrid:>10.2f}{text_only:>14.2f}")
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
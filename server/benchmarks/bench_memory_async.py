@@ -0,0 +1,120 @@
+"""
+Benchmark: event-loop-blockering från MemoryStore under samtidig chat- och röstlast.
+
+En "voice"-korutin tickar var 20:e ms (som en ljudram) och mäter hur sent
+den väcks. Samtidigt kör N "chat"-korutiner samma minnessekvens som
+/api/chat (turn, RAG-sökning, event, svar). Jämför synkrona anrop direkt
+i event-loopen med AsyncMemoryStore.
+
+Kör från server/:
+    python benchmarks/bench_memory_async.py --rows 50000 --chats 8
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from memory import MemoryStore  # noqa: E402
+from memory_async import AsyncMemoryStore, _percentile  # noqa: E402
+
+WORDS = ["kalender", "musik", "spotify", "möte", "väder", "dokument", "agent", "minne", "svenska", "projekt"]
+FRAME_MS = 20.0
+
+
+def populate(store: MemoryStore, rows: int) -> None:
+    rnd = random.Random(7)
+    with store._conn() as c:
+        c.executemany(
+            "INSERT INTO memories (ts, kind, text, score, tags) VALUES (?, 'text', ?, 0.0, NULL)",
+            [
+                ("2025-01-01T00:00:00Z", " ".join(rnd.choice(WORDS) for _ in range(30)) + f" #{i}")
+                for i in range(rows)
+            ],
+        )
+
+
+async def voice_ticker(stop: asyncio.Event, lags: List[float]) -> None:
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        t0 = loop.time()
+        await asyncio.sleep(FRAME_MS / 1000)
+        lags.append(max(0.0, (loop.time() - t0) * 1000 - FRAME_MS))
+
+
+async def chat_turn_sync(store: MemoryStore, i: int) -> None:
+    store.add_conversation_turn("bench", "user", f"fråga {i}")
+    store.retrieve_text_memories(random.choice(WORDS), limit=10)
+    store.append_event("chat.in", "{}")
+    mem_id = store.upsert_text_memory_single(f"svar {i}")
+    store.add_conversation_turn("bench", "assistant", f"svar {i}", mem_id)
+    await asyncio.sleep(0)
+
+
+async def chat_turn_async(amemory: AsyncMemoryStore, i: int) -> None:
+    await amemory.add_conversation_turn("bench", "user", f"fråga {i}")
+    await amemory.retrieve_text_memories(random.choice(WORDS), limit=10)
+    await amemory.append_event("chat.in", "{}")
+    mem_id = await amemory.upsert_text_memory_single(f"svar {i}")
+    await amemory.add_conversation_turn("bench", "assistant", f"svar {i}", mem_id)
+
+
+async def scenario(mode: str, store: MemoryStore, chats: int, turns: int) -> Dict[str, Any]:
+    amemory = AsyncMemoryStore(store) if mode == "async" else None
+    lags: List[float] = []
+    stop = asyncio.Event()
+    ticker = asyncio.create_task(voice_ticker(stop, lags))
+
+    async def chat_worker(w: int) -> None:
+        for t in range(turns):
+            if amemory is not None:
+                await chat_turn_async(amemory, w * turns + t)
+            else:
+                await chat_turn_sync(store, w * turns + t)
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(chat_worker(w) for w in range(chats)))
+    elapsed = time.perf_counter() - t0
+    stop.set()
+    await ticker
+    if amemory is not None:
+        await amemory.aclose()
+    return {
+        "turns_per_sec": chats * turns / elapsed,
+        "lag_p50": _percentile(lags, 50),
+        "lag_p99": _percentile(lags, 99),
+        "lag_max": max(lags) if lags else 0.0,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=50000)
+    parser.add_argument("--chats", type=int, default=8)
+    parser.add_argument("--turns", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = MemoryStore(os.path.join(tmp, "bench.db"))
+        populate(store, args.rows)
+        print(f"{args.rows} memories, {args.chats} concurrent chats x {args.turns} turns, voice frame {FRAME_MS:.0f} ms")
+        print(f"{'mode':<8}{'turns/s':>10}{'lag p50':>12}{'lag p99':>12}{'lag max':>12}")
+        for mode in ("sync", "async"):
+            r = asyncio.run(scenario(mode, store, args.chats, args.turns))
+            print(
+                f"{mode:<8}{r['turns_per_sec']:>10.1f}{r['lag_p50']:>10.1f}ms"
+                f"{r['lag_p99']:>10.1f}ms{r['lag_max']:>10.1f}ms"
+            )
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
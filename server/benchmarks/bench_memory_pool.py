@@ -0,0 +1,63 @@
+"""
+Micro-benchmark: MemoryStore ops/sec med och utan connection pool.
+
+Kör från server/:
+    python benchmarks/bench_memory_pool.py --ops 2000
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from typing import Callable, Dict
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from memory import MemoryStore  # noqa: E402
+
+
+def _ops_per_sec(fn: Callable[[int], None], ops: int) -> float:
+    t0 = time.perf_counter()
+    for i in range(ops):
+        fn(i)
+    dt = time.perf_counter() - t0
+    return ops / dt if dt > 0 else float("inf")
+
+
+def run(pooled: bool, ops: int) -> Dict[str, float]:
+    with tempfile.TemporaryDirectory() as tmp:
+        store = MemoryStore(os.path.join(tmp, "bench.db"), pooled=pooled)
+        for i in range(200):
+            store.upsert_text_memory_single(f"Alice minne nummer {i} om kalender och musik", score=0.0)
+        results = {
+            "append_event": _ops_per_sec(lambda i: store.append_event("bench", f'{{"i": {i}}}'), ops),
+            "add_conversation_turn": _ops_per_sec(
+                lambda i: store.add_conversation_turn("bench", "user", f"meddelande {i}"), ops
+            ),
+            "retrieve_text_memories": _ops_per_sec(
+                lambda i: store.retrieve_text_memories("kalender", limit=5), ops
+            ),
+        }
+        store.close()
+        return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--ops", type=int, default=2000)
+    args = parser.parse_args()
+
+    before = run(pooled=False, ops=args.ops)
+    after = run(pooled=True, ops=args.ops)
+
+    print(f"{'operation':<26}{'fresh conn':>14}{'pooled':>14}{'speedup':>10}")
+    for name in before:
+        b, a = before[name], after[name]
+        print(f"{name:<26}{b:>12.0f}/s{a:>12.0f}/s{a / b:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
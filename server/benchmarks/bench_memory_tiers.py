@@ -0,0 +1,91 @@
+"""
+Benchmark: RAG-sökning med och utan het nivå (memory_tiers.HotTier).
+
+Databasen fylls med ``--rows`` minnen där ``--hot-pct`` procent är nya
+(inom ``recent_days``) och resten är gamla med låg poäng. Frågorna blandar
+termer som finns i den heta delen med termer som bara finns på disk, så
+både hot-träffar och kalla fallbacks mäts. Latens per nivå skrivs ut som
+percentiler från ``HotTier.stats()``.
+
+Kör från server/:
+    python benchmarks/bench_memory_tiers.py --rows 200000 --hot-pct 5
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from memory import MemoryStore  # noqa: E402
+from memory_tiers import HotTier  # noqa: E402
+
+VOCAB = "kalender möte rapport budget schema musik dokument projekt".split()
+COLD_ONLY = "arkiv deklaration kvitto".split()
+FILLER = [f"ord{i}" for i in range(5000)]
+
+
+def populate(store: MemoryStore, rows: int, hot_pct: float) -> None:
+    rnd = random.Random(0)
+    batch = []
+    for i in range(rows):
+        hot = rnd.random() * 100 < hot_pct
+        words = [rnd.choice(FILLER) for _ in range(25)] + [rnd.choice(VOCAB if hot else VOCAB + COLD_ONLY)]
+        ts = "2999-01-01T00:00:00Z" if hot else "2020-01-01T00:00:00Z"
+        batch.append((ts, " ".join(words)))
+    with store._conn() as c:
+        c.executemany("INSERT INTO memories (ts, kind, text, score, tags) VALUES (?, 'text', ?, 0.0, NULL)", batch)
+
+
+def run(store: MemoryStore, queries: list, limit: int) -> list:
+    out = []
+    for q in queries:
+        t0 = time.perf_counter()
+        store.retrieve_hybrid(q, limit=limit)
+        out.append((time.perf_counter() - t0) * 1000)
+    return out
+
+
+def pct(values: list, p: float) -> float:
+    arr = sorted(values)
+    return arr[min(len(arr) - 1, int(round(p / 100 * (len(arr) - 1))))]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=200000)
+    parser.add_argument("--hot-pct", type=float, default=5.0)
+    parser.add_argument("--queries", type=int, default=300)
+    parser.add_argument("--limit", type=int, default=5)
+    args = parser.parse_args()
+
+    rnd = random.Random(1)
+    queries = [rnd.choice(VOCAB if rnd.random() < 0.9 else COLD_ONLY) for _ in range(args.queries)]
+    with tempfile.TemporaryDirectory() as tmp:
+        store = MemoryStore(os.path.join(tmp, "alice.db"), dedup=False)
+        populate(store, args.rows, args.hot_pct)
+        cold = run(store, queries, args.limit)
+
+        store.hot_tier = HotTier(store, recent_days=14, max_items=args.rows)
+        t0 = time.perf_counter()
+        store.hot_tier.load()
+        load_ms = (time.perf_counter() - t0) * 1000
+        tiered = run(store, queries, args.limit)
+        stats = store.hot_tier.stats()
+
+        print(f"hot items: {stats['items']} (load {load_ms:.0f} ms), hot ratio {stats['hot_ratio']:.2f}")
+        print(f"{'path':<20}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+        for name, values in (("disk only", cold), ("hot + cold", tiered)):
+            print(f"{name:<20}{pct(values, 50):>10.2f}{pct(values, 95):>10.2f}{pct(values, 99):>10.2f}")
+        for tier, lat in stats["latency_ms"].items():
+            print(f"  candidates {tier:<8}{lat['p50']:>10.2f}{lat['p95']:>10.2f}{lat['p99']:>10.2f}  (n={lat['count']})")
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+Benchmark: retention på conversations, radvis DELETE mot DROP av partition.
+
+Fyller en databas utan partitioner (som före partitioneringen) och en
+månadspartitionerad MemoryStore med samma rader utspridda över ``--months``
+månader, och tar sedan bort den äldsta månaden: ``DELETE ... WHERE ts < ?``
+respektive ``cleanup_old_conversations`` (DROP TABLE). Mäter tid och hur
+mycket WAL:en växer. Mäter även ``get_conversation_context``.
+
+Kör från server/ (10M rader tar några minuter och ~3 GB disk):
+    python benchmarks/bench_partition_retention.py --rows 10000000
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from memory import CONVERSATIONS, MemoryStore  # noqa: E402
+from partitions import month_bounds  # noqa: E402
+
+# Genererar raderna i SQLite; ts sprids jämnt över månaden (dag 01-28)
+FILL = """
+WITH RECURSIVE n(i) AS (SELECT 0 UNION ALL SELECT i + 1 FROM n WHERE i < ? - 1)
+INSERT INTO {table} (session_id, ts, role, content, memory_id)
+SELECT 's' || (i % 500), ? || '-' || printf('%02d', 1 + i % 28) || 'T12:00:00Z',
+       CASE i % 2 WHEN 0 THEN 'user' ELSE 'assistant' END,
+       'hej alice, vad står i kalendern den här veckan? tur ' || i, NULL
+FROM n
+"""
+
+
+def months_back(count: int):
+    now = datetime.utcnow()
+    year, month = now.year, now.month
+    out = []
+    for _ in range(count):
+        out.append(f"{year:04d}-{month:02d}")
+        year, month = (year - 1, 12) if month == 1 else (year, month - 1)
+    return list(reversed(out))
+
+
+def wal_mb(path: str) -> float:
+    wal = path + "-wal"
+    return os.path.getsize(wal) / 1e6 if os.path.exists(wal) else 0.0
+
+
+def timed(fn):
+    t0 = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - t0
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=10_000_000)
+    parser.add_argument("--months", type=int, default=12)
+    args = parser.parse_args()
+
+    months = months_back(args.months)
+    per_month = args.rows // args.months
+    oldest = months[0]
+    cutoff = month_bounds(oldest.replace("-", ""))[1] + "-01T00:00:00Z"
+    print(f"rows={per_month * args.months} months={args.months} dropping {oldest} ({per_month} rows)")
+    print(f"{'step':<36}{'seconds':>10}{'WAL MB':>10}{'rows':>10}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Före: en tabell, radvis DELETE
+        path = os.path.join(tmp, "legacy.db")
+        c = sqlite3.connect(path)
+        c.execute("PRAGMA journal_mode=WAL")
+        c.execute("PRAGMA synchronous=NORMAL")
+        c.execute(
+            "CREATE TABLE conversations (id INTEGER PRIMARY KEY AUTOINCREMENT, session_id TEXT, ts TEXT NOT NULL, "
+            "role TEXT NOT NULL, content TEXT NOT NULL, memory_id INTEGER)"
+        )
+        c.execute("CREATE INDEX idx_conversations_session ON conversations(session_id, ts)")
+        _, s = timed(lambda: [c.execute(FILL.format(table="conversations"), (per_month, m)) for m in months] and c.commit())
+        c.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        print(f"{'fill: single table':<36}{s:>10.1f}{'-':>10}{per_month * args.months:>10}")
+
+        def legacy_delete():
+            cur = c.execute("DELETE FROM conversations WHERE ts < ?", (cutoff,))
+            c.commit()
+            return cur.rowcount
+
+        rows, s = timed(legacy_delete)
+        print(f"{'retention: DELETE WHERE ts < ?':<36}{s:>10.2f}{wal_mb(path):>10.0f}{rows:>10}")
+        c.close()
+        os.remove(path)
+
+        # Efter: månadspartitioner, DROP TABLE
+        path = os.path.join(tmp, "partitioned.db")
+        store = MemoryStore(path)
+        pc = store._conn()
+
+        def fill_partitions():
+            for m in months:
+                key = store._partition_for(CONVERSATIONS, m + "-01")
+                with pc:
+                    pc.execute(FILL.format(table=CONVERSATIONS.partition(key)), (per_month, m))
+
+        _, s = timed(fill_partitions)
+        pc.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        print(f"{'fill: monthly partitions':<36}{s:>10.1f}{'-':>10}{per_month * args.months:>10}")
+        rows, s = timed(lambda: store.drop_partitions_before("conversations", cutoff))
+        print(f"{'retention: DROP partition':<36}{s:>10.2f}{wal_mb(path):>10.0f}{rows:>10}")
+
+        t0 = time.perf_counter()
+        for i in range(1000):
+            store.get_conversation_context(f"s{i % 500}", limit=10)
+        print(f"get_conversation_context: {(time.perf_counter() - t0):.3f} ms/call")
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Benchmark: RAG-sökning i /api/chat - en LIKE-scan per synonym mot en FTS5-fråga.
+
+Kör från server/:
+    python benchmarks/bench_rag_terms.py --sizes 10000 100000 300000
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from typing import List
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from memory import MemoryStore  # noqa: E402
+
+VOCAB = (
+    "alice kalender möte boka schema musik spotify spela låt dokument fil upload "
+    "agent planner executor orchestrator embedding vektor semantisk chunking segment "
+    "väder prestanda latens svarstid projekt rapport mejl e-post familj resa middag"
+).split()
+
+EXPANDED = [
+    "kalender", "calendar", "möte", "boka", "schema", "tid", "spotify", "musik",
+    "spela", "låt", "musikuppspelning", "vad", "har", "jag", "imorgon",
+]
+
+
+FILLER = [f"ord{i}" for i in range(20000)]
+
+
+def _text(rnd: random.Random) -> str:
+    # Mest utfyllnadsord; ett ämnesord i ungefär var tionde text
+    words = [rnd.choice(FILLER) for _ in range(40)]
+    if rnd.random() < 0.1:
+        words[rnd.randrange(40)] = rnd.choice(VOCAB)
+    return " ".join(words)
+
+
+def populate(store: MemoryStore, rows: int, start: int = 0) -> None:
+    rnd = random.Random(start)
+    with store._conn() as c:
+        c.executemany(
+            "INSERT INTO memories (ts, kind, text, score, tags) VALUES (?, 'text', ?, ?, NULL)",
+            [("2025-01-01T00:00:00Z", _text(rnd), rnd.random()) for _ in range(rows)],
+        )
+
+
+def per_word_like(store: MemoryStore, words: List[str]) -> int:
+    hits = []
+    for w in words:
+        if len(w) > 2:
+            hits.extend(store.retrieve_text_memories(w, limit=10))
+    return len(hits)
+
+
+def single_fts(store: MemoryStore, words: List[str]) -> int:
+    return len(store.retrieve_text_terms(words, limit=5))
+
+
+def timed(fn, store: MemoryStore, repeat: int) -> float:
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        fn(store, EXPANDED)
+    return (time.perf_counter() - t0) * 1000 / repeat
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 300000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = MemoryStore(os.path.join(tmp, "bench.db"))
+        have = 0
+        print(f"{'rows':>10}{'LIKE per word':>16}{'one FTS5':>12}")
+        for size in sorted(args.sizes):
+            populate(store, size - have, start=have)
+            have = size
+            like_ms = timed(per_word_like, store, args.repeat)
+            fts_ms = timed(single_fts, store, args.repeat)
+            print(f"{size:>10}{like_ms:>14.1f}ms{fts_ms:>10.1f}ms")
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
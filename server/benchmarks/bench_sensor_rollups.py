@@ -0,0 +1,76 @@
+"""
+Benchmark: sensortelemetri, inläsning och intervallfrågor med rollups.
+
+Läser in ``--days`` dygn av mätningar (en per ``--interval`` sekund och
+sensor) via ``add_sensor_telemetry_batch`` och jämför intervallfrågor som
+aggregerar råa rader (resolution="raw") med automatiskt vald rollup.
+Mäter även kostnaden för en enstaka ``add_sensor_telemetry``.
+
+Kör från server/:
+    python benchmarks/bench_sensor_rollups.py --days 28 --sensors 5
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from memory import MemoryStore  # noqa: E402
+
+
+def timed(fn, repeat: int = 1):
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return result, (time.perf_counter() - t0) / repeat
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--days", type=int, default=28)
+    parser.add_argument("--sensors", type=int, default=5)
+    parser.add_argument("--interval", type=float, default=10.0)
+    parser.add_argument("--batch", type=int, default=1000)
+    args = parser.parse_args()
+
+    rnd = random.Random(0)
+    end = time.time()
+    start = end - args.days * 86400
+    per_sensor = int(args.days * 86400 / args.interval)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = MemoryStore(os.path.join(tmp, "alice.db"))
+        t0 = time.perf_counter()
+        batch = []
+        for i in range(per_sensor):
+            t = start + i * args.interval
+            for s in range(args.sensors):
+                batch.append((f"sensor{s}", 20 + 5 * rnd.random(), None, t))
+            if len(batch) >= args.batch:
+                store.add_sensor_telemetry_batch(batch)
+                batch = []
+        store.add_sensor_telemetry_batch(batch)
+        total = per_sensor * args.sensors
+        s = time.perf_counter() - t0
+        print(f"ingest: {total} readings in {s:.1f} s ({total / s:.0f}/s, batch={args.batch})")
+        _, s = timed(lambda: store.add_sensor_telemetry("sensor0", 21.0), repeat=200)
+        print(f"single add_sensor_telemetry: {s * 1000:.2f} ms")
+
+        print(f"{'range':<10}{'source':>8}{'step s':>9}{'points':>8}{'rollup ms':>11}{'raw ms':>9}")
+        for label, days in (("1 h", 1 / 24), ("1 day", 1), ("1 week", 7), (f"{args.days} days", args.days)):
+            q_start = end - days * 86400
+            auto, auto_s = timed(lambda: store.query_sensor_telemetry("sensor0", q_start, end, max_points=500), repeat=5)
+            raw, raw_s = timed(lambda: store.query_sensor_telemetry("sensor0", q_start, end, max_points=500, resolution="raw"), repeat=2)
+            print(f"{label:<10}{auto['source']:>8}{auto['step_s']:>9}{len(auto['points']):>8}"
+                  f"{auto_s * 1000:>11.2f}{raw_s * 1000:>9.1f}")
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
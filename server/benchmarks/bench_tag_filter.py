@@ -0,0 +1,105 @@
+"""
+Benchmark: taggfiltrerad RAG - filtrering i Python mot memory_tags i SQL.
+
+Gammal väg: hämta FTS-träffar och JSON-tolka ``tags`` per rad i Python,
+tills ``limit`` träffar för dokumentet hittats. Ny väg:
+``retrieve_text_terms``/``search_embeddings`` med ``tags=`` där filtret
+körs i SQL via memory_tags.
+
+Kör från server/:
+    python benchmarks/bench_tag_filter.py --rows 100000 --docs 200
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from memory import MemoryStore, build_fts_query  # noqa: E402
+
+MODEL = "bench-embed"
+VOCAB = "kalender möte rapport budget schema musik dokument projekt".split()
+FILLER = [f"ord{i}" for i in range(5000)]
+
+
+def populate(store: MemoryStore, rows: int, docs: int, dim: int) -> None:
+    rnd = random.Random(0)
+    batch = []
+    for i in range(rows):
+        words = [rnd.choice(FILLER) for _ in range(25)] + [rnd.choice(VOCAB)]
+        if i % 2:
+            tags = {"source": "chat", "provider": "local"}
+        else:
+            tags = {"source": "document_upload", "filename": f"doc{rnd.randrange(docs)}.pdf", "chunked": True}
+        batch.append(("2026-10-01T00:00:00Z", " ".join(words), json.dumps(tags)))
+    with store._conn() as c:
+        c.executemany("INSERT INTO memories (ts, kind, text, score, tags) VALUES (?, 'text', ?, 0.0, ?)", batch)
+        ids = [r[0] for r in c.execute("SELECT id FROM memories ORDER BY id")]
+    vecs = np.random.default_rng(0).standard_normal((len(ids), dim)).astype(np.float32)
+    store.upsert_embeddings(MODEL, ids, vecs)
+
+
+def legacy(store: MemoryStore, term: str, filename: str, limit: int) -> int:
+    hits = []
+    with store._conn() as c:
+        cur = c.execute(
+            "SELECT m.id, m.tags FROM memories_fts JOIN memories m ON m.id = memories_fts.rowid "
+            "WHERE memories_fts MATCH ? ORDER BY bm25(memories_fts)",
+            (build_fts_query([term]),),
+        )
+        for mem_id, tags in cur:
+            t = json.loads(tags or "{}")
+            if t.get("source") == "document_upload" and t.get("filename") == filename:
+                hits.append(mem_id)
+                if len(hits) >= limit:
+                    break
+    return len(hits)
+
+
+def timed(fn, reps: int) -> float:
+    t0 = time.perf_counter()
+    for i in range(reps):
+        fn(i)
+    return (time.perf_counter() - t0) / reps * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--docs", type=int, default=200)
+    parser.add_argument("--dim", type=int, default=128)
+    parser.add_argument("--reps", type=int, default=50)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = MemoryStore(os.path.join(tmp, "alice.db"), dedup=False)
+        populate(store, args.rows, args.docs, args.dim)
+        qv = np.random.default_rng(1).standard_normal(args.dim).astype(np.float32)
+        store.vector_index(MODEL)
+
+        def tags(i):
+            return {"source": "document_upload", "filename": f"doc{i % args.docs}.pdf"}
+
+        rows = [
+            ("fts: python filter", timed(lambda i: legacy(store, VOCAB[i % len(VOCAB)], tags(i)["filename"], 5), args.reps)),
+            ("fts: memory_tags", timed(lambda i: store.retrieve_text_terms([VOCAB[i % len(VOCAB)]], limit=5, tags=tags(i)), args.reps)),
+            ("vector: unfiltered", timed(lambda i: store.search_embeddings(MODEL, qv, limit=5), args.reps)),
+            ("vector: memory_tags", timed(lambda i: store.search_embeddings(MODEL, qv, limit=5, tags=tags(i)), args.reps)),
+        ]
+        print(f"{'path':<24}{'ms/query':>10}")
+        for name, ms in rows:
+            print(f"{name:<24}{ms:>10.2f}")
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Benchmark: bandit-beslut och feedback mot SQLite respektive minnesräknare.
+
+Mäter beslut/s för ``EpsilonGreedyBandit.pick`` (en ``get_tool_stats`` per
+kandidat mot SQLite, eller en ``get_many`` mot ``ToolStatsCounters``) och
+feedback/s för ``update_tool_stats``.
+
+Kör från server/:
+    python benchmarks/bench_tool_stats.py --decisions 20000 --candidates 8
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from decision import EpsilonGreedyBandit  # noqa: E402
+from memory import MemoryStore  # noqa: E402
+from tool_stats import ToolStatsCounters  # noqa: E402
+
+
+def run(store: MemoryStore, decisions: int, candidates: int, feedback: int):
+    tools = [f"tool_{i}" for i in range(candidates)]
+    bandit = EpsilonGreedyBandit(store, epsilon=0.1)
+    rng = random.Random(0)
+
+    t0 = time.perf_counter()
+    for _ in range(feedback):
+        store.update_tool_stats(rng.choice(tools), rng.random() < 0.7)
+    feedback_rate = feedback / (time.perf_counter() - t0)
+
+    t0 = time.perf_counter()
+    for _ in range(decisions):
+        bandit.pick(tools)
+    decision_rate = decisions / (time.perf_counter() - t0)
+
+    if store.tool_counters is not None:
+        store.tool_counters.close()
+    total = sum(s + f for _, s, f in store.read_tool_stats())
+    return decision_rate, feedback_rate, total
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--decisions", type=int, default=20000)
+    parser.add_argument("--candidates", type=int, default=8)
+    parser.add_argument("--feedback", type=int, default=5000)
+    args = parser.parse_args()
+
+    print(f"{'path':<20}{'decisions/s':>14}{'feedback/s':>14}{'rows':>10}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, in_memory in [("sqlite", False), ("in-memory", True)]:
+            store = MemoryStore(os.path.join(tmp, f"{name}.db"))
+            if in_memory:
+                store.tool_counters = ToolStatsCounters(store).start()
+            decision_rate, feedback_rate, total = run(store, args.decisions, args.candidates, args.feedback)
+            print(f"{name:<20}{decision_rate:>14.0f}{feedback_rate:>14.0f}{total:>10}")
+            store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Benchmark: export av träningsdata (/api/training/dump).
+
+Jämför den tidigare exporten (hela tabeller ``ORDER BY ts``, en NDJSON-rad
+per yield, okomprimerat) med ``stream_dataset``: full export utan och med
+gzip/zstd, samt en inkrementell export från en markör efter att nya rader
+tillkommit.
+
+Kör från server/:
+    python benchmarks/bench_training_export.py --events 500000 --memories 100000
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from memory import MemoryStore  # noqa: E402
+from training import ZSTD_AVAILABLE, stream_dataset  # noqa: E402
+
+
+def legacy_stream_dataset(db_path: str):
+    # Som training.stream_dataset var tidigare (events/memories, en rad per yield)
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    for row in conn.execute("SELECT ts, topic, payload FROM events ORDER BY ts ASC"):
+        record = {"kind": "event", "ts": row["ts"], "topic": row["topic"], "payload": row["payload"]}
+        yield (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+    for row in conn.execute("SELECT ts, kind, text, score, tags FROM memories ORDER BY ts ASC"):
+        record = {"kind": "memory", "ts": row["ts"], "type": row["kind"], "text": row["text"],
+                  "score": row["score"], "tags": row["tags"]}
+        yield (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+    conn.close()
+
+
+def consume(chunks):
+    t0 = time.perf_counter()
+    size = n = 0
+    last = b""
+    for chunk in chunks:
+        size += len(chunk)
+        n += 1
+        last = chunk
+    return time.perf_counter() - t0, size, n, last
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--events", type=int, default=500_000)
+    parser.add_argument("--memories", type=int, default=100_000)
+    parser.add_argument("--new", type=int, default=1000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "alice.db")
+        store = MemoryStore(path, dedup=False)
+        base = datetime.utcnow() - timedelta(days=60)
+        payload = json.dumps({"text": "hej alice, vad står i kalendern i morgon?", "session": "s1"}, ensure_ascii=False)
+        for i in range(0, args.events, 50_000):
+            store.write_events([
+                ((base + timedelta(seconds=j * 10)).isoformat() + "Z", "chat.in" if j % 2 else "ws_in", payload)
+                for j in range(i, min(i + 50_000, args.events))
+            ])
+        with store._conn() as c:
+            store._insert_text_rows(c, [
+                (datetime.utcnow().isoformat() + "Z", f"minne {i}: mötet med projektgruppen flyttas till fredag", 1.0, None)
+                for i in range(args.memories)
+            ])
+        print(f"rows: events={args.events} memories={args.memories}")
+        print(f"{'export':<32}{'seconds':>9}{'MB':>9}{'chunks':>9}")
+
+        s, size, n, _ = consume(legacy_stream_dataset(path))
+        print(f"{'legacy (ORDER BY ts, per row)':<32}{s:>9.2f}{size / 1e6:>9.1f}{n:>9}")
+        tables = ["events", "memories"]
+        last = b""
+        for compression in ["none", "gzip"] + (["zstd"] if ZSTD_AVAILABLE else []):
+            s, size, n, chunk = consume(stream_dataset(path, tables=tables, compression=compression))
+            if compression == "none":
+                last = chunk
+            print(f"{'stream_dataset ' + compression:<32}{s:>9.2f}{size / 1e6:>9.1f}{n:>9}")
+
+        cursor = json.loads(last.decode("utf-8").splitlines()[-1])["cursor"]
+        store.write_events([(datetime.utcnow().isoformat() + "Z", "chat.in", payload)] * args.new)
+        s, size, n, _ = consume(stream_dataset(path, tables=tables, cursor=cursor))
+        print(f"{f'incremental (+{args.new} events)':<32}{s:>9.3f}{size / 1e6:>9.2f}{n:>9}")
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Benchmark: semantisk top-k - JSON + ren Python-cosine mot VectorIndex (float32/int8).
+
+Den gamla vägen mäts bara upp till --legacy-max rader (den är O(N*dim) i
+Python och tar minuter vid 1M). RAM: 1M x 1536 float32 är ~6 GB; använd
+--dim 384 på mindre maskiner.
+
+Kör från server/:
+    python benchmarks/bench_vector_index.py --sizes 100000 1000000 --dim 384
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import math
+import os
+import sys
+import time
+from typing import List, Tuple
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from vector_index import VectorIndex  # noqa: E402
+
+
+def legacy_topk(rows: List[Tuple[int, str]], qv: List[float], k: int) -> List[int]:
+    # Samma algoritm som /api/memory/retrieve hade tidigare
+    def cos(a, b):
+        num = sum(x * y for x, y in zip(a, b))
+        da = math.sqrt(sum(x * x for x in a))
+        db = math.sqrt(sum(y * y for y in b))
+        return (num / (da * db)) if da > 0 and db > 0 else 0.0
+
+    sims = [(mem_id, cos(qv, json.loads(v))) for mem_id, v in rows]
+    sims.sort(key=lambda x: x[1], reverse=True)
+    return [m for m, _ in sims[:k]]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100000, 1000000])
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=20)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--legacy-max", type=int, default=5000)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"dim={args.dim} k={args.k}")
+    print(f"{'rows':>10}{'mode':>10}{'ms/query':>12}{'MB':>10}{'recall@k':>10}")
+    for n in args.sizes:
+        data = rng.standard_normal((n, args.dim), dtype=np.float32)
+        queries = rng.standard_normal((args.queries, args.dim), dtype=np.float32)
+        ids = np.arange(1, n + 1)
+
+        if n <= args.legacy_max:
+            rows = [(int(i), json.dumps(v.tolist())) for i, v in zip(ids, data)]
+            t0 = time.perf_counter()
+            for q in queries[:3]:
+                legacy_topk(rows, q.tolist(), args.k)
+            ms = (time.perf_counter() - t0) * 1000 / 3
+            print(f"{n:>10}{'legacy':>10}{ms:>12.1f}{'-':>10}{'-':>10}")
+
+        exact = None
+        for quant in (None, "int8"):
+            index = VectorIndex(args.dim, quantize=quant, capacity=n)
+            index.add(ids, data)
+            t0 = time.perf_counter()
+            results = [[m for m, _ in index.search(q, args.k)] for q in queries]
+            ms = (time.perf_counter() - t0) * 1000 / len(queries)
+            if exact is None:
+                exact = results
+                recall = 1.0
+            else:
+                recall = float(np.mean([len(set(a) & set(b)) / args.k for a, b in zip(exact, results)]))
+            mb = index.stats()["bytes"] / 1e6
+            print(f"{n:>10}{quant or 'float32':>10}{ms:>12.2f}{mb:>10.0f}{recall:>10.3f}")
+            del index
+        del data
+
+
+if __name__ == "__main__":
+    main()
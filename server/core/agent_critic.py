@@ -593,7 +593,8 @@ class AgentCritic:
             
         try:
             import os
-            import httpx
+            from http_pool import http_clients
+            from llm.scheduler import Priority, llm_scheduler
             import json
             
             # Check if OpenAI is available
@@ -641,7 +642,7 @@ class AgentCritic:
             """
             
             # Call OpenAI for analysis
-            async with httpx.AsyncClient(timeout=30.0) as client:
+            async with llm_scheduler.slot("openai", Priority.TOOLS), http_clients.session("openai", timeout=30.0) as client:
                 response = await client.post(
                     "https://api.openai.com/v1/chat/completions",
                     headers={
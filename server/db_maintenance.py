@@ -0,0 +1,345 @@
+"""
+Underhåll av Alice SQLite-filer när servern är ledig.
+
+``ActivityTracker`` räknar HTTP-anrop och inkommande websocket-meddelanden
+(via ``ActivityMiddleware``). ``DatabaseMaintenance`` väntar tills ingen
+förfrågan pågår, det varit tyst i ``quiet_s`` sekunder och takten senaste
+minuten är låg, och kör då för varje databas i korta steg:
+
+* ``PRAGMA optimize`` (med ``analysis_limit`` så att ANALYZE är begränsad)
+* FTS5 ``merge`` i små portioner, ``optimize`` bara för små index
+* ``PRAGMA incremental_vacuum`` i portioner (``auto_vacuum=INCREMENTAL``);
+  små filer med mycket fritt utrymme VACUUM:as en gång till det läget
+* ``wal_checkpoint(PASSIVE)`` och, när den hunnit ikapp, ``TRUNCATE``
+
+Varje steg är en egen kort transaktion på en egen uppkoppling med kort
+``busy_timeout``: är databasen låst hoppas steget över i stället för att
+vänta. Mellan stegen kontrolleras aktiviteten igen och en körning avbryts
+så fort trafik kommer tillbaka, så ett röstvarv väntar som mest på ett steg.
+Storlek och fragmentering före/efter per fil exponeras via ``stats()``.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import sqlite3
+import time
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger("alice.db_maintenance")
+
+
+class ActivityTracker:
+    """Request rate and in-flight count, used to detect idle periods"""
+
+    def __init__(self, window_s: float = 60.0) -> None:
+        self.window_s = window_s
+        self._hits: "deque[float]" = deque()
+        self.in_flight = 0
+        self.last_hit = time.monotonic()
+        self.total = 0
+
+    def _prune(self, now: float) -> None:
+        cutoff = now - self.window_s
+        while self._hits and self._hits[0] < cutoff:
+            self._hits.popleft()
+
+    def hit(self) -> None:
+        now = time.monotonic()
+        self._hits.append(now)
+        self._prune(now)
+        self.last_hit = now
+        self.total += 1
+
+    def begin(self) -> None:
+        self.hit()
+        self.in_flight += 1
+
+    def end(self) -> None:
+        self.in_flight = max(0, self.in_flight - 1)
+        self.last_hit = time.monotonic()
+
+    def rate_per_min(self) -> float:
+        self._prune(time.monotonic())
+        return len(self._hits) * 60.0 / self.window_s
+
+    def idle_for(self) -> float:
+        return time.monotonic() - self.last_hit
+
+    def is_idle(self, quiet_s: float, max_rate_per_min: float) -> bool:
+        return self.in_flight == 0 and self.idle_for() >= quiet_s and self.rate_per_min() <= max_rate_per_min
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "in_flight": self.in_flight,
+            "rate_per_min": round(self.rate_per_min(), 2),
+            "idle_for_s": round(self.idle_for(), 1),
+            "total": self.total,
+        }
+
+
+class ActivityMiddleware:
+    """ASGI middleware feeding an ``ActivityTracker``.
+
+    HTTP requests count as in flight until the response is done. Websockets
+    are long-lived, so only each received message counts (a voice turn).
+    """
+
+    def __init__(self, app, tracker: ActivityTracker, ignore_prefixes=("/api/metrics", "/api/health", "/health")):
+        self.app = app
+        self.tracker = tracker
+        self.ignore_prefixes = tuple(ignore_prefixes)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and not scope.get("path", "").startswith(self.ignore_prefixes):
+            self.tracker.begin()
+            try:
+                await self.app(scope, receive, send)
+            finally:
+                self.tracker.end()
+        elif scope["type"] == "websocket":
+            async def receive_wrapper():
+                message = await receive()
+                if message["type"] == "websocket.receive":
+                    self.tracker.hit()
+                return message
+
+            await self.app(scope, receive_wrapper, send)
+        else:
+            await self.app(scope, receive, send)
+
+
+def _file_size(path: str) -> int:
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+
+def db_metrics(conn: sqlite3.Connection, path: str) -> Dict[str, Any]:
+    """Size and fragmentation of one database file"""
+    page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+    page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+    freelist = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    return {
+        "file_bytes": _file_size(path),
+        "wal_bytes": _file_size(path + "-wal"),
+        "page_size": page_size,
+        "page_count": page_count,
+        "freelist_pages": freelist,
+        "free_ratio": round(freelist / page_count, 4) if page_count else 0.0,
+        "journal_mode": conn.execute("PRAGMA journal_mode").fetchone()[0],
+        "auto_vacuum": {0: "none", 1: "full", 2: "incremental"}.get(conn.execute("PRAGMA auto_vacuum").fetchone()[0]),
+    }
+
+
+def _fts5_tables(conn: sqlite3.Connection) -> List[str]:
+    rows = conn.execute("SELECT name, sql FROM sqlite_master WHERE type='table' AND sql LIKE 'CREATE VIRTUAL TABLE%'")
+    return [name for name, sql in rows if "fts5" in (sql or "").lower()]
+
+
+class _Interrupted(Exception):
+    pass
+
+
+class DatabaseMaintenance:
+    """Idle-time optimize / FTS merge / incremental vacuum / WAL checkpoint"""
+
+    def __init__(
+        self,
+        databases: Dict[str, str],
+        activity: ActivityTracker,
+        interval_s: float = 3600.0,
+        quiet_s: float = 60.0,
+        max_rate_per_min: float = 6.0,
+        busy_timeout_ms: int = 50,
+        analysis_limit: int = 400,
+        fts_merge_pages: int = 200,
+        fts_optimize_max_rows: int = 2000,
+        vacuum_pages: int = 256,
+        vacuum_max_bytes: int = 32 * 1024 * 1024,
+        vacuum_min_free_ratio: float = 0.2,
+        max_steps: int = 200,
+        poll_s: float = 5.0,
+    ) -> None:
+        self.databases = dict(databases)
+        self.activity = activity
+        self.interval_s = interval_s
+        self.quiet_s = quiet_s
+        self.max_rate_per_min = max_rate_per_min
+        self.busy_timeout_ms = busy_timeout_ms
+        self.analysis_limit = analysis_limit
+        self.fts_merge_pages = fts_merge_pages
+        self.fts_optimize_max_rows = fts_optimize_max_rows
+        self.vacuum_pages = vacuum_pages
+        self.vacuum_max_bytes = vacuum_max_bytes
+        self.vacuum_min_free_ratio = vacuum_min_free_ratio
+        self.max_steps = max_steps
+        self.poll_s = poll_s
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = asyncio.Event()
+        self.runs = 0
+        self.interrupted = 0
+        self.skipped_locked = 0
+        self.last_run: Dict[str, Dict[str, Any]] = {}
+        self._step_ms: "deque[float]" = deque(maxlen=500)
+
+    # --- steg ---
+    def _is_idle(self) -> bool:
+        return self.activity.is_idle(self.quiet_s, self.max_rate_per_min)
+
+    def _step(
+        self, conn: sqlite3.Connection, sql: str, done: Dict[str, int], name: str, keep_going: Callable[[], bool]
+    ) -> int:
+        """Run one short autocommit statement; returns rows changed (0 if the database was busy)"""
+        if not keep_going():
+            raise _Interrupted()
+        before = conn.total_changes
+        t0 = time.perf_counter()
+        try:
+            conn.execute(sql).fetchall()
+        except sqlite3.OperationalError as e:
+            if "locked" not in str(e) and "busy" not in str(e):
+                raise
+            self.skipped_locked += 1
+            return 0
+        finally:
+            self._step_ms.append((time.perf_counter() - t0) * 1000)
+        done[name] = done.get(name, 0) + 1
+        return conn.total_changes - before
+
+    def maintain(self, name: str, path: str, force: bool = False) -> Dict[str, Any]:
+        """Maintain one database file (blocking; run in a thread)"""
+        t0 = time.perf_counter()
+        keep_going: Callable[[], bool] = (lambda: True) if force else self._is_idle
+        conn = sqlite3.connect(path, timeout=self.busy_timeout_ms / 1000.0, isolation_level=None)
+        done: Dict[str, int] = {}
+        result: Dict[str, Any] = {"path": path}
+        try:
+            conn.execute(f"PRAGMA busy_timeout={int(self.busy_timeout_ms)}")
+            result["before"] = db_metrics(conn, path)
+            try:
+                self._run_steps(conn, result["before"], done, keep_going)
+                result["status"] = "ok"
+            except _Interrupted:
+                result["status"] = "interrupted"
+                self.interrupted += 1
+            result["after"] = db_metrics(conn, path)
+        except Exception as e:
+            result["status"] = "error"
+            result["error"] = str(e)
+            logger.warning(f"Maintenance of {name} failed: {e}")
+        finally:
+            conn.close()
+        result["steps"] = done
+        result["duration_ms"] = round((time.perf_counter() - t0) * 1000, 1)
+        result["ts"] = time.time()
+        self.last_run[name] = result
+        return result
+
+    def _run_steps(
+        self, conn: sqlite3.Connection, before: Dict[str, Any], done: Dict[str, int], keep_going: Callable[[], bool]
+    ) -> None:
+        conn.execute(f"PRAGMA analysis_limit={int(self.analysis_limit)}")
+        self._step(conn, "PRAGMA optimize", done, "optimize", keep_going)
+
+        for table in _fts5_tables(conn):
+            rows = conn.execute(f'SELECT COUNT(*) FROM "{table}_data"').fetchone()[0]
+            if rows <= self.fts_optimize_max_rows:
+                self._step(conn, f"INSERT INTO \"{table}\"(\"{table}\") VALUES('optimize')", done, "fts_optimize", keep_going)
+                continue
+            # merge skriver högst N sidor per anrop; total_changes ökar med < 2 när inget fanns att slå ihop
+            for _ in range(self.max_steps):
+                changed = self._step(
+                    conn, f"INSERT INTO \"{table}\"(\"{table}\", rank) VALUES('merge', {int(self.fts_merge_pages)})",
+                    done, "fts_merge", keep_going,
+                )
+                if changed < 2:
+                    break
+
+        if before["auto_vacuum"] == "incremental":
+            for _ in range(self.max_steps):
+                if conn.execute("PRAGMA freelist_count").fetchone()[0] == 0:
+                    break
+                self._step(conn, f"PRAGMA incremental_vacuum({int(self.vacuum_pages)})", done, "incremental_vacuum", keep_going)
+        elif (
+            before["file_bytes"] <= self.vacuum_max_bytes
+            and before["free_ratio"] >= self.vacuum_min_free_ratio
+        ):
+            # Liten fil: en VACUUM är kort och slår på inkrementell vacuum för framtiden
+            conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+            self._step(conn, "VACUUM", done, "vacuum", keep_going)
+
+        if before["journal_mode"] == "wal":
+            busy, log, ckpt = conn.execute("PRAGMA wal_checkpoint(PASSIVE)").fetchone()
+            done["wal_checkpoint"] = done.get("wal_checkpoint", 0) + 1
+            if not busy and log >= 0 and log == ckpt:
+                # Allt är flyttat till databasen: TRUNCATE tar bara bort WAL-filens storlek
+                self._step(conn, "PRAGMA wal_checkpoint(TRUNCATE)", done, "wal_truncate", keep_going)
+
+    # --- schemaläggning ---
+    def run_once(self, force: bool = False) -> Dict[str, Dict[str, Any]]:
+        """Maintain every configured database that exists; stops early when traffic resumes"""
+        results = {}
+        for name, path in self.databases.items():
+            if not os.path.exists(path):
+                continue
+            if not force and not self._is_idle():
+                break
+            results[name] = self.maintain(name, path, force=force)
+        self.runs += 1
+        return results
+
+    async def run(self) -> None:
+        logger.info(f"Database maintenance scheduler started for {sorted(self.databases)}")
+        next_run = time.monotonic() + self.quiet_s
+        while not self._stopping.is_set():
+            await self._sleep(self.poll_s)
+            if time.monotonic() < next_run or not self._is_idle():
+                continue
+            try:
+                results = await asyncio.to_thread(self.run_once)
+            except Exception as e:
+                logger.warning(f"Database maintenance failed: {e}")
+                results = {}
+            if results and all(r.get("status") == "ok" for r in results.values()):
+                next_run = time.monotonic() + self.interval_s
+            # Avbruten körning: försök igen vid nästa lediga period
+
+    async def _sleep(self, seconds: float) -> None:
+        try:
+            await asyncio.wait_for(self._stopping.wait(), timeout=seconds)
+        except asyncio.TimeoutError:
+            pass
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._stopping = asyncio.Event()
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self) -> None:
+        self._stopping.set()
+        if self._task is not None:
+            try:
+                await asyncio.wait_for(self._task, timeout=10.0)
+            except asyncio.TimeoutError:
+                self._task.cancel()
+            self._task = None
+
+    def stats(self) -> Dict[str, Any]:
+        steps = sorted(self._step_ms)
+        return {
+            "running": self._task is not None and not self._task.done(),
+            "databases": sorted(self.databases),
+            "interval_s": self.interval_s,
+            "idle": self._is_idle(),
+            "activity": self.activity.stats(),
+            "runs": self.runs,
+            "interrupted": self.interrupted,
+            "skipped_locked": self.skipped_locked,
+            "step_ms_max": round(steps[-1], 2) if steps else 0.0,
+            "last_run": self.last_run,
+        }
@@ -0,0 +1,220 @@
+"""
+Läsrepliker (snapshots) av SQLite-filer för analysvägar.
+
+Tunga läsare - träningsexporten, KPI-beräkningen i proactive_shadow,
+mönsteranalysen och B1/B2-räkningarna - ska inte skanna samma fil som
+chattvägen skriver till. ``SnapshotReplica`` kopierar källan med SQLites
+backup-API till en temporär fil och byter sedan atomärt in den
+(``os.replace``). WAL-källor kopieras i ett svep (en läs-transaktion blockerar
+inte skrivare i WAL); källor med rollback-journal kopieras i små steg så att
+delade lås bara hålls kort. Repliken får ``journal_mode=DELETE`` och öppnas
+``mode=ro&immutable=1``: filen ändras aldrig på plats, så läsare behöver inga
+lås alls och redan öppna uppkopplingar fortsätter läsa den gamla kopian.
+
+``replicas`` är ett processgemensamt register. ``replicas.connect(path)``
+ger en uppkoppling mot repliken om ``path`` är registrerad och annars mot
+källan, så moduler som inte känner till repliker beter sig som förut.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional, Union
+
+logger = logging.getLogger("alice.db_snapshot")
+
+PathLike = Union[str, Path]
+
+
+def _key(path: PathLike) -> str:
+    return os.path.abspath(str(path))
+
+
+class SnapshotReplica:
+    """Read-only copy of one SQLite file, refreshed with the backup API"""
+
+    def __init__(
+        self,
+        source: PathLike,
+        path: Optional[PathLike] = None,
+        max_age_s: float = 300.0,
+        pages_per_step: int = 256,
+        step_sleep_s: float = 0.005,
+        busy_timeout_s: float = 5.0,
+    ) -> None:
+        self.source = _key(source)
+        self.path = _key(path) if path else self.source + ".replica"
+        self.max_age_s = max_age_s
+        self.pages_per_step = max(1, pages_per_step)
+        self.step_sleep_s = step_sleep_s
+        self.busy_timeout_s = busy_timeout_s
+        self._lock = threading.Lock()
+        self.refreshed_at: Optional[float] = None
+        self.refreshes = 0
+        self.errors = 0
+        self.last_error: Optional[str] = None
+        self.last_duration_ms = 0.0
+
+    def age_s(self) -> Optional[float]:
+        return None if self.refreshed_at is None else time.time() - self.refreshed_at
+
+    def is_fresh(self) -> bool:
+        age = self.age_s()
+        return age is not None and age <= self.max_age_s and os.path.exists(self.path)
+
+    def refresh(self) -> None:
+        """Copy the source into a temp file and swap it in atomically"""
+        with self._lock:
+            t0 = time.perf_counter()
+            tmp = self.path + ".tmp"
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            src = sqlite3.connect(self.source, timeout=self.busy_timeout_s)
+            dst = sqlite3.connect(tmp)
+            try:
+                wal = src.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+                pages = -1 if wal else self.pages_per_step
+                src.backup(dst, pages=pages, sleep=self.step_sleep_s)
+                # Utan WAL kan repliken öppnas read-only utan -shm-fil
+                dst.execute("PRAGMA journal_mode=DELETE")
+                dst.close()
+                os.replace(tmp, self.path)
+            except Exception as e:
+                dst.close()
+                if os.path.exists(tmp):
+                    os.remove(tmp)
+                self.errors += 1
+                self.last_error = str(e)
+                raise
+            finally:
+                src.close()
+            self.refreshed_at = time.time()
+            self.refreshes += 1
+            self.last_duration_ms = (time.perf_counter() - t0) * 1000
+
+    def ensure_fresh(self, newer_than: Optional[float] = None) -> str:
+        """Refresh if older than ``max_age_s`` or taken before ``newer_than`` (epoch); returns the replica path"""
+        stale = newer_than is not None and (self.refreshed_at is None or self.refreshed_at <= newer_than)
+        if stale or not self.is_fresh():
+            self.refresh()
+        return self.path
+
+    def connect(self) -> sqlite3.Connection:
+        """Lock-free read-only connection to a fresh-enough replica"""
+        path = self.ensure_fresh()
+        return sqlite3.connect(f"{Path(path).as_uri()}?mode=ro&immutable=1", uri=True, check_same_thread=False)
+
+    def stats(self) -> Dict[str, Any]:
+        age = self.age_s()
+        return {
+            "source": self.source,
+            "replica": self.path,
+            "age_s": None if age is None else round(age, 1),
+            "max_age_s": self.max_age_s,
+            "bytes": os.path.getsize(self.path) if os.path.exists(self.path) else 0,
+            "refreshes": self.refreshes,
+            "last_refresh_ms": round(self.last_duration_ms, 1),
+            "errors": self.errors,
+            "last_error": self.last_error,
+        }
+
+
+class ReplicaRegistry:
+    """Replicas keyed by source path, plus a scheduled refresher"""
+
+    def __init__(self) -> None:
+        self._replicas: Dict[str, SnapshotReplica] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = asyncio.Event()
+        self.interval_s = 60.0
+
+    def register(self, source: PathLike, replica_dir: Optional[PathLike] = None, **kwargs: Any) -> SnapshotReplica:
+        source = _key(source)
+        path = os.path.join(str(replica_dir), os.path.basename(source)) if replica_dir else None
+        replica = SnapshotReplica(source, path=path, **kwargs)
+        self._replicas[source] = replica
+        return replica
+
+    def unregister(self, source: PathLike) -> None:
+        self._replicas.pop(_key(source), None)
+
+    def get(self, source: PathLike) -> Optional[SnapshotReplica]:
+        return self._replicas.get(_key(source))
+
+    def connect(self, source: PathLike) -> sqlite3.Connection:
+        """Replica connection when ``source`` is registered, else a normal connection to it"""
+        replica = self.get(source)
+        if replica is not None and os.path.exists(replica.source):
+            try:
+                return replica.connect()
+            except Exception as e:
+                logger.warning(f"Replica of {replica.source} unavailable, reading source: {e}")
+        return sqlite3.connect(str(source))
+
+    def fresh_path(self, source: PathLike, newer_than: Optional[float] = None) -> str:
+        """Path to read ``source`` from: a fresh replica if registered, else the source itself.
+
+        ``newer_than`` forces a refresh when the replica was taken before a
+        known write to the source (e.g. a flush that must be visible).
+        """
+        replica = self.get(source)
+        if replica is not None and os.path.exists(replica.source):
+            try:
+                return replica.ensure_fresh(newer_than)
+            except Exception as e:
+                logger.warning(f"Replica of {replica.source} unavailable, reading source: {e}")
+        return str(source)
+
+    def refresh_all(self) -> int:
+        """Refresh every replica whose source exists; returns how many were refreshed"""
+        done = 0
+        for replica in list(self._replicas.values()):
+            if not os.path.exists(replica.source):
+                continue
+            try:
+                replica.refresh()
+                done += 1
+            except Exception as e:
+                logger.warning(f"Snapshot of {replica.source} failed: {e}")
+        return done
+
+    async def run(self) -> None:
+        while not self._stopping.is_set():
+            await asyncio.to_thread(self.refresh_all)
+            try:
+                await asyncio.wait_for(self._stopping.wait(), timeout=self.interval_s)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self, interval_s: Optional[float] = None) -> None:
+        if interval_s is not None:
+            self.interval_s = interval_s
+        if self._task is None or self._task.done():
+            self._stopping = asyncio.Event()
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self) -> None:
+        self._stopping.set()
+        if self._task is not None:
+            try:
+                await asyncio.wait_for(self._task, timeout=10.0)
+            except asyncio.TimeoutError:
+                self._task.cancel()
+            self._task = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "running": self._task is not None and not self._task.done(),
+            "interval_s": self.interval_s,
+            "replicas": {os.path.basename(k): r.stats() for k, r in self._replicas.items()},
+        }
+
+
+replicas = ReplicaRegistry()
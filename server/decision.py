@@ -18,10 +18,16 @@ class EpsilonGreedyBandit:
         if random.random() < self.epsilon:
             return random.choice(candidates)
         # Exploit: pick highest success rate from tool_stats
+        # (in-memory counters when attached: one dict snapshot, no SQLite)
+        counters = self.memory.tool_counters
+        if counters is not None:
+            stats = counters.get_many(candidates)
+        else:
+            stats = {tool: self.memory.get_tool_stats(tool) for tool in candidates}
         best_tool: Optional[str] = None
         best_rate: float = -1.0
         for tool in candidates:
-            s, f = self.memory.get_tool_stats(tool)
+            s, f = stats[tool]
             total = s + f
             rate = (s / total) if total > 0 else 0.0
             if rate > best_rate:
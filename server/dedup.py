@@ -0,0 +1,77 @@
+"""
+Dubblettdetektering vid inläsning av minnen.
+
+Två nivåer:
+- exakt: SHA-256 av normaliserad text (gemener, hopslagna blanksteg)
+- nära: MinHash-signatur (64 x 16 bitar) över ord-trigram, med 8 LSH-band
+  som nycklar i SQLite. Kandidater från banden verifieras mot signaturens
+  uppskattade Jaccard-likhet innan de räknas som dubbletter.
+
+Korta texter (färre än ``min_words`` ord) dedupliceras bara exakt: ett
+par ord skiljer t.ex. "ja, boka det" från "nej, boka inte det".
+"""
+
+from __future__ import annotations
+
+import hashlib
+import re
+import zlib
+from typing import List, Optional
+
+import numpy as np
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+# Mersenne-primtal 2^31-1: a*h ryms i uint64 när h är 32 bitar
+_PRIME = np.uint64((1 << 31) - 1)
+
+
+def normalize_text(text: str) -> str:
+    return " ".join((text or "").lower().split())
+
+
+def content_hash(text: str) -> bytes:
+    """SHA-256 digest of the normalized text (exact-duplicate key)"""
+    return hashlib.sha256(normalize_text(text).encode("utf-8")).digest()
+
+
+class MinHasher:
+    """MinHash signatures over word trigrams, banded for LSH lookups"""
+
+    def __init__(self, num_perm: int = 64, bands: int = 8, shingle: int = 3, min_words: int = 8, seed: int = 1) -> None:
+        if num_perm % bands:
+            raise ValueError(f"num_perm ({num_perm}) must be divisible by bands ({bands})")
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle = shingle
+        self.min_words = min_words
+        # Fast seed: signaturer sparas i databasen och måste vara stabila mellan körningar
+        rnd = np.random.RandomState(seed)
+        self._a = rnd.randint(1, int(_PRIME), size=(num_perm, 1)).astype(np.uint64)
+        self._b = rnd.randint(0, int(_PRIME), size=(num_perm, 1)).astype(np.uint64)
+
+    def signature(self, text: str) -> Optional[np.ndarray]:
+        """uint16 signature, or None when the text is too short for near-dup matching"""
+        words = _WORD_RE.findall((text or "").lower())
+        if len(words) < self.min_words:
+            return None
+        k = self.shingle
+        shingles = {" ".join(words[i:i + k]) for i in range(len(words) - k + 1)}
+        hashes = np.fromiter((zlib.crc32(s.encode("utf-8")) for s in shingles), dtype=np.uint64, count=len(shingles))
+        # Låga 16 bitar räcker (1/65536 falsk träff per position) och halverar lagringen
+        return (((self._a * hashes + self._b) % _PRIME).min(axis=1) & np.uint64(0xFFFF)).astype(np.uint16)
+
+    def band_keys(self, sig: np.ndarray) -> List[int]:
+        """One signed 64-bit bucket key per band (band index is part of the key)"""
+        keys = []
+        for band in range(self.bands):
+            chunk = sig[band * self.rows:(band + 1) * self.rows].tobytes()
+            digest = hashlib.blake2b(chunk, digest_size=8, person=band.to_bytes(2, "little")).digest()
+            keys.append(int.from_bytes(digest, "little", signed=True))
+        return keys
+
+    @staticmethod
+    def similarity(a: np.ndarray, b: np.ndarray) -> float:
+        """Estimated Jaccard similarity of two signatures"""
+        return float(np.count_nonzero(a == b)) / len(a)
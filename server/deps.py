@@ -14,6 +14,8 @@ import httpx
 from dotenv import load_dotenv
 from sqlalchemy.orm import Session
 
+from http_pool import http_clients
+
 # Load environment variables
 load_dotenv()
 
@@ -161,22 +163,18 @@ class OpenAIClient:
     
     def __init__(self, settings: Optional[OpenAISettings] = None):
         self.settings = settings or OpenAISettings()
-        self._client: Optional[httpx.AsyncClient] = None
     
-    async def get_client(self) -> httpx.AsyncClient:
-        """Hämta eller skapa async HTTP-klient"""
-        if self._client is None or self._client.is_closed:
-            self._client = httpx.AsyncClient(
-                base_url=self.settings.base_url,
-                headers=self.settings.headers,
-                timeout=httpx.Timeout(self.settings.timeout_seconds)
-            )
-        return self._client
+    async def get_client(self):
+        """Den delade OpenAI-klienten (http_pool) med inställningarnas bas-URL, headers och timeout"""
+        return http_clients.bind(
+            "openai",
+            timeout=httpx.Timeout(self.settings.timeout_seconds),
+            base_url=self.settings.base_url,
+            headers=self.settings.headers,
+        )
     
     async def close(self):
-        """Stäng HTTP-klient"""
-        if self._client and not self._client.is_closed:
-            await self._client.aclose()
+        """Inget att stänga: den delade klienten stängs av http_clients.aclose()"""
     
     async def __aenter__(self):
         return await self.get_client()
@@ -268,7 +266,7 @@ def set_global_openai_settings(settings: OpenAISettings):
 
 
 # Convenience function för snabb klientaccess
-async def get_openai_client() -> httpx.AsyncClient:
+async def get_openai_client():
     """Skapa en OpenAI HTTP-klient med globala inställningar"""
     settings = get_global_openai_settings()
     client = OpenAIClient(settings)
@@ -0,0 +1,168 @@
+"""
+Bakgrundsjobb som fyller i saknade embeddings.
+
+Hittar textminnen utan embedding för aktiv modell (t.ex. de som ``respond()``
+skriver), embeddar dem i batcher med begränsad takt och sparar en cursor per
+modell i ``embedding_backfill`` så att en omstart fortsätter där den slutade.
+Byts ``OPENAI_EMBED_MODEL`` får den nya modellen en egen cursor från 0, och
+rader med annan modell räknas som saknade - allt embeddas om i bakgrunden.
+
+Misslyckas en batch provas raderna en och en. En rad som fortsätter att
+misslyckas medan tjänsten svarar (t.ex. en text som API:t avvisar) räknas
+som trasig efter ``max_attempts`` försök; den hoppas över och cursorn går
+vidare. Misslyckas allt (API:t nere) räknas inga försök och cursorn står kvar.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from embedding_pipeline import EmbeddingPipeline
+
+logger = logging.getLogger("alice.embeddings")
+
+
+class EmbeddingBackfill:
+    """Rate-limited, resumable embedding backfill over an ``AsyncMemoryStore``"""
+
+    def __init__(
+        self,
+        store: Any,
+        pipeline: EmbeddingPipeline,
+        batch_size: int = 64,
+        rate_per_s: float = 20.0,
+        idle_s: float = 30.0,
+        error_backoff_s: float = 60.0,
+        max_attempts: int = 3,
+    ) -> None:
+        self.store = store
+        self.pipeline = pipeline
+        self.batch_size = max(1, batch_size)
+        self.rate_per_s = rate_per_s
+        self.idle_s = idle_s
+        self.error_backoff_s = error_backoff_s
+        self.max_attempts = max(1, max_attempts)
+        self._attempts: Dict[int, int] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = asyncio.Event()
+        self.embedded = 0
+        self.failed = 0
+        self.skipped = 0
+        self.batches = 0
+        self.last_id = 0
+        self.caught_up = False
+
+    @property
+    def model(self) -> str:
+        return self.pipeline.model
+
+    async def run_once(self) -> int:
+        """Embed one batch after the checkpoint; returns rows handled (0 = caught up)"""
+        checkpoint = await self.store.get_backfill_checkpoint(self.model)
+        rows = await self.store.get_memories_missing_embeddings(
+            self.model, after_id=checkpoint["last_id"], limit=self.batch_size
+        )
+        if not rows:
+            self.last_id = checkpoint["last_id"]
+            self.caught_up = True
+            return 0
+        self.caught_up = False
+        vectors, service_up = await self._embed_rows(rows)
+
+        done = [(mem_id, vec) for (mem_id, _), vec in zip(rows, vectors) if vec is not None]
+        failed = [mem_id for (mem_id, text), vec in zip(rows, vectors) if vec is None and text.strip()]
+        # Försök räknas bara när tjänsten svarar; ett avbrott bränner inga försök
+        if failed and service_up:
+            for mem_id in failed:
+                self._attempts[mem_id] = self._attempts.get(mem_id, 0) + 1
+        given_up = [m for m in failed if self._attempts.get(m, 0) >= self.max_attempts]
+        retrying = [m for m in failed if m not in given_up]
+        # Cursorn flyttas bara förbi den första raden som ska försökas igen; tomma och trasiga räknas som klara
+        last_id = rows[-1][0] if not retrying else retrying[0] - 1
+        if done:
+            await self.store.upsert_embeddings(self.model, [m for m, _ in done], np.stack([v for _, v in done]))
+        await self.store.set_backfill_checkpoint(self.model, max(last_id, checkpoint["last_id"]), len(done))
+
+        self.batches += 1
+        self.embedded += len(done)
+        self.last_id = max(last_id, checkpoint["last_id"])
+        if given_up:
+            self.skipped += len(given_up)
+            for mem_id in given_up:
+                self._attempts.pop(mem_id, None)
+            logger.warning(f"Skipping memories {given_up} after {self.max_attempts} failed embedding attempts")
+        if retrying:
+            self.failed += len(retrying)
+            raise RuntimeError(f"{len(retrying)} of {len(rows)} embeddings failed, backing off")
+        return len(rows)
+
+    async def _embed_rows(self, rows: List[Tuple[int, str]]) -> Tuple[List[Optional[np.ndarray]], bool]:
+        """Vectors for ``rows`` and whether the embedding service answered at all"""
+        vectors = await self.pipeline.embed([text for _, text in rows])
+        retry = [i for i, ((_, text), vec) in enumerate(zip(rows, vectors)) if vec is None and text.strip()]
+        if not retry:
+            return vectors, True
+        # Kom inga vektorer alls skiljer en trivial text en avvisad rad från ett avbrott
+        service_up = any(v is not None for v in vectors) or (await self.pipeline.embed(["ok"]))[0] is not None
+        if service_up and len(rows) > 1:
+            # En text som API:t avvisar fäller hela batchen: prova raderna en och en
+            for i in retry:
+                vectors[i] = (await self.pipeline.embed([rows[i][1]]))[0]
+        return vectors, service_up
+
+    async def run(self) -> None:
+        logger.info(f"Embedding backfill started for model {self.model}")
+        while not self._stopping.is_set():
+            t0 = time.monotonic()
+            try:
+                handled = await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Embedding backfill batch failed: {e}")
+                await self._sleep(self.error_backoff_s)
+                continue
+            if handled == 0:
+                await self._sleep(self.idle_s)
+            elif self.rate_per_s > 0:
+                await self._sleep(handled / self.rate_per_s - (time.monotonic() - t0))
+
+    async def _sleep(self, seconds: float) -> None:
+        if seconds <= 0:
+            return
+        try:
+            await asyncio.wait_for(self._stopping.wait(), timeout=seconds)
+        except asyncio.TimeoutError:
+            pass
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._stopping = asyncio.Event()
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self) -> None:
+        self._stopping.set()
+        if self._task is not None:
+            try:
+                await asyncio.wait_for(self._task, timeout=10.0)
+            except asyncio.TimeoutError:
+                self._task.cancel()
+            self._task = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "running": self._task is not None and not self._task.done(),
+            "model": self.model,
+            "last_id": self.last_id,
+            "caught_up": self.caught_up,
+            "embedded": self.embedded,
+            "failed": self.failed,
+            "skipped": self.skipped,
+            "batches": self.batches,
+            "rate_per_s": self.rate_per_s,
+        }
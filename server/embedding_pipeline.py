@@ -0,0 +1,162 @@
+"""
+Batchad embedding-pipeline för dokumentuppladdningar.
+
+Chunk-texter skickas som multi-input-anrop (``input: [...]``) mot ett
+OpenAI-kompatibelt /embeddings-API, ett begränsat antal batcher körs
+samtidigt och vektorerna skrivs med en enda ``executemany``.
+``OPENAI_EMBED_BASE_URL`` kan peka på en lokal ersättningsserver.
+Anropen går över den delade ``openai``-klienten i ``http_pool``.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from http_pool import http_clients
+
+logger = logging.getLogger("alice.embeddings")
+
+DEFAULT_BASE_URL = "https://api.openai.com/v1"
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+class EmbeddingPipeline:
+    """Multi-input embedding requests with bounded concurrency"""
+
+    def __init__(
+        self,
+        api_key: Optional[str],
+        model: str = "text-embedding-3-small",
+        base_url: str = DEFAULT_BASE_URL,
+        batch_size: int = 128,
+        max_batch_chars: int = 200_000,
+        concurrency: int = 4,
+        timeout: float = 30.0,
+        retries: int = 2,
+    ) -> None:
+        self.api_key = api_key
+        self.model = model
+        self.base_url = base_url.rstrip("/")
+        self.batch_size = max(1, batch_size)
+        self.max_batch_chars = max(1, max_batch_chars)
+        self.concurrency = max(1, concurrency)
+        self.timeout = timeout
+        self.retries = max(0, retries)
+        self.requests = 0
+        self.inputs = 0
+        self.failed_batches = 0
+
+    @classmethod
+    def from_env(cls) -> "EmbeddingPipeline":
+        return cls(
+            api_key=os.getenv("OPENAI_API_KEY"),
+            model=os.getenv("OPENAI_EMBED_MODEL", "text-embedding-3-small"),
+            base_url=os.getenv("OPENAI_EMBED_BASE_URL", DEFAULT_BASE_URL),
+            batch_size=int(os.getenv("EMBED_BATCH_SIZE", "128")),
+            concurrency=int(os.getenv("EMBED_CONCURRENCY", "4")),
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.api_key)
+
+    def _batches(self, texts: Sequence[str]) -> List[List[int]]:
+        """Group indices of non-empty texts by count and total characters"""
+        batches: List[List[int]] = []
+        current: List[int] = []
+        chars = 0
+        for i, text in enumerate(texts):
+            if not (text or "").strip():
+                continue
+            if current and (len(current) >= self.batch_size or chars + len(text) > self.max_batch_chars):
+                batches.append(current)
+                current, chars = [], 0
+            current.append(i)
+            chars += len(text)
+        if current:
+            batches.append(current)
+        return batches
+
+    async def _post(self, inputs: List[str]) -> np.ndarray:
+        client = http_clients.client("openai")
+        for attempt in range(self.retries + 1):
+            r = await client.post(
+                f"{self.base_url}/embeddings",
+                headers={"Authorization": f"Bearer {self.api_key}"},
+                json={"input": inputs, "model": self.model},
+                timeout=self.timeout,
+            )
+            self.requests += 1
+            if r.status_code in RETRY_STATUS and attempt < self.retries:
+                await asyncio.sleep(0.5 * 2 ** attempt)
+                continue
+            r.raise_for_status()
+            # Svaret är inte garanterat i ordning; sortera på "index"
+            data = sorted((r.json() or {}).get("data") or [], key=lambda d: d.get("index", 0))
+            if len(data) != len(inputs):
+                raise ValueError(f"expected {len(inputs)} embeddings, got {len(data)}")
+            self.inputs += len(inputs)
+            return np.asarray([d["embedding"] for d in data], dtype=np.float32)
+        raise RuntimeError("unreachable")
+
+    async def embed(self, texts: Sequence[str]) -> List[Optional[np.ndarray]]:
+        """Embed texts in order; empty texts and failed batches yield None"""
+        out: List[Optional[np.ndarray]] = [None] * len(texts)
+        if not self.enabled:
+            return out
+        sem = asyncio.Semaphore(self.concurrency)
+
+        async def run(batch: List[int]) -> None:
+            async with sem:
+                try:
+                    mat = await self._post([texts[i] for i in batch])
+                except Exception as e:
+                    self.failed_batches += 1
+                    logger.warning(f"Embedding batch of {len(batch)} failed: {e}")
+                    return
+            for i, row in zip(batch, mat):
+                out[i] = row
+
+        await asyncio.gather(*(run(b) for b in self._batches(texts)))
+        return out
+
+    async def embed_and_store(self, store: Any, mem_ids: Sequence[int], texts: Optional[Sequence[str]] = None) -> int:
+        """Embed memories and persist them with one ``upsert_embeddings`` call.
+
+        ``store`` is an ``AsyncMemoryStore``. Texts are fetched in one query
+        when not given. Returns the number of vectors written.
+        """
+        if not self.enabled or not mem_ids:
+            return 0
+        if texts is None:
+            id_to_text = await store.get_texts_for_mem_ids(list(mem_ids))
+            texts = [id_to_text.get(m, "") for m in mem_ids]
+        t0 = time.perf_counter()
+        vectors = await self.embed(texts)
+        ids = [m for m, v in zip(mem_ids, vectors) if v is not None]
+        if not ids:
+            return 0
+        mat = np.stack([v for v in vectors if v is not None])
+        written = await store.upsert_embeddings(self.model, ids, mat)
+        logger.info(f"Embedded {written}/{len(mem_ids)} chunks in {(time.perf_counter() - t0) * 1000:.0f} ms")
+        return written
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "model": self.model,
+            "batch_size": self.batch_size,
+            "concurrency": self.concurrency,
+            "requests": self.requests,
+            "inputs": self.inputs,
+            "failed_batches": self.failed_batches,
+        }
+
+    async def aclose(self) -> None:
+        """Nothing of our own to close: the shared client is closed by ``http_clients.aclose()``"""
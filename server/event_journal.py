@@ -0,0 +1,157 @@
+"""
+Write-behind-journal för MemoryStore.append_event.
+
+``append`` lägger händelsen i en begränsad ringbuffert och returnerar direkt
+(ingen SQLite på anroparens tråd). En bakgrundstråd tömmer bufferten var
+``flush_interval_s`` sekund, eller så fort ``batch_size`` händelser väntar,
+och skriver dem som en gruppcommit (en ``executemany`` per transaktion).
+
+Durability styr PRAGMA synchronous för journalens commits:
+``off`` (snabbast, kan tappa data vid OS-krasch), ``normal`` (WAL-standard,
+tål processkrasch) och ``full`` (fsync per gruppcommit). Händelser som ännu
+bara finns i bufferten går förlorade vid en hård krasch oavsett nivå; vid
+normal avstängning töms bufferten av ``close()``. Blir bufferten full
+skrivs de äldsta händelserna över och räknas som ``dropped``.
+"""
+
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger("alice.memory")
+
+DURABILITY_LEVELS = {"off": "OFF", "normal": "NORMAL", "full": "FULL"}
+
+EventRow = Tuple[str, str, Optional[str]]
+
+
+def _percentile(values: List[float], p: float) -> float:
+    if not values:
+        return 0.0
+    arr = sorted(values)
+    k = max(0, min(len(arr) - 1, int(round((p / 100.0) * (len(arr) - 1)))))
+    return float(arr[k])
+
+
+class EventJournal:
+    """Ring buffer of events, group-committed to ``events`` by a background thread"""
+
+    def __init__(
+        self,
+        store: Any,
+        max_queue: int = 100_000,
+        batch_size: int = 4096,
+        flush_interval_s: float = 0.05,
+        durability: str = "normal",
+    ) -> None:
+        durability = (durability or "normal").lower()
+        if durability not in DURABILITY_LEVELS:
+            raise ValueError(f"durability must be one of {sorted(DURABILITY_LEVELS)}, got {durability!r}")
+        self.store = store
+        self.max_queue = max(1, max_queue)
+        self.batch_size = max(1, batch_size)
+        self.flush_interval_s = flush_interval_s
+        self.durability = durability
+        self._buffer: "deque[EventRow]" = deque(maxlen=self.max_queue)
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._flush_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self.appended = 0
+        self.written = 0
+        self.batches = 0
+        self.errors = 0
+        self._flush_ms: List[float] = []
+
+    def start(self) -> "EventJournal":
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="event-journal", daemon=True)
+            self._thread.start()
+        return self
+
+    def append(self, topic: str, payload: Optional[str]) -> None:
+        """Enqueue one event; O(1), never touches SQLite"""
+        self._buffer.append((datetime.utcnow().isoformat() + "Z", topic, payload))
+        self.appended += 1
+        if len(self._buffer) >= self.batch_size:
+            self._wake.set()
+
+    def _take_batch(self) -> List[EventRow]:
+        batch: List[EventRow] = []
+        popleft = self._buffer.popleft
+        try:
+            for _ in range(self.batch_size):
+                batch.append(popleft())
+        except IndexError:
+            pass
+        return batch
+
+    def flush(self) -> int:
+        """Write everything queued so far; returns the number of events written"""
+        written = 0
+        with self._flush_lock:
+            while self._buffer:
+                batch = self._take_batch()
+                if not batch:
+                    break
+                t0 = time.perf_counter()
+                try:
+                    self.store.write_events(batch, synchronous=DURABILITY_LEVELS[self.durability])
+                except Exception:
+                    # Tillbaka först i kön (i ordning) och försök igen vid nästa flush
+                    self._buffer.extendleft(reversed(batch))
+                    self.errors += 1
+                    raise
+                self._flush_ms.append((time.perf_counter() - t0) * 1000)
+                if len(self._flush_ms) > 500:
+                    del self._flush_ms[:-500]
+                self.batches += 1
+                self.written += len(batch)
+                written += len(batch)
+        return written
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self._wake.wait(self.flush_interval_s)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                logger.warning(f"Event journal flush failed: {e}")
+                self._stop.wait(max(self.flush_interval_s, 1.0))
+
+    def close(self, timeout: float = 10.0) -> int:
+        """Stop the flusher and drain the buffer (call from on_shutdown)"""
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        return self.flush()
+
+    def stats(self) -> Dict[str, Any]:
+        queued = len(self._buffer)
+        return {
+            "running": self._thread is not None and self._thread.is_alive(),
+            "durability": self.durability,
+            "flush_interval_s": self.flush_interval_s,
+            "batch_size": self.batch_size,
+            "max_queue": self.max_queue,
+            "queued": queued,
+            "appended": self.appended,
+            "written": self.written,
+            "dropped": max(0, self.appended - self.written - queued),
+            "batches": self.batches,
+            "errors": self.errors,
+            "flush_ms": {
+                "p50": _percentile(self._flush_ms, 50),
+                "p95": _percentile(self._flush_ms, 95),
+                "p99": _percentile(self._flush_ms, 99),
+            },
+        }
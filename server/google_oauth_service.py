@@ -17,6 +17,7 @@ from urllib.parse import urlencode
 import json
 
 from database import Base
+from http_pool import http_clients
 from auth_models import User, AuditEventType
 
 logger = logging.getLogger("alice.google_oauth")
@@ -233,7 +234,7 @@ class GoogleOAuthService:
         }
         
         try:
-            async with httpx.AsyncClient(timeout=30.0) as client:
+            async with http_clients.session("google", timeout=30.0) as client:
                 response = await client.post(
                     self.token_url,
                     data=token_data,
@@ -350,7 +351,7 @@ class GoogleOAuthService:
         }
         
         try:
-            async with httpx.AsyncClient(timeout=30.0) as client:
+            async with http_clients.session("google", timeout=30.0) as client:
                 response = await client.post(
                     self.token_url,
                     data=refresh_data,
@@ -424,7 +425,7 @@ class GoogleOAuthService:
         # Revoke with Google
         success = False
         try:
-            async with httpx.AsyncClient(timeout=30.0) as client:
+            async with http_clients.session("google", timeout=30.0) as client:
                 # Try to revoke access token
                 response = await client.post(
                     self.revoke_url,
@@ -547,7 +548,7 @@ class GoogleOAuthService:
             return {"valid": False, "error": "No valid token available"}
         
         try:
-            async with httpx.AsyncClient(timeout=10.0) as client:
+            async with http_clients.session("google", timeout=10.0) as client:
                 response = await client.get(
                     self.token_info_url,
                     params={"access_token": access_token}
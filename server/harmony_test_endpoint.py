@@ -3,9 +3,10 @@ from __future__ import annotations
 import time
 from typing import Any, Dict, List, Optional
 
-import httpx
 from pydantic import BaseModel, Field
 
+from http_pool import http_clients
+
 
 class HarmonyTestCase(BaseModel):
     id: str
@@ -50,7 +51,7 @@ async def run_harmony_test_case(case: HarmonyTestCase, _cfg: HarmonyTestBatchReq
     t0 = time.perf_counter()
     # E2E: anropa den egna serverns /api/chat för att få verkligt beteende
     try:
-        async with httpx.AsyncClient(timeout=20.0) as client:
+        async with http_clients.session("local", timeout=20.0) as client:
             r = await client.post(
                 "http://127.0.0.1:8000/api/chat",
                 json={"prompt": case.utterance, "provider": "auto"},
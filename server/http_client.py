@@ -14,6 +14,8 @@ from enum import Enum
 import httpx
 from httpx import Response, RequestError, TimeoutException, HTTPStatusError
 
+from http_pool import http_clients
+
 logger = logging.getLogger("alice.http_client")
 
 
@@ -128,29 +130,30 @@ class AliceHTTPClient:
         config = retry_config or self.retry_config
         last_exception = None
         
+        kwargs.setdefault('timeout', self.default_timeout)
+        # Samma delade pool för alla försök: en retry återanvänder varma uppkopplingar
+        client = http_clients.client(self.service_name)
+        
         for attempt in range(config.max_retries + 1):
             try:
-                timeout = kwargs.get('timeout', self.default_timeout)
-                async with httpx.AsyncClient(timeout=timeout) as client:
-                    
-                    # Make the request
-                    response = await client.request(method, url, **kwargs)
-                    
-                    # Check if we should retry on this status
-                    if response.status_code in config.retry_on_status and attempt < config.max_retries:
-                        backoff_delay = min(
-                            config.backoff_factor * (2 ** attempt),
-                            config.backoff_max
-                        )
-                        logger.warning(
-                            f"HTTP {response.status_code} for {url}, "
-                            f"retrying in {backoff_delay}s (attempt {attempt + 1}/{config.max_retries})"
-                        )
-                        await asyncio.sleep(backoff_delay)
-                        continue
-                    
-                    # Success or non-retryable status
-                    return response
+                # Make the request
+                response = await client.request(method, url, **kwargs)
+                
+                # Check if we should retry on this status
+                if response.status_code in config.retry_on_status and attempt < config.max_retries:
+                    backoff_delay = min(
+                        config.backoff_factor * (2 ** attempt),
+                        config.backoff_max
+                    )
+                    logger.warning(
+                        f"HTTP {response.status_code} for {url}, "
+                        f"retrying in {backoff_delay}s (attempt {attempt + 1}/{config.max_retries})"
+                    )
+                    await asyncio.sleep(backoff_delay)
+                    continue
+                
+                # Success or non-retryable status
+                return response
                     
             except (RequestError, TimeoutException) as e:
                 last_exception = e
@@ -0,0 +1,310 @@
+"""
+Delade, långlivade HTTP-klienter för utgående anrop.
+
+Tidigare öppnade nästan varje anrop (Ollama, OpenAI, Spotify, väder, NLU,
+loopback till egna endpoints) en ny ``httpx.AsyncClient`` och betalade
+TCP- och TLS-uppkoppling varje gång. ``HTTPClientRegistry`` håller en klient
+per tjänst med egna poolgränser och keep-alive, och HTTP/2 mot HTTPS-tjänster
+när ``h2`` finns installerat. Klienterna skapas vid start (eller vid första
+användning) och stängs i ``aclose()`` vid avstängning.
+
+``session(service, timeout=...)`` ersätter ``httpx.AsyncClient(timeout=...)``
+på anropsplatsen: den ger den delade klienten med anropets timeout som
+standard per request och stänger inget när blocket lämnas. ``bind()`` ger
+samma sak som ett långlivat handtag, med bas-URL och headers för klasser som
+tidigare byggde en egen ``AsyncClient(base_url=..., headers=...)``. Byts
+event-loopen ersätts klienten, och den gamla stängs istället för att läcka.
+
+Varje request spåras med httpcores ``trace``-extension: en request som inte
+behövde ansluta räknas som poolträff, annars mäts tiden för TCP + TLS.
+``stats()`` visar träffgrad och uppkopplingstid (p50/p95/p99) per tjänst.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import importlib.util
+import logging
+import socket
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Dict, Optional, Sequence
+
+import httpx
+
+logger = logging.getLogger("alice.http_pool")
+
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+
+def _percentile(values: Sequence[float], p: float) -> float:
+    if not values:
+        return 0.0
+    arr = sorted(values)
+    k = max(0, min(len(arr) - 1, int(round((p / 100.0) * (len(arr) - 1)))))
+    return float(arr[k])
+
+
+@dataclass
+class PoolConfig:
+    """Connection pool settings for one upstream service"""
+    max_connections: int = 20
+    max_keepalive: int = 10
+    keepalive_expiry_s: float = 60.0
+    http2: bool = False  # endast över TLS; httpx talar HTTP/1.1 mot http://
+    timeout_s: Optional[float] = 30.0
+    connect_timeout_s: float = 5.0
+
+
+DEFAULT_POOLS: Dict[str, PoolConfig] = {
+    # Lokal Ollama: få men varma uppkopplingar, långa genereringar
+    "ollama": PoolConfig(max_connections=8, max_keepalive=8, keepalive_expiry_s=300.0, timeout_s=60.0),
+    "openai": PoolConfig(max_connections=32, max_keepalive=16, keepalive_expiry_s=120.0, http2=True),
+    "spotify": PoolConfig(max_connections=16, max_keepalive=8, http2=True, timeout_s=15.0),
+    "google": PoolConfig(max_connections=16, max_keepalive=8, http2=True),
+    "oauth": PoolConfig(max_connections=8, max_keepalive=4, http2=True),
+    "weather": PoolConfig(max_connections=8, max_keepalive=4, http2=True, timeout_s=10.0),
+    # Loopback till egna endpoints och NLU-agenten
+    "local": PoolConfig(max_connections=32, max_keepalive=16, keepalive_expiry_s=300.0),
+    "default": PoolConfig(),
+}
+
+
+class PoolStats:
+    """Pool hit and connect-time counters for one service"""
+
+    def __init__(self) -> None:
+        self.requests = 0
+        self.new_connections = 0
+        self.errors = 0
+        self.connect_ms: "deque[float]" = deque(maxlen=1000)
+
+    def tracer(self):
+        """Per-request httpcore ``trace`` callback"""
+        started: Dict[str, float] = {}
+
+        async def trace(event: str, info: Dict[str, Any]) -> None:
+            if event == "connection.connect_tcp.started":
+                started["connect"] = time.perf_counter()
+            elif event.endswith(".send_request_headers.started") and "sent" not in started:
+                # Första eventet när uppkopplingen är klar (TCP + ev. TLS/ALPN)
+                started["sent"] = 1.0
+                self.requests += 1
+                if "connect" in started:
+                    self.new_connections += 1
+                    self.connect_ms.append((time.perf_counter() - started["connect"]) * 1000)
+            elif event.endswith(".failed") and event.startswith("connection."):
+                self.errors += 1
+
+        return trace
+
+    def snapshot(self) -> Dict[str, Any]:
+        reused = self.requests - self.new_connections
+        values = list(self.connect_ms)
+        return {
+            "requests": self.requests,
+            "new_connections": self.new_connections,
+            "reused": reused,
+            "hit_rate": (reused / self.requests) if self.requests else 0.0,
+            "connect_errors": self.errors,
+            "connect_ms": {
+                "count": len(values),
+                "p50": _percentile(values, 50),
+                "p95": _percentile(values, 95),
+                "p99": _percentile(values, 99),
+            },
+        }
+
+
+class _Session:
+    """Shared client with call-site defaults (timeout, base URL, headers); closes nothing.
+
+    The client is looked up in the registry on every request, so a session
+    bound at import time follows the registry when it rebuilds a client.
+    """
+
+    def __init__(
+        self,
+        registry: "HTTPClientRegistry",
+        service: str,
+        timeout: Any,
+        base_url: Optional[str] = None,
+        headers: Optional[Dict[str, str]] = None,
+    ) -> None:
+        self._registry = registry
+        self._service = service
+        self._timeout = timeout
+        self._base_url = base_url.rstrip("/") if base_url else None
+        self._headers = dict(headers or {})
+
+    @property
+    def _client(self) -> httpx.AsyncClient:
+        return self._registry.client(self._service)
+
+    def _url(self, url: Any) -> Any:
+        if self._base_url is None or "://" in str(url):
+            return url
+        return f"{self._base_url}/{str(url).lstrip('/')}"
+
+    def _kw(self, kwargs: Dict[str, Any]) -> Dict[str, Any]:
+        if self._timeout is not httpx.USE_CLIENT_DEFAULT:
+            kwargs.setdefault("timeout", self._timeout)
+        if self._headers:
+            kwargs["headers"] = {**self._headers, **(kwargs.get("headers") or {})}
+        return kwargs
+
+    async def request(self, method: str, url: Any, **kwargs: Any) -> httpx.Response:
+        return await self._client.request(method, self._url(url), **self._kw(kwargs))
+
+    async def get(self, url: Any, **kwargs: Any) -> httpx.Response:
+        return await self._client.get(self._url(url), **self._kw(kwargs))
+
+    async def post(self, url: Any, **kwargs: Any) -> httpx.Response:
+        return await self._client.post(self._url(url), **self._kw(kwargs))
+
+    async def put(self, url: Any, **kwargs: Any) -> httpx.Response:
+        return await self._client.put(self._url(url), **self._kw(kwargs))
+
+    async def patch(self, url: Any, **kwargs: Any) -> httpx.Response:
+        return await self._client.patch(self._url(url), **self._kw(kwargs))
+
+    async def delete(self, url: Any, **kwargs: Any) -> httpx.Response:
+        return await self._client.delete(self._url(url), **self._kw(kwargs))
+
+    def stream(self, method: str, url: Any, **kwargs: Any):
+        return self._client.stream(method, self._url(url), **self._kw(kwargs))
+
+
+class HTTPClientRegistry:
+    """One long-lived ``httpx.AsyncClient`` per service, created lazily or at startup"""
+
+    def __init__(self, pools: Optional[Dict[str, PoolConfig]] = None) -> None:
+        self.pools: Dict[str, PoolConfig] = dict(pools or DEFAULT_POOLS)
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+        self._loops: Dict[str, Any] = {}
+        self._stats: Dict[str, PoolStats] = {}
+        self.created = 0
+        self.stale_closed = 0
+
+    def configure(self, service: str, **overrides: Any) -> PoolConfig:
+        base = self.pools.get(service, self.pools.get("default", PoolConfig()))
+        cfg = PoolConfig(**{**base.__dict__, **overrides})
+        self.pools[service] = cfg
+        return cfg
+
+    def _build(self, service: str) -> httpx.AsyncClient:
+        cfg = self.pools.get(service) or self.pools.get("default") or PoolConfig()
+        stats = self._stats.setdefault(service, PoolStats())
+
+        async def attach_trace(request: httpx.Request) -> None:
+            request.extensions.setdefault("trace", stats.tracer())
+
+        timeout = httpx.Timeout(cfg.timeout_s, connect=cfg.connect_timeout_s)
+        client = httpx.AsyncClient(
+            timeout=timeout,
+            limits=httpx.Limits(
+                max_connections=cfg.max_connections,
+                max_keepalive_connections=cfg.max_keepalive,
+                keepalive_expiry=cfg.keepalive_expiry_s,
+            ),
+            http2=cfg.http2 and HTTP2_AVAILABLE,
+            event_hooks={"request": [attach_trace]},
+        )
+        self.created += 1
+        return client
+
+    def client(self, service: str = "default") -> httpx.AsyncClient:
+        """The shared client for ``service`` (created on first use)"""
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+        client = self._clients.get(service)
+        # Uppkopplingar hör till en event-loop; en ny loop (t.ex. asyncio.run i tester) får en ny klient
+        if client is None or client.is_closed or (loop is not None and self._loops.get(service) not in (None, loop)):
+            if client is not None and not client.is_closed:
+                self._close_stale(service, client, self._loops.get(service))
+            client = self._clients[service] = self._build(service)
+            self._loops[service] = loop
+        elif self._loops.get(service) is None:
+            self._loops[service] = loop
+        return client
+
+    def _close_stale(self, service: str, client: httpx.AsyncClient, loop: Any) -> None:
+        """Close a client replaced after a loop change; its sockets belong to the old loop"""
+        self.stale_closed += 1
+        if loop is not None and loop.is_running():
+            # Loopen lever i en annan tråd: stäng klienten där
+            loop.call_soon_threadsafe(lambda: loop.create_task(client.aclose()))
+            return
+        # Loopen är stängd (t.ex. efter asyncio.run): aclose() går inte, koppla ner sockets direkt
+        pool = getattr(client, "_transport", None)
+        pool = getattr(pool, "_pool", None)
+        for conn in list(getattr(pool, "connections", None) or []):
+            stream = getattr(getattr(conn, "_connection", None), "_network_stream", None)
+            sock = stream.get_extra_info("socket") if stream is not None else None
+            # asyncio lämnar ut en TransportSocket-wrapper; den riktiga socketen ligger under
+            raw = getattr(sock, "_sock", sock)
+            if raw is not None:
+                try:
+                    raw.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+                raw.close()
+
+    def bind(
+        self,
+        service: str = "default",
+        timeout: Any = httpx.USE_CLIENT_DEFAULT,
+        base_url: Optional[str] = None,
+        headers: Optional[Dict[str, str]] = None,
+    ) -> _Session:
+        """Long-lived handle on the shared client with call-site defaults; nothing to close"""
+        return _Session(self, service, timeout, base_url=base_url, headers=headers)
+
+    @asynccontextmanager
+    async def session(self, service: str = "default", timeout: Any = httpx.USE_CLIENT_DEFAULT) -> AsyncIterator[_Session]:
+        """Drop-in for ``async with httpx.AsyncClient(timeout=...) as client``"""
+        yield self.bind(service, timeout)
+
+    def start(self, services: Optional[Sequence[str]] = None) -> None:
+        """Create clients up front so the first request does not pay for it"""
+        for service in services or list(self.pools):
+            self.client(service)
+        if any(cfg.http2 for cfg in self.pools.values()) and not HTTP2_AVAILABLE:
+            logger.info("h2 not installed; HTTPS pools use HTTP/1.1 keep-alive")
+
+    async def aclose(self) -> None:
+        clients, self._clients = self._clients, {}
+        self._loops = {}
+        for service, client in clients.items():
+            try:
+                await client.aclose()
+            except Exception as e:
+                logger.warning(f"Closing HTTP pool {service} failed: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        services: Dict[str, Any] = {}
+        for service, st in self._stats.items():
+            cfg = self.pools.get(service) or self.pools["default"]
+            services[service] = {
+                **st.snapshot(),
+                "open": service in self._clients and not self._clients[service].is_closed,
+                "http2": cfg.http2 and HTTP2_AVAILABLE,
+                "max_connections": cfg.max_connections,
+                "max_keepalive": cfg.max_keepalive,
+            }
+        total = sum(s["requests"] for s in services.values())
+        reused = sum(s["reused"] for s in services.values())
+        return {
+            "http2_available": HTTP2_AVAILABLE,
+            "clients_created": self.created,
+            "stale_clients_closed": self.stale_closed,
+            "hit_rate": (reused / total) if total else 0.0,
+            "services": services,
+        }
+
+
+http_clients = HTTPClientRegistry()
@@ -3,8 +3,11 @@ LLM abstraction layer with health monitoring and failover.
 """
 
 from .manager import ModelManager, LLM
+from .health import PassiveHealth, CircuitState
+from .hedging import HedgePolicy, prompt_class
+from .scheduler import LLMScheduler, Priority, llm_scheduler
 from .ollama import OllamaAdapter
 from .openai import OpenAIAdapter
 from .harmony import harmonyWrap
 
-__all__ = ["ModelManager", "LLM", "OllamaAdapter", "OpenAIAdapter", "harmonyWrap"]
\ No newline at end of file
+__all__ = ["ModelManager", "LLM", "PassiveHealth", "CircuitState", "HedgePolicy", "prompt_class", "LLMScheduler", "Priority", "llm_scheduler", "OllamaAdapter", "OpenAIAdapter", "harmonyWrap"]
\ No newline at end of file
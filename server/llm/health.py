@@ -0,0 +1,194 @@
+"""
+Passive health tracking for LLM providers.
+
+Health is derived from real traffic instead of probe generations in the
+request path: every ``ModelManager.ask`` reports its TTFT, or whether it
+failed or timed out. ``PassiveHealth`` keeps an EWMA of TTFT and a sliding
+window of outcomes and drives a three-state circuit:
+
+- CLOSED: all traffic goes to the provider. The circuit opens after
+  ``consecutive_failures`` failures in a row, when the window error rate
+  reaches ``max_error_rate``, or when the TTFT EWMA goes above
+  ``max_ttft_ms``.
+- OPEN: no traffic for ``cooldown_s``, then HALF_OPEN.
+- HALF_OPEN: at most ``half_open_max`` requests at a time are let through
+  as trials. ``half_open_successes`` successes close the circuit. Any
+  failure opens it again.
+
+Active probes run only when the provider has been idle (see
+``ModelManager.run_idle_probes``), and their results go through the same
+``record_*`` calls.
+"""
+
+import time
+from collections import deque
+from enum import Enum
+from typing import Any, Deque, Dict, Optional, Tuple
+
+
+class CircuitState(Enum):
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+
+class PassiveHealth:
+    """EWMA + sliding-window health with a half-open circuit"""
+
+    def __init__(
+        self,
+        window_s: float = 60.0,
+        min_samples: int = 5,
+        max_error_rate: float = 0.5,
+        consecutive_failures: int = 3,
+        max_ttft_ms: float = 10000.0,
+        ewma_alpha: float = 0.2,
+        cooldown_s: float = 30.0,
+        half_open_max: int = 1,
+        half_open_successes: int = 2,
+    ):
+        self.window_s = window_s
+        self.min_samples = min_samples
+        self.max_error_rate = max_error_rate
+        self.consecutive_failures = consecutive_failures
+        self.max_ttft_ms = max_ttft_ms
+        self.ewma_alpha = ewma_alpha
+        self.cooldown_s = cooldown_s
+        self.half_open_max = max(1, half_open_max)
+        self.half_open_successes = max(1, half_open_successes)
+
+        self.state = CircuitState.CLOSED
+        self.opened_at = 0.0
+        self.open_reason: Optional[str] = None
+        self.ttft_ewma_ms: Optional[float] = None
+        self.failures_in_row = 0
+        self.trials_in_flight = 0
+        self.trial_successes = 0
+        self.in_flight = 0
+        self.last_activity = 0.0
+        # (monotonic ts, ok, timeout)
+        self._window: Deque[Tuple[float, bool, bool]] = deque()
+        self.totals = {"success": 0, "error": 0, "timeout": 0, "rejected": 0, "opened": 0}
+
+    # --- routing ---
+    def allow(self) -> bool:
+        """May the next request go to this provider? Reserves a trial slot in HALF_OPEN"""
+        now = time.monotonic()
+        if self.state == CircuitState.OPEN and now - self.opened_at >= self.cooldown_s:
+            self.state = CircuitState.HALF_OPEN
+            self.trials_in_flight = 0
+            self.trial_successes = 0
+        if self.state == CircuitState.CLOSED:
+            return True
+        if self.state == CircuitState.HALF_OPEN and self.trials_in_flight < self.half_open_max:
+            self.trials_in_flight += 1
+            return True
+        self.totals["rejected"] += 1
+        return False
+
+    def begin(self) -> None:
+        self.in_flight += 1
+        self.last_activity = time.monotonic()
+
+    def _end(self) -> None:
+        self.in_flight = max(0, self.in_flight - 1)
+        self.last_activity = time.monotonic()
+
+    def idle_for(self) -> float:
+        if self.in_flight:
+            return 0.0
+        return time.monotonic() - self.last_activity if self.last_activity else float("inf")
+
+    # --- outcomes ---
+    def _push(self, ok: bool, timeout: bool) -> None:
+        now = time.monotonic()
+        self._window.append((now, ok, timeout))
+        cutoff = now - self.window_s
+        while self._window and self._window[0][0] < cutoff:
+            self._window.popleft()
+
+    def record_success(self, ttft_ms: Optional[float], trial: bool = False) -> None:
+        self._end()
+        self._push(True, False)
+        self.totals["success"] += 1
+        self.failures_in_row = 0
+        if ttft_ms is not None:
+            a = self.ewma_alpha
+            self.ttft_ewma_ms = ttft_ms if self.ttft_ewma_ms is None else a * ttft_ms + (1 - a) * self.ttft_ewma_ms
+        if self.state == CircuitState.HALF_OPEN:
+            if trial:
+                self.trials_in_flight = max(0, self.trials_in_flight - 1)
+            self.trial_successes += 1
+            if self.trial_successes >= self.half_open_successes:
+                self._close()
+        elif self.state == CircuitState.CLOSED and self.max_ttft_ms and (self.ttft_ewma_ms or 0.0) > self.max_ttft_ms:
+            self._open(f"TTFT EWMA {self.ttft_ewma_ms:.0f}ms > {self.max_ttft_ms:.0f}ms")
+
+    def record_failure(self, timeout: bool = False, trial: bool = False, error: Optional[str] = None) -> None:
+        self._end()
+        self._push(False, timeout)
+        self.totals["timeout" if timeout else "error"] += 1
+        self.failures_in_row += 1
+        if self.state == CircuitState.HALF_OPEN:
+            if trial:
+                self.trials_in_flight = max(0, self.trials_in_flight - 1)
+            self._open(f"half-open trial failed: {error or ('timeout' if timeout else 'error')}")
+            return
+        if self.state != CircuitState.CLOSED:
+            return
+        if self.failures_in_row >= self.consecutive_failures:
+            self._open(f"{self.failures_in_row} failures in a row")
+            return
+        samples, errors, _ = self._window_counts()
+        if samples >= self.min_samples and errors / samples >= self.max_error_rate:
+            self._open(f"error rate {errors}/{samples} in {self.window_s:.0f}s")
+
+    def abandon(self, trial: bool = False) -> None:
+        """Request ended without an outcome (e.g. client went away before the first token)"""
+        self._end()
+        if trial and self.state == CircuitState.HALF_OPEN:
+            self.trials_in_flight = max(0, self.trials_in_flight - 1)
+
+    def _window_counts(self) -> Tuple[int, int, int]:
+        cutoff = time.monotonic() - self.window_s
+        recent = [w for w in self._window if w[0] >= cutoff]
+        return len(recent), sum(1 for w in recent if not w[1]), sum(1 for w in recent if w[2])
+
+    def _open(self, reason: str) -> None:
+        self.state = CircuitState.OPEN
+        self.opened_at = time.monotonic()
+        self.open_reason = reason
+        self.trials_in_flight = 0
+        self.trial_successes = 0
+        self.totals["opened"] += 1
+
+    def _close(self) -> None:
+        self.state = CircuitState.CLOSED
+        self.open_reason = None
+        self.failures_in_row = 0
+        self.trials_in_flight = 0
+        # Felen som öppnade kretsen ska inte öppna den igen direkt
+        self._window.clear()
+        self.ttft_ewma_ms = None
+
+    def reset(self) -> None:
+        self._close()
+
+    @property
+    def healthy(self) -> bool:
+        return self.state == CircuitState.CLOSED
+
+    def stats(self) -> Dict[str, Any]:
+        samples, errors, timeouts = self._window_counts()
+        return {
+            "state": self.state.value,
+            "open_reason": self.open_reason,
+            "ttft_ewma_ms": None if self.ttft_ewma_ms is None else round(self.ttft_ewma_ms, 1),
+            "window_s": self.window_s,
+            "window_samples": samples,
+            "error_rate": (errors / samples) if samples else 0.0,
+            "timeout_rate": (timeouts / samples) if samples else 0.0,
+            "failures_in_row": self.failures_in_row,
+            "in_flight": self.in_flight,
+            "totals": dict(self.totals),
+        }
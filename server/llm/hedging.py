@@ -0,0 +1,252 @@
+"""
+Hedged requests: preferred provider first, backup only when it is late.
+
+The old ``auto`` provider raced local and cloud on every request, which
+doubles load and cloud spend even when the local model answers in 300 ms.
+``HedgePolicy.race`` starts the primary alone and waits up to the learned
+p90 TTFT for the prompt class. Only if the primary is still silent, and the
+per-minute hedge budget allows it, is the backup launched; the first
+acceptable result (first token for streams) wins and the loser is cancelled.
+A primary that fails fast fails over to the backup without spending budget.
+
+``stats()`` reports hedge rate, wins per side, budget denials and the backup
+calls (and estimated cost) saved compared to always racing both.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, Sequence
+
+from .scheduler import SlotClock, slot_clock
+
+logger = logging.getLogger("alice.llm.hedging")
+
+PRIMARY = "primary"
+BACKUP = "backup"
+
+
+def _percentile(values: Sequence[float], p: float) -> float:
+    if not values:
+        return 0.0
+    arr = sorted(values)
+    k = max(0, min(len(arr) - 1, int(round((p / 100.0) * (len(arr) - 1)))))
+    return float(arr[k])
+
+
+def prompt_class(kind: str, text: str = "", tools: bool = False) -> str:
+    """Bucket a request so TTFT is learned per endpoint, prompt size and tool use"""
+    n = len(text or "")
+    size = "short" if n < 400 else "medium" if n < 2000 else "long"
+    return f"{kind}:{size}{':tools' if tools else ''}"
+
+
+def _acceptable(value: Any) -> bool:
+    return value is not None and not isinstance(value, BaseException)
+
+
+@dataclass
+class HedgeResult:
+    value: Any
+    winner: Optional[str] = None  # PRIMARY | BACKUP | None (båda misslyckades)
+    hedged: bool = False
+    elapsed_ms: float = 0.0
+
+
+class HedgePolicy:
+    """Learned-delay hedging with a sliding per-minute budget"""
+
+    def __init__(
+        self,
+        quantile: float = 90.0,
+        default_delay_ms: float = 1500.0,
+        min_delay_ms: float = 100.0,
+        max_delay_ms: float = 10000.0,
+        min_samples: int = 10,
+        window: int = 200,
+        budget_per_min: int = 30,
+        backup_cost: float = 0.0,
+    ):
+        self.quantile = quantile
+        self.default_delay_ms = default_delay_ms
+        self.min_delay_ms = min_delay_ms
+        self.max_delay_ms = max_delay_ms
+        self.min_samples = min_samples
+        self.window = window
+        self.budget_per_min = budget_per_min
+        self.backup_cost = backup_cost
+
+        self._ttft: Dict[str, Deque[float]] = {}
+        self._spent: Deque[float] = deque()
+        self.totals = {
+            "requests": 0,
+            "hedged": 0,
+            "budget_denied": 0,
+            "failovers": 0,
+            "failed": 0,
+            "backup_calls": 0,
+        }
+        self.wins = {PRIMARY: 0, BACKUP: 0}
+        self.hedge_wins = {PRIMARY: 0, BACKUP: 0}
+
+    @classmethod
+    def from_env(cls) -> "HedgePolicy":
+        return cls(
+            quantile=float(os.getenv("LLM_HEDGE_QUANTILE", "90")),
+            default_delay_ms=float(os.getenv("LLM_HEDGE_DEFAULT_DELAY_MS", "1500")),
+            min_delay_ms=float(os.getenv("LLM_HEDGE_MIN_DELAY_MS", "100")),
+            max_delay_ms=float(os.getenv("LLM_HEDGE_MAX_DELAY_MS", "10000")),
+            min_samples=int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "10")),
+            budget_per_min=int(os.getenv("LLM_HEDGE_BUDGET_PER_MIN", "30")),
+            # Uppskattad kostnad per backup-anrop (t.ex. USD för ett molnsvar)
+            backup_cost=float(os.getenv("LLM_HEDGE_BACKUP_COST", "0.0005")),
+        )
+
+    # --- learning ---
+    def record_ttft(self, klass: str, ms: float) -> None:
+        samples = self._ttft.get(klass)
+        if samples is None:
+            samples = self._ttft[klass] = deque(maxlen=self.window)
+        samples.append(ms)
+
+    def delay_ms(self, klass: str) -> float:
+        """How long the primary may stay silent before the backup is launched"""
+        samples = self._ttft.get(klass)
+        if not samples or len(samples) < self.min_samples:
+            return self.default_delay_ms
+        return min(self.max_delay_ms, max(self.min_delay_ms, _percentile(samples, self.quantile)))
+
+    # --- budget ---
+    def _prune(self, now: float) -> None:
+        while self._spent and self._spent[0] <= now - 60.0:
+            self._spent.popleft()
+
+    def try_spend(self) -> bool:
+        now = time.monotonic()
+        self._prune(now)
+        if len(self._spent) >= self.budget_per_min:
+            return False
+        self._spent.append(now)
+        return True
+
+    def budget_left(self) -> int:
+        self._prune(time.monotonic())
+        return max(0, self.budget_per_min - len(self._spent))
+
+    # --- racing ---
+    async def race(
+        self,
+        primary: Callable[[], Awaitable[Any]],
+        backup: Optional[Callable[[], Awaitable[Any]]],
+        klass: str = "default",
+        accept: Callable[[Any], bool] = _acceptable,
+        on_cancel: Optional[Callable[[str, asyncio.Task], None]] = None,
+        primary_ttft: Optional[Callable[[], Optional[float]]] = None,
+    ) -> HedgeResult:
+        """
+        Run ``primary`` and, if it is late or fails, ``backup``. Returns the first
+        result ``accept`` likes; a failed side's return value or exception is
+        passed through as ``value`` when neither is acceptable. ``on_cancel`` is
+        called with the losing side and its (cancelled) task.
+
+        The learned TTFT excludes scheduler queue wait: a ``SlotClock`` is
+        installed in the primary's task, and the sample is the time since it
+        was granted its ``llm_scheduler`` slot (none if it was cancelled while
+        still queued). A primary that never asks for a slot is timed from the
+        start of the race. ``primary_ttft`` overrides this: it returns the
+        primary's own latency so far, or None to record no sample.
+        """
+        self.totals["requests"] += 1
+        t0 = time.perf_counter()
+        clock = SlotClock()
+
+        async def clocked_primary() -> Any:
+            # Egen task, egen kontext: klockan syns bara för primärens slot
+            slot_clock.set(clock)
+            return await primary()
+
+        tasks: Dict[asyncio.Task, str] = {asyncio.ensure_future(clocked_primary()): PRIMARY}
+        hedged = False
+        last: Any = None
+
+        def elapsed_ms() -> float:
+            return (time.perf_counter() - t0) * 1000
+
+        def record_primary() -> None:
+            if primary_ttft is not None:
+                ms = primary_ttft()
+            elif clock.queued_at is None:
+                ms = elapsed_ms()
+            else:
+                ms = clock.elapsed_ms()
+            if ms is not None:
+                self.record_ttft(klass, ms)
+
+        def launch_backup() -> None:
+            self.totals["backup_calls"] += 1
+            tasks[asyncio.ensure_future(backup())] = BACKUP
+
+        try:
+            done, _ = await asyncio.wait(set(tasks), timeout=self.delay_ms(klass) / 1000.0)
+            if not done and backup is not None:
+                if self.try_spend():
+                    hedged = True
+                    self.totals["hedged"] += 1
+                    launch_backup()
+                else:
+                    self.totals["budget_denied"] += 1
+            while tasks:
+                done, _ = await asyncio.wait(set(tasks), return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    side = tasks.pop(task)
+                    try:
+                        value = task.result()
+                    except Exception as e:
+                        value = e
+                    if accept(value):
+                        if side == PRIMARY:
+                            record_primary()
+                        self.wins[side] += 1
+                        if hedged:
+                            self.hedge_wins[side] += 1
+                        for loser, loser_side in tasks.items():
+                            loser.cancel()
+                            if loser_side == PRIMARY:
+                                # Censurerat prov: primären var minst så här långsam
+                                record_primary()
+                            if on_cancel is not None:
+                                on_cancel(loser_side, loser)
+                        tasks.clear()
+                        return HedgeResult(value, winner=side, hedged=hedged, elapsed_ms=elapsed_ms())
+                    last = value
+                    if side == PRIMARY and backup is not None and BACKUP not in tasks.values() and not hedged:
+                        # Primären föll snabbt: failover, kostar ingen hedge-budget
+                        self.totals["failovers"] += 1
+                        launch_backup()
+        finally:
+            for task in tasks:
+                task.cancel()
+        self.totals["failed"] += 1
+        return HedgeResult(last, winner=None, hedged=hedged, elapsed_ms=elapsed_ms())
+
+    def stats(self) -> Dict[str, Any]:
+        requests = self.totals["requests"]
+        # Jämfört med att alltid köra båda: varje request utan backup-anrop sparar ett
+        saved = max(0, requests - self.totals["backup_calls"])
+        return {
+            **self.totals,
+            "hedge_rate": (self.totals["hedged"] / requests) if requests else 0.0,
+            "wins": dict(self.wins),
+            "hedge_wins": dict(self.hedge_wins),
+            "budget_per_min": self.budget_per_min,
+            "budget_left": self.budget_left(),
+            "backup_calls_saved": saved,
+            "est_cost_saved": round(saved * self.backup_cost, 6),
+            "classes": {
+                k: {"samples": len(v), "delay_ms": round(self.delay_ms(k), 1)}
+                for k, v in self._ttft.items()
+            },
+        }
@@ -1,13 +1,18 @@
 """
-ModelManager - LLM abstraction with health check and circuit breaker
+ModelManager - LLM abstraction with passive health tracking and circuit breaker
 """
 
 import os
 import time
+import asyncio
 import logging
-from typing import Any, Dict, List, Optional, Protocol
+from typing import Any, AsyncIterator, Dict, List, Optional, Protocol
 from dataclasses import dataclass
 
+from .health import CircuitState, PassiveHealth
+from .hedging import BACKUP, PRIMARY, HedgePolicy, prompt_class
+from .scheduler import LLMOverloaded, LLMPreempted
+
 logger = logging.getLogger("alice.llm")
 
 @dataclass
@@ -22,6 +27,22 @@ class LLMResponse:
     tool_calls: Optional[List[Any]] = None
     provider: str = ""
     tftt_ms: Optional[float] = None
+    total_ms: Optional[float] = None
+    tokens: Optional[int] = None
+    tokens_per_s: Optional[float] = None
+
+@dataclass
+class LLMChunk:
+    """One streamed delta; the last chunk has ``done=True`` and the totals"""
+    text: str = ""
+    provider: str = ""
+    done: bool = False
+    tftt_ms: Optional[float] = None
+    total_ms: Optional[float] = None
+    tokens: Optional[int] = None
+    tokens_per_s: Optional[float] = None
+    tool_calls: Optional[List[Any]] = None
+    failover: bool = False
 
 class LLM(Protocol):
     """LLM interface for adapters"""
@@ -31,94 +52,201 @@ class LLM(Protocol):
         """Send chat request and return response"""
         ...
     
+    def stream_chat(self, messages: List[Dict[str, Any]], tools: Optional[List[Any]] = None) -> AsyncIterator[LLMChunk]:
+        """Stream text deltas as they are generated, ending with a ``done`` chunk"""
+        ...
+    
     async def health(self) -> HealthStatus:
         """Check health and measure time-to-first-token"""
         ...
 
+class TokenMeter:
+    """First-token latency and token rate for one streamed generation"""
+    
+    def __init__(self, provider: str):
+        self.provider = provider
+        self.start = time.perf_counter()
+        self.first_token_at: Optional[float] = None
+        self.chunks = 0
+    
+    def chunk(self, text: str) -> LLMChunk:
+        if self.first_token_at is None:
+            self.first_token_at = time.perf_counter()
+        self.chunks += 1
+        return LLMChunk(text=text, provider=self.provider, tftt_ms=self.tftt_ms)
+    
+    @property
+    def tftt_ms(self) -> Optional[float]:
+        return None if self.first_token_at is None else (self.first_token_at - self.start) * 1000
+    
+    def done(self, tokens: Optional[int] = None, gen_s: Optional[float] = None, tool_calls: Optional[List[Any]] = None) -> LLMChunk:
+        """Final chunk; ``tokens``/``gen_s`` from the backend if it reports them, else counted chunks"""
+        end = time.perf_counter()
+        tokens = tokens if tokens is not None else self.chunks
+        if gen_s is None and self.first_token_at is not None:
+            gen_s = end - self.first_token_at
+        return LLMChunk(
+            provider=self.provider,
+            done=True,
+            tftt_ms=self.tftt_ms,
+            total_ms=(end - self.start) * 1000,
+            tokens=tokens,
+            tokens_per_s=(tokens / gen_s) if tokens and gen_s else None,
+            tool_calls=tool_calls,
+        )
+
+async def collect_stream(chunks: AsyncIterator[LLMChunk]) -> LLMResponse:
+    """Drain a ``stream_chat`` iterator into an ``LLMResponse`` (with real TTFT)"""
+    parts: List[str] = []
+    resp = LLMResponse(text="")
+    async for chunk in chunks:
+        if chunk.text:
+            parts.append(chunk.text)
+        if chunk.provider:
+            resp.provider = chunk.provider
+        if chunk.done:
+            resp.tool_calls = chunk.tool_calls
+            resp.tftt_ms = chunk.tftt_ms
+            resp.total_ms = chunk.total_ms
+            resp.tokens = chunk.tokens
+            resp.tokens_per_s = chunk.tokens_per_s
+    resp.text = "".join(parts)
+    return resp
+
+def _is_timeout(e: BaseException) -> bool:
+    return isinstance(e, (asyncio.TimeoutError, TimeoutError)) or "timeout" in type(e).__name__.lower()
+
+
 class ModelManager:
     """
     Manages primary and fallback LLM providers with circuit breaker pattern.
-    Automatically routes requests based on health and failure count.
+    Primary health is derived from real requests (TTFT EWMA, error and timeout
+    rates over a sliding window); probes run only when the primary is idle.
     """
     
-    def __init__(self, primary: LLM, fallback: LLM):
+    def __init__(self, primary: LLM, fallback: LLM, health: Optional[PassiveHealth] = None, hedge: Optional[HedgePolicy] = None):
         self.primary = primary
         self.fallback = fallback
-        self.failure_count = 0
         self.circuit_breaker_threshold = int(os.getenv("LLM_CIRCUIT_BREAKER_FAILS", "3"))
-        self.last_health_check = 0
-        self.health_cache_duration = 30  # seconds
+        self.health = health or PassiveHealth(
+            window_s=float(os.getenv("LLM_HEALTH_WINDOW_S", "60")),
+            min_samples=int(os.getenv("LLM_HEALTH_MIN_SAMPLES", "5")),
+            max_error_rate=float(os.getenv("LLM_HEALTH_MAX_ERROR_RATE", "0.5")),
+            consecutive_failures=self.circuit_breaker_threshold,
+            max_ttft_ms=float(os.getenv("LLM_HEALTH_MAX_TTFT_MS", "10000")),
+            cooldown_s=float(os.getenv("LLM_HEALTH_COOLDOWN_S", "30")),
+            half_open_max=int(os.getenv("LLM_HEALTH_HALF_OPEN_MAX", "1")),
+        )
+        # Aktiva prober: bara när primären varit tyst så länge, aldrig i request-vägen
+        self.probe_idle_s = float(os.getenv("LLM_HEALTH_PROBE_IDLE_S", "60"))
+        self.probe_interval_s = float(os.getenv("LLM_HEALTH_PROBE_INTERVAL_S", "30"))
+        self.last_health_check = 0.0
         self.cached_health: Optional[HealthStatus] = None
+        self._probe_task: Optional[asyncio.Task] = None
+        # Hedging: fallback startas bara när primären är sen (inlärd p90 TTFT per promptklass)
+        self.hedge = hedge or HedgePolicy.from_env()
         
         logger.info(f"ModelManager initialized with primary={primary.name}, fallback={fallback.name}")
-    
-    async def _is_primary_healthy(self) -> bool:
-        """Check if primary provider is healthy (with caching)"""
-        now = time.time()
-        
-        # Use cached health if recent
-        if (self.cached_health and 
-            now - self.last_health_check < self.health_cache_duration):
-            return self.cached_health.ok
-        
-        # Perform fresh health check
+
+    @property
+    def failure_count(self) -> int:
+        return self.health.failures_in_row
+
+    def _ensure_prober(self) -> None:
+        if self.probe_interval_s <= 0 or (self._probe_task is not None and not self._probe_task.done()):
+            return
         try:
-            health = await self.primary.health()
-            self.cached_health = health
-            self.last_health_check = now
-            
-            if health.ok:
-                logger.debug(f"Primary {self.primary.name} healthy (TTFT: {health.tftt_ms}ms)")
-            else:
-                logger.warning(f"Primary {self.primary.name} unhealthy: {health.error}")
-                
-            return health.ok
-            
+            self._probe_task = asyncio.get_running_loop().create_task(self.run_idle_probes())
+        except RuntimeError:
+            pass
+
+    async def probe(self) -> Optional[HealthStatus]:
+        """One active health check, only if the primary is idle (or its circuit wants a trial)"""
+        half_open_due = (
+            self.health.state == CircuitState.OPEN
+            and time.monotonic() - self.health.opened_at >= self.health.cooldown_s
+        )
+        if self.health.in_flight or not (half_open_due or self.health.idle_for() >= self.probe_idle_s):
+            return None
+        trial = self.health.state != CircuitState.CLOSED
+        if trial and not self.health.allow():
+            return None
+        self.health.begin()
+        # Idle-proben är billig (ingen generering); en HALF_OPEN-provning genererar om adaptern kan
+        check = getattr(self.primary, "trial", None) if trial else None
+        try:
+            status = await (check or self.primary.health)()
+        except (LLMOverloaded, LLMPreempted):
+            # Provningen fick inte plats bakom riktig trafik: försök igen vid nästa intervall
+            self.health.abandon(trial=trial)
+            return None
         except Exception as e:
-            logger.error(f"Health check failed for {self.primary.name}: {e}")
-            self.cached_health = HealthStatus(ok=False, error=str(e))
-            self.last_health_check = now
-            return False
+            status = HealthStatus(ok=False, error=str(e))
+        self.cached_health = status
+        self.last_health_check = time.time()
+        if status.ok:
+            self.health.record_success(status.tftt_ms, trial=trial)
+        else:
+            logger.warning(f"Idle probe of {self.primary.name} failed: {status.error}")
+            self.health.record_failure(timeout="timeout" in (status.error or "").lower(), trial=trial, error=status.error)
+        return status
+
+    async def run_idle_probes(self) -> None:
+        while True:
+            await asyncio.sleep(self.probe_interval_s)
+            try:
+                await self.probe()
+            except Exception as e:
+                logger.error(f"Idle probe error for {self.primary.name}: {e}")
+
+    async def stop(self) -> None:
+        if self._probe_task is not None:
+            self._probe_task.cancel()
+            try:
+                await self._probe_task
+            except (asyncio.CancelledError, Exception):
+                pass
+            self._probe_task = None
+    
+    def _record_primary_failure(self, e: BaseException, trial: bool) -> None:
+        if isinstance(e, (LLMOverloaded, LLMPreempted)):
+            # Avvisad/avbruten av den lokala schemaläggaren, inte ett fel hos providern
+            self.health.abandon(trial=trial)
+        else:
+            self.health.record_failure(timeout=_is_timeout(e), trial=trial, error=str(e))
     
     async def _should_use_primary(self) -> bool:
-        """Determine if we should use primary provider based on health and circuit breaker"""
-        # Circuit breaker: too many recent failures
-        if self.failure_count >= self.circuit_breaker_threshold:
-            logger.info(f"Circuit breaker OPEN: {self.failure_count} failures >= {self.circuit_breaker_threshold}")
-            return False
-        
-        # Health check
-        is_healthy = await self._is_primary_healthy()
-        if not is_healthy:
-            logger.info(f"Primary {self.primary.name} is unhealthy, using fallback")
-            return False
-            
-        return True
+        """Route to primary unless its circuit is open (no I/O in the request path)"""
+        if self.health.allow():
+            return True
+        logger.info(f"Primary {self.primary.name} circuit {self.health.state.value} ({self.health.open_reason}), using fallback")
+        return False
     
     async def ask(self, messages: List[Dict[str, Any]], tools: Optional[List[Any]] = None) -> LLMResponse:
         """
         Send request to appropriate provider with automatic failover.
         Returns response with provider information.
         """
+        self._ensure_prober()
         use_primary = await self._should_use_primary()
+        # I HALF_OPEN är varje släppt request ett prov på återhämtning
+        trial = use_primary and self.health.state == CircuitState.HALF_OPEN
         target = self.primary if use_primary else self.fallback
         
         logger.debug(f"Routing request to {target.name} (primary_healthy={use_primary})")
         
+        if target == self.primary:
+            self.health.begin()
         try:
             start_time = time.time()
             response = await target.chat(messages, tools)
             
-            # Success - reset failure counter if we used primary
-            if target == self.primary:
-                if self.failure_count > 0:
-                    logger.info(f"Primary {self.primary.name} recovered, resetting failure count")
-                    self.failure_count = 0
-            
             # Add metadata
             response.provider = target.name
             if not response.tftt_ms:
                 response.tftt_ms = (time.time() - start_time) * 1000
+            if target == self.primary:
+                self.health.record_success(response.tftt_ms, trial=trial)
             
             logger.debug(f"Response from {target.name}: {len(response.text)} chars, {response.tftt_ms:.1f}ms")
             return response
@@ -126,9 +254,9 @@ class ModelManager:
         except Exception as e:
             logger.error(f"Request failed with {target.name}: {e}")
             
-            # If primary failed, increment failure counter and try fallback
+            # If primary failed, record it and try fallback
             if target == self.primary:
-                self.failure_count += 1
+                self._record_primary_failure(e, trial)
                 logger.warning(f"Primary failure count: {self.failure_count}/{self.circuit_breaker_threshold}")
                 
                 # Hard failover to fallback
@@ -147,25 +275,209 @@ class ModelManager:
             # If fallback failed, re-raise
             raise
     
+    async def stream_chat(self, messages: List[Dict[str, Any]], tools: Optional[List[Any]] = None) -> AsyncIterator[LLMChunk]:
+        """
+        Streaming ``ask``: deltas as they arrive, routed and health-tracked the same way.
+        If the primary fails before its first token the fallback streams the whole
+        answer; if it fails mid-stream the fallback is asked to continue the partial
+        answer and its chunks carry ``failover=True``.
+        """
+        self._ensure_prober()
+        use_primary = await self._should_use_primary()
+        trial = use_primary and self.health.state == CircuitState.HALF_OPEN
+        target = self.primary if use_primary else self.fallback
+        if target != self.primary:
+            async for chunk in target.stream_chat(messages, tools):
+                chunk.provider = target.name
+                yield chunk
+            return
+        
+        self.health.begin()
+        partial: List[str] = []
+        first_ms: Optional[float] = None
+        recorded = False
+        try:
+            async for chunk in target.stream_chat(messages, tools):
+                if chunk.text:
+                    if first_ms is None:
+                        first_ms = chunk.tftt_ms
+                    partial.append(chunk.text)
+                chunk.provider = target.name
+                if chunk.done:
+                    self.health.record_success(chunk.tftt_ms or first_ms, trial=trial)
+                    recorded = True
+                yield chunk
+        except Exception as e:
+            if recorded:
+                raise
+            recorded = True
+            logger.error(f"Stream failed with {target.name} after {len(partial)} chunks: {e}")
+            self._record_primary_failure(e, trial)
+            async for chunk in self._stream_failover(messages, partial, tools):
+                yield chunk
+        finally:
+            if not recorded:
+                # Konsumenten slutade läsa i förtid: räknas som lyckat om första token kom
+                if first_ms is not None:
+                    self.health.record_success(first_ms, trial=trial)
+                else:
+                    self.health.abandon(trial=trial)
+    
+    async def _stream_failover(self, messages: List[Dict[str, Any]], partial: List[str], tools: Optional[List[Any]]) -> AsyncIterator[LLMChunk]:
+        if partial:
+            # Fortsätt det påbörjade svaret istället för att börja om (UI/TTS har redan fått början)
+            messages = list(messages) + [
+                {"role": "assistant", "content": "".join(partial)},
+                {"role": "user", "content": "Fortsätt exakt där svaret avbröts, utan att upprepa något."},
+            ]
+        logger.info(f"Attempting stream failover to {self.fallback.name}")
+        async for chunk in self.fallback.stream_chat(messages, tools):
+            chunk.provider = f"{self.fallback.name} (failover)"
+            chunk.failover = True
+            yield chunk
+    
+    async def hedged_stream(
+        self,
+        messages: List[Dict[str, Any]],
+        tools: Optional[List[Any]] = None,
+        klass: Optional[str] = None,
+    ) -> AsyncIterator[LLMChunk]:
+        """
+        Like ``stream_chat`` but the fallback is also used as a hedge: it is started
+        only if the primary has not produced a first token within the learned p90
+        TTFT for ``klass`` (and the hedge budget allows). Whichever side yields the
+        first token wins and the other stream is cancelled.
+        """
+        self._ensure_prober()
+        if not await self._should_use_primary():
+            async for chunk in self.fallback.stream_chat(messages, tools):
+                chunk.provider = self.fallback.name
+                yield chunk
+            return
+        trial = self.health.state == CircuitState.HALF_OPEN
+        if klass is None:
+            last = str((messages[-1] if messages else {}).get("content") or "")
+            klass = prompt_class("chat", last, bool(tools))
+        streams = {
+            PRIMARY: self.primary.stream_chat(messages, tools),
+            BACKUP: self.fallback.stream_chat(messages, tools),
+        }
+        recorded = False
+        
+        async def first_chunk(side: str) -> LLMChunk:
+            async for chunk in streams[side]:
+                if chunk.text or chunk.done:
+                    return chunk
+            raise RuntimeError(f"{side} stream ended without output")
+        
+        async def first_primary() -> LLMChunk:
+            nonlocal recorded
+            try:
+                return await first_chunk(PRIMARY)
+            except Exception as e:
+                recorded = True
+                self._record_primary_failure(e, trial)
+                raise
+        
+        async def reap(task: asyncio.Task, side: str) -> None:
+            try:
+                await task
+            except BaseException:
+                pass
+            await streams[side].aclose()
+        
+        def on_cancel(side: str, task: asyncio.Task) -> None:
+            nonlocal recorded
+            if side == PRIMARY and not recorded:
+                recorded = True
+                self.health.abandon(trial=trial)
+            asyncio.ensure_future(reap(task, side))
+        
+        self.health.begin()
+        try:
+            # race() räknar inlärd TTFT från adapterns beviljade slot, inte från kön
+            result = await self.hedge.race(first_primary, lambda: first_chunk(BACKUP), klass, on_cancel=on_cancel)
+        except BaseException:
+            if not recorded:
+                recorded = True
+                self.health.abandon(trial=trial)
+            raise
+        if result.winner is None:
+            raise Exception(f"Both providers failed: {result.value}")
+        
+        if result.winner == BACKUP:
+            label = f"{self.fallback.name} ({'hedge' if result.hedged else 'failover'})"
+            chunk = result.value
+            try:
+                while True:
+                    chunk.provider = label
+                    chunk.failover = True
+                    yield chunk
+                    if chunk.done:
+                        break
+                    chunk = await streams[BACKUP].__anext__()
+            except StopAsyncIteration:
+                pass
+            finally:
+                await streams[BACKUP].aclose()
+            return
+        
+        partial: List[str] = []
+        first_ms: Optional[float] = result.value.tftt_ms or result.elapsed_ms
+        chunk = result.value
+        try:
+            while True:
+                chunk.provider = self.primary.name
+                if chunk.text:
+                    partial.append(chunk.text)
+                if chunk.done:
+                    self.health.record_success(chunk.tftt_ms or first_ms, trial=trial)
+                    recorded = True
+                yield chunk
+                if chunk.done:
+                    break
+                chunk = await streams[PRIMARY].__anext__()
+        except StopAsyncIteration:
+            pass
+        except Exception as e:
+            if recorded:
+                raise
+            recorded = True
+            logger.error(f"Hedged stream failed with {self.primary.name} after {len(partial)} chunks: {e}")
+            self._record_primary_failure(e, trial)
+            async for chunk in self._stream_failover(messages, partial, tools):
+                yield chunk
+        finally:
+            await streams[PRIMARY].aclose()
+            if not recorded:
+                self.health.record_success(first_ms, trial=trial)
+    
+    async def ask_hedged(self, messages: List[Dict[str, Any]], tools: Optional[List[Any]] = None, klass: Optional[str] = None) -> LLMResponse:
+        """Non-streaming ``hedged_stream``"""
+        return await collect_stream(self.hedged_stream(messages, tools, klass))
+    
     def get_status(self) -> Dict[str, Any]:
         """Get current status for monitoring/UI"""
         return {
             "primary": {
                 "name": self.primary.name,
                 "failure_count": self.failure_count,
-                "circuit_breaker_open": self.failure_count >= self.circuit_breaker_threshold,
+                "circuit_breaker_open": not self.health.healthy,
+                "circuit_state": self.health.state.value,
+                "health": self.health.stats(),
                 "last_health_check": self.last_health_check,
                 "health_status": self.cached_health.__dict__ if self.cached_health else None
             },
             "fallback": {
                 "name": self.fallback.name
             },
-            "threshold": self.circuit_breaker_threshold
+            "threshold": self.circuit_breaker_threshold,
+            "hedging": self.hedge.stats()
         }
     
     def reset_circuit_breaker(self):
         """Manually reset circuit breaker (for admin/testing)"""
         old_count = self.failure_count
-        self.failure_count = 0
-        self.cached_health = None  # Force fresh health check
-        logger.info(f"Circuit breaker reset manually (was {old_count} failures)")
\ No newline at end of file
+        self.health.reset()
+        self.cached_health = None
+        logger.info(f"Circuit breaker reset manually (was {old_count} failures)")
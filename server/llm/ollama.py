@@ -7,9 +7,12 @@ import time
 import json
 import httpx
 import logging
-from typing import Dict, List, Any, Optional
+from typing import AsyncIterator, Dict, List, Any, Optional
 
-from .manager import LLM, HealthStatus, LLMResponse
+from http_pool import http_clients
+
+from .manager import LLM, HealthStatus, LLMChunk, LLMResponse, TokenMeter, collect_stream
+from .scheduler import Priority, llm_scheduler
 
 logger = logging.getLogger("alice.llm.ollama")
 
@@ -30,15 +33,12 @@ class OllamaAdapter(LLM):
     
     async def health(self) -> HealthStatus:
         """
-        Health check with TTFT measurement using minimal prompt.
-        Returns ok=False if service down or TTFT > threshold.
+        Idle probe: /api/tags plus a model-presence check. No generation, so
+        it never competes with real traffic for the shared model; TTFT comes
+        from real requests (PassiveHealth) or from ``trial()``.
         """
         try:
-            start_time = time.time()
-            
-            # Test basic connectivity first
-            async with httpx.AsyncClient(timeout=self.health_timeout) as client:
-                # Quick ping to /api/tags
+            async with http_clients.session("ollama", timeout=self.health_timeout) as client:
                 response = await client.get(f"{self.base_url}/api/tags")
                 if response.status_code != 200:
                     return HealthStatus(ok=False, error=f"Service unavailable: {response.status_code}")
@@ -49,85 +49,109 @@ class OllamaAdapter(LLM):
                 if self.model not in models:
                     return HealthStatus(ok=False, error=f"Model {self.model} not found. Available: {models}")
                 
-                # TTFT test with minimal prompt
-                ttft_start = time.time()
-                generate_payload = {
-                    "model": self.model,
-                    "prompt": self.health_prompt,
-                    "stream": False,
-                    "options": {
-                        "temperature": 0.1,
-                        "num_predict": 5  # Very short response
-                    }
-                }
-                
-                response = await client.post(f"{self.base_url}/api/generate", json=generate_payload)
-                ttft_ms = (time.time() - ttft_start) * 1000
-                
-                if response.status_code != 200:
-                    return HealthStatus(ok=False, error=f"Generate failed: {response.status_code}")
-                
-                # Check if TTFT is acceptable
-                if ttft_ms > self.max_ttft * 1000:
-                    return HealthStatus(ok=False, tftt_ms=ttft_ms, 
-                                      error=f"TTFT {ttft_ms:.0f}ms > {self.max_ttft*1000:.0f}ms threshold")
-                
-                return HealthStatus(ok=True, tftt_ms=ttft_ms)
+                return HealthStatus(ok=True)
                 
         except httpx.TimeoutException:
             return HealthStatus(ok=False, error="Health check timeout")
         except Exception as e:
             return HealthStatus(ok=False, error=f"Health check error: {e}")
     
-    async def chat(self, messages: List[Dict[str, Any]], tools: Optional[List[Any]] = None) -> LLMResponse:
+    async def trial(self) -> HealthStatus:
         """
-        Send chat request to Ollama.
-        Converts messages to Ollama format and handles tool calls.
+        Minimal generation for a HALF_OPEN circuit. Runs in a BACKGROUND
+        scheduler slot (so it yields to voice/chat and may be shed or
+        preempted - those propagate as LLMOverloaded/LLMPreempted) and TTFT
+        is measured from when the slot is granted.
         """
-        try:
-            start_time = time.time()
-            
-            # Convert messages to Ollama prompt format
-            prompt = self._messages_to_prompt(messages)
-            
-            payload = {
-                "model": self.model,
-                "prompt": prompt,
-                "stream": False,
-                "options": {
-                    "temperature": float(os.getenv("LOCAL_AI_TEMPERATURE", "0.3")),
-                    "num_predict": int(os.getenv("LOCAL_AI_MAX_TOKENS", "2048"))
-                }
+        generate_payload = {
+            "model": self.model,
+            "prompt": self.health_prompt,
+            "stream": False,
+            "options": {
+                "temperature": 0.1,
+                "num_predict": 5  # Very short response
             }
-            
-            async with httpx.AsyncClient(timeout=30.0) as client:
-                response = await client.post(f"{self.base_url}/api/generate", json=payload)
-                response.raise_for_status()
-                
-                result = response.json()
-                text = result.get("response", "")
-                
-                # Extract tool calls if present
-                tool_calls = self._extract_tool_calls(text)
-                
-                ttft_ms = (time.time() - start_time) * 1000
-                
-                logger.debug(f"Ollama response: {len(text)} chars, {ttft_ms:.1f}ms")
-                
-                return LLMResponse(
-                    text=text,
-                    tool_calls=tool_calls,
-                    provider=self.name,
-                    tftt_ms=ttft_ms
-                )
-                
-        except httpx.HTTPStatusError as e:
-            logger.error(f"Ollama HTTP error: {e.response.status_code} - {e.response.text}")
-            raise Exception(f"Ollama request failed: {e.response.status_code}")
+        }
+        async with llm_scheduler.slot("ollama", Priority.BACKGROUND):
+            try:
+                async with http_clients.session("ollama", timeout=self.health_timeout) as client:
+                    ttft_start = time.time()
+                    response = await client.post(f"{self.base_url}/api/generate", json=generate_payload)
+                    ttft_ms = (time.time() - ttft_start) * 1000
+            except httpx.TimeoutException:
+                return HealthStatus(ok=False, error="Health check timeout")
+            except Exception as e:
+                return HealthStatus(ok=False, error=f"Health check error: {e}")
+        
+        if response.status_code != 200:
+            return HealthStatus(ok=False, error=f"Generate failed: {response.status_code}")
+        
+        # Check if TTFT is acceptable
+        if ttft_ms > self.max_ttft * 1000:
+            return HealthStatus(ok=False, tftt_ms=ttft_ms,
+                              error=f"TTFT {ttft_ms:.0f}ms > {self.max_ttft*1000:.0f}ms threshold")
+        
+        return HealthStatus(ok=True, tftt_ms=ttft_ms)
+    
+    def _payload(self, messages: List[Dict[str, Any]], stream: bool) -> Dict[str, Any]:
+        return {
+            "model": self.model,
+            "prompt": self._messages_to_prompt(messages),
+            "stream": stream,
+            "options": {
+                "temperature": float(os.getenv("LOCAL_AI_TEMPERATURE", "0.3")),
+                "num_predict": int(os.getenv("LOCAL_AI_MAX_TOKENS", "2048"))
+            }
+        }
+    
+    async def stream_chat(self, messages: List[Dict[str, Any]], tools: Optional[List[Any]] = None) -> AsyncIterator[LLMChunk]:
+        """
+        Stream from Ollama /api/generate (NDJSON). TTFT is the first non-empty
+        ``response`` delta; tokens and tokens/sec come from ``eval_count`` and
+        ``eval_duration`` in the final line. Tool calls are extracted from the
+        full text in the ``done`` chunk.
+        """
+        meter = TokenMeter(self.name)
+        parts: List[str] = []
+        # 30 s mellan chunkar, inte för hela genereringen
+        timeout = httpx.Timeout(30.0, connect=5.0)
+        try:
+            # Prioritet från anroparen (current_priority); TTFT inkluderar kötid
+            async with llm_scheduler.slot("ollama"), http_clients.session("ollama", timeout=timeout) as client:
+                async with client.stream("POST", f"{self.base_url}/api/generate", json=self._payload(messages, True)) as response:
+                    if response.status_code != 200:
+                        body = (await response.aread()).decode("utf-8", "replace")
+                        raise Exception(f"Ollama request failed: {response.status_code} - {body[:200]}")
+                    async for line in response.aiter_lines():
+                        if not line:
+                            continue
+                        data = json.loads(line)
+                        delta = data.get("response", "")
+                        if delta:
+                            parts.append(delta)
+                            yield meter.chunk(delta)
+                        if data.get("done"):
+                            eval_ns = data.get("eval_duration")
+                            text = "".join(parts)
+                            logger.debug(f"Ollama stream: {len(text)} chars, TTFT {meter.tftt_ms}ms")
+                            yield meter.done(
+                                tokens=data.get("eval_count"),
+                                gen_s=(eval_ns / 1e9) if eval_ns else None,
+                                tool_calls=self._extract_tool_calls(text),
+                            )
+                            return
+            raise Exception("Ollama stream ended without done")
         except Exception as e:
             logger.error(f"Ollama request error: {e}")
             raise
     
+    async def chat(self, messages: List[Dict[str, Any]], tools: Optional[List[Any]] = None) -> LLMResponse:
+        """
+        Send chat request to Ollama.
+        Streams internally so ``tftt_ms`` is the real first-token latency.
+        """
+        return await collect_stream(self.stream_chat(messages, tools))
+    
     def _messages_to_prompt(self, messages: List[Dict[str, Any]]) -> str:
         """Convert OpenAI-style messages to Ollama prompt"""
         prompt_parts = []
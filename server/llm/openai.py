@@ -7,9 +7,12 @@ import time
 import json
 import httpx
 import logging
-from typing import Dict, List, Any, Optional
+from typing import AsyncIterator, Dict, List, Any, Optional
 
-from .manager import LLM, HealthStatus, LLMResponse
+from http_pool import http_clients
+
+from .manager import LLM, HealthStatus, LLMChunk, LLMResponse, TokenMeter, collect_stream
+from .scheduler import llm_scheduler
 
 logger = logging.getLogger("alice.llm.openai")
 
@@ -52,7 +55,7 @@ class OpenAIAdapter(LLM):
                 "temperature": 0.1
             }
             
-            async with httpx.AsyncClient(timeout=self.health_timeout) as client:
+            async with http_clients.session("openai", timeout=self.health_timeout) as client:
                 response = await client.post(f"{self.base_url}/chat/completions", 
                                            json=payload, headers=headers)
                 
@@ -77,68 +80,79 @@ class OpenAIAdapter(LLM):
         except Exception as e:
             return HealthStatus(ok=False, error=f"Health check error: {e}")
     
-    async def chat(self, messages: List[Dict[str, Any]], tools: Optional[List[Any]] = None) -> LLMResponse:
+    def _request(self, messages: List[Dict[str, Any]], tools: Optional[List[Any]], stream: bool):
+        headers = {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json"
+        }
+        payload = {
+            "model": self.model,
+            "messages": messages,
+            "temperature": float(os.getenv("FALLBACK_TEMPERATURE", "0.6")),
+            "max_tokens": int(os.getenv("FAST_PATH_MAX_TOKENS", "150"))
+        }
+        if stream:
+            payload["stream"] = True
+            payload["stream_options"] = {"include_usage": True}
+        # Add tools if provided
+        if tools:
+            payload["tools"] = tools
+            payload["tool_choice"] = "auto"
+        return headers, payload
+    
+    async def stream_chat(self, messages: List[Dict[str, Any]], tools: Optional[List[Any]] = None) -> AsyncIterator[LLMChunk]:
         """
-        Send chat request to OpenAI with tool support.
-        Handles both regular chat and tool calls.
+        Stream chat completions (SSE). TTFT is the first content delta; tool call
+        deltas are assembled by index and returned in the ``done`` chunk, and
+        ``usage.completion_tokens`` gives the token count.
         """
+        headers, payload = self._request(messages, tools, stream=True)
+        meter = TokenMeter(self.name)
+        calls: Dict[int, Dict[str, Any]] = {}
+        tokens: Optional[int] = None
+        timeout = httpx.Timeout(30.0, connect=5.0)
         try:
-            start_time = time.time()
-            
-            headers = {
-                "Authorization": f"Bearer {self.api_key}",
-                "Content-Type": "application/json"
-            }
-            
-            payload = {
-                "model": self.model,
-                "messages": messages,
-                "temperature": float(os.getenv("FALLBACK_TEMPERATURE", "0.6")),
-                "max_tokens": int(os.getenv("FAST_PATH_MAX_TOKENS", "150"))
-            }
-            
-            # Add tools if provided
-            if tools:
-                payload["tools"] = tools
-                payload["tool_choice"] = "auto"
-            
-            async with httpx.AsyncClient(timeout=30.0) as client:
-                response = await client.post(f"{self.base_url}/chat/completions", 
-                                           json=payload, headers=headers)
-                response.raise_for_status()
-                
-                result = response.json()
-                
-                if "choices" not in result or not result["choices"]:
-                    raise Exception("No choices in OpenAI response")
-                
-                choice = result["choices"][0]
-                message = choice.get("message", {})
-                
-                text = message.get("content", "") or ""
-                tool_calls = message.get("tool_calls", [])
-                
-                ttft_ms = (time.time() - start_time) * 1000
-                
-                logger.debug(f"OpenAI response: {len(text)} chars, {ttft_ms:.1f}ms, {len(tool_calls)} tools")
-                
-                return LLMResponse(
-                    text=text,
-                    tool_calls=tool_calls if tool_calls else None,
-                    provider=self.name,
-                    tftt_ms=ttft_ms
-                )
-                
-        except httpx.HTTPStatusError as e:
-            error_text = ""
-            try:
-                error_data = e.response.json()
-                error_text = error_data.get("error", {}).get("message", "")
-            except:
-                error_text = e.response.text
-            
-            logger.error(f"OpenAI HTTP error: {e.response.status_code} - {error_text}")
-            raise Exception(f"OpenAI request failed: {e.response.status_code} - {error_text}")
+            # Prioritet från anroparen (current_priority); TTFT inkluderar kötid
+            async with llm_scheduler.slot("openai"), http_clients.session("openai", timeout=timeout) as client:
+                async with client.stream("POST", f"{self.base_url}/chat/completions", json=payload, headers=headers) as response:
+                    if response.status_code != 200:
+                        body = (await response.aread()).decode("utf-8", "replace")
+                        try:
+                            error_text = json.loads(body).get("error", {}).get("message", "")
+                        except Exception:
+                            error_text = body[:200]
+                        raise Exception(f"OpenAI request failed: {response.status_code} - {error_text}")
+                    async for line in response.aiter_lines():
+                        if not line.startswith("data: "):
+                            continue
+                        data = line[len("data: "):].strip()
+                        if data == "[DONE]":
+                            break
+                        event = json.loads(data)
+                        if event.get("usage"):
+                            tokens = event["usage"].get("completion_tokens")
+                        for choice in event.get("choices") or []:
+                            delta = choice.get("delta") or {}
+                            if delta.get("content"):
+                                yield meter.chunk(delta["content"])
+                            for tc in delta.get("tool_calls") or []:
+                                call = calls.setdefault(tc.get("index", 0), {"id": None, "type": "function", "function": {"name": "", "arguments": ""}})
+                                if tc.get("id"):
+                                    call["id"] = tc["id"]
+                                fn = tc.get("function") or {}
+                                call["function"]["name"] += fn.get("name") or ""
+                                call["function"]["arguments"] += fn.get("arguments") or ""
+                                if meter.first_token_at is None:
+                                    meter.first_token_at = time.perf_counter()
+            tool_calls = [calls[i] for i in sorted(calls)] or None
+            yield meter.done(tokens=tokens, tool_calls=tool_calls)
         except Exception as e:
             logger.error(f"OpenAI request error: {e}")
-            raise
\ No newline at end of file
+            raise
+    
+    async def chat(self, messages: List[Dict[str, Any]], tools: Optional[List[Any]] = None) -> LLMResponse:
+        """
+        Send chat request to OpenAI with tool support.
+        Streams internally so ``tftt_ms`` is the real first-token latency.
+        """
+        return await collect_stream(self.stream_chat(messages, tools))
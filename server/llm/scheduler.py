@@ -0,0 +1,330 @@
+"""
+Priority-aware scheduling of LLM calls per backend.
+
+The local Ollama backend is one shared model. Voice turns, chat, tool
+classification (route/act, critic/planner) and background work such as
+ambient summaries used to hit it with no coordination, so a summary could
+delay a live voice answer by seconds. Every LLM call now takes a slot from
+``llm_scheduler`` first:
+
+- Priority classes: VOICE > CHAT > TOOLS > BACKGROUND. When a slot frees up
+  it goes to the oldest waiter of the highest class.
+- Each backend has bounded concurrency (``limit``). BACKGROUND may only use
+  ``background_slots`` of them, so there is always headroom for interactive
+  traffic, and it only runs when nothing more important is waiting.
+- Queue-depth shedding: a call is rejected with ``LLMOverloaded`` when
+  ``max_queue[class]`` calls of the same or a higher class are already
+  queued ahead of it (shallow for background, deep for voice), so callers
+  can fail over right away instead of waiting for a slot that will come
+  too late.
+- Preemption: when interactive work waits and all slots are busy, running
+  BACKGROUND holders are cancelled and get ``LLMPreempted``. ``run()`` defers
+  and retries such work later.
+
+``stats()`` shows queue wait (p50/p95/p99) per class and running/queued per
+backend. A ``SlotClock`` in ``slot_clock`` records when the current task
+queued and when it got its slot, so callers (e.g. ``HedgePolicy.race``) can
+time the provider without the queue wait.
+"""
+
+import asyncio
+import contextvars
+import heapq
+import itertools
+import logging
+import os
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from enum import IntEnum
+from typing import Any, AsyncIterator, Awaitable, Callable, Deque, Dict, Iterator, List, Optional, Sequence, Set, Tuple
+
+logger = logging.getLogger("alice.llm.scheduler")
+
+
+class Priority(IntEnum):
+    VOICE = 0
+    CHAT = 1
+    TOOLS = 2
+    BACKGROUND = 3
+
+
+# Prioritet för anrop som inte anger någon (t.ex. adaptrarna i ModelManager)
+current_priority: contextvars.ContextVar[Priority] = contextvars.ContextVar("llm_priority", default=Priority.CHAT)
+
+
+class SlotClock:
+    """When the calling task was granted its first slot, for latencies that exclude queue wait"""
+
+    __slots__ = ("queued_at", "granted_at")
+
+    def __init__(self) -> None:
+        self.queued_at: Optional[float] = None  # None: tasken har aldrig bett om en slot
+        self.granted_at: Optional[float] = None
+
+    def elapsed_ms(self) -> Optional[float]:
+        """Milliseconds since the slot was granted; None while still queued"""
+        return None if self.granted_at is None else (time.perf_counter() - self.granted_at) * 1000
+
+
+# Sätts av den som vill mäta (t.ex. hedging); acquire() stämplar när slot beviljas
+slot_clock: contextvars.ContextVar[Optional[SlotClock]] = contextvars.ContextVar("llm_slot_clock", default=None)
+
+
+class LLMOverloaded(RuntimeError):
+    """Request shed because the backend queue is too deep for its class"""
+
+
+class LLMPreempted(RuntimeError):
+    """Background work cancelled to make room for interactive traffic"""
+
+
+def _percentile(values: Sequence[float], p: float) -> float:
+    if not values:
+        return 0.0
+    arr = sorted(values)
+    k = max(0, min(len(arr) - 1, int(round((p / 100.0) * (len(arr) - 1)))))
+    return float(arr[k])
+
+
+@contextmanager
+def priority_scope(priority: Priority) -> Iterator[None]:
+    """Run the enclosed LLM calls with ``priority`` unless they pass their own"""
+    token = current_priority.set(Priority(priority))
+    try:
+        yield
+    finally:
+        current_priority.reset(token)
+
+
+class Ticket:
+    """One queued or running LLM call"""
+
+    __slots__ = ("priority", "backend", "task", "future", "enqueued", "preempted")
+
+    def __init__(self, priority: Priority, backend: str, task: Optional[asyncio.Task]):
+        self.priority = priority
+        self.backend = backend
+        self.task = task
+        self.future: Optional[asyncio.Future] = None
+        self.enqueued = time.perf_counter()
+        self.preempted = False
+
+
+class _Backend:
+    def __init__(self, limit: int, background_slots: int):
+        self.limit = max(1, limit)
+        self.background_slots = max(0, min(background_slots, self.limit))
+        self.running: Set[Ticket] = set()
+        self.queue: List[Tuple[int, int, Ticket]] = []
+
+    def running_background(self) -> int:
+        return sum(1 for t in self.running if t.priority == Priority.BACKGROUND)
+
+    def can_run(self, priority: Priority) -> bool:
+        if len(self.running) >= self.limit:
+            return False
+        return priority != Priority.BACKGROUND or self.running_background() < self.background_slots
+
+
+DEFAULT_MAX_QUEUE: Dict[Priority, int] = {
+    Priority.VOICE: 64,
+    Priority.CHAT: 32,
+    Priority.TOOLS: 16,
+    Priority.BACKGROUND: 4,
+}
+
+
+class LLMScheduler:
+    """Per-backend priority queues with bounded concurrency, shedding and preemption"""
+
+    def __init__(
+        self,
+        limits: Optional[Dict[str, int]] = None,
+        background_slots: Optional[Dict[str, int]] = None,
+        max_queue: Optional[Dict[Priority, int]] = None,
+        default_limit: int = 4,
+        preempt: bool = True,
+    ):
+        self.limits = dict(limits or {})
+        self.background_slots = dict(background_slots or {})
+        self.max_queue = {**DEFAULT_MAX_QUEUE, **(max_queue or {})}
+        self.default_limit = default_limit
+        self.preempt = preempt
+        self._backends: Dict[str, _Backend] = {}
+        self._seq = itertools.count()
+        self._waits: Dict[Priority, Deque[float]] = {p: deque(maxlen=1000) for p in Priority}
+        self.totals: Dict[Priority, Dict[str, int]] = {
+            p: {"admitted": 0, "shed": 0, "preempted": 0, "cancelled": 0} for p in Priority
+        }
+
+    @classmethod
+    def from_env(cls) -> "LLMScheduler":
+        return cls(
+            limits={
+                # En delad lokal modell: få parallella genereringar (jfr OLLAMA_NUM_PARALLEL)
+                "ollama": int(os.getenv("LLM_SCHED_OLLAMA_CONCURRENCY", "2")),
+                "openai": int(os.getenv("LLM_SCHED_OPENAI_CONCURRENCY", "16")),
+            },
+            background_slots={
+                "ollama": int(os.getenv("LLM_SCHED_OLLAMA_BACKGROUND_SLOTS", "1")),
+                "openai": int(os.getenv("LLM_SCHED_OPENAI_BACKGROUND_SLOTS", "4")),
+            },
+            max_queue={p: int(os.getenv(f"LLM_SCHED_MAX_QUEUE_{p.name}", str(n))) for p, n in DEFAULT_MAX_QUEUE.items()},
+            preempt=os.getenv("LLM_SCHED_PREEMPT", "true").lower() == "true",
+        )
+
+    def _backend(self, name: str) -> _Backend:
+        b = self._backends.get(name)
+        if b is None:
+            limit = self.limits.get(name, self.default_limit)
+            b = self._backends[name] = _Backend(limit, self.background_slots.get(name, max(1, limit // 2)))
+        return b
+
+    # --- admission ---
+    async def acquire(self, backend: str, priority: Optional[Priority] = None) -> Ticket:
+        priority = Priority(current_priority.get() if priority is None else priority)
+        b = self._backend(backend)
+        try:
+            task = asyncio.current_task()
+        except RuntimeError:
+            task = None
+        ticket = Ticket(priority, backend, task)
+        clock = slot_clock.get()
+        if clock is not None and clock.queued_at is None:
+            clock.queued_at = ticket.enqueued
+        # Djup framför oss: köade anrop i samma eller högre klass
+        depth = sum(1 for e in b.queue if e[0] <= priority)
+        ticket.future = asyncio.get_running_loop().create_future()
+        heapq.heappush(b.queue, (int(priority), next(self._seq), ticket))
+        self._dispatch(b)
+        if not ticket.future.done():
+            if depth >= self.max_queue[priority]:
+                self._unqueue(b, ticket)
+                self.totals[priority]["shed"] += 1
+                raise LLMOverloaded(f"{backend} queue depth {depth} >= {self.max_queue[priority]} for {priority.name.lower()}")
+            if priority < Priority.BACKGROUND:
+                self._maybe_preempt(b)
+        try:
+            await ticket.future
+        except asyncio.CancelledError:
+            if ticket in b.running:
+                # Slot beviljades samtidigt som vi avbröts: lämna tillbaka den
+                self.release(ticket)
+            else:
+                self._unqueue(b, ticket)
+            self.totals[priority]["cancelled"] += 1
+            raise
+        if clock is not None and clock.granted_at is None:
+            clock.granted_at = time.perf_counter()
+        return ticket
+
+    def _unqueue(self, b: _Backend, ticket: Ticket) -> None:
+        b.queue = [e for e in b.queue if e[2] is not ticket]
+        heapq.heapify(b.queue)
+
+    def _admit(self, b: _Backend, ticket: Ticket) -> Ticket:
+        b.running.add(ticket)
+        self._waits[ticket.priority].append((time.perf_counter() - ticket.enqueued) * 1000)
+        self.totals[ticket.priority]["admitted"] += 1
+        return ticket
+
+    def _dispatch(self, b: _Backend) -> None:
+        while b.queue:
+            _, _, head = b.queue[0]
+            if head.future is not None and head.future.done():
+                heapq.heappop(b.queue)
+                continue
+            # Kön är prioritetsordnad: om huvudet inte får köra får ingen lägre klass det heller
+            if not b.can_run(head.priority):
+                break
+            heapq.heappop(b.queue)
+            self._admit(b, head)
+            head.future.set_result(None)
+
+    def _maybe_preempt(self, b: _Backend) -> None:
+        if not self.preempt or len(b.running) < b.limit:
+            return
+        waiting = sum(1 for _, _, t in b.queue if t.priority < Priority.BACKGROUND)
+        pending = sum(1 for t in b.running if t.preempted)
+        victims = sorted(
+            (t for t in b.running if t.priority == Priority.BACKGROUND and not t.preempted and t.task is not None and not t.task.done()),
+            key=lambda t: t.enqueued,
+            reverse=True,
+        )
+        for victim in victims[: max(0, waiting - pending)]:
+            victim.preempted = True
+            self.totals[Priority.BACKGROUND]["preempted"] += 1
+            logger.info(f"Preempting background LLM call on {victim.backend} for interactive traffic")
+            victim.task.cancel()
+
+    def release(self, ticket: Ticket) -> None:
+        b = self._backend(ticket.backend)
+        b.running.discard(ticket)
+        self._dispatch(b)
+
+    @asynccontextmanager
+    async def slot(self, backend: str, priority: Optional[Priority] = None) -> AsyncIterator[Ticket]:
+        """Hold one concurrency slot on ``backend`` for the enclosed call"""
+        ticket = await self.acquire(backend, priority)
+        try:
+            yield ticket
+        except asyncio.CancelledError:
+            if not ticket.preempted:
+                raise
+            task = asyncio.current_task()
+            if task is not None and hasattr(task, "uncancel"):
+                task.uncancel()
+            raise LLMPreempted(f"{backend} slot preempted by interactive traffic") from None
+        finally:
+            self.release(ticket)
+
+    async def run(
+        self,
+        backend: str,
+        call: Callable[[], Awaitable[Any]],
+        priority: Optional[Priority] = None,
+        retries: int = 3,
+        defer_s: float = 2.0,
+    ) -> Any:
+        """``call()`` inside a slot; preempted work is deferred and retried"""
+        attempt = 0
+        while True:
+            try:
+                async with self.slot(backend, priority):
+                    return await call()
+            except LLMPreempted:
+                attempt += 1
+                if attempt > retries:
+                    raise
+                await asyncio.sleep(defer_s * attempt)
+
+    def stats(self) -> Dict[str, Any]:
+        classes: Dict[str, Any] = {}
+        for p in Priority:
+            waits = list(self._waits[p])
+            classes[p.name.lower()] = {
+                **self.totals[p],
+                "max_queue": self.max_queue[p],
+                "wait_ms": {
+                    "count": len(waits),
+                    "p50": _percentile(waits, 50),
+                    "p95": _percentile(waits, 95),
+                    "p99": _percentile(waits, 99),
+                    "max": max(waits) if waits else 0.0,
+                },
+            }
+        backends = {
+            name: {
+                "limit": b.limit,
+                "background_slots": b.background_slots,
+                "running": len(b.running),
+                "running_background": b.running_background(),
+                "queued": len(b.queue),
+            }
+            for name, b in self._backends.items()
+        }
+        return {"classes": classes, "backends": backends}
+
+
+llm_scheduler = LLMScheduler.from_env()
@@ -5,9 +5,9 @@ LLM Coordinator - Main interface for model management and routing
 import os
 import logging
 import asyncio
-from typing import Dict, List, Any, Optional
+from typing import AsyncIterator, Dict, List, Any, Optional
 
-from llm import ModelManager, OllamaAdapter, OpenAIAdapter, harmonyWrap
+from llm import ModelManager, OllamaAdapter, OpenAIAdapter, harmonyWrap, prompt_class
 from llm.harmony import create_system_prompt, create_developer_prompt, extract_harmony_sections
 from agent import routeIntent, classifyIntent, IntentClassification
 from agent.tools import extractToolCalls, executeToolCall
@@ -22,6 +22,8 @@ class LLMCoordinator:
     
     def __init__(self):
         self.model_manager = None
+        # Hedging mot molnet bara när fallback är en riktig provider (inte mock)
+        self.hedging = False
         self._initialize_models()
         
         # Cache for frequently used prompts
@@ -48,12 +50,18 @@ class LLMCoordinator:
                 fallback = OpenAIAdapter(api_key=openai_api_key, model=fallback_model)
             
             self.model_manager = ModelManager(primary=primary, fallback=fallback)
+            self.hedging = bool(openai_api_key) and os.getenv("LLM_HEDGE_ENABLED", "true").lower() == "true"
             
         except Exception as e:
             logger.error(f"Failed to initialize models: {e}")
             # Create mock manager for development
             self.model_manager = MockModelManager()
     
+    async def aclose(self) -> None:
+        """Stop the model manager's idle prober; it may hold a BACKGROUND scheduler slot"""
+        if self.model_manager is not None:
+            await self.model_manager.stop()
+    
     async def process_request(
         self, 
         user_input: str, 
@@ -92,9 +100,9 @@ class LLMCoordinator:
                 history=history
             )
             
-            # Get model response
+            # Get model response (hedged: cloud only if local is late for this path/prompt size)
             start_time = asyncio.get_event_loop().time()
-            response = await self.model_manager.ask(messages)
+            response = await self._ask(messages, prompt_class(path.lower(), user_input))
             processing_time = (asyncio.get_event_loop().time() - start_time) * 1000
             
             # Extract structured sections
@@ -124,7 +132,7 @@ class LLMCoordinator:
                     tool_responses=tool_responses
                 )
                 
-                final_response = await self.model_manager.ask(final_messages)
+                final_response = await self._ask(final_messages, prompt_class(f"{path.lower()}:final", user_input))
                 final_sections = extract_harmony_sections(final_response.text)
                 final_text = final_sections.get("final", final_response.text)
             
@@ -155,6 +163,48 @@ class LLMCoordinator:
                 "error": str(e)
             }
     
+    async def stream_request(
+        self,
+        user_input: str,
+        history: Optional[List[Dict[str, str]]] = None,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Streaming variant of ``process_request`` for TTS/UI: yields ``chunk``
+        events as tokens arrive and one ``done`` event with provider, timing
+        (TTFT, total, tokens, tokens/sec) and any tool calls. Tools are not
+        executed here; callers that get ``tool_calls`` use ``process_request``.
+        """
+        messages = harmonyWrap(
+            system=self.system_prompt,
+            developer=self.developer_prompt,
+            user=user_input,
+            history=history
+        )
+        if self.hedging:
+            stream = self.model_manager.hedged_stream(messages, klass=prompt_class("stream", user_input))
+        else:
+            stream = self.model_manager.stream_chat(messages)
+        async for chunk in stream:
+            if chunk.text:
+                yield {"type": "chunk", "text": chunk.text, "provider": chunk.provider, "failover": chunk.failover}
+            if chunk.done:
+                yield {
+                    "type": "done",
+                    "provider": chunk.provider,
+                    "tool_calls": chunk.tool_calls,
+                    "timing": {
+                        "ttft_ms": chunk.tftt_ms,
+                        "total_ms": chunk.total_ms,
+                        "tokens": chunk.tokens,
+                        "tokens_per_s": chunk.tokens_per_s,
+                    },
+                }
+    
+    async def _ask(self, messages: List[Dict[str, Any]], klass: str) -> Any:
+        if self.hedging:
+            return await self.model_manager.ask_hedged(messages, klass=klass)
+        return await self.model_manager.ask(messages)
+    
     async def _execute_tools(self, tool_calls: List[Dict[str, Any]]) -> List[Any]:
         """Execute tool calls and return results"""
         results = []
@@ -222,6 +272,12 @@ class MockOpenAIAdapter:
             text="Mock OpenAI response - API key not configured",
             provider="mock-openai"
         )
+    
+    async def stream_chat(self, messages, tools=None):
+        from llm.manager import TokenMeter
+        meter = TokenMeter(self.name)
+        yield meter.chunk("Mock OpenAI response - API key not configured")
+        yield meter.done()
 
 class MockModelManager:
     """Mock model manager for development"""
@@ -236,5 +292,14 @@ class MockModelManager:
             provider="mock"
         )
     
+    async def stream_chat(self, messages, tools=None):
+        from llm.manager import TokenMeter
+        meter = TokenMeter("mock")
+        yield meter.chunk("Mock response - models not properly configured")
+        yield meter.done()
+    
     def get_status(self):
-        return {"status": "mock", "message": "Development mode - models not configured"}
\ No newline at end of file
+        return {"status": "mock", "message": "Development mode - models not configured"}
+    
+    async def stop(self):
+        pass
\ No newline at end of file
@@ -3,8 +3,10 @@ FastAPI router for LLM coordination endpoints
 """
 
 from fastapi import APIRouter, HTTPException, BackgroundTasks
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
 from typing import Dict, List, Any, Optional
+import json
 import logging
 
 from llm_coordinator import LLMCoordinator
@@ -22,6 +24,11 @@ def get_coordinator() -> LLMCoordinator:
         coordinator = LLMCoordinator()
     return coordinator
 
+async def shutdown() -> None:
+    """Stop the coordinator's background tasks (idle probes) if it was ever created"""
+    if coordinator is not None:
+        await coordinator.aclose()
+
 class ChatRequest(BaseModel):
     """Chat request model"""
     message: str = Field(..., description="User message")
@@ -58,6 +65,25 @@ async def chat(request: ChatRequest):
         logger.error(f"Chat request failed: {e}")
         raise HTTPException(status_code=500, detail=f"Chat processing failed: {e}")
 
+@router.post("/chat/stream")
+async def chat_stream(request: ChatRequest):
+    """
+    Stream the answer as server-sent events so TTS/UI can start on the first tokens.
+    
+    Events: ``chunk`` (text delta) and a final ``done`` with provider and timing.
+    """
+    coord = get_coordinator()
+    
+    async def gen():
+        try:
+            async for event in coord.stream_request(request.message, history=request.history):
+                yield f"data: {json.dumps(event, ensure_ascii=False)}\n\n"
+        except Exception as e:
+            logger.error(f"Chat stream failed: {e}")
+            yield f"data: {json.dumps({'type': 'error', 'error': str(e)}, ensure_ascii=False)}\n\n"
+    
+    return StreamingResponse(gen(), media_type="text/event-stream")
+
 @router.get("/status")
 async def get_status():
     """
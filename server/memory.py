@@ -1,36 +1,323 @@
 from __future__ import annotations
 
+import functools
+import hashlib
+import inspect
+import itertools
+import json
 import sqlite3
 import os
+import re
+import threading
+import time
 from datetime import datetime
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Callable, Iterable, Tuple, Union
+
+import numpy as np
+
+from ann_index import IVFIndex
+from dedup import MinHasher, content_hash
+from partitions import PartitionedTable, month_key
+from query_cache import QueryCache
+from telemetry import (
+    RESOLUTIONS, ROLLUP_RETENTION_S, Reading, TimeLike, aggregate, choose_resolution, iso_utc,
+    parse_time, points_from_rows, rollup_table,
+)
+from text_chunker import iter_semantic_chunks
+from vector_index import VectorIndex, VectorLike, as_float32, encode_vector
+
+
+_FTS_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+# Append-only-tabeller partitioneras per månad bakom vyer med samma namn
+EVENTS = PartitionedTable(
+    "events",
+    "ts TEXT NOT NULL, topic TEXT NOT NULL, payload TEXT",
+    indexes=[("topic_ts", "topic, ts")],
+)
+CONVERSATIONS = PartitionedTable(
+    "conversations",
+    "session_id TEXT, ts TEXT NOT NULL, role TEXT NOT NULL, content TEXT NOT NULL, memory_id INTEGER, "
+    "FOREIGN KEY (memory_id) REFERENCES memories(id)",
+    indexes=[("session", "session_id, ts")],
+)
+
+
+# Taggnycklar som speglas till memory_tags (key, value, mem_id) så att filter kan köras i SQL
+INDEXED_TAG_KEYS = ("source", "filename", "chunked", "content_type", "provider")
+# Dubbletter slås bara ihop inom samma källa/fil, annars försvinner en andra fil ur taggfiltren
+DEDUP_SCOPE_TAGS = ("source", "filename")
+# Taggfiltrerad vektorsökning: k * TAG_OVERSAMPLE kandidater, upp till TAG_OVERSAMPLE_ROUNDS gånger
+TAG_OVERSAMPLE = 4
+TAG_OVERSAMPLE_ROUNDS = 3
+_TAG_KEYS_SQL = ", ".join(f"'{k}'" for k in INDEXED_TAG_KEYS)
+# json_each tål inte ogiltig JSON; sådana taggar indexeras helt enkelt inte
+_TAG_ROWS_SQL = (
+    "SELECT j.key, j.value, {mem_id} FROM {source}json_each(CASE WHEN json_valid({tags}) THEN {tags} END) AS j "
+    f"WHERE j.key IN ({_TAG_KEYS_SQL}) AND j.type NOT IN ('object', 'array', 'null')"
+)
+
+
+def _tag_filter_sql(tags: Optional[Dict[str, Any]], column: str = "m.id") -> Tuple[str, List[Any]]:
+    """Compile ``{key: value | [values]}`` into ``AND column IN (...)`` clauses over memory_tags.
+
+    >>> _tag_filter_sql({"source": "document_upload", "chunked": True})[0].count("memory_tags")
+    2
+    """
+    if not tags:
+        return "", []
+    clauses: List[str] = []
+    params: List[Any] = []
+    for key, value in sorted(tags.items()):
+        if key not in INDEXED_TAG_KEYS:
+            raise ValueError(f"tag {key!r} is not indexed; filterable tags: {', '.join(INDEXED_TAG_KEYS)}")
+        values = list(value) if isinstance(value, (list, tuple, set)) else [value]
+        if not values or any(v is None or not isinstance(v, (str, int, float)) for v in values):
+            raise ValueError(f"tag {key!r} filter must be a string/number/bool or a list of them")
+        # JSON true/false ligger som 1/0 i memory_tags, precis som Pythons bool binds
+        qmarks = ",".join(["?"] * len(values))
+        clauses.append(f" AND {column} IN (SELECT mem_id FROM memory_tags WHERE key = ? AND value IN ({qmarks}))")
+        params.extend([key, *values])
+    return "".join(clauses), params
+
+
+def _normalize_terms(terms: Iterable[str]) -> List[str]:
+    seen: Dict[str, None] = {}
+    for term in terms:
+        t = " ".join(_FTS_TOKEN_RE.findall((term or "").lower()))
+        if t:
+            seen.setdefault(t, None)
+    return list(seen)
+
+
+def build_fts_query(terms: Iterable[str], min_term_len: int = 3) -> str:
+    """Compile search terms into one OR-grouped FTS5 MATCH expression.
+
+    >>> build_fts_query(["Kalender", "agent core", "är"])
+    '"kalender"* OR "agent core"'
+    """
+    parts = []
+    for term in _normalize_terms(terms):
+        if " " in term:
+            parts.append(f'"{term}"')
+        elif len(term) >= min_term_len:
+            parts.append(f'"{term}"*')
+    return " OR ".join(parts)
+
+
+def _cache_key_part(value: Any, tokenize: bool) -> Any:
+    if value is None or isinstance(value, (bool, int, float)):
+        return value
+    if isinstance(value, str):
+        # FTS-baserade metoder tokeniserar ändå; övriga (LIKE '%…%', rå MATCH) nycklas på exakt sträng
+        return " ".join(_FTS_TOKEN_RE.findall(value.lower())) if tokenize else value
+    if isinstance(value, dict):
+        # Taggfilter: exakta värden (filnamn är skiftlägeskänsliga)
+        return json.dumps(value, sort_keys=True, default=sorted)
+    if isinstance(value, (bytes, np.ndarray)) or (
+        isinstance(value, (list, tuple)) and value and isinstance(value[0], (int, float))
+    ):
+        return hashlib.blake2b(as_float32(value).tobytes(), digest_size=16).hexdigest()
+    return tuple(sorted(_normalize_terms(value)))
+
+
+def _cached_query(tokenize: bool = False, hot_access: Optional[Callable[[Dict[str, Any]], bool]] = None):
+    """Serve a read method through ``self.query_cache`` when one is configured.
+
+    ``hot_access(arguments)`` tells whether the method counts hot-tier
+    accesses for a call; cache hits for such calls are counted too, so the
+    most repeated queries still reach promotion.
+    """
+    def decorator(method):
+        signature = inspect.signature(method)
+
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            cache = self.query_cache
+            if cache is None:
+                return method(self, *args, **kwargs)
+            key = (
+                method.__name__,
+                tuple(_cache_key_part(a, tokenize) for a in args),
+                tuple((k, _cache_key_part(v, tokenize)) for k, v in sorted(kwargs.items())),
+            )
+            computed = []
+
+            def compute():
+                computed.append(True)
+                return method(self, *args, **kwargs)
+
+            rows = cache.get_or_compute(key, compute)
+            # Kopior så att anropare kan mutera utan att förstöra cachen
+            rows = [dict(r) if isinstance(r, dict) else r for r in rows]
+            if not computed and rows and hot_access is not None and self.hot_tier is not None:
+                if hot_access(signature.bind(self, *args, **kwargs).arguments):
+                    self.hot_tier.record_access(rows)
+            return rows
+        return wrapper
+    return decorator
+
+
+def _invalidates_queries(method):
+    """Bump the query-cache generation after a write that can change search results"""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            if self.query_cache is not None:
+                self.query_cache.bump()
+    return wrapper
 
 
 class MemoryStore:
-    def __init__(self, db_path: str) -> None:
-        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+    def __init__(
+        self,
+        db_path: str,
+        pooled: bool = True,
+        cached_statements: int = 256,
+        vector_quantize: Optional[str] = None,
+        vector_index_mode: str = "exact",
+        vector_index_dir: Optional[str] = None,
+        ann_nprobe: int = 8,
+        query_cache: Optional[QueryCache] = None,
+        dedup: bool = True,
+        dedup_threshold: float = 0.85,
+        dedup_score_bump: float = 0.1,
+    ) -> None:
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
         self.db_path = db_path
+        # Thread-local connection pool: en uppkoppling per tråd, PRAGMAs körs en gång
+        self.pooled = pooled
+        self.cached_statements = cached_statements
+        self._local = threading.local()
+        self._pool_lock = threading.Lock()
+        self._pool: Dict[int, sqlite3.Connection] = {}
+        self._pool_generation = 0
+        self._connections_opened = 0
+        # Återanvändningar räknas per tråd (bara ägartråden skriver, inget lås i heta vägen);
+        # _connections_reused samlar upp räknare från stängda uppkopplingar
+        self._connections_reused = 0
+        self._reuse_counts: Dict[int, List[int]] = {}
+        # Lazily loaded in-process vector indexes, one per embedding model
+        # vector_index_mode: "exact" (VectorIndex) eller "ivf" (persisterad ANN-index)
+        self.vector_quantize = vector_quantize
+        self.vector_index_mode = (vector_index_mode or "exact").lower()
+        self.vector_index_dir = vector_index_dir or os.path.join(os.path.dirname(db_path) or ".", "vector_index")
+        self.ann_nprobe = ann_nprobe
+        self._vector_indexes: Dict[str, Union[VectorIndex, IVFIndex]] = {}
+        self._vector_lock = threading.Lock()
+        # Valfri resultatcache för retrieval, invalideras av skrivningar
+        self.query_cache = query_cache
+        # Dubblettsammanslagning vid inläsning: exakt SHA-256 + MinHash/LSH för nära dubbletter
+        self.minhasher = MinHasher() if dedup else None
+        self.dedup_threshold = dedup_threshold
+        self.dedup_score_bump = dedup_score_bump
+        self._dedup_counts = {"inserted": 0, "exact": 0, "near": 0}
+        # Valfri write-behind-journal för append_event (event_journal.EventJournal)
+        self.event_journal = None
+        # Valfria minnesresidenta verktygsräknare (tool_stats.ToolStatsCounters)
+        self.tool_counters = None
+        # Valfri het nivå i minnet framför memories/memories_fts (memory_tiers.HotTier)
+        self.hot_tier = None
+        # Kända månadspartitioner per tabell (sorterade nycklar, t.ex. "202610")
+        self._partition_keys: Dict[str, List[str]] = {}
+        self._partition_lock = threading.Lock()
         self._init()
+        self._init_partitions()
 
-    def _conn(self) -> sqlite3.Connection:
-        conn = sqlite3.connect(self.db_path, check_same_thread=False)
+    def _open_connection(self) -> sqlite3.Connection:
+        # cached_statements ger återanvändning av prepared statements per uppkoppling
+        conn = sqlite3.connect(
+            self.db_path,
+            check_same_thread=False,
+            cached_statements=self.cached_statements,
+        )
         conn.execute("PRAGMA journal_mode=WAL;")
         conn.execute("PRAGMA synchronous=NORMAL;")
+        conn.execute("PRAGMA busy_timeout=5000;")
+        with self._pool_lock:
+            self._connections_opened += 1
+        return conn
+
+    def _conn(self) -> sqlite3.Connection:
+        """Return this thread's pooled connection (opened lazily).
+
+        The connection is long-lived, so ``with self._conn() as c:`` only
+        commits/rolls back the transaction - it does not close anything.
+        """
+        if not self.pooled:
+            return self._open_connection()
+
+        conn = getattr(self._local, "conn", None)
+        if conn is not None and getattr(self._local, "generation", -1) == self._pool_generation:
+            self._local.reuses[0] += 1
+            return conn
+
+        conn = self._open_connection()
+        ident = threading.get_ident()
+        reuses = [0]
+        with self._pool_lock:
+            self._prune_dead_threads()
+            stale = self._pool.pop(ident, None)
+            self._retire_reuses(ident)
+            self._pool[ident] = conn
+            self._reuse_counts[ident] = reuses
+            generation = self._pool_generation
+        if stale is not None and stale is not conn:
+            try:
+                stale.close()
+            except Exception:
+                pass
+        self._local.conn = conn
+        self._local.generation = generation
+        self._local.reuses = reuses
         return conn
 
+    def _retire_reuses(self, ident: int) -> None:
+        # Anropas med _pool_lock hållen
+        counter = self._reuse_counts.pop(ident, None)
+        if counter is not None:
+            self._connections_reused += counter[0]
+
+    def _prune_dead_threads(self) -> None:
+        # Anropas med _pool_lock hållen; stänger uppkopplingar för trådar som avslutats
+        alive = {t.ident for t in threading.enumerate()}
+        for ident in [i for i in self._pool if i not in alive]:
+            self._retire_reuses(ident)
+            try:
+                self._pool.pop(ident).close()
+            except Exception:
+                pass
+
+    def close(self) -> None:
+        """Close every pooled connection. The store reopens lazily on next use."""
+        with self._pool_lock:
+            conns = list(self._pool.values())
+            self._pool.clear()
+            for ident in list(self._reuse_counts):
+                self._retire_reuses(ident)
+            self._pool_generation += 1
+        for conn in conns:
+            try:
+                conn.close()
+            except Exception:
+                pass
+        self._local = threading.local()
+
+    def pool_stats(self) -> Dict[str, Any]:
+        """Connection pool health surface for /api/health and /api/metrics"""
+        with self._pool_lock:
+            return {
+                "pooled": self.pooled,
+                "open_connections": len(self._pool),
+                "connections_opened": self._connections_opened,
+                "connections_reused": self._connections_reused + sum(c[0] for c in self._reuse_counts.values()),
+                "cached_statements": self.cached_statements,
+            }
+
     def _init(self) -> None:
         with self._conn() as c:
-            c.execute(
-                """
-                CREATE TABLE IF NOT EXISTS events (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    ts TEXT NOT NULL,
-                    topic TEXT NOT NULL,
-                    payload TEXT
-                )
-                """
-            )
-            c.execute("CREATE INDEX IF NOT EXISTS idx_events_topic_ts ON events(topic, ts)")
             c.execute(
                 """
                 CREATE TABLE IF NOT EXISTS memories (
@@ -90,21 +377,35 @@ class MemoryStore:
                 """
             )
             c.execute("CREATE INDEX IF NOT EXISTS idx_sensor_ts ON sensor_timeseries(sensor, ts)")
-            # Conversation context tracking
-            c.execute(
-                """
-                CREATE TABLE IF NOT EXISTS conversations (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    session_id TEXT,
-                    ts TEXT NOT NULL,
-                    role TEXT NOT NULL,
-                    content TEXT NOT NULL,
-                    memory_id INTEGER,
-                    FOREIGN KEY (memory_id) REFERENCES memories(id)
+            # Rollups per minut/timme/dygn (telemetry.py), uppdateras inkrementellt vid inläsning
+            for name, width in RESOLUTIONS.items():
+                table = rollup_table(name)
+                exists = c.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name = ?", (table,)).fetchone()
+                c.execute(
+                    f"""
+                    CREATE TABLE IF NOT EXISTS {table} (
+                        sensor TEXT NOT NULL,
+                        bucket INTEGER NOT NULL,  -- epoch-sekunder, hinkens start
+                        count INTEGER NOT NULL,
+                        sum REAL NOT NULL,
+                        min REAL,
+                        max REAL,
+                        PRIMARY KEY (sensor, bucket)
+                    ) WITHOUT ROWID
+                    """
                 )
-                """
-            )
-            c.execute("CREATE INDEX IF NOT EXISTS idx_conversations_session ON conversations(session_id, ts)")
+                if not exists:
+                    # Ny tabell i en befintlig databas: bygg från råa rader en gång
+                    c.execute(
+                        f"""
+                        INSERT INTO {table} (sensor, bucket, count, sum, min, max)
+                        SELECT sensor, (CAST(strftime('%s', ts) AS INTEGER) / {width}) * {width} AS b,
+                               COUNT(value), SUM(value), MIN(value), MAX(value)
+                        FROM sensor_timeseries
+                        WHERE value IS NOT NULL
+                        GROUP BY sensor, b
+                        """
+                    )
             # Embeddings för semantisk sökning
             c.execute(
                 """
@@ -118,6 +419,56 @@ class MemoryStore:
                 """
             )
             c.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_model ON embeddings(model)")
+            self._migrate_embeddings_to_blob(c)
+            # Checkpoint för bakgrunds-backfill av embeddings, en rad per modell
+            c.execute(
+                """
+                CREATE TABLE IF NOT EXISTS embedding_backfill (
+                    model TEXT PRIMARY KEY,
+                    last_id INTEGER NOT NULL DEFAULT 0,
+                    embedded INTEGER NOT NULL DEFAULT 0,
+                    updated_ts TEXT
+                )
+                """
+            )
+            # Fingeravtryck för dubblettdetektering (dedup.py); LSH-band som egna rader
+            c.execute(
+                """
+                CREATE TABLE IF NOT EXISTS memory_fingerprints (
+                    mem_id INTEGER PRIMARY KEY,
+                    sha256 BLOB NOT NULL,
+                    minhash BLOB            -- uint16-signatur, NULL för korta texter
+                )
+                """
+            )
+            c.execute("CREATE INDEX IF NOT EXISTS idx_memory_fingerprints_sha ON memory_fingerprints(sha256)")
+            c.execute(
+                """
+                CREATE TABLE IF NOT EXISTS memory_lsh (
+                    bucket INTEGER NOT NULL,
+                    mem_id INTEGER NOT NULL,
+                    PRIMARY KEY (bucket, mem_id)
+                ) WITHOUT ROWID
+                """
+            )
+            # Raderade eller omskrivna minnen ska inte längre matcha som dubbletter. LSH-rader
+            # lämnas kvar (inget index på mem_id): kandidater utan fingeravtryck ignoreras
+            # och AUTOINCREMENT återanvänder aldrig id:n
+            c.execute(
+                """
+                CREATE TRIGGER IF NOT EXISTS memories_fp_ad AFTER DELETE ON memories BEGIN
+                    DELETE FROM memory_fingerprints WHERE mem_id = old.id;
+                END;
+                """
+            )
+            c.execute(
+                """
+                CREATE TRIGGER IF NOT EXISTS memories_fp_au AFTER UPDATE OF text ON memories BEGIN
+                    DELETE FROM memory_fingerprints WHERE mem_id = old.id;
+                END;
+                """
+            )
+            self._init_tag_index(c)
             # FTS5 for BM25 retrieval (external content table referencing memories)
             try:
                 c.execute(
@@ -141,9 +492,13 @@ class MemoryStore:
                     END;
                     """
                 )
+                # Bara textändringar ska indexera om FTS (inte score/tags-uppdateringar)
+                row = c.execute("SELECT sql FROM sqlite_master WHERE type='trigger' AND name='memories_au'").fetchone()
+                if row and "UPDATE OF text" not in row[0]:
+                    c.execute("DROP TRIGGER memories_au")
                 c.execute(
                     """
-                    CREATE TRIGGER IF NOT EXISTS memories_au AFTER UPDATE ON memories BEGIN
+                    CREATE TRIGGER IF NOT EXISTS memories_au AFTER UPDATE OF text ON memories BEGIN
                         INSERT INTO memories_fts(memories_fts, rowid, text) VALUES('delete', old.id, old.text);
                         INSERT INTO memories_fts(rowid, text) VALUES (new.id, new.text);
                     END;
@@ -153,6 +508,119 @@ class MemoryStore:
                 # FTS5 may be unavailable; skip without failing init
                 pass
 
+    def _init_tag_index(self, c: sqlite3.Connection) -> None:
+        # Sidotabell för utvalda taggnycklar, hålls i synk av triggers på memories
+        exists = c.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='memory_tags'").fetchone()
+        c.execute(
+            """
+            CREATE TABLE IF NOT EXISTS memory_tags (
+                key TEXT NOT NULL,
+                value NOT NULL,         -- JSON-värdet; true/false lagras som 1/0
+                mem_id INTEGER NOT NULL,
+                PRIMARY KEY (key, value, mem_id)
+            ) WITHOUT ROWID
+            """
+        )
+        c.execute("CREATE INDEX IF NOT EXISTS idx_memory_tags_mem ON memory_tags(mem_id)")
+        # Triggrarna bär nyckellistan; ändras INDEXED_TAG_KEYS byggs indexet om
+        row = c.execute("SELECT sql FROM sqlite_master WHERE type='trigger' AND name='memories_tags_ai'").fetchone()
+        rebuild = not exists or row is None or _TAG_KEYS_SQL not in row[0]
+        if row is not None and rebuild:
+            for name in ("memories_tags_ai", "memories_tags_au", "memories_tags_ad"):
+                c.execute(f"DROP TRIGGER IF EXISTS {name}")
+        new_rows = _TAG_ROWS_SQL.format(mem_id="new.id", tags="new.tags", source="")
+        c.execute(
+            f"""
+            CREATE TRIGGER IF NOT EXISTS memories_tags_ai AFTER INSERT ON memories BEGIN
+                INSERT OR IGNORE INTO memory_tags (key, value, mem_id) {new_rows};
+            END;
+            """
+        )
+        c.execute(
+            f"""
+            CREATE TRIGGER IF NOT EXISTS memories_tags_au AFTER UPDATE OF tags ON memories BEGIN
+                DELETE FROM memory_tags WHERE mem_id = old.id;
+                INSERT OR IGNORE INTO memory_tags (key, value, mem_id) {new_rows};
+            END;
+            """
+        )
+        c.execute(
+            """
+            CREATE TRIGGER IF NOT EXISTS memories_tags_ad AFTER DELETE ON memories BEGIN
+                DELETE FROM memory_tags WHERE mem_id = old.id;
+            END;
+            """
+        )
+        if rebuild:
+            c.execute("DELETE FROM memory_tags")
+            rows = _TAG_ROWS_SQL.format(mem_id="m.id", tags="m.tags", source="memories AS m, ")
+            c.execute(f"INSERT OR IGNORE INTO memory_tags (key, value, mem_id) {rows}")
+
+    def _tagged_ids(self, tags: Dict[str, Any]) -> List[int]:
+        """Ids of memories matching every tag filter, resolved from memory_tags alone"""
+        where, params = _tag_filter_sql(tags, column="mem_id")
+        with self._conn() as c:
+            cur = c.execute(f"SELECT DISTINCT mem_id FROM memory_tags WHERE 1=1{where}", params)
+            return [int(r[0]) for r in cur.fetchall()]
+
+    def _init_partitions(self) -> None:
+        # Äldre databaser har events/conversations som vanliga tabeller: flytta raderna en gång
+        c = self._conn()
+        key = month_key(datetime.utcnow().isoformat())
+        for table in (EVENTS, CONVERSATIONS):
+            table.migrate(c)
+            self._partition_keys[table.name] = table.ensure(c, key)
+
+    def _partition_for(self, table: PartitionedTable, ts: str) -> str:
+        key = month_key(ts)
+        if key not in self._partition_keys.get(table.name, ()):
+            with self._partition_lock:
+                self._partition_keys[table.name] = table.ensure(self._conn(), key)
+        return key
+
+    def _insert_partitioned(
+        self, c: sqlite3.Connection, table: PartitionedTable, key: str, sql: str, params: Any, many: bool = False
+    ) -> sqlite3.Cursor:
+        # sql innehåller "{table}"; sen skrivning till en äldre månad synkar id-sekvenserna runt insättningen
+        late = key != self._partition_keys[table.name][-1]
+        if late:
+            table.sync_sequences(c)
+        sql = sql.format(table=table.partition(key))
+        cur = c.executemany(sql, params) if many else c.execute(sql, params)
+        if late:
+            table.sync_sequences(c)
+        return cur
+
+    def partition_stats(self) -> Dict[str, List[str]]:
+        """Monthly partitions per partitioned table, oldest first"""
+        return {name: list(keys) for name, keys in self._partition_keys.items()}
+
+    def drop_partitions_before(self, table_name: str, cutoff_ts: str) -> int:
+        """Drop whole months older than ``cutoff_ts``; returns the number of rows removed"""
+        table = {EVENTS.name: EVENTS, CONVERSATIONS.name: CONVERSATIONS}[table_name]
+        keep = month_key(datetime.utcnow().isoformat())
+        with self._partition_lock:
+            _, rows = table.drop_before(self._conn(), cutoff_ts, keep)
+            self._partition_keys[table.name] = table.list_keys(self._conn())
+        return rows
+
+    def _migrate_embeddings_to_blob(self, c: sqlite3.Connection, batch: int = 1000) -> None:
+        # Äldre databaser lagrade vektorer som JSON-text; konvertera till float32 BLOB
+        while True:
+            rows = c.execute(
+                "SELECT mem_id, vector FROM embeddings WHERE typeof(vector) = 'text' LIMIT ?",
+                (batch,),
+            ).fetchall()
+            if not rows:
+                return
+            updates = []
+            for mem_id, vector in rows:
+                try:
+                    updates.append((encode_vector(vector), mem_id))
+                except Exception:
+                    updates.append((None, mem_id))
+            c.executemany("UPDATE embeddings SET vector = ? WHERE mem_id = ?", updates)
+
     def ping(self) -> bool:
         try:
             with self._conn() as c:
@@ -162,129 +630,61 @@ class MemoryStore:
             return False
 
     def append_event(self, topic: str, payload: Optional[str]) -> None:
+        if self.event_journal is not None:
+            # Write-behind: gruppcommit från journalens bakgrundstråd
+            self.event_journal.append(topic, payload)
+            return
         ts = datetime.utcnow().isoformat() + "Z"
+        key = self._partition_for(EVENTS, ts)
         with self._conn() as c:
-            c.execute(
-                "INSERT INTO events (ts, topic, payload) VALUES (?, ?, ?)",
-                (ts, topic, payload),
+            self._insert_partitioned(
+                c, EVENTS, key, "INSERT INTO {table} (ts, topic, payload) VALUES (?, ?, ?)", (ts, topic, payload)
             )
 
+    def write_events(self, rows: List[Tuple[str, str, Optional[str]]], synchronous: Optional[str] = None) -> None:
+        """Insert ``(ts, topic, payload)`` rows in one transaction (event journal group commit)"""
+        if not rows:
+            return
+        by_month: Dict[str, List[Tuple[str, str, Optional[str]]]] = {}
+        for row in rows:
+            by_month.setdefault(self._partition_for(EVENTS, row[0]), []).append(row)
+        c = self._conn()
+        if synchronous and synchronous != "NORMAL":
+            c.execute(f"PRAGMA synchronous={synchronous};")
+        try:
+            with c:
+                for key, month_rows in by_month.items():
+                    self._insert_partitioned(
+                        c, EVENTS, key, "INSERT INTO {table} (ts, topic, payload) VALUES (?, ?, ?)", month_rows, many=True
+                    )
+        finally:
+            if synchronous and synchronous != "NORMAL":
+                c.execute("PRAGMA synchronous=NORMAL;")
+
     # --- Memories (text) ---
     def _chunk_text_semantically(self, text: str, max_chunk_size: int = 600) -> List[str]:
         """Enhanced text chunking with header preservation and overlapping"""
         if len(text) <= max_chunk_size:
             return [text]
-        
-        chunks = []
-        overlap_size = max_chunk_size // 5  # 20% overlap (120 chars for 600 char chunks)
-        
-        # Extract headers for context inheritance
-        lines = text.split('\n')
-        current_headers = []
-        
-        # First split by double newlines (paragraphs) 
-        paragraphs = text.split('\n\n')
-        
-        current_chunk = ""
-        
-        for paragraph in paragraphs:
-            # Check if paragraph contains headers (markdown or html)
-            paragraph_headers = []
-            for line in paragraph.split('\n'):
-                line = line.strip()
-                # Markdown headers or HTML headers
-                if (line.startswith('#') or 
-                    line.startswith('<h') or 
-                    (line.isupper() and len(line.split()) <= 10)):
-                    paragraph_headers.append(line)
-                    if line not in current_headers:
-                        current_headers.append(line)
-            
-            # Build chunk with header context
-            header_context = '\n'.join(current_headers[-3:]) if current_headers else ""  # Keep last 3 headers
-            chunk_prefix = header_context + '\n\n' if header_context and header_context not in current_chunk else ""
-            # If paragraph alone is too long, split by sentences with overlap
-            if len(paragraph) > max_chunk_size:
-                # Split by sentence endings
-                sentences = []
-                for delimiter in ['. ', '! ', '? ', '.\n', '!\n', '?\n']:
-                    if delimiter in paragraph:
-                        parts = paragraph.split(delimiter)
-                        for i, part in enumerate(parts[:-1]):
-                            sentences.append(part + delimiter.strip())
-                        if parts[-1].strip():
-                            sentences.append(parts[-1])
-                        break
-                else:
-                    # No sentence delimiters found, split by length with overlap
-                    sentences = []
-                    for i in range(0, len(paragraph), max_chunk_size - overlap_size):
-                        chunk_end = min(i + max_chunk_size, len(paragraph))
-                        sentences.append(paragraph[i:chunk_end])
-                
-                # Process sentences with overlapping
-                for sentence in sentences:
-                    full_content = chunk_prefix + current_chunk + (' ' if current_chunk else '') + sentence
-                    
-                    if len(full_content) > max_chunk_size:
-                        if current_chunk.strip():
-                            # Add overlap from end of current chunk
-                            final_chunk = chunk_prefix + current_chunk
-                            chunks.append(final_chunk.strip())
-                        
-                        # Start new chunk with overlap from previous
-                        if current_chunk and len(current_chunk) > overlap_size:
-                            overlap_text = current_chunk[-overlap_size:]
-                            current_chunk = overlap_text + ' ' + sentence
-                        else:
-                            current_chunk = chunk_prefix + sentence
-                    else:
-                        current_chunk += (' ' if current_chunk else '') + sentence
-            else:
-                # Normal paragraph processing with header context
-                full_content = chunk_prefix + current_chunk + ('\n\n' if current_chunk else '') + paragraph
-                
-                if len(full_content) > max_chunk_size:
-                    if current_chunk.strip():
-                        # Finalize current chunk
-                        final_chunk = chunk_prefix + current_chunk
-                        chunks.append(final_chunk.strip())
-                    
-                    # Start new chunk with overlap
-                    if current_chunk and len(current_chunk) > overlap_size:
-                        overlap_text = current_chunk[-overlap_size:]
-                        current_chunk = overlap_text + '\n\n' + paragraph
-                    else:
-                        current_chunk = chunk_prefix + paragraph
-                else:
-                    current_chunk += ('\n\n' if current_chunk else '') + paragraph
-        
-        # Add final chunk
-        if current_chunk.strip():
-            final_chunk = (header_context + '\n\n' if header_context and header_context not in current_chunk else "") + current_chunk
-            chunks.append(final_chunk.strip())
-        
+        chunks = list(iter_semantic_chunks([text], max_chunk_size))
         return chunks if chunks else [text]
 
+    @_invalidates_queries
     def upsert_text_memory(self, text: str, score: float = 0.0, tags_json: Optional[str] = None, auto_chunk: bool = True) -> List[int]:
         """Insert text memory with optional semantic chunking for long texts"""
         if not auto_chunk or len(text) <= 500:
             # Single memory entry
             ts = datetime.utcnow().isoformat() + "Z"
             with self._conn() as c:
-                cur = c.execute(
-                    "INSERT INTO memories (ts, kind, text, score, tags) VALUES (?, 'text', ?, ?, ?)",
-                    (ts, text, score, tags_json),
-                )
-                return [int(cur.lastrowid)]
+                ids = self._upsert_text_rows(c, [(ts, text, score, tags_json)])[0]
+            self._sync_hot(ids)
+            return ids
         
         # Chunked memory entries
         chunks = self._chunk_text_semantically(text)
-        memory_ids = []
         ts = datetime.utcnow().isoformat() + "Z"
         
         # Add chunk metadata to tags
-        import json
         base_tags = json.loads(tags_json) if tags_json else {}
         base_tags.update({
             "chunked": True,
@@ -292,169 +692,630 @@ class MemoryStore:
             "original_length": len(text)
         })
         
+        rows = []
+        for i, chunk in enumerate(chunks):
+            chunk_tags = base_tags.copy()
+            chunk_tags["chunk_index"] = i
+            rows.append((ts, chunk, score, json.dumps(chunk_tags, ensure_ascii=False)))
         with self._conn() as c:
-            for i, chunk in enumerate(chunks):
-                chunk_tags = base_tags.copy()
-                chunk_tags["chunk_index"] = i
-                chunk_tags_json = json.dumps(chunk_tags, ensure_ascii=False)
-                
-                cur = c.execute(
-                    "INSERT INTO memories (ts, kind, text, score, tags) VALUES (?, 'text', ?, ?, ?)",
-                    (ts, chunk, score, chunk_tags_json),
+            ids = self._upsert_text_rows(c, rows)[0]
+        self._sync_hot(ids)
+        return ids
+
+    def _sync_hot(self, ids: Iterable[int]) -> None:
+        """Offer rows just committed to disk to the hot tier (no-op without one)"""
+        if self.hot_tier is None:
+            return
+        ids = list(dict.fromkeys(int(i) for i in ids))
+        if ids:
+            self.hot_tier.offer(self._memory_rows(ids))
+
+    def _memory_rows(self, ids: List[int]) -> List[Tuple[int, str, str, str, float, Optional[str]]]:
+        with self._conn() as c:
+            cur = c.execute(
+                """
+                SELECT id, ts, kind, text, score, tags FROM memories
+                WHERE kind='text' AND id IN (SELECT value FROM json_each(?))
+                """,
+                (json.dumps(ids),),
+            )
+            return [tuple(r) for r in cur.fetchall()]
+
+    def load_hot_candidates(
+        self, cutoff_ts: str, min_score: float, max_items: int, promoted_ids: Iterable[int] = ()
+    ) -> List[Tuple[int, str, str, str, float, Optional[str]]]:
+        """Rows for the hot tier: newer than ``cutoff_ts`` or ``score >= min_score``
+        (newest first, at most ``max_items``), plus ``promoted_ids``"""
+        with self._conn() as c:
+            cur = c.execute(
+                """
+                SELECT id, ts, kind, text, score, tags FROM memories
+                WHERE kind='text' AND (ts >= ? OR score >= ?)
+                ORDER BY ts DESC
+                LIMIT ?
+                """,
+                (cutoff_ts, min_score, max_items),
+            )
+            rows = [tuple(r) for r in cur.fetchall()]
+        seen = {r[0] for r in rows}
+        extra = [int(i) for i in promoted_ids if int(i) not in seen]
+        if extra:
+            rows.extend(self._memory_rows(extra))
+        return rows
+
+    @staticmethod
+    def _dedup_scope(tags_json: Optional[str]) -> Tuple[Any, ...]:
+        """``(source, filename)`` of a row; duplicates only merge within the same scope"""
+        try:
+            tags = json.loads(tags_json) if tags_json else {}
+        except (TypeError, ValueError):
+            tags = {}
+        if not isinstance(tags, dict):
+            tags = {}
+        return tuple(
+            v if isinstance(v, (str, int, float)) else None for v in (tags.get(k) for k in DEDUP_SCOPE_TAGS)
+        )
+
+    @staticmethod
+    def _dedup_scope_sql(scope: Tuple[Any, ...]) -> Tuple[str, List[Any]]:
+        # Samma värde för varje scope-tagg, eller taggen saknas på båda sidor
+        clauses: List[str] = []
+        params: List[Any] = []
+        for key, value in zip(DEDUP_SCOPE_TAGS, scope):
+            if value is None:
+                clauses.append(" AND mem_id NOT IN (SELECT mem_id FROM memory_tags WHERE key = ?)")
+                params.append(key)
+            else:
+                clauses.append(" AND mem_id IN (SELECT mem_id FROM memory_tags WHERE key = ? AND value = ?)")
+                params.extend([key, value])
+        return "".join(clauses), params
+
+    def _find_duplicate(
+        self, c: sqlite3.Connection, sha: bytes, sig: Optional[np.ndarray], scope: Tuple[Any, ...] = (None, None)
+    ) -> Optional[Tuple[int, str]]:
+        where, params = self._dedup_scope_sql(scope)
+        row = c.execute(f"SELECT mem_id FROM memory_fingerprints WHERE sha256 = ?{where} LIMIT 1", (sha, *params)).fetchone()
+        if row is not None:
+            return int(row[0]), "exact"
+        if sig is None:
+            return None
+        keys = self.minhasher.band_keys(sig)
+        qmarks = ",".join(["?"] * len(keys))
+        # Kandidater delar minst ett LSH-band; verifiera mot signaturen (begränsat för heta band)
+        candidates = c.execute(
+            f"""
+            SELECT mem_id, minhash FROM memory_fingerprints
+            WHERE mem_id IN (SELECT mem_id FROM memory_lsh WHERE bucket IN ({qmarks}) LIMIT 200){where}
+            """,
+            (*keys, *params),
+        ).fetchall()
+        best, best_sim = None, self.dedup_threshold
+        for mem_id, blob in candidates:
+            if blob is None:
+                continue
+            sim = MinHasher.similarity(sig, np.frombuffer(blob, dtype=np.uint16))
+            if sim >= best_sim:
+                best, best_sim = int(mem_id), sim
+        return (best, "near") if best is not None else None
+
+    def _upsert_text_rows(
+        self, c: sqlite3.Connection, rows: List[Tuple[str, str, float, Optional[str]]]
+    ) -> Tuple[List[int], List[int]]:
+        """Insert rows, merging duplicates into existing memories.
+
+        Duplicates only merge within the same ``source``/``filename`` tags, so a
+        chunk shared by two documents stays findable under both. A merged
+        memory takes the incoming text and tags (the newest version wins).
+
+        Returns ``(ids, inserted)``: one id per row (the existing memory for a
+        merged duplicate) and the ids that were actually inserted.
+        """
+        if self.minhasher is None:
+            ids = self._insert_text_rows(c, rows)
+            return ids, ids
+        ids: List[Optional[int]] = []
+        merges: List[Tuple[float, str, Optional[str], int]] = []
+        rewrites: List[Tuple[str, int, bytes, Optional[np.ndarray]]] = []
+        fresh: List[Tuple[str, str, float, Optional[str]]] = []
+        fingerprints: List[Tuple[bytes, Optional[np.ndarray]]] = []
+        batch_shas: Dict[Tuple[bytes, Tuple[Any, ...]], int] = {}
+        for row in rows:
+            sha = content_hash(row[1])
+            scope = self._dedup_scope(row[3])
+            if (sha, scope) in batch_shas:
+                # Samma text två gånger i samma batch: båda pekar på den nya raden
+                ids.append(-1 - batch_shas[(sha, scope)])
+                continue
+            sig = self.minhasher.signature(row[1])
+            dup = self._find_duplicate(c, sha, sig, scope)
+            if dup is not None:
+                ids.append(dup[0])
+                merges.append((self.dedup_score_bump, row[0], row[3], dup[0]))
+                if dup[1] == "near":
+                    # Redigerad text: behåll den nya versionen, inte den gamla
+                    rewrites.append((row[1], dup[0], sha, sig))
+                self._dedup_counts[dup[1]] += 1
+                continue
+            batch_shas[(sha, scope)] = len(fresh)
+            ids.append(-1 - len(fresh))
+            fresh.append(row)
+            fingerprints.append((sha, sig))
+        if merges:
+            c.executemany("UPDATE memories SET score = COALESCE(score, 0) + ?, ts = ?, tags = ? WHERE id = ?", merges)
+        if rewrites:
+            # memories_fp_au tar bort fingeravtrycket; det nya skrivs nedan
+            c.executemany("UPDATE memories SET text = ? WHERE id = ?", [(text, mem_id) for text, mem_id, _, _ in rewrites])
+        inserted = self._insert_text_rows(c, fresh)
+        stamped = list(zip(inserted, fingerprints)) + [(mem_id, (sha, sig)) for _, mem_id, sha, sig in rewrites]
+        if stamped:
+            c.executemany(
+                "INSERT OR REPLACE INTO memory_fingerprints (mem_id, sha256, minhash) VALUES (?, ?, ?)",
+                [(i, sha, sig.tobytes() if sig is not None else None) for i, (sha, sig) in stamped],
+            )
+            c.executemany(
+                "INSERT OR IGNORE INTO memory_lsh (bucket, mem_id) VALUES (?, ?)",
+                [
+                    (key, i)
+                    for i, (_, sig) in stamped if sig is not None
+                    for key in self.minhasher.band_keys(sig)
+                ],
+            )
+        self._dedup_counts["inserted"] += len(inserted)
+        self._dedup_counts["exact"] += len(rows) - len(fresh) - len(merges)
+        return [inserted[-1 - i] if i < 0 else i for i in ids], inserted
+
+    def backfill_fingerprints(self, limit: int = 1000) -> int:
+        """Fingerprint up to ``limit`` memories stored before dedup existed; returns how many"""
+        if self.minhasher is None:
+            return 0
+        with self._conn() as c:
+            rows = c.execute(
+                """
+                SELECT id, text FROM memories m
+                WHERE kind = 'text' AND NOT EXISTS (SELECT 1 FROM memory_fingerprints f WHERE f.mem_id = m.id)
+                ORDER BY id
+                LIMIT ?
+                """,
+                (limit,),
+            ).fetchall()
+            fps, lsh = [], []
+            for mem_id, text in rows:
+                sig = self.minhasher.signature(text or "")
+                fps.append((mem_id, content_hash(text or ""), sig.tobytes() if sig is not None else None))
+                if sig is not None:
+                    lsh.extend((key, mem_id) for key in self.minhasher.band_keys(sig))
+            c.executemany("INSERT OR REPLACE INTO memory_fingerprints (mem_id, sha256, minhash) VALUES (?, ?, ?)", fps)
+            c.executemany("INSERT OR IGNORE INTO memory_lsh (bucket, mem_id) VALUES (?, ?)", lsh)
+        return len(rows)
+
+    def dedup_stats(self) -> Dict[str, Any]:
+        counts = dict(self._dedup_counts)
+        merged = counts["exact"] + counts["near"]
+        total = merged + counts["inserted"]
+        return {
+            "enabled": self.minhasher is not None,
+            "threshold": self.dedup_threshold,
+            **counts,
+            "merge_ratio": (merged / total) if total else 0.0,
+        }
+
+    def _insert_text_rows(self, c: sqlite3.Connection, rows: List[Tuple[str, str, float, Optional[str]]]) -> List[int]:
+        # Inom en skrivtransaktion får raderna rowid max+1 i tur och ordning, så id:na är sammanhängande
+        if not rows:
+            return []
+        c.executemany("INSERT INTO memories (ts, kind, text, score, tags) VALUES (?, 'text', ?, ?, ?)", rows)
+        last = c.execute("SELECT last_insert_rowid()").fetchone()[0]
+        return list(range(last - len(rows) + 1, last + 1))
+
+    @_invalidates_queries
+    def upsert_text_memory_stream(
+        self,
+        pieces: Iterable[str],
+        score: float = 0.0,
+        tags_json: Optional[str] = None,
+        batch_size: int = 500,
+        max_chunk_size: int = 600,
+    ) -> List[int]:
+        """Chunk streamed text (e.g. one PDF page at a time) into batched inserts.
+
+        Produces the same chunks as ``upsert_text_memory("".join(pieces))``.
+        Chunks are inserted ``batch_size`` at a time as they are produced, in
+        one transaction; ``total_chunks`` and ``original_length`` are known
+        only at the end and are filled in with one ``json_set`` update.
+        Chunks that duplicate an existing memory are merged into it.
+        """
+        it = iter(pieces)
+        head: List[str] = []
+        head_len = 0
+        for piece in it:
+            head.append(piece)
+            head_len += len(piece)
+            if head_len > max_chunk_size:
+                break
+        else:
+            return self.upsert_text_memory("".join(head), score, tags_json, auto_chunk=True)
+
+        total_length = 0
+
+        def counted() -> Iterable[str]:
+            nonlocal total_length
+            for piece in itertools.chain(head, it):
+                total_length += len(piece)
+                yield piece
+
+        base_tags = json.loads(tags_json) if tags_json else {}
+        base_tags.update({"chunked": True, "total_chunks": None, "original_length": None})
+        ts = datetime.utcnow().isoformat() + "Z"
+        ids: List[int] = []
+        with self._conn() as c:
+            batch = []
+            for i, chunk in enumerate(iter_semantic_chunks(counted(), max_chunk_size)):
+                batch.append((ts, chunk, score, json.dumps(dict(base_tags, chunk_index=i), ensure_ascii=False)))
+                if len(batch) >= batch_size:
+                    ids.extend(self._upsert_text_rows(c, batch)[0])
+                    batch = []
+            ids.extend(self._upsert_text_rows(c, batch)[0])
+            if ids:
+                # Sammanslagna dubbletter har tagit över den nya chunkens taggar och får också totalen
+                c.execute(
+                    """
+                    UPDATE memories
+                    SET tags = json_set(tags, '$.total_chunks', ?, '$.original_length', ?)
+                    WHERE id IN (SELECT value FROM json_each(?))
+                    """,
+                    (len(ids), total_length, json.dumps(list(dict.fromkeys(ids)))),
                 )
-                memory_ids.append(int(cur.lastrowid))
-        
-        return memory_ids
+        self._sync_hot(ids)
+        return ids
     
     def upsert_text_memory_single(self, text: str, score: float = 0.0, tags_json: Optional[str] = None) -> int:
         """Backward compatible version that returns single memory ID"""
         memory_ids = self.upsert_text_memory(text, score, tags_json, auto_chunk=False)
         return memory_ids[0]
 
-    def retrieve_text_memories(self, query: str, limit: int = 5):
+    @_cached_query()
+    def retrieve_text_memories(self, query: str, limit: int = 5, tags: Optional[Dict[str, Any]] = None):
         # Simple LIKE-based retrieval as a baseline; embeddings can replace this later
         like = f"%{query}%"
+        tag_where, tag_params = _tag_filter_sql(tags, column="id")
         with self._conn() as c:
             cur = c.execute(
-                """
+                f"""
                 SELECT id, ts, kind, text, score, tags
                 FROM memories
-                WHERE kind='text' AND (text LIKE ?)
+                WHERE kind='text' AND (text LIKE ?){tag_where}
                 ORDER BY score DESC, ts DESC
                 LIMIT ?
                 """,
-                (like, limit),
+                (like, *tag_params, limit),
             )
             rows = cur.fetchall()
             cols = [d[0] for d in cur.description]
             return [dict(zip(cols, r)) for r in rows]
 
-    def retrieve_text_bm25_recency(self, query: str, limit: int = 5, context_bonus: float = 0.0) -> List[Dict[str, Any]]:
-        """Advanced hybrid retrieval: FTS5 BM25 + recency + relevance + context.
-        Returns top items with optimized combined score.
+    @_cached_query(tokenize=True, hot_access=lambda call: call.get("tags") is None)
+    def retrieve_text_terms(
+        self,
+        terms: Iterable[str],
+        limit: int = 10,
+        min_term_len: int = 3,
+        tags: Optional[Dict[str, Any]] = None,
+    ) -> List[Dict[str, Any]]:
+        """Search an expanded term set with ONE FTS5 query.
+
+        Terms are OR-grouped into a single MATCH: single words become prefix
+        queries (``"kalend"*``), multi-word synonyms become phrases. Ranking is
+        BM25 computed in SQL, so no rows are loaded for rescoring in Python.
+        Falls back to one LIKE query over the same terms when FTS5 is missing.
+        ``tags`` (e.g. ``{"source": "document_upload"}``) is applied in SQL.
+        With a hot tier and no ``tags``, the hot set is searched first and
+        disk is only read when it has fewer than ``limit`` hits.
         """
+        match = build_fts_query(terms, min_term_len=min_term_len)
+        if not match:
+            return []
+        hot = self.hot_tier if tags is None else None
+        if hot is not None:
+            t0 = time.perf_counter()
+            out = hot.search_rows(match, limit)
+            if len(out) >= limit:
+                hot.record_latency("hot", (time.perf_counter() - t0) * 1000)
+                hot.record_access(out)
+                return out
+        tag_where, tag_params = _tag_filter_sql(tags)
         try:
+            t0 = time.perf_counter()
             with self._conn() as c:
                 cur = c.execute(
-                    """
+                    f"""
                     SELECT m.id, m.ts, m.kind, m.text, m.score, m.tags,
                            bm25(memories_fts) AS rank
                     FROM memories_fts
                     JOIN memories m ON m.id = memories_fts.rowid
-                    WHERE memories_fts MATCH ? AND m.kind='text'
-                    ORDER BY rank ASC
-                    LIMIT 100
+                    WHERE memories_fts MATCH ? AND m.kind='text'{tag_where}
+                    ORDER BY rank ASC, m.score DESC
+                    LIMIT ?
                     """,
-                    (query,)
+                    (match, *tag_params, limit),
+                )
+                rows = cur.fetchall()
+                cols = [d[0] for d in cur.description]
+                out = [dict(zip(cols, r)) for r in rows]
+            if hot is not None:
+                hot.record_latency("cold", (time.perf_counter() - t0) * 1000)
+                hot.record_access(out)
+            return out
+        except sqlite3.OperationalError:
+            words = [t for t in _normalize_terms(terms) if len(t) >= min_term_len]
+            if not words:
+                return []
+            where = " OR ".join(["text LIKE ?"] * len(words))
+            tag_where, tag_params = _tag_filter_sql(tags, column="id")
+            with self._conn() as c:
+                cur = c.execute(
+                    f"""
+                    SELECT id, ts, kind, text, score, tags
+                    FROM memories
+                    WHERE kind='text' AND ({where}){tag_where}
+                    ORDER BY score DESC, ts DESC
+                    LIMIT ?
+                    """,
+                    (*[f"%{w}%" for w in words], *tag_params, limit),
+                )
+                rows = cur.fetchall()
+                cols = [d[0] for d in cur.description]
+                return [dict(zip(cols, r)) for r in rows]
+
+    @_cached_query()
+    def retrieve_text_bm25_recency(
+        self, query: str, limit: int = 5, context_bonus: float = 0.0, tags: Optional[Dict[str, Any]] = None
+    ) -> List[Dict[str, Any]]:
+        """Advanced hybrid retrieval: FTS5 BM25 + recency + relevance + context.
+        Returns top items with optimized combined score.
+
+        BM25, recency tier (julianday age), explicit score and length bonus are
+        computed in SQL; only query-word coverage and context are added per row.
+        """
+        tag_where, tag_params = _tag_filter_sql(tags)
+        try:
+            with self._conn() as c:
+                cur = c.execute(
+                    f"""
+                    SELECT id, ts, kind, text, score, tags, rank,
+                           MAX(0.0, 10.0 - rank) * 1.0
+                           + CASE
+                               WHEN age_h IS NULL THEN 0.0
+                               WHEN age_h < 1 THEN 5.0
+                               WHEN age_h < 24 THEN 3.0
+                               WHEN age_h < 168 THEN 2.0
+                               ELSE MAX(0.0, 1.0 - age_h / 24.0 / 60.0)
+                             END * 0.8
+                           + COALESCE(score, 0.0) * 0.5
+                           + CASE
+                               WHEN length(text) BETWEEN 50 AND 500 THEN 1.0
+                               WHEN length(text) > 500 THEN 0.5
+                               ELSE 0.3
+                             END * 0.3 AS base_score
+                    FROM (
+                        SELECT m.id, m.ts, m.kind, m.text, m.score, m.tags,
+                               COALESCE(bm25(memories_fts), 100.0) AS rank,
+                               (julianday('now') - julianday(m.ts)) * 24.0 AS age_h
+                        FROM memories_fts
+                        JOIN memories m ON m.id = memories_fts.rowid
+                        WHERE memories_fts MATCH ? AND m.kind='text'{tag_where}
+                        ORDER BY rank ASC
+                        LIMIT 100
+                    )
+                    """,
+                    (query, *tag_params)
                 )
                 rows = cur.fetchall()
                 cols = [d[0] for d in cur.description]
                 items = [dict(zip(cols, r)) for r in rows]
         except Exception:
             # FTS not available; fallback to LIKE
-            return self.retrieve_text_memories(query, limit)
+            return self.retrieve_text_memories(query, limit, tags=tags)
 
         if not items:
             return []
 
-        # Advanced multi-factor scoring
-        now = datetime.utcnow()
-        def to_dt(ts: str) -> Optional[datetime]:
-            if not ts:
-                return None
-            t = ts.rstrip("Z")
-            try:
-                return datetime.fromisoformat(t)
-            except Exception:
-                return None
-
+        query_words = set(query.lower().split())
         rescored = []
-        query_lower = query.lower()
-        query_words = set(query_lower.split())
-        
         for it in items:
-            # 1. BM25 relevance (lower rank = higher relevance)
-            bm25_score = max(0.0, 10.0 - float(it.get("rank") or 100.0))
-            
-            # 2. Recency with improved decay
-            ts = to_dt(str(it.get("ts") or ""))
-            if ts:
-                age_hours = (now - ts).total_seconds() / 3600.0
-                # Multi-tier recency: bonus for very recent, gradual decay
-                if age_hours < 1:
-                    recency = 5.0  # Very recent
-                elif age_hours < 24:
-                    recency = 3.0  # Same day
-                elif age_hours < 168:  # 1 week
-                    recency = 2.0
-                else:
-                    age_days = age_hours / 24.0
-                    recency = max(0.0, 1.0 - (age_days / 60.0))  # Decay over 2 months
-            else:
-                recency = 0.0
-            
-            # 3. Explicit score (user/system assigned importance)
-            explicit = float(it.get("score") or 0.0)
-            
-            # 4. Text quality indicators
-            text = str(it.get("text") or "")
-            text_lower = text.lower()
-            
-            # Length bonus (neither too short nor too long)
-            length = len(text)
-            if 50 <= length <= 500:
-                length_bonus = 1.0
-            elif length > 500:
-                length_bonus = 0.5  # Long texts get reduced priority
-            else:
-                length_bonus = 0.3  # Very short texts get reduced priority
-            
-            # Query word coverage
-            text_words = set(text_lower.split())
-            coverage = len(query_words.intersection(text_words)) / max(1, len(query_words))
-            coverage_bonus = coverage * 2.0
-            
-            # 5. Context bonus (for related conversations)
+            text_lower = str(it.get("text") or "").lower()
+            # Query word coverage (weight 0.7) and context bonus for related conversations (0.4)
+            coverage = len(query_words.intersection(text_lower.split())) / max(1, len(query_words))
             context_score = context_bonus if any(word in text_lower for word in query_words) else 0.0
-            
-            # 6. Combined scoring with optimized weights
-            combined = (
-                bm25_score * 1.0 +          # BM25 relevance
-                recency * 0.8 +             # Recency importance
-                explicit * 0.5 +            # Explicit user score
-                length_bonus * 0.3 +        # Text quality
-                coverage_bonus * 0.7 +      # Query coverage
-                context_score * 0.4         # Context bonus
-            )
-            
-            rescored.append((combined, it, {
-                'bm25': bm25_score, 'recency': recency, 'explicit': explicit,
-                'length_bonus': length_bonus, 'coverage': coverage_bonus,
-                'context': context_score, 'final': combined
-            }))
-        
+            combined = it.pop("base_score") + coverage * 2.0 * 0.7 + context_score * 0.4
+            rescored.append((combined, it))
+
         # Sort by combined score and return top results
         rescored.sort(key=lambda x: x[0], reverse=True)
-        top = [it for _, it, _ in rescored[: max(1, limit)]]
-        return top
+        return [it for _, it in rescored[: max(1, limit)]]
+
+    def _bm25_candidate_ids(
+        self, terms: List[str], limit: int, tags: Optional[Dict[str, Any]] = None, min_hits: int = 1
+    ) -> List[int]:
+        match = build_fts_query(terms)
+        if not match:
+            return []
+        hot = self.hot_tier if tags is None else None
+        if hot is not None:
+            t0 = time.perf_counter()
+            ids = hot.search_ids(match, limit)
+            if len(ids) >= min_hits:
+                hot.record_latency("hot", (time.perf_counter() - t0) * 1000)
+                return ids
+        tag_where, tag_params = _tag_filter_sql(tags, column="rowid")
+        try:
+            t0 = time.perf_counter()
+            with self._conn() as c:
+                cur = c.execute(
+                    f"""
+                    SELECT rowid FROM memories_fts
+                    WHERE memories_fts MATCH ?{tag_where}
+                    ORDER BY bm25(memories_fts)
+                    LIMIT ?
+                    """,
+                    (match, *tag_params, limit),
+                )
+                ids = [int(r[0]) for r in cur.fetchall()]
+            if hot is not None:
+                hot.record_latency("cold", (time.perf_counter() - t0) * 1000)
+            return ids
+        except sqlite3.OperationalError:
+            return [int(it["id"]) for it in self.retrieve_text_terms(terms, limit=limit, tags=tags)]
+
+    @_cached_query(tokenize=True, hot_access=lambda call: True)
+    def retrieve_hybrid(
+        self,
+        query: Union[str, Iterable[str]],
+        query_vector: Optional[VectorLike] = None,
+        model: Optional[str] = None,
+        limit: int = 5,
+        candidates: int = 50,
+        rrf_k: int = 60,
+        recency_half_life_h: float = 24.0 * 14,
+        recency_weight: float = 0.1,
+        score_weight: float = 0.1,
+        tags: Optional[Dict[str, Any]] = None,
+    ) -> List[Dict[str, Any]]:
+        """Hybrid retrieval: FTS5 BM25 and vector candidates fused with RRF.
+
+        Each ranked list contributes ``1 / (rrf_k + rank)``. Recency (half-life
+        decay on ``ts``) and the explicit ``score`` are added on top in units
+        of a rank-1 hit, computed with numpy over the candidate set. Items get
+        ``hybrid_score``, ``bm25_rank`` and ``vector_rank`` (1-based or None).
+        Without ``query_vector``/``model`` this is BM25 + recency only.
+        ``tags`` restricts both candidate lists before ranking, so a filtered
+        query still gets ``candidates`` hits from each side. With a hot tier,
+        BM25 candidates come from the hot set when it has at least ``limit``
+        hits, and candidate rows that are hot are not read from disk.
+        """
+        terms = _FTS_TOKEN_RE.findall(query.lower()) if isinstance(query, str) else list(query)
+        bm25_ids = self._bm25_candidate_ids(terms, candidates, tags=tags, min_hits=max(1, limit))
+        vector_ids: List[int] = []
+        if query_vector is not None and model:
+            vector_ids = [m for m, _ in self.search_embeddings(model, query_vector, limit=candidates, tags=tags)]
+        ids = list(dict.fromkeys(bm25_ids + vector_ids))
+        if not ids:
+            return []
+
+        # En query för alla kandidater; ålder räknas i SQL istället för fromisoformat per rad
+        items = self.hot_tier.get_rows(ids) if self.hot_tier is not None else []
+        hot_ids = {it["id"] for it in items}
+        missing = [m for m in ids if m not in hot_ids]
+        if missing:
+            qmarks = ",".join(["?"] * len(missing))
+            with self._conn() as c:
+                cur = c.execute(
+                    f"""
+                    SELECT id, ts, kind, text, score, tags,
+                           (julianday('now') - julianday(ts)) * 24.0 AS age_h
+                    FROM memories
+                    WHERE kind='text' AND id IN ({qmarks})
+                    """,
+                    missing,
+                )
+                cols = [d[0] for d in cur.description]
+                items.extend(dict(zip(cols, r)) for r in cur.fetchall())
+        if not items:
+            return []
 
-    def get_recent_text_memories(self, limit: int = 10):
+        bm25_rank = {m: i + 1 for i, m in enumerate(bm25_ids)}
+        vector_rank = {m: i + 1 for i, m in enumerate(vector_ids)}
+        n = len(items)
+        miss = np.inf
+        r_bm25 = np.fromiter((bm25_rank.get(it["id"], miss) for it in items), np.float64, n)
+        r_vec = np.fromiter((vector_rank.get(it["id"], miss) for it in items), np.float64, n)
+        age_h = np.fromiter((np.nan if it["age_h"] is None else it["age_h"] for it in items), np.float64, n)
+        explicit = np.fromiter((it["score"] or 0.0 for it in items), np.float64, n)
+
+        rrf = 1.0 / (rrf_k + r_bm25) + 1.0 / (rrf_k + r_vec)
+        recency = np.nan_to_num(np.exp2(-np.maximum(age_h, 0.0) / recency_half_life_h))
+        bonus = recency_weight * recency + score_weight * np.tanh(explicit)
+        final = rrf + bonus / (rrf_k + 1.0)
+
+        k = min(max(1, limit), n)
+        top = np.argpartition(-final, k - 1)[:k] if k < n else np.arange(n)
+        top = top[np.argsort(-final[top], kind="stable")]
+        out = []
+        for i in top:
+            it = items[i]
+            it.pop("age_h")
+            it["hybrid_score"] = float(final[i])
+            it["bm25_rank"] = bm25_rank.get(it["id"])
+            it["vector_rank"] = vector_rank.get(it["id"])
+            out.append(it)
+        if self.hot_tier is not None:
+            self.hot_tier.record_access(out)
+        return out
+
+    def get_recent_text_memories(self, limit: int = 10, tags: Optional[Dict[str, Any]] = None):
+        tag_where, tag_params = _tag_filter_sql(tags, column="id")
         with self._conn() as c:
             cur = c.execute(
-                """
+                f"""
                 SELECT id, ts, kind, text, score, tags
                 FROM memories
-                WHERE kind='text'
+                WHERE kind='text'{tag_where}
                 ORDER BY ts DESC
                 LIMIT ?
                 """,
-                (limit,),
+                (*tag_params, limit),
             )
             rows = cur.fetchall()
             cols = [d[0] for d in cur.description]
             return [dict(zip(cols, r)) for r in rows]
 
+    def get_memory_ids_since(self, since_ts: str) -> List[int]:
+        """Ids of memories stored at or after ``since_ts`` (ISO, UTC 'Z')"""
+        with self._conn() as c:
+            cur = c.execute("SELECT id FROM memories WHERE ts >= ? ORDER BY id", (since_ts,))
+            return [int(r[0]) for r in cur.fetchall()]
+
+    def find_memory_ids_exact(self, phrase: Optional[str] = None, keywords: Optional[Iterable[str]] = None) -> List[int]:
+        """Ids of text memories containing ``phrase`` verbatim AND every keyword as a whole word.
+
+        Meant for deletion: no prefix expansion, no OR, no hot tier and no limit,
+        so it never matches more than what was asked for.
+        """
+        terms = _normalize_terms([phrase] if phrase else [])
+        terms += [t for t in _normalize_terms(keywords or []) if t not in terms]
+        if not terms:
+            return []
+        match = " AND ".join('"' + t.replace('"', '""') + '"' for t in terms)
+        try:
+            with self._conn() as c:
+                cur = c.execute(
+                    """
+                    SELECT m.id FROM memories_fts
+                    JOIN memories m ON m.id = memories_fts.rowid
+                    WHERE memories_fts MATCH ? AND m.kind='text'
+                    ORDER BY m.id
+                    """,
+                    (match,),
+                )
+                return [int(r[0]) for r in cur.fetchall()]
+        except sqlite3.OperationalError:
+            # Utan FTS5: LIKE som grovfilter, sedan exakt ordmatchning i Python
+            where = " AND ".join(["text LIKE ?"] * len(terms))
+            with self._conn() as c:
+                cur = c.execute(
+                    f"SELECT id, text FROM memories WHERE kind='text' AND {where} ORDER BY id",
+                    tuple(f"%{t}%" for t in terms),
+                )
+                rows = cur.fetchall()
+            out = []
+            for mem_id, text in rows:
+                tokens = f" {' '.join(_FTS_TOKEN_RE.findall((text or '').lower()))} "
+                if all(f" {t} " in tokens for t in terms):
+                    out.append(int(mem_id))
+            return out
+
     def get_all_tool_stats(self):
+        if self.tool_counters is not None:
+            return self.tool_counters.all()
         with self._conn() as c:
             cur = c.execute("SELECT tool, success, fail FROM tool_stats ORDER BY (success+fail) DESC, tool ASC")
             rows = cur.fetchall()
@@ -464,19 +1325,257 @@ class MemoryStore:
             ]
 
     # --- Embeddings ---
-    def upsert_embedding(self, mem_id: int, model: str, dim: int, vector_json: str) -> None:
+    @_invalidates_queries
+    def upsert_embedding(self, mem_id: int, model: str, dim: int, vector: VectorLike) -> None:
+        """Store a vector as a float32 BLOB and update the loaded index, if any"""
         ts = datetime.utcnow().isoformat() + "Z"
+        vec = as_float32(vector)
         with self._conn() as c:
             c.execute(
                 "INSERT OR REPLACE INTO embeddings (mem_id, ts, model, dim, vector) VALUES (?, ?, ?, ?, ?)",
-                (mem_id, ts, model, dim, vector_json),
+                (mem_id, ts, model, dim, vec.tobytes()),
+            )
+        # Under _vector_lock so a concurrent lazy load cannot miss this row
+        with self._vector_lock:
+            for name, index in self._vector_indexes.items():
+                if name == model:
+                    if index.dim == vec.shape[0]:
+                        index.add([mem_id], vec[None, :])
+                else:
+                    index.remove([mem_id])
+
+    @_invalidates_queries
+    def upsert_embeddings(self, model: str, mem_ids: List[int], vectors: Union[np.ndarray, List[VectorLike]]) -> int:
+        """Store many vectors of one model with a single ``executemany``.
+
+        ``vectors`` is an ``(n, dim)`` matrix or a list of equal-length vectors
+        aligned with ``mem_ids``. The loaded index, if any, gets one bulk add.
+        """
+        if not len(mem_ids):
+            return 0
+        mat = np.ascontiguousarray(
+            vectors if isinstance(vectors, np.ndarray) else np.stack([as_float32(v) for v in vectors]),
+            dtype=np.float32,
+        )
+        if mat.ndim != 2 or mat.shape[0] != len(mem_ids):
+            raise ValueError(f"expected {len(mem_ids)} vectors, got shape {mat.shape}")
+        ts = datetime.utcnow().isoformat() + "Z"
+        dim = int(mat.shape[1])
+        with self._conn() as c:
+            c.executemany(
+                "INSERT OR REPLACE INTO embeddings (mem_id, ts, model, dim, vector) VALUES (?, ?, ?, ?, ?)",
+                [(int(m), ts, model, dim, row.tobytes()) for m, row in zip(mem_ids, mat)],
+            )
+        ids = [int(m) for m in mem_ids]
+        with self._vector_lock:
+            for name, index in self._vector_indexes.items():
+                if name == model:
+                    if index.dim == dim:
+                        index.add(ids, mat)
+                else:
+                    # mem_id är primärnyckel: en rad per minne, så den gamla modellens vektor är ersatt
+                    index.remove(ids)
+        return len(ids)
+
+    def get_memories_missing_embeddings(self, model: str, after_id: int = 0, limit: int = 64) -> List[Tuple[int, str]]:
+        """``(id, text)`` of text memories above ``after_id`` with no embedding for ``model``"""
+        with self._conn() as c:
+            cur = c.execute(
+                """
+                SELECT m.id, m.text
+                FROM memories m
+                LEFT JOIN embeddings e ON e.mem_id = m.id
+                WHERE m.kind = 'text' AND m.id > ? AND (e.mem_id IS NULL OR e.model IS NOT ?)
+                ORDER BY m.id
+                LIMIT ?
+                """,
+                (after_id, model, limit),
+            )
+            return [(int(r[0]), r[1] or "") for r in cur.fetchall()]
+
+    def get_backfill_checkpoint(self, model: str) -> Dict[str, Any]:
+        with self._conn() as c:
+            row = c.execute(
+                "SELECT last_id, embedded, updated_ts FROM embedding_backfill WHERE model = ?", (model,)
+            ).fetchone()
+        if row is None:
+            return {"model": model, "last_id": 0, "embedded": 0, "updated_ts": None}
+        return {"model": model, "last_id": int(row[0]), "embedded": int(row[1]), "updated_ts": row[2]}
+
+    def set_backfill_checkpoint(self, model: str, last_id: int, embedded: int = 0) -> None:
+        """Advance the backfill cursor for ``model`` and add ``embedded`` to its counter"""
+        ts = datetime.utcnow().isoformat() + "Z"
+        with self._conn() as c:
+            c.execute(
+                """
+                INSERT INTO embedding_backfill (model, last_id, embedded, updated_ts) VALUES (?, ?, ?, ?)
+                ON CONFLICT(model) DO UPDATE SET
+                    last_id = excluded.last_id,
+                    embedded = embedding_backfill.embedded + excluded.embedded,
+                    updated_ts = excluded.updated_ts
+                """,
+                (model, int(last_id), int(embedded), ts),
             )
 
     def get_all_embeddings(self, model: str):
+        """Rows of ``(mem_id, dim, vector_blob)``; decode with ``vector_index.as_float32``"""
         with self._conn() as c:
             cur = c.execute("SELECT mem_id, dim, vector FROM embeddings WHERE model = ?", (model,))
             return cur.fetchall()
 
+    def _ann_path(self, model: str) -> str:
+        safe = re.sub(r"[^A-Za-z0-9_.-]", "_", model)
+        return os.path.join(self.vector_index_dir, f"{safe}.ivf.npz")
+
+    def _load_embedding_matrix(self, model: str, ids: Optional[List[int]] = None) -> Tuple[List[int], Optional[np.ndarray]]:
+        if ids is None:
+            rows = self.get_all_embeddings(model)
+        else:
+            rows = []
+            for start in range(0, len(ids), 500):
+                chunk = ids[start:start + 500]
+                qmarks = ",".join(["?"] * len(chunk))
+                with self._conn() as c:
+                    rows.extend(c.execute(
+                        f"SELECT mem_id, dim, vector FROM embeddings WHERE model = ? AND mem_id IN ({qmarks})",
+                        (model, *chunk),
+                    ).fetchall())
+        if not rows:
+            return [], None
+        dim = int(rows[0][1] or len(as_float32(rows[0][2])))
+        out_ids, vecs = [], []
+        for mem_id, row_dim, vector in rows:
+            if vector is None or int(row_dim or 0) != dim:
+                continue
+            out_ids.append(int(mem_id))
+            vecs.append(as_float32(vector))
+        return out_ids, (np.stack(vecs) if vecs else None)
+
+    def _load_ann_index(self, model: str) -> Optional[IVFIndex]:
+        path = self._ann_path(model)
+        index = IVFIndex.load(path, nprobe=self.ann_nprobe)
+        if index is None:
+            ids, mat = self._load_embedding_matrix(model)
+            if mat is None:
+                return None
+            index = IVFIndex(mat.shape[1], nprobe=self.ann_nprobe, path=path, capacity=max(1024, len(ids)))
+            index.add(ids, mat)
+            index.save()
+            return index
+        # Stäm av mot SQLite: rader skrivna/raderade efter senaste flush
+        with self._conn() as c:
+            db_ids = {int(r[0]) for r in c.execute("SELECT mem_id FROM embeddings WHERE model = ?", (model,))}
+        indexed = set(index.ids())
+        index.remove(indexed - db_ids)
+        missing = sorted(db_ids - indexed)
+        if missing:
+            ids, mat = self._load_embedding_matrix(model, missing)
+            if mat is not None and mat.shape[1] == index.dim:
+                index.add(ids, mat)
+        return index
+
+    def vector_index(self, model: str) -> Optional[Union[VectorIndex, IVFIndex]]:
+        """In-memory index for ``model``, loaded from SQLite (or the ANN file) on first use"""
+        index = self._vector_indexes.get(model)
+        if index is not None:
+            return index
+        with self._vector_lock:
+            index = self._vector_indexes.get(model)
+            if index is not None:
+                return index
+            if self.vector_index_mode == "ivf":
+                index = self._load_ann_index(model)
+            else:
+                ids, mat = self._load_embedding_matrix(model)
+                if mat is not None:
+                    index = VectorIndex(mat.shape[1], quantize=self.vector_quantize, capacity=max(1024, len(ids)))
+                    index.add(ids, mat)
+            if index is not None:
+                self._vector_indexes[model] = index
+            return index
+
+    def flush_vector_indexes(self) -> None:
+        """Persist ANN indexes (compacting tombstones) - no-op in exact mode"""
+        with self._vector_lock:
+            for index in self._vector_indexes.values():
+                if isinstance(index, IVFIndex):
+                    index.save()
+
+    def vector_stats(self) -> Dict[str, Any]:
+        return {model: index.stats() for model, index in list(self._vector_indexes.items())}
+
+    def search_embeddings(
+        self, model: str, query_vector: VectorLike, limit: int = 5, tags: Optional[Dict[str, Any]] = None
+    ) -> List[Tuple[int, float]]:
+        """Cosine top-k as ``(mem_id, similarity)`` pairs, best first (optionally tag-filtered)"""
+        index = self.vector_index(model)
+        if index is None:
+            return []
+        if tags:
+            return self._search_tagged(index, query_vector, limit, tags)
+        return index.search(query_vector, k=limit)
+
+    def _search_tagged(
+        self, index: Union[VectorIndex, IVFIndex], query_vector: VectorLike, limit: int, tags: Dict[str, Any]
+    ) -> List[Tuple[int, float]]:
+        # Översampla och filtrera bara kandidaterna i SQL: kostnaden följer k, inte taggens storlek
+        where, params = _tag_filter_sql(tags, column="mem_id")
+        k = max(1, limit) * TAG_OVERSAMPLE
+        for _ in range(TAG_OVERSAMPLE_ROUNDS):
+            hits = index.search(query_vector, k=k)
+            if not hits:
+                return []
+            with self._conn() as c:
+                allowed = {
+                    int(r[0])
+                    for r in c.execute(
+                        f"SELECT DISTINCT mem_id FROM memory_tags WHERE mem_id IN (SELECT value FROM json_each(?)){where}",
+                        (json.dumps([m for m, _ in hits]), *params),
+                    )
+                }
+            out = [h for h in hits if h[0] in allowed]
+            if len(out) >= limit or len(hits) < k:
+                return out[:limit]
+            k *= TAG_OVERSAMPLE
+        # Selektivt filter (få träffar bland grannarna): taggmängden är liten, sök exakt över den
+        return index.search(query_vector, k=limit, ids=self._tagged_ids(tags))
+
+    @_invalidates_queries
+    def delete_memories(self, ids: Iterable[int]) -> int:
+        """Delete memories with their embeddings (FTS is kept in sync by trigger)"""
+        ids = [int(i) for i in ids]
+        if not ids:
+            return 0
+        qmarks = ",".join(["?"] * len(ids))
+        with self._conn() as c:
+            c.execute(f"DELETE FROM embeddings WHERE mem_id IN ({qmarks})", ids)
+            cur = c.execute(f"DELETE FROM memories WHERE id IN ({qmarks})", ids)
+            deleted = cur.rowcount
+        if self.hot_tier is not None:
+            self.hot_tier.remove(ids)
+        with self._vector_lock:
+            loaded = set()
+            for index in self._vector_indexes.values():
+                hits = index.remove(ids)
+                if isinstance(index, IVFIndex) and index.path:
+                    loaded.add(index.path)
+                    if hits:
+                        # Raderade vektorer ska inte ligga kvar i filen tills nästa flush
+                        index.save()
+            # Sparade index för modeller som inte är laddade just nu: bara tombstone-loggen,
+            # som spelas upp vid load() (och komprimeras bort vid nästa save)
+            for path in self._persisted_ann_paths():
+                if path not in loaded:
+                    IVFIndex.log_tombstones(path, ids)
+        return deleted
+
+    def _persisted_ann_paths(self) -> List[str]:
+        try:
+            names = os.listdir(self.vector_index_dir)
+        except FileNotFoundError:
+            return []
+        return [os.path.join(self.vector_index_dir, n) for n in sorted(names) if n.endswith(".ivf.npz")]
+
     def get_texts_for_mem_ids(self, ids):
         if not ids:
             return {}
@@ -488,11 +1587,17 @@ class MemoryStore:
             )
             return {int(r[0]): (r[1] or "") for r in cur.fetchall()}
 
+    @_invalidates_queries
     def update_memory_score(self, mem_id: int, delta: float) -> None:
         with self._conn() as c:
             c.execute("UPDATE memories SET score = COALESCE(score,0) + ? WHERE id = ?", (delta, mem_id))
+        self._sync_hot([mem_id])
 
     def update_tool_stats(self, tool: str, success: bool) -> None:
+        if self.tool_counters is not None:
+            # Räknas i minnet, skrivs av räknarnas flush-tråd
+            self.tool_counters.record(tool, success)
+            return
         with self._conn() as c:
             # Upsert-like behavior for SQLite
             c.execute("INSERT OR IGNORE INTO tool_stats(tool, success, fail) VALUES (?, 0, 0)", (tool,))
@@ -502,6 +1607,8 @@ class MemoryStore:
                 c.execute("UPDATE tool_stats SET fail = fail + 1 WHERE tool = ?", (tool,))
 
     def get_tool_stats(self, tool: str):
+        if self.tool_counters is not None:
+            return self.tool_counters.get(tool)
         with self._conn() as c:
             cur = c.execute("SELECT success, fail FROM tool_stats WHERE tool = ?", (tool,))
             row = cur.fetchone()
@@ -509,6 +1616,27 @@ class MemoryStore:
                 return 0, 0
             return int(row[0] or 0), int(row[1] or 0)
 
+    def read_tool_stats(self) -> List[Tuple[str, int, int]]:
+        """All ``(tool, success, fail)`` rows straight from SQLite (counter load)"""
+        with self._conn() as c:
+            cur = c.execute("SELECT tool, success, fail FROM tool_stats")
+            return [(r[0], int(r[1] or 0), int(r[2] or 0)) for r in cur.fetchall()]
+
+    def write_tool_stats(self, deltas: List[Tuple[str, int, int]]) -> None:
+        """Add ``(tool, success_delta, fail_delta)`` rows in one transaction"""
+        if not deltas:
+            return
+        with self._conn() as c:
+            c.executemany(
+                """
+                INSERT INTO tool_stats(tool, success, fail) VALUES (?, ?, ?)
+                ON CONFLICT(tool) DO UPDATE SET
+                    success = COALESCE(success, 0) + excluded.success,
+                    fail = COALESCE(fail, 0) + excluded.fail
+                """,
+                deltas,
+            )
+
     # --- Perception/Sensors ---
     def add_cv_frame(self, source: str, meta_json: str) -> int:
         ts = datetime.utcnow().isoformat() + "Z"
@@ -520,41 +1648,137 @@ class MemoryStore:
             return int(cur.lastrowid)
 
     def add_sensor_telemetry(self, sensor: str, value: float, meta_json: str = None) -> int:
-        ts = datetime.utcnow().isoformat() + "Z"
+        return self.add_sensor_telemetry_batch([(sensor, value, meta_json, None)])[0]
+
+    def add_sensor_telemetry_batch(self, readings: Iterable[Reading]) -> List[int]:
+        """Insert ``(sensor, value, meta_json, epoch)`` readings and fold them into the rollups.
+
+        One transaction: an ``executemany`` for the raw rows and one upsert
+        batch per rollup resolution. ``epoch=None`` means now.
+        """
+        now_s = time.time()
+        rows, folded = [], []
+        for sensor, value, meta_json, epoch in readings:
+            t = now_s if epoch is None else float(epoch)
+            rows.append((iso_utc(t), sensor, value, meta_json))
+            folded.append((sensor, value, t))
+        if not rows:
+            return []
         with self._conn() as c:
-            cur = c.execute(
-                "INSERT INTO sensor_timeseries (ts, sensor, value, meta) VALUES (?, ?, ?, ?)",
-                (ts, sensor, value, meta_json),
-            )
-            return int(cur.lastrowid)
+            c.executemany("INSERT INTO sensor_timeseries (ts, sensor, value, meta) VALUES (?, ?, ?, ?)", rows)
+            last = c.execute("SELECT last_insert_rowid()").fetchone()[0]
+            for name, buckets in aggregate(folded).items():
+                c.executemany(
+                    f"""
+                    INSERT INTO {rollup_table(name)} (sensor, bucket, count, sum, min, max) VALUES (?, ?, ?, ?, ?, ?)
+                    ON CONFLICT (sensor, bucket) DO UPDATE SET
+                        count = count + excluded.count,
+                        sum = sum + excluded.sum,
+                        min = MIN(min, excluded.min),
+                        max = MAX(max, excluded.max)
+                    """,
+                    buckets,
+                )
+        return list(range(last - len(rows) + 1, last + 1))
+
+    def query_sensor_telemetry(
+        self,
+        sensor: str,
+        start: TimeLike = None,
+        end: TimeLike = None,
+        max_points: int = 500,
+        resolution: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """Downsampled min/max/mean series for ``[start, end)`` (default: the last 24 h).
+
+        Reads the coarsest rollup that still resolves ``(end - start) / max_points``
+        (or the requested ``resolution``), so long ranges never scan raw rows.
+        """
+        end_s = parse_time(end, time.time())
+        start_s = parse_time(start, end_s - 86400)
+        if end_s <= start_s:
+            raise ValueError("end must be after start")
+        source, step = choose_resolution(start_s, end_s, max_points, resolution)
+        with self._conn() as c:
+            if source == "raw":
+                # ISO utan "Z" som gräns: sorterar före alla ts inom samma sekund
+                rows = c.execute(
+                    """
+                    SELECT (CAST(strftime('%s', ts) AS INTEGER) / ?) * ? AS b,
+                           COUNT(value), SUM(value), MIN(value), MAX(value)
+                    FROM sensor_timeseries
+                    WHERE sensor = ? AND ts >= ? AND ts < ? AND value IS NOT NULL
+                    GROUP BY b ORDER BY b
+                    """,
+                    (step, step, sensor, iso_utc(start_s)[:-1], iso_utc(end_s)[:-1]),
+                ).fetchall()
+            else:
+                width = RESOLUTIONS[source]
+                rows = c.execute(
+                    f"""
+                    SELECT (bucket / ?) * ? AS b, SUM(count), SUM(sum), MIN(min), MAX(max)
+                    FROM {rollup_table(source)}
+                    WHERE sensor = ? AND bucket >= ? AND bucket < ?
+                    GROUP BY b ORDER BY b
+                    """,
+                    (step, step, sensor, int(start_s // width) * width, end_s),
+                ).fetchall()
+        return {
+            "sensor": sensor,
+            "start": iso_utc(start_s),
+            "end": iso_utc(end_s),
+            "source": source,
+            "step_s": step,
+            "points": points_from_rows(rows),
+        }
+
+    def prune_sensor_rollups(self, now_s: Optional[float] = None) -> Dict[str, int]:
+        """Drop fine-grained rollup buckets past ``ROLLUP_RETENTION_S``"""
+        now_s = time.time() if now_s is None else now_s
+        removed = {}
+        with self._conn() as c:
+            for name, keep_s in ROLLUP_RETENTION_S.items():
+                if keep_s is None:
+                    continue
+                cur = c.execute(f"DELETE FROM {rollup_table(name)} WHERE bucket < ?", (int(now_s - keep_s),))
+                removed[name] = cur.rowcount
+        return removed
     
     # --- Conversation Context Tracking ---
     def add_conversation_turn(self, session_id: str, role: str, content: str, memory_id: int = None) -> int:
         """Add a conversation turn for context tracking"""
         ts = datetime.utcnow().isoformat() + "Z"
+        key = self._partition_for(CONVERSATIONS, ts)
         with self._conn() as c:
-            cur = c.execute(
-                "INSERT INTO conversations (session_id, ts, role, content, memory_id) VALUES (?, ?, ?, ?, ?)",
+            cur = self._insert_partitioned(
+                c,
+                CONVERSATIONS,
+                key,
+                "INSERT INTO {table} (session_id, ts, role, content, memory_id) VALUES (?, ?, ?, ?, ?)",
                 (session_id, ts, role, content, memory_id),
             )
             return int(cur.lastrowid)
     
     def get_conversation_context(self, session_id: str, limit: int = 10) -> List[Dict[str, Any]]:
         """Get recent conversation context for a session"""
+        cols = ["id", "ts", "role", "content", "memory_id"]
+        rows: List[Tuple[Any, ...]] = []
         with self._conn() as c:
-            cur = c.execute(
-                """
-                SELECT id, ts, role, content, memory_id
-                FROM conversations
-                WHERE session_id = ?
-                ORDER BY ts DESC
-                LIMIT ?
-                """,
-                (session_id, limit),
-            )
-            rows = cur.fetchall()
-            cols = [d[0] for d in cur.description]
-            return [dict(zip(cols, r)) for r in reversed(rows)]  # Reverse to chronological order
+            # Nyaste partitionen först; äldre månader läses bara om den inte räcker
+            for key in reversed(self._partition_keys.get(CONVERSATIONS.name, [])):
+                rows.extend(c.execute(
+                    f"""
+                    SELECT id, ts, role, content, memory_id
+                    FROM {CONVERSATIONS.partition(key)}
+                    WHERE session_id = ?
+                    ORDER BY ts DESC
+                    LIMIT ?
+                    """,
+                    (session_id, limit - len(rows)),
+                ).fetchall())
+                if len(rows) >= limit:
+                    break
+        return [dict(zip(cols, r)) for r in reversed(rows)]  # Reverse to chronological order
     
     def get_related_memories_from_context(self, session_id: str, query: str, limit: int = 3) -> List[Dict[str, Any]]:
         """Retrieve memories related to current conversation context"""
@@ -579,15 +1803,15 @@ class MemoryStore:
         return self.retrieve_text_bm25_recency(query, limit)
     
     def cleanup_old_conversations(self, days: int = 30) -> int:
-        """Clean up old conversation history"""
+        """Clean up old conversation history (whole months older than ``days``)"""
         cutoff = datetime.utcnow().timestamp() - (days * 24 * 3600)
         cutoff_iso = datetime.fromtimestamp(cutoff).isoformat() + "Z"
-        
-        with self._conn() as c:
-            cur = c.execute(
-                "DELETE FROM conversations WHERE ts < ?",
-                (cutoff_iso,)
-            )
-            return cur.rowcount
+        return self.drop_partitions_before(CONVERSATIONS.name, cutoff_iso)
+
+    def cleanup_old_events(self, days: int = 90) -> int:
+        """Clean up old events (whole months older than ``days``)"""
+        cutoff = datetime.utcnow().timestamp() - (days * 24 * 3600)
+        cutoff_iso = datetime.fromtimestamp(cutoff).isoformat() + "Z"
+        return self.drop_partitions_before(EVENTS.name, cutoff_iso)
 
 
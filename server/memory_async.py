@@ -0,0 +1,167 @@
+"""
+AsyncMemoryStore - awaitable facade över MemoryStore.
+
+SQLite-anrop körs utanför event-loopen: alla skrivningar går genom en
+dedikerad writer-tråd (serialiserade, ingen SQLITE_BUSY mellan skrivare)
+och läsningar körs i en liten reader-pool. Varje tråd får sin egen
+uppkoppling via MemoryStore:s thread-local pool, så WAL ger samtidiga
+läsare medan en skrivning pågår.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import functools
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from memory import MemoryStore
+
+logger = logging.getLogger("alice.memory")
+
+
+def _percentile(values: List[float], p: float) -> float:
+    if not values:
+        return 0.0
+    arr = sorted(values)
+    k = max(0, min(len(arr) - 1, int(round((p / 100.0) * (len(arr) - 1)))))
+    return float(arr[k])
+
+
+class AsyncMemoryStore:
+    """Awaitable MemoryStore: ``await amemory.append_event(...)``"""
+
+    # append_event och *_tool_stats är egna metoder nedan (journal/räknare tas utan trådbyte)
+    WRITE_METHODS = frozenset({
+        "upsert_text_memory",
+        "upsert_text_memory_single",
+        "upsert_text_memory_stream",
+        "upsert_embedding",
+        "upsert_embeddings",
+        "set_backfill_checkpoint",
+        "backfill_fingerprints",
+        "update_memory_score",
+        "update_tool_stats",
+        "write_tool_stats",
+        "delete_memories",
+        "flush_vector_indexes",
+        "add_cv_frame",
+        "add_sensor_telemetry",
+        "add_sensor_telemetry_batch",
+        "prune_sensor_rollups",
+        "add_conversation_turn",
+        "cleanup_old_conversations",
+        "cleanup_old_events",
+        "drop_partitions_before",
+    })
+
+    READ_METHODS = frozenset({
+        "ping",
+        "retrieve_text_memories",
+        "retrieve_text_terms",
+        "retrieve_text_bm25_recency",
+        "retrieve_hybrid",
+        "get_recent_text_memories",
+        "get_memory_ids_since",
+        "find_memory_ids_exact",
+        "get_all_tool_stats",
+        "get_all_embeddings",
+        "get_memories_missing_embeddings",
+        "get_backfill_checkpoint",
+        "search_embeddings",
+        "vector_index",
+        "get_texts_for_mem_ids",
+        "get_tool_stats",
+        "read_tool_stats",
+        "get_conversation_context",
+        "get_related_memories_from_context",
+        "partition_stats",
+        "query_sensor_telemetry",
+    })
+
+    def __init__(self, store: MemoryStore, readers: int = 4) -> None:
+        self.store = store
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="memory-writer")
+        self._readers = ThreadPoolExecutor(max_workers=readers, thread_name_prefix="memory-reader")
+        self._latency_ms: Dict[str, List[float]] = {"read": [], "write": []}
+
+    def _record(self, kind: str, ms: float, cap: int = 500) -> None:
+        arr = self._latency_ms[kind]
+        arr.append(ms)
+        if len(arr) > cap:
+            del arr[: len(arr) - cap]
+
+    async def _submit(self, kind: str, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        executor = self._writer if kind == "write" else self._readers
+        loop = asyncio.get_running_loop()
+        t0 = time.perf_counter()
+        try:
+            return await loop.run_in_executor(executor, functools.partial(fn, *args, **kwargs))
+        finally:
+            self._record(kind, (time.perf_counter() - t0) * 1000)
+
+    async def write(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """Run an arbitrary callable on the writer thread"""
+        return await self._submit("write", fn, *args, **kwargs)
+
+    async def read(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """Run an arbitrary callable on the reader pool"""
+        return await self._submit("read", fn, *args, **kwargs)
+
+    async def append_event(self, topic: str, payload: Optional[str]) -> None:
+        if self.store.event_journal is not None:
+            self.store.event_journal.append(topic, payload)
+            return
+        await self._submit("write", self.store.append_event, topic, payload)
+
+    async def update_tool_stats(self, tool: str, success: bool) -> None:
+        if self.store.tool_counters is not None:
+            self.store.tool_counters.record(tool, success)
+            return
+        await self._submit("write", self.store.update_tool_stats, tool, success)
+
+    async def get_tool_stats(self, tool: str):
+        if self.store.tool_counters is not None:
+            return self.store.tool_counters.get(tool)
+        return await self._submit("read", self.store.get_tool_stats, tool)
+
+    async def get_all_tool_stats(self):
+        if self.store.tool_counters is not None:
+            return self.store.tool_counters.all()
+        return await self._submit("read", self.store.get_all_tool_stats)
+
+    def __getattr__(self, name: str) -> Callable[..., Awaitable[Any]]:
+        if name in AsyncMemoryStore.WRITE_METHODS:
+            kind = "write"
+        elif name in AsyncMemoryStore.READ_METHODS:
+            kind = "read"
+        else:
+            raise AttributeError(f"AsyncMemoryStore has no attribute '{name}'")
+        fn = getattr(self.store, name)
+
+        async def call(*args: Any, **kwargs: Any) -> Any:
+            return await self._submit(kind, fn, *args, **kwargs)
+
+        call.__name__ = name
+        return call
+
+    def stats(self) -> Dict[str, Any]:
+        """Round-trip latency (queue wait + SQLite) per operation class"""
+        return {
+            kind: {
+                "count": len(values),
+                "p50": _percentile(values, 50),
+                "p95": _percentile(values, 95),
+                "p99": _percentile(values, 99),
+            }
+            for kind, values in self._latency_ms.items()
+        }
+
+    async def aclose(self) -> None:
+        """Drain pending writes, stop worker threads and close connections"""
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, functools.partial(self._writer.shutdown, wait=True))
+        await loop.run_in_executor(None, functools.partial(self._readers.shutdown, wait=True))
+        self.store.close()
@@ -0,0 +1,302 @@
+"""
+Het minnesnivå framför MemoryStore:s on-disk ``memories``/``memories_fts``.
+
+``HotTier`` håller en delmängd av textminnena i en in-memory SQLite med eget
+FTS5-index: allt från de senaste ``recent_days`` dagarna, allt med
+``score >= min_score`` och minnen som befordrats för att de hämtas ofta.
+Disken är fortfarande sanningen (den kalla nivån innehåller allt); MemoryStore
+frågar den heta nivån först och går bara till disk när den ger färre än
+önskat antal träffar.
+
+Åtkomst räknas per minne med exponentiellt avtagande vikt (halveringstid
+``access_half_life_s``). Ett kallt minne som nått ``promote_hits`` befordras
+direkt; ``rebalance()`` (bakgrundstråd) laddar om urvalet från disk och
+degraderar minnen som varken är nya, högt poängsatta eller använda. Latens
+per nivå (hot/cold) rapporteras som percentiler i ``stats()``.
+"""
+
+from __future__ import annotations
+
+import logging
+import sqlite3
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger("alice.memory")
+
+MemoryRow = Tuple[int, str, str, str, float, Optional[str]]
+_COLS = ["id", "ts", "kind", "text", "score", "tags"]
+
+
+def _percentile(values: Sequence[float], p: float) -> float:
+    if not values:
+        return 0.0
+    arr = sorted(values)
+    k = max(0, min(len(arr) - 1, int(round((p / 100.0) * (len(arr) - 1)))))
+    return float(arr[k])
+
+
+class HotTier:
+    """In-memory SQLite + FTS5 copy of recent, high-score and frequently used memories"""
+
+    def __init__(
+        self,
+        store: Any,
+        recent_days: float = 14.0,
+        min_score: float = 2.0,
+        max_items: int = 50_000,
+        promote_hits: float = 3.0,
+        access_half_life_s: float = 24 * 3600.0,
+        rebalance_interval_s: float = 600.0,
+    ) -> None:
+        self.store = store
+        self.recent_days = recent_days
+        self.min_score = min_score
+        self.max_items = max(1, max_items)
+        self.promote_hits = promote_hits
+        self.access_half_life_s = access_half_life_s
+        self.rebalance_interval_s = rebalance_interval_s
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(":memory:", check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE hot_memories (id INTEGER PRIMARY KEY, ts TEXT, kind TEXT, text TEXT, score REAL, tags TEXT)"
+        )
+        try:
+            self._db.execute("CREATE VIRTUAL TABLE hot_fts USING fts5(text, content='hot_memories', content_rowid='id')")
+            self.fts = True
+        except sqlite3.OperationalError:
+            # Utan FTS5 finns inget att söka i: allt går till disk
+            self.fts = False
+        # mem_id -> [avtagande åtkomstvikt, senaste åtkomst (monotonic)]
+        self._access: Dict[int, List[float]] = {}
+        self._promoted: set = set()
+        self._latency_ms: Dict[str, "deque[float]"] = {"hot": deque(maxlen=1000), "cold": deque(maxlen=1000)}
+        self.hot_served = 0
+        self.cold_fallbacks = 0
+        self.promotions = 0
+        self.demotions = 0
+        self.loaded = False
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    # --- urval ---
+    def _cutoff_ts(self) -> str:
+        return (datetime.utcnow() - timedelta(days=self.recent_days)).isoformat() + "Z"
+
+    def _qualifies(self, row: MemoryRow, cutoff: str) -> bool:
+        return (row[1] or "") >= cutoff or float(row[4] or 0.0) >= self.min_score or row[0] in self._promoted
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM hot_memories").fetchone()[0]
+
+    def __contains__(self, mem_id: int) -> bool:
+        with self._lock:
+            return self._db.execute("SELECT 1 FROM hot_memories WHERE id = ?", (int(mem_id),)).fetchone() is not None
+
+    def _upsert(self, rows: Iterable[MemoryRow]) -> int:
+        # Anropas med _lock hållen; FTS (external content) kräver delete av gamla texten först
+        n = 0
+        for row in rows:
+            old = self._db.execute("SELECT text FROM hot_memories WHERE id = ?", (row[0],)).fetchone()
+            if old is not None and self.fts:
+                self._db.execute("INSERT INTO hot_fts(hot_fts, rowid, text) VALUES('delete', ?, ?)", (row[0], old[0]))
+            self._db.execute("INSERT OR REPLACE INTO hot_memories (id, ts, kind, text, score, tags) VALUES (?, ?, ?, ?, ?, ?)", row)
+            if self.fts:
+                self._db.execute("INSERT INTO hot_fts(rowid, text) VALUES (?, ?)", (row[0], row[3]))
+            n += 1
+        return n
+
+    def _remove(self, ids: Iterable[int]) -> int:
+        n = 0
+        for mem_id in ids:
+            old = self._db.execute("SELECT text FROM hot_memories WHERE id = ?", (int(mem_id),)).fetchone()
+            if old is None:
+                continue
+            if self.fts:
+                self._db.execute("INSERT INTO hot_fts(hot_fts, rowid, text) VALUES('delete', ?, ?)", (int(mem_id), old[0]))
+            self._db.execute("DELETE FROM hot_memories WHERE id = ?", (int(mem_id),))
+            n += 1
+        return n
+
+    def offer(self, rows: Iterable[MemoryRow]) -> int:
+        """Take freshly written rows: keep those that qualify, refresh ones already hot"""
+        cutoff = self._cutoff_ts()
+        with self._lock:
+            keep = []
+            for row in rows:
+                present = self._db.execute("SELECT 1 FROM hot_memories WHERE id = ?", (row[0],)).fetchone()
+                if self._qualifies(row, cutoff) or present:
+                    keep.append(row)
+            n = self._upsert(keep)
+            self._db.commit()
+        return n
+
+    def remove(self, ids: Iterable[int]) -> int:
+        ids = [int(i) for i in ids]
+        with self._lock:
+            n = self._remove(ids)
+            self._db.commit()
+            for mem_id in ids:
+                self._access.pop(mem_id, None)
+                self._promoted.discard(mem_id)
+        return n
+
+    # --- sökning ---
+    def search_ids(self, match: str, limit: int) -> List[int]:
+        if not self.fts:
+            return []
+        with self._lock:
+            cur = self._db.execute(
+                "SELECT rowid FROM hot_fts WHERE hot_fts MATCH ? ORDER BY bm25(hot_fts) LIMIT ?", (match, limit)
+            )
+            return [int(r[0]) for r in cur.fetchall()]
+
+    def search_rows(self, match: str, limit: int) -> List[Dict[str, Any]]:
+        """Same columns and order as ``MemoryStore.retrieve_text_terms`` (BM25 is over the hot set)"""
+        if not self.fts:
+            return []
+        with self._lock:
+            cur = self._db.execute(
+                """
+                SELECT m.id, m.ts, m.kind, m.text, m.score, m.tags, bm25(hot_fts) AS rank
+                FROM hot_fts JOIN hot_memories m ON m.id = hot_fts.rowid
+                WHERE hot_fts MATCH ?
+                ORDER BY rank ASC, m.score DESC
+                LIMIT ?
+                """,
+                (match, limit),
+            )
+            cols = [d[0] for d in cur.description]
+            return [dict(zip(cols, r)) for r in cur.fetchall()]
+
+    def get_rows(self, ids: Sequence[int]) -> List[Dict[str, Any]]:
+        """Rows for the ids that are hot, with ``age_h`` like ``retrieve_hybrid`` computes it"""
+        if not ids:
+            return []
+        qmarks = ",".join(["?"] * len(ids))
+        with self._lock:
+            cur = self._db.execute(
+                f"""
+                SELECT id, ts, kind, text, score, tags,
+                       (julianday('now') - julianday(ts)) * 24.0 AS age_h
+                FROM hot_memories WHERE id IN ({qmarks})
+                """,
+                list(ids),
+            )
+            cols = [d[0] for d in cur.description]
+            return [dict(zip(cols, r)) for r in cur.fetchall()]
+
+    # --- åtkomst och latens ---
+    def record_latency(self, tier: str, ms: float) -> None:
+        self._latency_ms[tier].append(ms)
+        if tier == "hot":
+            self.hot_served += 1
+        else:
+            self.cold_fallbacks += 1
+
+    def _weight(self, entry: List[float], now: float) -> float:
+        return entry[0] * 0.5 ** ((now - entry[1]) / self.access_half_life_s)
+
+    def record_access(self, items: Iterable[Dict[str, Any]]) -> int:
+        """Count one access per returned item; cold items reaching ``promote_hits`` are promoted"""
+        now = time.monotonic()
+        promote: List[MemoryRow] = []
+        with self._lock:
+            for it in items:
+                mem_id = int(it["id"])
+                entry = self._access.get(mem_id)
+                weight = (self._weight(entry, now) if entry else 0.0) + 1.0
+                self._access[mem_id] = [weight, now]
+                # Marginal: tre snabba träffar ska räcka även om vikten hunnit avta en aning
+                if weight >= self.promote_hits - 1e-3 and mem_id not in self._promoted:
+                    self._promoted.add(mem_id)
+                    promote.append(tuple(it.get(c) for c in _COLS))  # type: ignore[arg-type]
+            if promote:
+                fresh = [r for r in promote if self._db.execute("SELECT 1 FROM hot_memories WHERE id = ?", (r[0],)).fetchone() is None]
+                self.promotions += self._upsert(fresh)
+                self._db.commit()
+        return len(promote)
+
+    # --- ombalansering ---
+    def load(self) -> int:
+        """Full rebuild from disk (startup)"""
+        return self.rebalance()
+
+    def rebalance(self) -> int:
+        """Reload the qualifying set from disk, demote what no longer qualifies; returns hot size"""
+        now = time.monotonic()
+        with self._lock:
+            # Åtkomstvikter avtar; under 1 räknas minnet inte längre som befordrat
+            for mem_id, entry in list(self._access.items()):
+                if self._weight(entry, now) < 1.0:
+                    del self._access[mem_id]
+                    self._promoted.discard(mem_id)
+            promoted = list(self._promoted)
+        rows = self.store.load_hot_candidates(self._cutoff_ts(), self.min_score, self.max_items, promoted)
+        wanted = {r[0] for r in rows}
+        with self._lock:
+            present = {int(r[0]) for r in self._db.execute("SELECT id FROM hot_memories")}
+            stale = present - wanted
+            if self.loaded:
+                self.demotions += len(stale)
+            self._remove(stale)
+            self._upsert(rows)
+            self._db.commit()
+            self.loaded = True
+            return len(wanted)
+
+    def start(self) -> "HotTier":
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="memory-hot-tier", daemon=True)
+            self._thread.start()
+        return self
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self.rebalance()
+            except Exception as e:
+                logger.warning(f"Hot tier rebalance failed: {e}")
+            self._stop.wait(self.rebalance_interval_s)
+
+    def close(self, timeout: float = 10.0) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            items = self._db.execute("SELECT COUNT(*) FROM hot_memories").fetchone()[0]
+            tracked = len(self._access)
+            promoted = len(self._promoted)
+        lookups = self.hot_served + self.cold_fallbacks
+        return {
+            "running": self._thread is not None and self._thread.is_alive(),
+            "loaded": self.loaded,
+            "items": items,
+            "max_items": self.max_items,
+            "recent_days": self.recent_days,
+            "min_score": self.min_score,
+            "promoted": promoted,
+            "tracked": tracked,
+            "hot_served": self.hot_served,
+            "cold_fallbacks": self.cold_fallbacks,
+            "hot_ratio": (self.hot_served / lookups) if lookups else 0.0,
+            "promotions": self.promotions,
+            "demotions": self.demotions,
+            "latency_ms": {
+                tier: {
+                    "count": len(values),
+                    "p50": _percentile(values, 50),
+                    "p95": _percentile(values, 95),
+                    "p99": _percentile(values, 99),
+                }
+                for tier, values in self._latency_ms.items()
+            },
+        }
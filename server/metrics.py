@@ -39,6 +39,7 @@ class Metrics:
         self.active_connections: List[int] = []
         self.cache_hits: int = 0
         self.cache_misses: int = 0
+        self.cache_saved_ms: float = 0.0
         
         # Process monitoring for memory leaks
         if PSUTIL_AVAILABLE:
@@ -71,8 +72,9 @@ class Metrics:
     def record_llm_hit(self) -> None:
         self.llm_hits += 1
     
-    def record_cache_hit(self) -> None:
+    def record_cache_hit(self, saved_ms: float = 0.0) -> None:
         self.cache_hits += 1
+        self.cache_saved_ms += float(saved_ms)
     
     def record_cache_miss(self) -> None:
         self.cache_misses += 1
@@ -144,6 +146,7 @@ class Metrics:
                 "llm_hits": self.llm_hits,
                 "cache_hits": self.cache_hits,
                 "cache_misses": self.cache_misses,
+                "cache_saved_ms": round(self.cache_saved_ms, 3),
             },
         }
         
@@ -16,6 +16,7 @@ from urllib.parse import urlencode
 
 from auth_models import User, AuditEventType, SWEDISH_ERROR_MESSAGES
 from auth_service import AuthService
+from http_pool import http_clients
 
 logger = logging.getLogger("alice.oauth")
 
@@ -152,7 +153,7 @@ class OAuthService:
         }
         
         try:
-            async with httpx.AsyncClient(timeout=30.0) as client:
+            async with http_clients.session("oauth", timeout=30.0) as client:
                 response = await client.post(
                     config["token_url"],
                     data=token_data,
@@ -200,7 +201,7 @@ class OAuthService:
         }
         
         try:
-            async with httpx.AsyncClient(timeout=30.0) as client:
+            async with http_clients.session("oauth", timeout=30.0) as client:
                 # Get user info
                 response = await client.get(config["user_info_url"], headers=headers)
                 
@@ -0,0 +1,158 @@
+"""
+Månadspartitionering av append-only-tabeller (events, conversations).
+
+Varje kalendermånad får en egen tabell (``events_202610``) och det gamla
+tabellnamnet blir en vy (``UNION ALL`` över partitionerna), så befintliga
+läsare som ``SELECT ... FROM events`` fungerar oförändrat. Skrivningar går
+direkt till månadens partition. Retention blir ``DROP TABLE`` på hela
+månader i stället för radvisa ``DELETE`` som sväller WAL:en och håller
+skrivlåset länge.
+
+Id:n är globalt unika över partitionerna: en ny partition får sin
+AUTOINCREMENT-sekvens satt till familjens högsta id, och runt skrivningar
+till en äldre partition synkas alla partitioners sekvenser till maxvärdet.
+"""
+
+from __future__ import annotations
+
+import re
+import sqlite3
+from datetime import datetime
+from typing import Dict, Iterable, List, Tuple
+
+_MONTH_RE = re.compile(r"^(\d{4})-(\d{2})")
+
+
+def month_key(ts: str) -> str:
+    """``'2026-10-16T08:00:00Z'`` -> ``'202610'`` (current month if ts is malformed)"""
+    m = _MONTH_RE.match(ts or "")
+    if m and 1 <= int(m.group(2)) <= 12:
+        return m.group(1) + m.group(2)
+    return datetime.utcnow().strftime("%Y%m")
+
+
+def month_bounds(key: str) -> Tuple[str, str]:
+    """ISO prefixes ``[lo, hi)`` covering every ts in the month"""
+    year, month = int(key[:4]), int(key[4:])
+    nxt = (year + 1, 1) if month == 12 else (year, month + 1)
+    return f"{year:04d}-{month:02d}", f"{nxt[0]:04d}-{nxt[1]:02d}"
+
+
+def _begin(c: sqlite3.Connection) -> None:
+    # Python-sqlite3 startar ingen transaktion för DDL; ta skrivlåset direkt
+    if not c.in_transaction:
+        c.execute("BEGIN IMMEDIATE")
+
+
+class PartitionedTable:
+    """One logical table split into monthly ``<name>_YYYYMM`` tables behind a view"""
+
+    def __init__(self, name: str, columns: str, indexes: Iterable[Tuple[str, str]] = ()) -> None:
+        # columns: kolumndefinitioner efter id, t.ex. "ts TEXT NOT NULL, topic TEXT NOT NULL"
+        self.name = name
+        self.columns = columns
+        self.column_names = [part.strip().split()[0] for part in columns.split(",") if part.strip()
+                             and not part.strip().upper().startswith("FOREIGN")]
+        self.indexes = list(indexes)
+        self.glob = f"{name}_" + "[0-9]" * 6
+
+    def partition(self, key: str) -> str:
+        return f"{self.name}_{key}"
+
+    def list_keys(self, c: sqlite3.Connection) -> List[str]:
+        rows = c.execute(
+            "SELECT name FROM sqlite_master WHERE type='table' AND name GLOB ?", (self.glob,)
+        ).fetchall()
+        return sorted(r[0][-6:] for r in rows)
+
+    def _max_seq(self, c: sqlite3.Connection) -> int:
+        row = c.execute("SELECT MAX(seq) FROM sqlite_sequence WHERE name GLOB ?", (self.glob,)).fetchone()
+        return int(row[0] or 0)
+
+    def _create(self, c: sqlite3.Connection, key: str) -> None:
+        table = self.partition(key)
+        c.execute(f"CREATE TABLE IF NOT EXISTS {table} (id INTEGER PRIMARY KEY AUTOINCREMENT, {self.columns})")
+        for suffix, cols in self.indexes:
+            c.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_{suffix} ON {table}({cols})")
+        if c.execute("SELECT 1 FROM sqlite_sequence WHERE name = ?", (table,)).fetchone() is None:
+            c.execute("INSERT INTO sqlite_sequence (name, seq) VALUES (?, ?)", (table, self._max_seq(c)))
+
+    def _rebuild_view(self, c: sqlite3.Connection, keys: List[str]) -> None:
+        cols = ", ".join(["id"] + self.column_names)
+        c.execute(f"DROP VIEW IF EXISTS {self.name}")
+        c.execute(
+            f"CREATE VIEW {self.name} AS "
+            + " UNION ALL ".join(f"SELECT {cols} FROM {self.partition(k)}" for k in keys)
+        )
+
+    def ensure(self, c: sqlite3.Connection, key: str) -> List[str]:
+        """Create the partition (and refresh the view) if missing; returns all keys"""
+        with c:
+            _begin(c)
+            keys = self.list_keys(c)
+            view = c.execute("SELECT 1 FROM sqlite_master WHERE type='view' AND name = ?", (self.name,)).fetchone()
+            missing = key not in keys
+            if missing:
+                self._create(c, key)
+                keys = sorted(keys + [key])
+            if missing or view is None:
+                self._rebuild_view(c, keys)
+        return keys
+
+    def sync_sequences(self, c: sqlite3.Connection) -> None:
+        """Raise every partition's AUTOINCREMENT sequence to the family maximum.
+
+        Call inside the write transaction before and after inserting into an
+        older partition, so neither that write nor the next one into the
+        newest partition can reuse an id.
+        """
+        c.execute(
+            "UPDATE sqlite_sequence SET seq = (SELECT MAX(seq) FROM sqlite_sequence WHERE name GLOB ?) WHERE name GLOB ?",
+            (self.glob, self.glob),
+        )
+
+    def migrate(self, c: sqlite3.Connection) -> int:
+        """Move rows from a legacy unpartitioned table into monthly partitions"""
+        row = c.execute("SELECT type FROM sqlite_master WHERE name = ?", (self.name,)).fetchone()
+        if row is None or row[0] != "table":
+            return 0
+        legacy = f"{self.name}_unpartitioned"
+        cols = ", ".join(["id"] + self.column_names)
+        moved = 0
+        with c:
+            _begin(c)
+            c.execute(f"ALTER TABLE {self.name} RENAME TO {legacy}")
+            c.execute(f"CREATE INDEX idx_{legacy}_month ON {legacy}(substr(ts, 1, 7))")
+            by_key: Dict[str, List[str]] = {}
+            for (prefix,) in c.execute(f"SELECT DISTINCT substr(ts, 1, 7) FROM {legacy}").fetchall():
+                by_key.setdefault(month_key(prefix or ""), []).append(prefix)
+            for key in sorted(by_key):
+                self._create(c, key)
+                for prefix in by_key[key]:
+                    cur = c.execute(
+                        f"INSERT INTO {self.partition(key)} ({cols}) SELECT {cols} FROM {legacy} "
+                        f"WHERE substr(ts, 1, 7) IS ?",
+                        (prefix,),
+                    )
+                    moved += cur.rowcount
+            c.execute(f"DROP TABLE {legacy}")
+            self.sync_sequences(c)
+            keys = self.list_keys(c)
+            if keys:
+                self._rebuild_view(c, keys)
+        return moved
+
+    def drop_before(self, c: sqlite3.Connection, cutoff_ts: str, keep: str) -> Tuple[List[str], int]:
+        """Drop every partition whose whole month lies before ``cutoff_ts``; never drops ``keep``"""
+        with c:
+            _begin(c)
+            keys = self.list_keys(c)
+            doomed = [k for k in keys if k != keep and month_bounds(k)[1] <= cutoff_ts[:7]]
+            rows = 0
+            for key in doomed:
+                table = self.partition(key)
+                rows += c.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                c.execute(f"DROP TABLE {table}")
+            if doomed:
+                self._rebuild_view(c, [k for k in keys if k not in doomed])
+        return doomed, rows
@@ -13,6 +13,8 @@ from dataclasses import dataclass
 import os
 from pathlib import Path
 
+from db_snapshot import replicas
+
 @dataclass
 class ShadowLog:
     """Log entry for shadow mode tracking"""
@@ -151,7 +153,8 @@ class ProactiveShadow:
         if not date:
             date = datetime.now().strftime("%Y-%m-%d")
             
-        conn = sqlite3.connect(self.db_path)
+        # Läsreplik: DATE(timestamp)-skanningen ska inte konkurrera med loggningen
+        conn = replicas.connect(self.db_path)
         cursor = conn.cursor()
         
         # Get all logs for the date
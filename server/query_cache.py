@@ -0,0 +1,95 @@
+"""
+LRU+TTL-cache för retrieval-resultat framför MemoryStore.
+
+Invalideras med en generationsräknare: varje skrivning som kan ändra ett
+sökresultat anropar ``bump()``, och poster från en äldre generation
+serveras aldrig. Generationen läses innan resultatet räknas ut, så en
+skrivning som sker under uträkningen gör posten ogiltig direkt.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Tuple
+
+_MISS = object()
+
+
+class QueryCache:
+    """Thread-safe LRU cache with TTL and generation-based invalidation"""
+
+    def __init__(self, max_entries: int = 1024, ttl_s: float = 60.0, metrics: Any = None) -> None:
+        self.max_entries = max(1, int(max_entries))
+        self.ttl_s = float(ttl_s)
+        self.metrics = metrics
+        self._lock = threading.Lock()
+        # key -> (generation, expires_at, value, compute_ms)
+        self._entries: "OrderedDict[Hashable, Tuple[int, float, Any, float]]" = OrderedDict()
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.saved_ms = 0.0
+
+    @property
+    def generation(self) -> int:
+        return self._generation
+
+    def bump(self) -> None:
+        """Invalidate every cached result (called after committed writes)"""
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], Any]) -> Any:
+        now = time.monotonic()
+        with self._lock:
+            gen = self._generation
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == gen and entry[1] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                self.saved_ms += entry[3]
+                value, saved = entry[2], entry[3]
+            else:
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                value = _MISS
+        if value is not _MISS:
+            if self.metrics is not None:
+                self.metrics.record_cache_hit(saved)
+            return value
+
+        if self.metrics is not None:
+            self.metrics.record_cache_miss()
+        t0 = time.perf_counter()
+        value = compute()
+        compute_ms = (time.perf_counter() - t0) * 1000.0
+        with self._lock:
+            # Skrivning under uträkningen -> resultatet kan vara inaktuellt, spara inte
+            if gen == self._generation:
+                self._entries[key] = (gen, time.monotonic() + self.ttl_s, value, compute_ms)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_s": self.ttl_s,
+                "generation": self._generation,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits / total) if total else 0.0,
+                "saved_ms": round(self.saved_ms, 3),
+            }
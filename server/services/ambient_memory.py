@@ -11,6 +11,7 @@ import time
 
 # Import our enhanced logging
 from logger_config import get_logger
+from llm.scheduler import Priority, llm_scheduler
 
 router = APIRouter(prefix="/api/memory/ambient", tags=["ambient"])
 logger = get_logger("ambient_memory")
@@ -315,11 +316,16 @@ TRANSKRIPT:
 
 Sammanfatta:"""
 
-        response = await client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[{"role": "user", "content": prompt}],
-            max_tokens=300,
-            temperature=0.3
+        # Bakgrundsarbete: viker för röst/chat, avbrutna sammanfattningar skjuts upp och körs om
+        response = await llm_scheduler.run(
+            "openai",
+            lambda: client.chat.completions.create(
+                model="gpt-4o-mini",
+                messages=[{"role": "user", "content": prompt}],
+                max_tokens=300,
+                temperature=0.3
+            ),
+            priority=Priority.BACKGROUND,
         )
         
         summary = response.choices[0].message.content.strip()
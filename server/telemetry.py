@@ -0,0 +1,115 @@
+"""
+Rollups för sensortelemetri (sensor_timeseries).
+
+Varje inläst mätning uppdaterar inkrementellt tre rollup-tabeller med
+fasta hinkar: 1 minut, 1 timme och 1 dygn (count/sum/min/max per sensor och
+hink; mean = sum/count). Intervallfrågor läser från den grövsta tabell vars
+hinkbredd fortfarande ger den upplösning som efterfrågas, och slår vid
+behov ihop hinkar till ``step`` sekunder i SQL. Råa rader läses bara för
+korta intervall där steget är under en minut.
+
+Tider lagras som ISO-strängar i sensor_timeseries (som övriga tabeller)
+och som epoch-sekunder (hinkens start) i rollup-tabellerna.
+"""
+
+from __future__ import annotations
+
+import math
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+# Namn -> hinkbredd i sekunder, finast först
+RESOLUTIONS: Dict[str, int] = {"1m": 60, "1h": 3600, "1d": 86400}
+
+# Hur länge finare rollups behålls av prune_sensor_rollups (None = för alltid)
+ROLLUP_RETENTION_S: Dict[str, Optional[int]] = {"1m": 14 * 86400, "1h": 400 * 86400, "1d": None}
+
+Reading = Tuple[str, float, Optional[str], Optional[float]]  # sensor, value, meta_json, epoch (None = nu)
+
+TimeLike = Union[str, int, float, datetime, None]
+
+
+def rollup_table(resolution: str) -> str:
+    return f"sensor_rollup_{resolution}"
+
+
+def parse_time(value: TimeLike, default: Optional[float] = None) -> float:
+    """Epoch seconds from epoch numbers, ISO strings (``Z`` allowed) or datetimes"""
+    if value is None or value == "":
+        if default is None:
+            raise ValueError("time value required")
+        return default
+    if isinstance(value, datetime):
+        dt = value
+    elif isinstance(value, (int, float)):
+        return float(value)
+    else:
+        try:
+            return float(value)
+        except ValueError:
+            dt = datetime.fromisoformat(value.strip().replace("Z", "+00:00"))
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.timestamp()
+
+
+def iso_utc(epoch: float) -> str:
+    """Same format as ``datetime.utcnow().isoformat() + "Z"``"""
+    return datetime.fromtimestamp(epoch, tz=timezone.utc).replace(tzinfo=None).isoformat() + "Z"
+
+
+def aggregate(readings: Iterable[Tuple[str, float, float]]) -> Dict[str, List[Tuple[str, int, int, float, float, float]]]:
+    """Fold ``(sensor, value, epoch)`` into per-resolution ``(sensor, bucket, count, sum, min, max)`` rows"""
+    acc: Dict[str, Dict[Tuple[str, int], List[float]]] = {name: {} for name in RESOLUTIONS}
+    for sensor, value, epoch in readings:
+        if value is None or (isinstance(value, float) and math.isnan(value)):
+            continue
+        for name, width in RESOLUTIONS.items():
+            key = (sensor, int(epoch // width) * width)
+            cur = acc[name].get(key)
+            if cur is None:
+                acc[name][key] = [1, value, value, value]
+            else:
+                cur[0] += 1
+                cur[1] += value
+                if value < cur[2]:
+                    cur[2] = value
+                if value > cur[3]:
+                    cur[3] = value
+    return {
+        name: [(s, b, int(v[0]), v[1], v[2], v[3]) for (s, b), v in buckets.items()]
+        for name, buckets in acc.items()
+    }
+
+
+def choose_resolution(start: float, end: float, max_points: int, resolution: Optional[str] = None) -> Tuple[str, int]:
+    """Pick the source (``raw`` or a rollup) and the output step in seconds.
+
+    The step is the requested resolution, or ``(end - start) / max_points``
+    rounded up; the source is the coarsest rollup no wider than the step.
+    """
+    if resolution is not None and resolution != "raw" and resolution not in RESOLUTIONS:
+        raise ValueError(f"resolution must be raw or one of {list(RESOLUTIONS)}, got {resolution!r}")
+    if resolution == "raw":
+        return "raw", max(1, int(math.ceil((end - start) / max(1, max_points))))
+    if resolution is not None:
+        width = RESOLUTIONS[resolution]
+        return resolution, max(width, int(math.ceil((end - start) / max(1, max_points) / width)) * width)
+    step = max(1, int(math.ceil((end - start) / max(1, max_points))))
+    source = "raw"
+    for name, width in RESOLUTIONS.items():
+        if width <= step:
+            source = name
+    if source != "raw":
+        # Hela hinkar ur källtabellen per punkt
+        width = RESOLUTIONS[source]
+        step = int(math.ceil(step / width)) * width
+    return source, step
+
+
+def points_from_rows(rows: Iterable[Tuple[Any, ...]]) -> List[Dict[str, Any]]:
+    """``(bucket, count, sum, min, max)`` rows -> JSON points"""
+    return [
+        {"t": int(b), "iso": iso_utc(b), "count": int(n), "mean": (s / n) if n else None, "min": lo, "max": hi}
+        for b, n, s, lo, hi in rows
+    ]
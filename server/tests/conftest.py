@@ -0,0 +1,33 @@
+"""
+Delade fixtures för MemoryStore-testerna
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from memory import MemoryStore
+
+
+@pytest.fixture
+def dedup():
+    """Dubblettsammanslagning i ``store``; en testmodul kan överskugga fixturen med False"""
+    return True
+
+
+@pytest.fixture
+def store(tmp_path, dedup):
+    s = MemoryStore(str(tmp_path / "alice.db"), dedup=dedup)
+    yield s
+    s.close()
+
+
+@pytest.fixture
+def count_rows():
+    """``count_rows(store, table="memories")``: antal rader via storens poolade uppkoppling"""
+    def count(store, table="memories"):
+        return store._conn().execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+    return count
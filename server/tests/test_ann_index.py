@@ -0,0 +1,201 @@
+"""
+Tester för ann_index.py - IVF-index med persistens och tombstones
+"""
+
+import asyncio
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from ann_index import IVFIndex
+from memory import MemoryStore
+from memory_async import AsyncMemoryStore
+
+
+def _clustered(n, dim, clusters=20, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim)).astype(np.float32)
+    labels = rng.integers(0, clusters, n)
+    return centers[labels] + 0.3 * rng.standard_normal((n, dim)).astype(np.float32)
+
+
+class TestIVFIndex:
+
+    def test_exact_until_trained(self):
+        data = _clustered(200, 16)
+        index = IVFIndex(16, train_min=1000)
+        index.add(range(200), data)
+        assert not index.trained
+        assert index.search(data[5], 1)[0][0] == 5
+
+    def test_trained_recall(self):
+        data = _clustered(3000, 32)
+        index = IVFIndex(32, train_min=1000, nprobe=8)
+        index.add(range(3000), data)
+        index.wait_for_training()
+        assert index.trained
+        hits = sum(index.search(data[i], 1)[0][0] == i for i in range(0, 3000, 100))
+        assert hits >= 28
+
+    def test_incremental_insert_after_training(self):
+        data = _clustered(1500, 16)
+        index = IVFIndex(16, train_min=1000)
+        index.add(range(1500), data)
+        index.wait_for_training()
+        index.add([9999], data[:1] * 1.0001)
+        assert 9999 in [m for m, _ in index.search(data[0], 2)]
+
+    def test_tombstones_persist_and_purge(self, tmp_path):
+        path = str(tmp_path / "m.ivf.npz")
+        data = _clustered(1200, 16)
+        index = IVFIndex(16, train_min=1000, path=path)
+        index.add(range(1200), data)
+        index.wait_for_training()
+        index.save()
+        index.remove([3])
+        assert 3 not in [m for m, _ in index.search(data[3], 5)]
+        # Tombstone log is replayed on load, before the next save
+        reloaded = IVFIndex.load(path)
+        assert 3 not in reloaded and len(reloaded) == 1199
+        assert reloaded.trained
+        # A save compacts: the forgotten vector is no longer on disk
+        reloaded.save()
+        assert not os.path.exists(path + ".tombstones")
+        with np.load(path) as saved:
+            assert 3 not in saved["ids"]
+
+    def test_retrain_runs_off_the_writer_and_old_centroids_keep_serving(self, monkeypatch):
+        import threading
+
+        import ann_index
+
+        data = _clustered(1200, 16)
+        index = IVFIndex(16, train_min=200, retrain_factor=2.0)
+        index.add(range(300), data[:300])
+        index.wait_for_training()
+        old = index._centroids
+        release, started = threading.Event(), threading.Event()
+        real_kmeans = ann_index._kmeans
+
+        def slow_kmeans(*args, **kw):
+            started.set()
+            release.wait(5)
+            return real_kmeans(*args, **kw)
+
+        monkeypatch.setattr(ann_index, "_kmeans", slow_kmeans)
+        index.add(range(300, 1000), data[300:1000])
+        assert started.wait(5)
+        # add() kom tillbaka medan k-means körs; sökningar och skrivningar går på de gamla listorna
+        index.add(range(1000, 1200), data[1000:1200])
+        assert index._centroids is old and index.stats()["training"]
+        assert index.search(data[1100], 1)[0][0] == 1100
+        release.set()
+        index.wait_for_training()
+        assert index._centroids is not old and index.trainings == 2
+        assert sum(len(lst) for lst in index._lists) == 1200
+        assert index.search(data[1150], 1)[0][0] == 1150
+
+    def test_replaced_vector_logged_as_tombstone(self, tmp_path):
+        path = str(tmp_path / "m.ivf.npz")
+        index = IVFIndex(2, path=path)
+        index.add([1, 2], np.array([[1.0, 0.0], [0.0, 1.0]], dtype=np.float32))
+        index.save()
+        index.add([1], np.array([[0.0, 1.0]], dtype=np.float32))
+        # No save: the old vector for id 1 must not come back on load
+        reloaded = IVFIndex.load(path)
+        assert 1 not in reloaded and 2 in reloaded
+
+
+class TestMemoryStoreANN:
+
+    def test_ivf_mode_reconciles_with_sqlite(self, tmp_path):
+        db = str(tmp_path / "alice.db")
+        store = MemoryStore(db, vector_index_mode="ivf")
+        a = store.upsert_text_memory_single("a")
+        store.upsert_embedding(a, "m", 2, [1.0, 0.0])
+        assert store.search_embeddings("m", [1.0, 0.0], limit=1)[0][0] == a
+        assert os.path.exists(store._ann_path("m"))
+        # Written after the index file was saved, then a restart
+        b = store.upsert_text_memory_single("b")
+        store.upsert_embedding(b, "m", 2, [0.0, 1.0])
+        store.close()
+        store = MemoryStore(db, vector_index_mode="ivf")
+        assert store.search_embeddings("m", [0.0, 1.0], limit=1)[0][0] == b
+        store.close()
+
+    def test_privacy_forget_removes_vectors(self, tmp_path):
+        pytest.importorskip("fastapi")
+        store = MemoryStore(str(tmp_path / "alice.db"), vector_index_mode="ivf")
+        keep = store.upsert_text_memory_single("Vi pratade om väder")
+        secret = store.upsert_text_memory_single("Min kod till dörren är hemlig")
+        store.upsert_embedding(keep, "m", 2, [1.0, 0.0])
+        store.upsert_embedding(secret, "m", 2, [0.9, 0.1])
+        store.vector_index("m")
+
+        async def forget():
+            from b3_privacy_hooks import B3PrivacyHooks, ForgetRequest
+            amemory = AsyncMemoryStore(store)
+            hooks = B3PrivacyHooks(amemory)
+            result = await hooks.process_forget_request(ForgetRequest(keywords=["dörren"]))
+            await amemory.aclose()
+            return result
+
+        result = asyncio.run(forget())
+        assert result.deleted_memory_ids == [str(secret)]
+        assert [m for m, _ in store.search_embeddings("m", [0.9, 0.1], limit=5)] == [keep]
+        with np.load(store._ann_path("m")) as saved:
+            assert secret not in saved["ids"]
+        store.close()
+
+    def test_forget_query_only_deletes_exact_subject(self, tmp_path):
+        pytest.importorskip("fastapi")
+        store = MemoryStore(str(tmp_path / "alice.db"))
+        target = store.upsert_text_memory_single("Lunch med Anna står i min kalender")
+        survivors = [
+            store.upsert_text_memory_single(t)
+            for t in ("Det där var min idé", "Kalendern synkas om natten", "Min mormor ringde")
+        ]
+
+        async def forget():
+            from b3_privacy_hooks import B3PrivacyHooks, ForgetRequest
+            amemory = AsyncMemoryStore(store)
+            hooks = B3PrivacyHooks(amemory)
+            result = await hooks.process_forget_request(ForgetRequest(query="glöm det där om min kalender"))
+            await amemory.aclose()
+            return result
+
+        assert asyncio.run(forget()).deleted_memory_ids == [str(target)]
+        assert store.find_memory_ids_exact(None, ["min"]) == [survivors[0], survivors[2]]
+        store.close()
+
+    def test_delete_tombstones_unloaded_index_files(self, tmp_path):
+        db = str(tmp_path / "alice.db")
+        store = MemoryStore(db, vector_index_mode="ivf")
+        current = store.upsert_text_memory_single("ny modell")
+        keep, gone = store.upsert_text_memory_single("kvar"), store.upsert_text_memory_single("borta")
+        store.upsert_embedding(current, "m", 2, [1.0, 0.0])
+        store.upsert_embedding(keep, "old", 2, [1.0, 0.0])
+        store.upsert_embedding(gone, "old", 2, [0.0, 1.0])
+        store.vector_index("m")
+        store.vector_index("old")
+        store.close()
+        # Efter omstart är bara "m" laddad; "old" ligger kvar på disk
+        store = MemoryStore(db, vector_index_mode="ivf")
+        store.vector_index("m")
+        path = store._ann_path("old")
+        mtime = os.stat(path).st_mtime_ns
+        assert store.delete_memories([gone]) == 1
+        # Filen för "old" laddas inte; id:t loggas som tombstone och spelas upp vid load
+        assert os.stat(path).st_mtime_ns == mtime and "old" not in store._vector_indexes
+        with open(path + ".tombstones", encoding="utf-8") as f:
+            assert f.read().split() == [str(gone)]
+        assert gone not in IVFIndex.load(path)
+        assert store.vector_index("old").ids() == [keep]
+        store.flush_vector_indexes()
+        with np.load(path) as saved:
+            assert list(saved["ids"]) == [keep]
+        store.close()
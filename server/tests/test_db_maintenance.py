@@ -0,0 +1,120 @@
+"""
+Tester för db_maintenance.py - underhåll av SQLite-filer vid låg trafik
+"""
+
+import asyncio
+import os
+import sqlite3
+import sys
+import time
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from db_maintenance import ActivityMiddleware, ActivityTracker, DatabaseMaintenance, db_metrics
+
+
+@pytest.fixture
+def dedup():
+    return False
+
+
+@pytest.fixture
+def store(store):
+    for i in range(500):
+        store.upsert_text_memory_single(f"minne {i} om kalender och möten " * 4)
+    return store
+
+
+def _quiet_tracker():
+    tracker = ActivityTracker()
+    tracker.last_hit -= 3600
+    return tracker
+
+
+class TestActivityTracker:
+
+    def test_idle_detection(self):
+        tracker = _quiet_tracker()
+        assert tracker.is_idle(quiet_s=60, max_rate_per_min=6)
+        tracker.begin()
+        assert not tracker.is_idle(quiet_s=0, max_rate_per_min=6)
+        tracker.end()
+        assert tracker.is_idle(quiet_s=0, max_rate_per_min=6)
+        for _ in range(10):
+            tracker.hit()
+        assert not tracker.is_idle(quiet_s=0, max_rate_per_min=6)
+
+    def test_middleware_counts_http_and_ws_messages(self):
+        tracker = ActivityTracker()
+
+        async def app(scope, receive, send):
+            if scope["type"] == "websocket":
+                await receive()
+                await receive()
+
+        messages = iter([{"type": "websocket.connect"}, {"type": "websocket.receive", "text": "hej"}])
+
+        async def receive():
+            return next(messages)
+
+        mw = ActivityMiddleware(app, tracker)
+        asyncio.run(mw({"type": "http", "path": "/api/chat"}, receive, None))
+        asyncio.run(mw({"type": "http", "path": "/api/metrics"}, receive, None))
+        asyncio.run(mw({"type": "websocket", "path": "/ws/alice"}, receive, None))
+        assert tracker.total == 2 and tracker.in_flight == 0
+
+
+class TestDatabaseMaintenance:
+
+    def test_vacuums_fragmented_small_db_and_truncates_wal(self, store):
+        store.delete_memories(range(1, 400))
+        dm = DatabaseMaintenance({"alice": store.db_path}, _quiet_tracker(), quiet_s=0)
+        result = dm.run_once()["alice"]
+        assert result["status"] == "ok"
+        assert result["before"]["freelist_pages"] > 0
+        assert result["after"]["freelist_pages"] == 0
+        assert result["after"]["auto_vacuum"] == "incremental"
+        assert result["after"]["wal_bytes"] == 0
+        assert {"optimize", "fts_optimize", "vacuum", "wal_truncate"} <= set(result["steps"])
+        # Poolens uppkopplingar fungerar efter VACUUM
+        assert store.retrieve_text_terms(["kalender"], limit=1)
+
+    def test_incremental_vacuum_and_fts_merge_on_later_runs(self, store):
+        dm = DatabaseMaintenance({"alice": store.db_path}, _quiet_tracker(), quiet_s=0, fts_optimize_max_rows=0)
+        store.delete_memories(range(1, 400))
+        dm.run_once()
+        store.delete_memories(range(400, 480))
+        result = dm.run_once()["alice"]
+        assert "fts_merge" in result["steps"]
+        assert result["steps"].get("incremental_vacuum", 0) >= 1
+        assert result["after"]["freelist_pages"] == 0
+
+    def test_traffic_interrupts_run(self, store):
+        tracker = _quiet_tracker()
+        dm = DatabaseMaintenance({"alice": store.db_path}, tracker, quiet_s=0, max_rate_per_min=1000)
+        tracker.begin()
+        assert dm.run_once() == {}
+        result = dm.maintain("alice", store.db_path)
+        assert result["status"] == "interrupted" and result["steps"] == {}
+        assert dm.stats()["interrupted"] == 1
+
+    def test_locked_database_is_skipped_not_waited_on(self, store):
+        dm = DatabaseMaintenance({"alice": store.db_path}, _quiet_tracker(), quiet_s=0, busy_timeout_ms=10)
+        blocker = sqlite3.connect(store.db_path, isolation_level=None)
+        blocker.execute("BEGIN IMMEDIATE")
+        try:
+            t0 = time.perf_counter()
+            result = dm.run_once(force=True)["alice"]
+            assert time.perf_counter() - t0 < 2.0
+        finally:
+            blocker.execute("ROLLBACK")
+            blocker.close()
+        assert result["status"] == "ok"
+        assert dm.stats()["skipped_locked"] >= 1
+
+    def test_missing_files_are_ignored(self, tmp_path, store):
+        dm = DatabaseMaintenance({"alice": store.db_path, "gone": str(tmp_path / "gone.db")}, _quiet_tracker(), quiet_s=0)
+        assert set(dm.run_once()) == {"alice"}
+        assert db_metrics(sqlite3.connect(store.db_path), store.db_path)["journal_mode"] == "wal"
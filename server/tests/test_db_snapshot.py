@@ -0,0 +1,99 @@
+"""
+Tester för db_snapshot.py - läsrepliker via SQLites backup-API
+"""
+
+import os
+import sqlite3
+import sys
+import time
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from db_snapshot import ReplicaRegistry, SnapshotReplica
+
+
+@pytest.fixture
+def dedup():
+    return False
+
+
+@pytest.fixture
+def store(store):
+    store.upsert_text_memory_single("första minnet")
+    return store
+
+
+def _count(conn):
+    try:
+        return conn.execute("SELECT COUNT(*) FROM memories").fetchone()[0]
+    finally:
+        conn.close()
+
+
+class TestSnapshotReplica:
+
+    def test_replica_is_read_only_copy(self, store, tmp_path):
+        replica = SnapshotReplica(store.db_path, path=tmp_path / "replicas" / "alice.db")
+        conn = replica.connect()
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "delete"
+        with pytest.raises(sqlite3.OperationalError):
+            conn.execute("DELETE FROM memories")
+        assert _count(conn) == 1
+        assert replica.stats()["refreshes"] == 1
+
+    def test_stale_replica_refreshes_and_open_readers_keep_old_copy(self, store, tmp_path):
+        replica = SnapshotReplica(store.db_path, path=tmp_path / "alice.replica.db", max_age_s=60)
+        old = replica.connect()
+        store.upsert_text_memory_single("andra minnet")
+        assert _count(replica.connect()) == 1  # fortfarande färsk nog
+        replica.refreshed_at = time.time() - 120
+        assert _count(replica.connect()) == 2
+        assert _count(old) == 1
+
+    def test_rollback_journal_source_copied_in_steps(self, tmp_path):
+        src = tmp_path / "ambient.db"
+        conn = sqlite3.connect(src)
+        conn.execute("CREATE TABLE memory (id INTEGER PRIMARY KEY, text TEXT)")
+        conn.executemany("INSERT INTO memory (text) VALUES (?)", [("x" * 500,)] * 2000)
+        conn.commit()
+        conn.close()
+        replica = SnapshotReplica(src, pages_per_step=16, step_sleep_s=0)
+        rows = replica.connect().execute("SELECT COUNT(*) FROM memory").fetchone()[0]
+        assert rows == 2000
+
+
+class TestReplicaRegistry:
+
+    def test_unregistered_paths_read_the_source(self, store):
+        registry = ReplicaRegistry()
+        assert registry.fresh_path(store.db_path) == store.db_path
+        store.upsert_text_memory_single("syns direkt")
+        assert _count(registry.connect(store.db_path)) == 2
+
+    def test_registered_paths_read_the_replica(self, store, tmp_path):
+        registry = ReplicaRegistry()
+        replica = registry.register(store.db_path, replica_dir=tmp_path / "replicas")
+        assert registry.fresh_path(store.db_path) == replica.path == str(tmp_path / "replicas" / "alice.db")
+        store.upsert_text_memory_single("inte i repliken än")
+        assert _count(registry.connect(store.db_path)) == 1
+        assert registry.refresh_all() == 1
+        assert _count(registry.connect(store.db_path)) == 2
+        assert "alice.db" in registry.stats()["replicas"]
+
+    def test_flushed_tool_stats_force_a_refresh(self, store, tmp_path):
+        from tool_stats import ToolStatsCounters
+
+        registry = ReplicaRegistry()
+        registry.register(store.db_path, replica_dir=tmp_path / "replicas", max_age_s=3600)
+        registry.fresh_path(store.db_path)
+        counters = ToolStatsCounters(store)
+        counters.record("spotify", True)
+        counters.flush()
+        path = registry.fresh_path(store.db_path, newer_than=counters.last_flush_at)
+        conn = sqlite3.connect(path)
+        try:
+            assert conn.execute("SELECT success FROM tool_stats WHERE tool = 'spotify'").fetchone() == (1,)
+        finally:
+            conn.close()
@@ -0,0 +1,139 @@
+"""
+Tester för dedup.py och dubblettsammanslagning i MemoryStore
+"""
+
+import json
+import os
+import random
+import sys
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from dedup import MinHasher, content_hash
+from memory import MemoryStore
+
+REPLY = ("Jag har lagt till mötet med projektgruppen i kalendern på fredag klockan tio, "
+         "och skickat en påminnelse till alla deltagare en timme innan.")
+LONG = ("Sammanfattning av veckan: du hade fyra möten med projektgruppen, två av dem flyttades "
+        "från tisdag till onsdag eftermiddag. Rapporten om energiförbrukningen skickades till "
+        "styrelsen i torsdags och de bad om en uppdaterad budget före månadsskiftet. Spotify-listan "
+        "för träningen spelades elva gånger och du missade inga påminnelser om medicinen den här veckan.")
+
+
+class TestMinHasher:
+
+    def test_content_hash_normalizes_whitespace_and_case(self):
+        assert content_hash("Hej  Alice\n") == content_hash("hej alice")
+        assert content_hash("hej alice") != content_hash("hej alice!")
+
+    def test_similarity_tracks_jaccard(self):
+        hasher = MinHasher(num_perm=256, bands=32)
+        rnd = random.Random(0)
+        words = [f"ord{i}" for i in range(300)]
+        a = " ".join(words)
+        b = " ".join(w if rnd.random() > 0.03 else "x" for w in words)
+        sim = MinHasher.similarity(hasher.signature(a), hasher.signature(b))
+        assert 0.75 < sim < 0.98
+        assert MinHasher.similarity(hasher.signature(a), hasher.signature(" ".join(reversed(words)))) < 0.1
+
+    def test_short_text_has_no_signature(self):
+        assert MinHasher().signature("ja boka det") is None
+
+    def test_bands_must_divide_permutations(self):
+        with pytest.raises(ValueError):
+            MinHasher(num_perm=64, bands=10)
+
+
+class TestIngestDedup:
+
+    def test_exact_duplicate_merges(self, store, count_rows):
+        (first,) = store.upsert_text_memory(REPLY, score=0.0)
+        ts = store._conn().execute("SELECT ts FROM memories WHERE id = ?", (first,)).fetchone()[0]
+        assert store.upsert_text_memory_single("  " + REPLY.upper()) == first
+        score, new_ts = store._conn().execute("SELECT score, ts FROM memories WHERE id = ?", (first,)).fetchone()
+        assert count_rows(store) == 1
+        assert score == pytest.approx(store.dedup_score_bump) and new_ts >= ts
+        assert store.dedup_stats()["exact"] == 1
+
+    def test_near_duplicate_merges(self, store, count_rows):
+        first = store.upsert_text_memory_single(REPLY)
+        # Bara skiljetecken skiljer: samma ord-trigram
+        assert store.upsert_text_memory_single(REPLY.replace("tio,", "tio;")) == first
+        second = store.upsert_text_memory_single(LONG)
+        assert store.upsert_text_memory_single(LONG.replace("elva", "tolv")) == second
+        other = store.upsert_text_memory_single("Vädret i Göteborg blir soligt i morgon med upp till tjugo grader och svag vind.")
+        assert len({first, second, other}) == 3 and count_rows(store) == 3
+        assert store.dedup_stats()["near"] == 2
+
+    def test_short_texts_only_merge_exactly(self, store):
+        a = store.upsert_text_memory_single("ja, boka det")
+        assert store.upsert_text_memory_single("nej, boka inte det") != a
+        assert store.upsert_text_memory_single("Ja, boka det") == a
+
+    def test_reupload_merges_all_chunks(self, store, count_rows):
+        doc = "\n\n".join(f"Avsnitt {i}. " + " ".join(f"ord{i}_{j}" for j in range(60)) for i in range(20))
+        tags = json.dumps({"source": "document_upload"})
+        first = store.upsert_text_memory_stream([doc[:3000], doc[3000:]], score=2.0, tags_json=tags, batch_size=3)
+        rows_before = count_rows(store)
+        again = store.upsert_text_memory_stream([doc], score=2.0, tags_json=tags)
+        assert again == first and count_rows(store) == rows_before
+        stored = json.loads(store._conn().execute("SELECT tags FROM memories WHERE id = ?", (first[0],)).fetchone()[0])
+        assert stored["total_chunks"] == len(first) and stored["original_length"] == len(doc)
+
+    def test_shared_paragraph_stays_findable_under_each_document(self, store):
+        shared = "Gemensamt avsnitt. " + " ".join(f"delat{j}" for j in range(80))
+
+        def upload(filename, intro):
+            tags = json.dumps({"source": "document_upload", "filename": filename})
+            return store.upsert_text_memory_stream([intro + "\n\n" + shared], score=2.0, tags_json=tags)
+
+        first = upload("a.txt", "Inledning för a. " + " ".join(f"alfa{j}" for j in range(80)))
+        second = upload("b.txt", "Inledning för b. " + " ".join(f"beta{j}" for j in range(80)))
+        assert not set(first) & set(second)
+        hits = store.retrieve_text_terms(["delat5"], tags={"filename": "b.txt"})
+        assert [h["id"] for h in hits] == [second[-1]]
+        # Samma fil igen slås fortfarande ihop
+        assert upload("b.txt", "Inledning för b. " + " ".join(f"beta{j}" for j in range(80))) == second
+
+    def test_near_duplicate_keeps_edited_text_and_tags(self, store):
+        tags = json.dumps({"source": "document_upload", "filename": "a.txt", "chunk_index": 0})
+        first = store.upsert_text_memory_single(LONG, tags_json=tags)
+        edited = LONG.replace("elva", "tolv")
+        newer = json.dumps({"source": "document_upload", "filename": "a.txt", "chunk_index": 1})
+        assert store.upsert_text_memory_single(edited, tags_json=newer) == first
+        text, stored = store._conn().execute("SELECT text, tags FROM memories WHERE id = ?", (first,)).fetchone()
+        assert text == edited and json.loads(stored)["chunk_index"] == 1
+        # Fingeravtrycket följer den nya texten
+        assert store.upsert_text_memory_single(edited, tags_json=newer) == first
+        assert [h["id"] for h in store.retrieve_text_terms(["tolv"])] == [first]
+
+    def test_duplicates_within_one_batch(self, store, count_rows):
+        ids = store._upsert_text_rows(store._conn(), [("t", REPLY, 0.0, None), ("t", REPLY, 0.0, None)])[0]
+        store._conn().commit()
+        assert ids[0] == ids[1] and count_rows(store) == 1
+
+    def test_deleted_memory_is_not_a_merge_target(self, store):
+        first = store.upsert_text_memory_single(REPLY)
+        store.delete_memories([first])
+        assert store.upsert_text_memory_single(REPLY) != first
+        assert store._conn().execute("SELECT COUNT(*) FROM memory_fingerprints WHERE mem_id = ?", (first,)).fetchone()[0] == 0
+
+    def test_disabled(self, tmp_path, count_rows):
+        store = MemoryStore(str(tmp_path / "plain.db"), dedup=False)
+        store.upsert_text_memory_single(REPLY)
+        store.upsert_text_memory_single(REPLY)
+        assert count_rows(store) == 2 and not store.dedup_stats()["enabled"]
+        store.close()
+
+    def test_backfill_fingerprints_for_existing_rows(self, tmp_path):
+        path = str(tmp_path / "old.db")
+        old = MemoryStore(path, dedup=False)
+        first = old.upsert_text_memory_single(REPLY)
+        old.close()
+        store = MemoryStore(path)
+        assert store.backfill_fingerprints(limit=10) == 1
+        assert store.backfill_fingerprints(limit=10) == 0
+        assert store.upsert_text_memory_single(REPLY) == first
+        store.close()
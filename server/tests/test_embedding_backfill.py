@@ -0,0 +1,184 @@
+"""
+Tester för embedding_backfill.py - bakgrunds-backfill med checkpoint
+"""
+
+import asyncio
+import os
+import sys
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from embedding_backfill import EmbeddingBackfill
+from memory import MemoryStore
+from memory_async import AsyncMemoryStore
+
+
+class FakePipeline:
+    """Deterministic stand-in for EmbeddingPipeline.embed"""
+
+    def __init__(self, model="m1", fail_texts=(), whole_batch=False, down=False):
+        self.model = model
+        self.fail_texts = set(fail_texts)
+        self.whole_batch = whole_batch  # en trasig text fäller hela anropet, som hos API:t
+        self.down = down
+        self.seen = []
+
+    async def embed(self, texts):
+        self.seen.extend(texts)
+        if self.down or (self.whole_batch and self.fail_texts.intersection(texts)):
+            return [None] * len(texts)
+        return [
+            None if (not t.strip() or t in self.fail_texts) else np.array([len(t), 1.0], dtype=np.float32)
+            for t in texts
+        ]
+
+
+def _run(store, pipeline, batches, **kw):
+    async def go():
+        amemory = AsyncMemoryStore(store)
+        worker = EmbeddingBackfill(amemory, pipeline, **kw)
+        handled = []
+        try:
+            for _ in range(batches):
+                handled.append(await worker.run_once())
+        finally:
+            await amemory.aclose()
+        return worker, handled
+
+    return asyncio.run(go())
+
+
+class TestEmbeddingBackfill:
+
+    def test_fills_missing_and_resumes(self, tmp_path):
+        db = str(tmp_path / "alice.db")
+        store = MemoryStore(db)
+        ids = [store.upsert_text_memory_single(f"minne {i}") for i in range(5)]
+        store.upsert_embedding(ids[1], "m1", 2, [1.0, 0.0])  # already embedded inline
+        pipe = FakePipeline()
+        _, handled = _run(store, pipe, 1, batch_size=2)
+        assert handled == [2] and pipe.seen == ["minne 0", "minne 2"]
+
+        # Restart: a new store and worker continue after the checkpoint
+        store = MemoryStore(db)
+        pipe = FakePipeline()
+        worker, handled = _run(store, pipe, 3, batch_size=2)
+        assert pipe.seen == ["minne 3", "minne 4"]
+        assert handled == [2, 0, 0] and worker.caught_up
+        assert sorted(r[0] for r in store.get_all_embeddings("m1")) == ids
+        assert store.get_backfill_checkpoint("m1")["embedded"] == 4
+        store.close()
+
+    def test_model_change_reembeds_everything(self, tmp_path):
+        store = MemoryStore(str(tmp_path / "alice.db"))
+        ids = [store.upsert_text_memory_single(f"text {i}") for i in range(3)]
+        _run(store, FakePipeline("m1"), 2)
+        store.vector_index("m1")
+        assert len(store.vector_index("m1")) == 3
+
+        _run(store, FakePipeline("m2"), 2)
+        assert store.get_all_embeddings("m1") == []
+        assert sorted(r[0] for r in store.get_all_embeddings("m2")) == ids
+        # Stale vectors leave the old model's loaded index
+        assert len(store.vector_index("m1")) == 0
+        store.close()
+
+    def test_failure_does_not_skip_rows(self, tmp_path):
+        store = MemoryStore(str(tmp_path / "alice.db"))
+        ids = [store.upsert_text_memory_single(t) for t in ("a1", "trasig", "a3")]
+        pipe = FakePipeline(fail_texts={"trasig"})
+
+        async def go():
+            amemory = AsyncMemoryStore(store)
+            worker = EmbeddingBackfill(amemory, pipe)
+            try:
+                await worker.run_once()
+            except RuntimeError:
+                pass
+            finally:
+                await amemory.aclose()
+            return worker
+
+        worker = asyncio.run(go())
+        assert worker.failed == 1
+        assert store.get_backfill_checkpoint("m1")["last_id"] == ids[0]
+        assert sorted(r[0] for r in store.get_all_embeddings("m1")) == [ids[0], ids[2]]
+        # Next pass retries only the failed row
+        pipe.fail_texts.clear()
+        pipe.seen.clear()
+        _run(store, pipe, 1)
+        assert pipe.seen == ["trasig"]
+        store.close()
+
+    def test_poison_row_retried_alone_then_skipped(self, tmp_path):
+        store = MemoryStore(str(tmp_path / "alice.db"))
+        ids = [store.upsert_text_memory_single(t) for t in ("a1", "trasig", "a3")]
+        pipe = FakePipeline(fail_texts={"trasig"}, whole_batch=True)
+
+        async def go():
+            amemory = AsyncMemoryStore(store)
+            worker = EmbeddingBackfill(amemory, pipe, max_attempts=2)
+            errors = []
+            try:
+                for _ in range(3):
+                    try:
+                        await worker.run_once()
+                    except RuntimeError as e:
+                        errors.append(str(e))
+            finally:
+                await amemory.aclose()
+            return worker, errors
+
+        worker, errors = asyncio.run(go())
+        # Batchen föll på en rad; de andra embeddades när raderna provades en och en
+        assert sorted(r[0] for r in store.get_all_embeddings("m1")) == [ids[0], ids[2]]
+        assert errors == ["1 of 3 embeddings failed, backing off"]
+        assert worker.skipped == 1 and worker.failed == 1
+        # Cursorn har passerat den trasiga raden och backfillen är ikapp
+        assert store.get_backfill_checkpoint("m1")["last_id"] == ids[1] and worker.caught_up
+        store.close()
+
+    def test_outage_does_not_use_up_attempts(self, tmp_path):
+        store = MemoryStore(str(tmp_path / "alice.db"))
+        ids = [store.upsert_text_memory_single(t) for t in ("b1", "b2")]
+        pipe = FakePipeline(down=True)
+
+        async def go():
+            amemory = AsyncMemoryStore(store)
+            worker = EmbeddingBackfill(amemory, pipe, max_attempts=1)
+            try:
+                for _ in range(3):
+                    try:
+                        await worker.run_once()
+                    except RuntimeError:
+                        pass
+            finally:
+                await amemory.aclose()
+            return worker
+
+        worker = asyncio.run(go())
+        assert worker.skipped == 0 and worker.failed == 6
+        assert store.get_backfill_checkpoint("m1")["last_id"] == ids[0] - 1
+        store.close()
+
+    def test_start_stop(self, tmp_path):
+        store = MemoryStore(str(tmp_path / "alice.db"))
+        store.upsert_text_memory_single("bakgrund")
+
+        async def go():
+            amemory = AsyncMemoryStore(store)
+            worker = EmbeddingBackfill(amemory, FakePipeline(), idle_s=60)
+            worker.start()
+            for _ in range(100):
+                await asyncio.sleep(0.01)
+                if worker.caught_up:
+                    break
+            await worker.stop()
+            await amemory.aclose()
+            return worker.stats()
+
+        stats = asyncio.run(go())
+        assert stats["embedded"] == 1 and stats["caught_up"] and not stats["running"]
+        store.close()
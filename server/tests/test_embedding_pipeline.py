@@ -0,0 +1,133 @@
+"""
+Tester för embedding_pipeline.py mot en lokal ersättningsserver (OpenAI-format)
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from embedding_pipeline import EmbeddingPipeline
+from memory import MemoryStore
+from memory_async import AsyncMemoryStore
+
+DIM = 8
+
+
+def _fake_vector(text):
+    seed = int.from_bytes(hashlib.sha256(text.encode()).digest()[:4], "little")
+    return np.random.default_rng(seed).standard_normal(DIM).round(6).tolist()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        server = self.server
+        with server.lock:
+            server.calls.append(body)
+            fail = server.fail_next > 0
+            server.fail_next -= 1
+        if fail:
+            self.send_response(503)
+            self.end_headers()
+            return
+        inputs = body["input"] if isinstance(body["input"], list) else [body["input"]]
+        # Omvänd ordning: klienten måste sortera på "index"
+        data = [{"object": "embedding", "index": i, "embedding": _fake_vector(t)} for i, t in enumerate(inputs)][::-1]
+        payload = json.dumps({"object": "list", "data": data, "model": body["model"]}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def embed_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    server.calls, server.fail_next, server.lock = [], 0, threading.Lock()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _pipeline(server, **kw):
+    return EmbeddingPipeline(
+        api_key="test", model="fake", base_url=f"http://127.0.0.1:{server.server_address[1]}/v1", **kw
+    )
+
+
+class TestEmbeddingPipeline:
+
+    def test_batches_and_order(self, embed_server):
+        texts = [f"chunk {i}" for i in range(25)] + ["", "   "]
+        pipe = _pipeline(embed_server, batch_size=10, concurrency=2)
+
+        async def run():
+            try:
+                return await pipe.embed(texts)
+            finally:
+                await pipe.aclose()
+
+        vectors = asyncio.run(run())
+        assert len(embed_server.calls) == 3
+        assert all(isinstance(c["input"], list) for c in embed_server.calls)
+        for text, vec in zip(texts[:25], vectors):
+            assert np.allclose(vec, _fake_vector(text), atol=1e-6)
+        assert vectors[25] is None and vectors[26] is None
+
+    def test_char_budget_splits_batches(self):
+        pipe = EmbeddingPipeline(api_key="x", batch_size=100, max_batch_chars=10)
+        assert pipe._batches(["aaaa", "bbbb", "cccc", "", "dd"]) == [[0, 1], [2, 4]]
+
+    def test_retries_transient_errors(self, embed_server):
+        embed_server.fail_next = 1
+        pipe = _pipeline(embed_server)
+
+        async def run():
+            try:
+                return await pipe.embed(["hej"])
+            finally:
+                await pipe.aclose()
+
+        vectors = asyncio.run(run())
+        assert vectors[0] is not None and len(embed_server.calls) == 2
+
+    def test_disabled_without_key(self):
+        pipe = EmbeddingPipeline(api_key=None)
+        assert asyncio.run(pipe.embed(["a"])) == [None]
+
+    def test_embed_and_store_uses_bulk_write(self, embed_server, tmp_path):
+        store = MemoryStore(str(tmp_path / "alice.db"))
+        text = " ".join(f"Mening nummer {i} om dokumentet." for i in range(400))
+        ids = store.upsert_text_memory(text, auto_chunk=True)
+        assert len(ids) > 5
+        pipe = _pipeline(embed_server, batch_size=4)
+
+        async def run():
+            amemory = AsyncMemoryStore(store)
+            try:
+                return await pipe.embed_and_store(amemory, ids)
+            finally:
+                await pipe.aclose()
+                await amemory.aclose()
+
+        assert asyncio.run(run()) == len(ids)
+        rows = store.get_all_embeddings("fake")
+        assert sorted(r[0] for r in rows) == sorted(ids)
+        texts = store.get_texts_for_mem_ids(ids)
+        best = store.search_embeddings("fake", _fake_vector(texts[ids[3]]), limit=1)
+        assert best[0][0] == ids[3]
@@ -0,0 +1,93 @@
+"""
+Tester för event_journal.py - write-behind med gruppcommit
+"""
+
+import asyncio
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from event_journal import EventJournal
+from memory import MemoryStore
+from memory_async import AsyncMemoryStore
+
+
+class TestEventJournal:
+
+    def test_append_is_buffered_until_flush(self, store, count_rows):
+        store.event_journal = EventJournal(store)
+        for i in range(10):
+            store.append_event("ws_in", f'{{"i": {i}}}')
+        assert count_rows(store, "events") == 0
+        assert store.event_journal.flush() == 10
+        rows = store._conn().execute("SELECT topic, payload FROM events ORDER BY id").fetchall()
+        assert rows[0] == ("ws_in", '{"i": 0}') and rows[-1] == ("ws_in", '{"i": 9}')
+
+    def test_background_group_commit(self, store, count_rows):
+        journal = EventJournal(store, batch_size=100, flush_interval_s=0.01).start()
+        store.event_journal = journal
+        for i in range(1000):
+            store.append_event("chat.in", None)
+        deadline = time.time() + 5
+        while count_rows(store, "events") < 1000 and time.time() < deadline:
+            time.sleep(0.01)
+        assert count_rows(store, "events") == 1000
+        assert journal.stats()["batches"] <= 20
+        journal.close()
+
+    def test_bounded_queue_drops_oldest(self, store):
+        journal = EventJournal(store, max_queue=5)
+        for i in range(8):
+            journal.append("t", str(i))
+        journal.flush()
+        payloads = [r[0] for r in store._conn().execute("SELECT payload FROM events ORDER BY id")]
+        assert payloads == ["3", "4", "5", "6", "7"]
+        assert journal.stats()["dropped"] == 3
+
+    def test_close_drains(self, store, count_rows):
+        journal = EventJournal(store, flush_interval_s=60).start()
+        for _ in range(50):
+            journal.append("t", None)
+        journal.close()
+        assert count_rows(store, "events") == 50 and not journal.stats()["running"]
+
+    def test_failed_flush_keeps_events(self, store):
+        journal = EventJournal(store)
+        journal.append("t", "a")
+        original = store.write_events
+        store.write_events = lambda rows, synchronous=None: (_ for _ in ()).throw(RuntimeError("disk"))
+        with pytest.raises(RuntimeError):
+            journal.flush()
+        store.write_events = original
+        assert journal.flush() == 1 and journal.stats()["errors"] == 1
+
+    @pytest.mark.parametrize("level", ["off", "normal", "full"])
+    def test_durability_levels(self, store, level, count_rows):
+        journal = EventJournal(store, durability=level)
+        journal.append("t", None)
+        journal.flush()
+        # The pooled connection is restored to the store default afterwards
+        assert store._conn().execute("PRAGMA synchronous").fetchone()[0] == 1
+        assert count_rows(store, "events") == 1
+
+    def test_invalid_durability(self, store):
+        with pytest.raises(ValueError):
+            EventJournal(store, durability="sometimes")
+
+    def test_async_append_skips_writer_thread(self, store):
+        store.event_journal = EventJournal(store)
+
+        async def go():
+            amemory = AsyncMemoryStore(store)
+            await amemory.append_event("ws_in", "{}")
+            stats = amemory.stats()
+            await amemory.aclose()
+            return stats
+
+        stats = asyncio.run(go())
+        assert stats["write"]["count"] == 0
+        assert store.event_journal.stats()["queued"] == 1
@@ -0,0 +1,160 @@
+"""
+Tester för http_pool.py - delade HTTP-klienter med keep-alive och poolstatistik
+"""
+
+import asyncio
+import os
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from http_client import AliceHTTPClient, RetryConfig
+from http_pool import HTTP2_AVAILABLE, HTTPClientRegistry, PoolConfig, http_clients
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    fail_next = 0
+
+    def do_GET(self):
+        status = 200
+        if _Handler.fail_next > 0:
+            _Handler.fail_next -= 1
+            status = 503
+        self.send_response(status)
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write(b"ok")
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture(scope="module")
+def server_url():
+    srv = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{srv.server_port}"
+    srv.shutdown()
+
+
+class TestHTTPClientRegistry:
+
+    def test_sessions_share_one_keepalive_connection(self, server_url):
+        reg = HTTPClientRegistry()
+
+        async def run():
+            for _ in range(5):
+                async with reg.session("local", timeout=2.0) as client:
+                    r = await client.get(server_url)
+                    assert r.text == "ok"
+            await reg.aclose()
+
+        asyncio.run(run())
+        st = reg.stats()["services"]["local"]
+        assert st["requests"] == 5
+        assert st["new_connections"] == 1 and st["reused"] == 4
+        assert st["hit_rate"] == pytest.approx(0.8)
+        assert st["connect_ms"]["count"] == 1
+        assert reg.created == 1
+
+    def test_session_applies_call_site_timeout(self, server_url):
+        reg = HTTPClientRegistry()
+        seen = []
+
+        async def run():
+            async with reg.session("local", timeout=1.5) as client:
+                r = await client.get(server_url)
+                seen.append(r.request.extensions["timeout"])
+                r = await client.get(server_url, timeout=3.0)
+                seen.append(r.request.extensions["timeout"])
+            await reg.aclose()
+
+        asyncio.run(run())
+        assert seen[0]["read"] == 1.5
+        assert seen[1]["read"] == 3.0
+
+    def test_session_does_not_close_shared_client(self):
+        reg = HTTPClientRegistry()
+
+        async def run():
+            async with reg.session("local") as _:
+                pass
+            client = reg.client("local")
+            assert not client.is_closed
+            await reg.aclose()
+            assert client.is_closed
+
+        asyncio.run(run())
+
+    def test_new_event_loop_gets_new_client(self):
+        reg = HTTPClientRegistry()
+
+        async def get():
+            return reg.client("local")
+
+        first = asyncio.run(get())
+        second = asyncio.run(get())
+        assert first is not second
+        assert reg.created == 2
+
+    def test_loop_change_closes_replaced_client(self, server_url):
+        reg = HTTPClientRegistry()
+
+        async def get():
+            async with reg.session("local", timeout=2.0) as client:
+                await client.get(server_url)
+            return reg.client("local")
+
+        first = asyncio.run(get())
+        conns = first._transport._pool.connections
+        assert len(conns) == 1
+        asyncio.run(get())
+        assert reg.stale_closed == 1 and reg.stats()["stale_clients_closed"] == 1
+        # Den gamla loopens uppkoppling är nedkopplad, inte kvarlämnad åt GC
+        sock = conns[0]._connection._network_stream.get_extra_info("socket")
+        assert sock.fileno() == -1
+
+    def test_bound_session_adds_base_url_and_headers(self, server_url):
+        reg = HTTPClientRegistry()
+        bound = reg.bind("local", timeout=2.0, base_url=server_url + "/v1/", headers={"X-Alice": "1", "X-Both": "bound"})
+
+        async def run():
+            r = await bound.get("/models", headers={"X-Both": "call"})
+            await reg.aclose()
+            return r.request
+
+        req = asyncio.run(run())
+        assert str(req.url) == server_url + "/v1/models"
+        assert req.headers["X-Alice"] == "1" and req.headers["X-Both"] == "call"
+        # Bunden vid import, används i en senare loop: följer registrets nya klient
+        req = asyncio.run(run())
+        assert str(req.url) == server_url + "/v1/models"
+
+    def test_pool_config_and_http2_flag(self):
+        reg = HTTPClientRegistry({"default": PoolConfig(), "api": PoolConfig(max_connections=3, http2=True)})
+        cfg = reg.configure("api", max_keepalive=2)
+        assert (cfg.max_connections, cfg.max_keepalive) == (3, 2)
+        reg.start(["api"])
+        stats = reg.stats()["services"]["api"]
+        assert stats["max_connections"] == 3
+        assert stats["http2"] is HTTP2_AVAILABLE
+
+
+def test_retries_reuse_pooled_connection(server_url):
+    _Handler.fail_next = 2
+    client = AliceHTTPClient("retry-test")
+    retry = RetryConfig(max_retries=3, backoff_factor=0.0)
+
+    async def run():
+        r = await client.get(server_url, retry_config=retry)
+        await http_clients.aclose()
+        return r.status_code
+
+    assert asyncio.run(run()) == 200
+    st = http_clients.stats()["services"]["retry-test"]
+    assert st["requests"] == 3 and st["new_connections"] == 1
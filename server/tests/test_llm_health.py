@@ -0,0 +1,200 @@
+"""
+Tester för llm/health.py - passiv hälsa (EWMA + glidande fönster) i ModelManager
+"""
+
+import asyncio
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from llm.health import CircuitState, PassiveHealth
+from llm.manager import HealthStatus, LLMResponse, ModelManager
+
+
+class FakeLLM:
+    def __init__(self, name, ttft_ms=100.0):
+        self.name = name
+        self.ttft_ms = ttft_ms
+        self.fail = False
+        self.chats = 0
+        self.health_calls = 0
+
+    async def chat(self, messages, tools=None):
+        self.chats += 1
+        if self.fail:
+            raise RuntimeError("boom")
+        return LLMResponse(text="ok", tftt_ms=self.ttft_ms)
+
+    async def health(self):
+        self.health_calls += 1
+        return HealthStatus(ok=not self.fail, tftt_ms=self.ttft_ms, error="down" if self.fail else None)
+
+
+def _manager(**health_kw):
+    primary, fallback = FakeLLM("primary"), FakeLLM("fallback")
+    kw = dict(consecutive_failures=3, cooldown_s=0.0, half_open_max=1, half_open_successes=2)
+    kw.update(health_kw)
+    return ModelManager(primary, fallback, health=PassiveHealth(**kw)), primary, fallback
+
+
+def _ask(mgr, n=1):
+    async def run():
+        return [await mgr.ask([{"role": "user", "content": "hej"}]) for _ in range(n)]
+    return asyncio.run(run())
+
+
+class TestPassiveHealth:
+
+    def test_ewma_tracks_ttft(self):
+        h = PassiveHealth(ewma_alpha=0.5, max_ttft_ms=0)
+        for ms in (100.0, 200.0, 200.0):
+            h.begin()
+            h.record_success(ms)
+        assert h.ttft_ewma_ms == pytest.approx(175.0)
+
+    def test_error_rate_opens_circuit(self):
+        h = PassiveHealth(min_samples=4, max_error_rate=0.5, consecutive_failures=10)
+        for ok in (True, False, True, False):
+            h.begin()
+            h.record_success(50.0) if ok else h.record_failure()
+        assert h.state == CircuitState.OPEN
+        assert "error rate" in h.open_reason
+
+    def test_slow_ttft_opens_circuit(self):
+        h = PassiveHealth(max_ttft_ms=500, ewma_alpha=1.0)
+        h.begin()
+        h.record_success(900.0)
+        assert h.state == CircuitState.OPEN
+
+    def test_timeouts_counted_separately(self):
+        h = PassiveHealth(consecutive_failures=10, min_samples=100)
+        h.begin()
+        h.record_failure(timeout=True)
+        h.begin()
+        h.record_success(10.0)
+        st = h.stats()
+        assert st["timeout_rate"] == 0.5 and st["totals"]["timeout"] == 1
+
+    def test_half_open_lets_a_trickle_through(self):
+        h = PassiveHealth(consecutive_failures=1, cooldown_s=0.0, half_open_max=1)
+        h.record_failure()
+        assert h.allow()  # OPEN -> HALF_OPEN, första provet
+        assert h.state == CircuitState.HALF_OPEN
+        assert not h.allow()  # bara ett prov åt gången
+        h.record_failure(trial=True)
+        assert h.state == CircuitState.OPEN
+
+
+class TestModelManagerPassiveHealth:
+
+    def test_no_probe_in_request_path(self):
+        mgr, primary, _ = _manager()
+        _ask(mgr, 3)
+        assert primary.health_calls == 0
+        assert primary.chats == 3
+        assert mgr.get_status()["primary"]["health"]["totals"]["success"] == 3
+
+    def test_failures_open_then_trial_traffic_closes(self):
+        mgr, primary, fallback = _manager(cooldown_s=3600.0)
+        primary.fail = True
+        out = _ask(mgr, 3)
+        assert all("failover" in r.provider for r in out)
+        assert mgr.health.state == CircuitState.OPEN
+        assert mgr.get_status()["primary"]["circuit_breaker_open"]
+
+        # Öppen krets: direkt till fallback utan att röra primären
+        before = primary.chats
+        assert _ask(mgr)[0].provider == "fallback"
+        assert primary.chats == before
+
+        # Efter cooldown släpps prov-trafik igenom och stänger kretsen
+        primary.fail = False
+        mgr.health.cooldown_s = 0.0
+        out = _ask(mgr, 2)
+        assert [r.provider for r in out] == ["primary", "primary"]
+        assert mgr.health.state == CircuitState.CLOSED
+        assert mgr.failure_count == 0
+
+    def test_idle_probe_only_when_idle(self):
+        mgr, primary, _ = _manager()
+        mgr.probe_idle_s = 3600.0
+        _ask(mgr)
+        assert asyncio.run(mgr.probe()) is None
+        assert primary.health_calls == 0
+        mgr.probe_idle_s = 0.0
+        status = asyncio.run(mgr.probe())
+        assert status.ok and primary.health_calls == 1
+        assert mgr.get_status()["primary"]["health_status"]["ok"]
+
+    def test_idle_probe_tests_recovery(self):
+        mgr, primary, _ = _manager(half_open_successes=1)
+        mgr.probe_idle_s = 3600.0
+        primary.fail = True
+        _ask(mgr, 3)
+        assert mgr.health.state == CircuitState.OPEN
+        primary.fail = False
+        # Cooldown passerad: proben får köras trots att primären inte är "idle" länge
+        assert asyncio.run(mgr.probe()).ok
+        assert mgr.health.state == CircuitState.CLOSED
+
+    def test_half_open_trial_generates_idle_probe_does_not(self):
+        mgr, primary, _ = _manager(half_open_successes=1)
+        calls = []
+
+        async def trial():
+            calls.append("trial")
+            return HealthStatus(ok=True, tftt_ms=50.0)
+
+        primary.trial = trial
+        mgr.probe_idle_s = 0.0
+        assert asyncio.run(mgr.probe()).ok
+        assert calls == [] and primary.health_calls == 1
+        primary.fail = True
+        _ask(mgr, 3)
+        assert mgr.health.state == CircuitState.OPEN
+        assert asyncio.run(mgr.probe()).ok
+        assert calls == ["trial"] and primary.health_calls == 1
+        assert mgr.health.state == CircuitState.CLOSED
+
+    def test_shed_trial_is_not_a_failure(self):
+        from llm.scheduler import LLMOverloaded
+
+        mgr, primary, _ = _manager()
+        primary.fail = True
+        _ask(mgr, 3)
+
+        async def trial():
+            raise LLMOverloaded("queue full")
+
+        primary.trial = trial
+        assert asyncio.run(mgr.probe()) is None
+        assert mgr.health.state == CircuitState.HALF_OPEN
+        assert mgr.health.trials_in_flight == 0 and mgr.health.in_flight == 0
+
+    def test_coordinator_close_stops_idle_prober(self):
+        from llm_coordinator import LLMCoordinator
+
+        mgr, _, _ = _manager()
+        mgr.probe_interval_s = 3600.0
+        coordinator = LLMCoordinator()
+        coordinator.model_manager = mgr
+
+        async def run():
+            await mgr.ask([{"role": "user", "content": "hej"}])
+            task = mgr._probe_task
+            assert task is not None and not task.done()
+            await coordinator.aclose()
+            return task
+
+        task = asyncio.run(run())
+        assert task.cancelled() and mgr._probe_task is None
+
+    def test_reset_circuit_breaker(self):
+        mgr, primary, _ = _manager(cooldown_s=3600.0)
+        primary.fail = True
+        _ask(mgr, 3)
+        mgr.reset_circuit_breaker()
+        assert mgr.health.state == CircuitState.CLOSED and mgr.failure_count == 0
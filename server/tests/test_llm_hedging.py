@@ -0,0 +1,227 @@
+"""
+Tester för llm/hedging.py - hedgade requests med inlärd p90-fördröjning och budget
+"""
+
+import asyncio
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from llm.health import PassiveHealth
+from llm.hedging import BACKUP, PRIMARY, HedgePolicy, prompt_class
+from llm.manager import HealthStatus, ModelManager, TokenMeter, collect_stream
+
+
+def _after(seconds, value, log=None, name=None):
+    async def run():
+        if log is not None:
+            log.append(f"{name}:start")
+        try:
+            await asyncio.sleep(seconds)
+        except asyncio.CancelledError:
+            if log is not None:
+                log.append(f"{name}:cancelled")
+            raise
+        if isinstance(value, BaseException):
+            raise value
+        return value
+    return run
+
+
+def _policy(**kw):
+    base = dict(default_delay_ms=50.0, min_delay_ms=1.0, min_samples=3, budget_per_min=10, backup_cost=0.01)
+    base.update(kw)
+    return HedgePolicy(**base)
+
+
+class TestHedgePolicy:
+
+    def test_fast_primary_never_starts_backup(self):
+        policy, log = _policy(), []
+        res = asyncio.run(policy.race(_after(0.0, "local"), _after(0.0, "cloud", log, "b"), "c"))
+        assert (res.value, res.winner, res.hedged) == ("local", PRIMARY, False)
+        assert log == []
+        st = policy.stats()
+        assert st["backup_calls"] == 0 and st["backup_calls_saved"] == 1
+        assert st["est_cost_saved"] == pytest.approx(0.01)
+
+    def test_slow_primary_is_hedged_and_loser_cancelled(self):
+        policy, log = _policy(), []
+
+        async def run():
+            res = await policy.race(_after(1.0, "local", log, "p"), _after(0.01, "cloud", log, "b"), "c")
+            await asyncio.sleep(0)
+            return res
+
+        res = asyncio.run(run())
+        assert (res.value, res.winner, res.hedged) == ("cloud", BACKUP, True)
+        assert "p:cancelled" in log
+        st = policy.stats()
+        assert st["hedge_rate"] == 1.0 and st["hedge_wins"][BACKUP] == 1
+
+    def test_delay_learned_from_p90_per_class(self):
+        policy = _policy(min_samples=5)
+        for ms in (100, 110, 120, 130, 400):
+            policy.record_ttft("chat:short", ms)
+        assert policy.delay_ms("chat:short") == 400
+        assert policy.delay_ms("route:short") == 50.0  # ingen data än: default
+
+        async def run():
+            for _ in range(5):
+                await policy.race(_after(0.0, "x"), _after(0.0, "y"), "route:short")
+
+        asyncio.run(run())
+        assert policy.delay_ms("route:short") < 50.0
+
+    def test_budget_caps_hedges_per_minute(self):
+        policy, log = _policy(default_delay_ms=1.0, budget_per_min=2, min_samples=100), []
+
+        async def run():
+            return [await policy.race(_after(0.02, "p"), _after(0.0, "b", log, "b"), "c") for _ in range(4)]
+
+        out = asyncio.run(run())
+        assert [r.hedged for r in out] == [True, True, False, False]
+        assert [r.winner for r in out[2:]] == [PRIMARY, PRIMARY]
+        assert policy.stats()["budget_denied"] == 2 and policy.budget_left() == 0
+
+    def test_fast_failure_fails_over_without_budget(self):
+        policy = _policy(budget_per_min=0)
+        res = asyncio.run(policy.race(_after(0.0, RuntimeError("down")), _after(0.0, "cloud"), "c"))
+        assert res.winner == BACKUP and not res.hedged
+        assert policy.stats()["failovers"] == 1
+
+    def test_both_failing_returns_last_error(self):
+        policy = _policy()
+        res = asyncio.run(policy.race(_after(0.0, None), _after(0.0, RuntimeError("nope")), "c"))
+        assert res.winner is None and isinstance(res.value, RuntimeError)
+        assert policy.stats()["failed"] == 1
+
+    def test_race_learns_latency_from_slot_grant(self):
+        from llm.scheduler import LLMScheduler, Priority
+
+        sched = LLMScheduler(limits={"ollama": 1})
+        policy = _policy(default_delay_ms=5000.0)
+
+        async def try_local():
+            # Som /api/chat: icke-strömmande anrop som tar sin slot inne i det tidsatta anropet
+            async with sched.slot("ollama", Priority.CHAT):
+                await asyncio.sleep(0.01)
+                return "local"
+
+        async def run():
+            async def voice():
+                async with sched.slot("ollama", Priority.VOICE):
+                    await asyncio.sleep(0.1)
+
+            holder = asyncio.create_task(voice())
+            await asyncio.sleep(0)
+            res = await policy.race(try_local, _after(0.0, "cloud"), "chat:short")
+            await holder
+            return res
+
+        res = asyncio.run(run())
+        assert res.winner == PRIMARY and res.elapsed_ms >= 100.0
+        assert list(policy._ttft["chat:short"])[0] < 50.0
+
+    def test_prompt_class_buckets(self):
+        assert prompt_class("chat", "hej") == "chat:short"
+        assert prompt_class("chat", "x" * 5000, tools=True) == "chat:long:tools"
+
+
+class SlowStreamLLM:
+    def __init__(self, name, words, delay=0.0, fail=False):
+        self.name = name
+        self.words = words
+        self.delay = delay
+        self.fail = fail
+        self.started = 0
+        self.closed = 0
+
+    async def stream_chat(self, messages, tools=None):
+        self.started += 1
+        meter = TokenMeter(self.name)
+        try:
+            await asyncio.sleep(self.delay)
+            if self.fail:
+                raise RuntimeError("down")
+            for w in self.words:
+                yield meter.chunk(w)
+            yield meter.done()
+        finally:
+            self.closed += 1
+
+    async def health(self):
+        return HealthStatus(ok=True)
+
+
+def _manager(primary, fallback, **kw):
+    return ModelManager(primary, fallback, health=PassiveHealth(consecutive_failures=3), hedge=_policy(**kw))
+
+
+def _ask(mgr):
+    async def run():
+        resp = await collect_stream(mgr.hedged_stream([{"role": "user", "content": "hej"}]))
+        await asyncio.sleep(0.01)
+        return resp
+    return asyncio.run(run())
+
+
+class TestModelManagerHedging:
+
+    def test_fast_primary_streams_alone(self):
+        primary, fallback = SlowStreamLLM("local", ["a", "b"]), SlowStreamLLM("cloud", ["x"])
+        mgr = _manager(primary, fallback)
+        resp = _ask(mgr)
+        assert resp.text == "ab" and resp.provider == "local"
+        assert fallback.started == 0
+        assert mgr.health.totals["success"] == 1 and mgr.health.in_flight == 0
+        assert mgr.get_status()["hedging"]["wins"][PRIMARY] == 1
+
+    def test_slow_primary_loses_to_hedge_and_is_closed(self):
+        primary, fallback = SlowStreamLLM("local", ["a"], delay=1.0), SlowStreamLLM("cloud", ["x", "y"])
+        mgr = _manager(primary, fallback)
+        resp = _ask(mgr)
+        assert resp.text == "xy" and resp.provider == "cloud (hedge)"
+        assert primary.closed == 1
+        assert mgr.health.in_flight == 0 and mgr.health.totals["success"] == 0
+
+    def test_primary_failure_recorded_and_fails_over(self):
+        primary, fallback = SlowStreamLLM("local", [], fail=True), SlowStreamLLM("cloud", ["x"])
+        mgr = _manager(primary, fallback)
+        resp = _ask(mgr)
+        assert resp.text == "x" and resp.provider == "cloud (failover)"
+        assert mgr.health.failures_in_row == 1 and mgr.health.in_flight == 0
+
+    def test_learned_ttft_excludes_scheduler_queue_wait(self):
+        from llm.scheduler import LLMScheduler, Priority
+
+        sched = LLMScheduler(limits={"ollama": 1})
+
+        class QueuedLLM(SlowStreamLLM):
+            async def stream_chat(self, messages, tools=None):
+                async with sched.slot("ollama"):
+                    meter = TokenMeter(self.name)
+                    yield meter.chunk("a")
+                    yield meter.done()
+
+        primary, fallback = QueuedLLM("local", []), SlowStreamLLM("cloud", ["x"])
+        mgr = _manager(primary, fallback, default_delay_ms=5000.0)
+
+        async def run():
+            async def busy():
+                async with sched.slot("ollama", Priority.VOICE):
+                    await asyncio.sleep(0.1)
+
+            holder = asyncio.create_task(busy())
+            await asyncio.sleep(0)
+            resp = await collect_stream(mgr.hedged_stream([{"role": "user", "content": "hej"}], klass="c"))
+            await holder
+            return resp
+
+        resp = asyncio.run(run())
+        assert resp.provider == "local" and fallback.started == 0
+        # Kön tog ~100 ms; det inlärda provet är bara tiden efter beviljad slot
+        assert list(mgr.hedge._ttft["c"])[0] < 50.0
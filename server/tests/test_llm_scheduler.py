@@ -0,0 +1,201 @@
+"""
+Tester för llm/scheduler.py - prioritetsklasser, begränsad samtidighet, shedding och preemption
+"""
+
+import asyncio
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from llm.scheduler import LLMOverloaded, LLMPreempted, LLMScheduler, Priority, priority_scope
+
+
+def _sched(**kw):
+    base = dict(limits={"ollama": 1}, background_slots={"ollama": 1})
+    base.update(kw)
+    return LLMScheduler(**base)
+
+
+async def _hold(sched, order, name, priority, release, backend="ollama"):
+    async with sched.slot(backend, priority):
+        order.append(name)
+        await release.wait()
+
+
+class TestLLMScheduler:
+
+    def test_slots_go_to_highest_class_first(self):
+        sched, order = _sched(), []
+
+        async def run():
+            gate = asyncio.Event()
+            first = asyncio.create_task(_hold(sched, order, "busy", Priority.CHAT, gate))
+            await asyncio.sleep(0)
+            waiters = [
+                asyncio.create_task(_hold(sched, order, name, prio, gate))
+                for name, prio in (("bg", Priority.BACKGROUND), ("tools", Priority.TOOLS), ("chat", Priority.CHAT), ("voice", Priority.VOICE))
+            ]
+            await asyncio.sleep(0)
+            gate.set()
+            await asyncio.gather(first, *waiters)
+
+        asyncio.run(run())
+        assert order == ["busy", "voice", "chat", "tools", "bg"]
+        st = sched.stats()
+        assert st["classes"]["background"]["wait_ms"]["count"] == 1
+        assert st["classes"]["background"]["wait_ms"]["max"] >= st["classes"]["voice"]["wait_ms"]["max"]
+        assert st["backends"]["ollama"] == {"limit": 1, "background_slots": 1, "running": 0, "running_background": 0, "queued": 0}
+
+    def test_concurrency_is_bounded_per_backend(self):
+        sched = _sched(limits={"ollama": 2, "openai": 8})
+        peak = {"ollama": 0, "openai": 0}
+        live = {"ollama": 0, "openai": 0}
+
+        async def call(backend):
+            async with sched.slot(backend, Priority.CHAT):
+                live[backend] += 1
+                peak[backend] = max(peak[backend], live[backend])
+                await asyncio.sleep(0.01)
+                live[backend] -= 1
+
+        async def run():
+            await asyncio.gather(*[call(b) for b in ("ollama", "openai") for _ in range(6)])
+
+        asyncio.run(run())
+        assert peak == {"ollama": 2, "openai": 6}
+
+    def test_background_capped_to_leave_headroom(self):
+        sched, order = _sched(limits={"ollama": 2}, background_slots={"ollama": 1}, preempt=False), []
+
+        async def run():
+            gate = asyncio.Event()
+            bg = [asyncio.create_task(_hold(sched, order, f"bg{i}", Priority.BACKGROUND, gate)) for i in range(2)]
+            await asyncio.sleep(0)
+            voice = asyncio.create_task(_hold(sched, order, "voice", Priority.VOICE, gate))
+            await asyncio.sleep(0)
+            # Den andra bakgrundsuppgiften väntar trots ledig slot; rösten får den direkt
+            assert order == ["bg0", "voice"]
+            gate.set()
+            await asyncio.gather(voice, *bg)
+
+        asyncio.run(run())
+        assert order == ["bg0", "voice", "bg1"]
+
+    def test_queue_depth_sheds_low_priority_first(self):
+        sched = _sched(max_queue={Priority.VOICE: 8, Priority.CHAT: 2, Priority.TOOLS: 1, Priority.BACKGROUND: 0})
+
+        async def run():
+            gate = asyncio.Event()
+            busy = asyncio.create_task(_hold(sched, [], "busy", Priority.CHAT, gate))
+            await asyncio.sleep(0)
+            with pytest.raises(LLMOverloaded):
+                await sched.acquire("ollama", Priority.BACKGROUND)
+            queued = [asyncio.create_task(_hold(sched, [], "c", Priority.CHAT, gate)) for _ in range(2)]
+            await asyncio.sleep(0)
+            with pytest.raises(LLMOverloaded):
+                await sched.acquire("ollama", Priority.TOOLS)
+            # Rösten räknar bara det som köar framför den
+            voice = asyncio.create_task(_hold(sched, [], "v", Priority.VOICE, gate))
+            await asyncio.sleep(0)
+            gate.set()
+            await asyncio.gather(busy, voice, *queued)
+
+        asyncio.run(run())
+        st = sched.stats()["classes"]
+        assert st["background"]["shed"] == 1 and st["tools"]["shed"] == 1
+        assert st["voice"]["shed"] == 0 and st["voice"]["admitted"] == 1
+
+    def test_background_preempted_and_deferred(self):
+        sched, order = _sched(), []
+        attempts = []
+
+        async def summary():
+            attempts.append(len(attempts))
+            await asyncio.sleep(0.05 if len(attempts) == 1 else 0.0)
+            return "sammanfattning"
+
+        async def run():
+            bg = asyncio.create_task(sched.run("ollama", summary, priority=Priority.BACKGROUND, defer_s=0.01))
+            await asyncio.sleep(0.01)
+            gate = asyncio.Event()
+            gate.set()
+            await _hold(sched, order, "voice", Priority.VOICE, gate)
+            return await bg
+
+        assert asyncio.run(run()) == "sammanfattning"
+        assert order == ["voice"] and len(attempts) == 2
+        assert sched.stats()["classes"]["background"]["preempted"] == 1
+
+    def test_preempted_slot_raises_llm_preempted(self):
+        sched = _sched()
+
+        async def run():
+            async def bg():
+                async with sched.slot("ollama", Priority.BACKGROUND):
+                    await asyncio.sleep(1.0)
+
+            task = asyncio.create_task(bg())
+            await asyncio.sleep(0)
+            async with sched.slot("ollama", Priority.CHAT):
+                pass
+            with pytest.raises(LLMPreempted):
+                await task
+
+        asyncio.run(run())
+
+    def test_cancelled_waiter_leaves_queue(self):
+        sched = _sched()
+
+        async def run():
+            gate = asyncio.Event()
+            busy = asyncio.create_task(_hold(sched, [], "busy", Priority.CHAT, gate))
+            await asyncio.sleep(0)
+            waiter = asyncio.create_task(sched.acquire("ollama", Priority.TOOLS))
+            await asyncio.sleep(0)
+            waiter.cancel()
+            await asyncio.sleep(0)
+            gate.set()
+            await busy
+
+        asyncio.run(run())
+        st = sched.stats()
+        assert st["backends"]["ollama"]["queued"] == 0 and st["backends"]["ollama"]["running"] == 0
+        assert st["classes"]["tools"]["cancelled"] == 1
+
+    def test_priority_scope_sets_default_class(self):
+        sched = _sched()
+
+        async def run():
+            with priority_scope(Priority.VOICE):
+                async with sched.slot("ollama") as ticket:
+                    return ticket.priority
+
+        assert asyncio.run(run()) == Priority.VOICE
+
+
+def test_shed_primary_does_not_trip_circuit():
+    from llm.health import PassiveHealth
+    from llm.manager import HealthStatus, LLMResponse, ModelManager
+
+    class Shed:
+        name = "local"
+
+        async def chat(self, messages, tools=None):
+            raise LLMOverloaded("queue full")
+
+        async def health(self):
+            return HealthStatus(ok=True)
+
+    class Cloud(Shed):
+        name = "cloud"
+
+        async def chat(self, messages, tools=None):
+            return LLMResponse(text="ok")
+
+    mgr = ModelManager(Shed(), Cloud(), health=PassiveHealth(consecutive_failures=1))
+    resp = asyncio.run(mgr.ask([{"role": "user", "content": "hej"}]))
+    assert resp.provider == "cloud (failover)"
+    assert mgr.health.healthy and mgr.health.in_flight == 0
@@ -0,0 +1,162 @@
+"""
+Tester för stream_chat - token-streaming med riktig TTFT i adaptrar och ModelManager
+"""
+
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from http_pool import http_clients
+from llm.health import PassiveHealth
+from llm.manager import HealthStatus, LLMChunk, ModelManager, TokenMeter, collect_stream
+from llm.ollama import OllamaAdapter
+from llm.openai import OpenAIAdapter
+
+
+class _StreamHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def _chunked(self, content_type, lines, delay):
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for line in lines:
+            data = line.encode()
+            self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+            self.wfile.flush()
+            time.sleep(delay)
+        self.wfile.write(b"0\r\n\r\n")
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if self.path == "/api/generate":
+            lines = [json.dumps({"response": w, "done": False}) + "\n" for w in ("Hej", " där", "!")]
+            lines.append(json.dumps({"response": "", "done": True, "eval_count": 3, "eval_duration": 300_000_000}) + "\n")
+            self._chunked("application/x-ndjson", lines, 0.05)
+        else:
+            events = [{"choices": [{"delta": {"content": w}}]} for w in ("Hej", " igen")]
+            events.append({"choices": [{"delta": {"tool_calls": [{"index": 0, "id": "c1", "function": {"name": "PLAY", "arguments": "{\"q\":"}}]}}]})
+            events.append({"choices": [{"delta": {"tool_calls": [{"index": 0, "function": {"arguments": "\"jazz\"}"}}]}}]})
+            events.append({"choices": [], "usage": {"completion_tokens": 4}})
+            lines = [f"data: {json.dumps(e)}\n\n" for e in events] + ["data: [DONE]\n\n"]
+            self._chunked("text/event-stream", lines, 0.02)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture(scope="module")
+def base_url():
+    srv = ThreadingHTTPServer(("127.0.0.1", 0), _StreamHandler)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{srv.server_port}"
+    srv.shutdown()
+
+
+def _drain(agen):
+    async def run():
+        out = [c async for c in agen]
+        await http_clients.aclose()
+        return out
+    return asyncio.run(run())
+
+
+class TestAdapters:
+
+    def test_ollama_streams_with_real_ttft(self, base_url):
+        chunks = _drain(OllamaAdapter(base_url=base_url, model="m").stream_chat([{"role": "user", "content": "hej"}]))
+        assert "".join(c.text for c in chunks) == "Hej där!"
+        done = chunks[-1]
+        assert done.done and done.tokens == 3
+        assert done.tokens_per_s == pytest.approx(10.0)
+        # Första token kommer långt före sista: TTFT < total
+        assert 0 < done.tftt_ms < done.total_ms - 80
+
+    def test_openai_streams_and_assembles_tool_calls(self, base_url):
+        adapter = OpenAIAdapter(api_key="test-key", model="m")
+        adapter.base_url = base_url + "/v1"
+        chunks = _drain(adapter.stream_chat([{"role": "user", "content": "hej"}]))
+        assert "".join(c.text for c in chunks) == "Hej igen"
+        done = chunks[-1]
+        assert done.tokens == 4
+        assert done.tool_calls == [{"id": "c1", "type": "function", "function": {"name": "PLAY", "arguments": "{\"q\":\"jazz\"}"}}]
+
+    def test_chat_is_collected_stream(self, base_url):
+        async def run():
+            r = await OllamaAdapter(base_url=base_url, model="m").chat([{"role": "user", "content": "hej"}])
+            await http_clients.aclose()
+            return r
+        resp = asyncio.run(run())
+        assert resp.text == "Hej där!" and resp.tokens == 3
+        assert resp.tftt_ms < resp.total_ms
+
+
+class FakeStreamLLM:
+    def __init__(self, name, words, fail_after=None):
+        self.name = name
+        self.words = words
+        self.fail_after = fail_after
+        self.seen = []
+
+    async def stream_chat(self, messages, tools=None):
+        self.seen.append(messages)
+        meter = TokenMeter(self.name)
+        for i, w in enumerate(self.words):
+            if self.fail_after is not None and i >= self.fail_after:
+                raise RuntimeError("connection reset")
+            yield meter.chunk(w)
+        yield meter.done()
+
+    async def health(self):
+        return HealthStatus(ok=True)
+
+
+def _manager(primary, fallback):
+    return ModelManager(primary, fallback, health=PassiveHealth(consecutive_failures=3))
+
+
+class TestModelManagerStreaming:
+
+    def test_streams_primary_and_records_ttft(self):
+        mgr = _manager(FakeStreamLLM("p", ["a", "b"]), FakeStreamLLM("f", ["x"]))
+        resp = asyncio.run(collect_stream(mgr.stream_chat([{"role": "user", "content": "q"}])))
+        assert resp.text == "ab" and resp.provider == "p" and resp.tokens == 2
+        assert mgr.health.totals["success"] == 1 and mgr.health.ttft_ewma_ms is not None
+
+    def test_failover_before_first_token_restarts_on_fallback(self):
+        fallback = FakeStreamLLM("f", ["x", "y"])
+        mgr = _manager(FakeStreamLLM("p", ["a"], fail_after=0), fallback)
+        chunks = _drain(mgr.stream_chat([{"role": "user", "content": "q"}]))
+        assert "".join(c.text for c in chunks) == "xy"
+        assert all(c.failover for c in chunks)
+        assert fallback.seen[0] == [{"role": "user", "content": "q"}]
+        assert mgr.health.failures_in_row == 1
+
+    def test_failover_mid_stream_continues_partial_answer(self):
+        fallback = FakeStreamLLM("f", [" c"])
+        mgr = _manager(FakeStreamLLM("p", ["a", " b", " z"], fail_after=2), fallback)
+        chunks = _drain(mgr.stream_chat([{"role": "user", "content": "q"}]))
+        assert "".join(c.text for c in chunks) == "a b c"
+        assert [c.failover for c in chunks if c.text] == [False, False, True]
+        assert fallback.seen[0][1] == {"role": "assistant", "content": "a b"}
+
+    def test_abandoned_stream_releases_in_flight(self):
+        mgr = _manager(FakeStreamLLM("p", ["a", "b", "c"]), FakeStreamLLM("f", ["x"]))
+
+        async def run():
+            agen = mgr.stream_chat([{"role": "user", "content": "q"}])
+            first = await agen.__anext__()
+            await agen.aclose()
+            return first
+
+        assert isinstance(asyncio.run(run()), LLMChunk)
+        assert mgr.health.in_flight == 0 and mgr.health.totals["success"] == 1
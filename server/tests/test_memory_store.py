@@ -0,0 +1,267 @@
+"""
+Tester för memory.py - MemoryStore (SQLite)
+"""
+
+import asyncio
+import os
+import sys
+import threading
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from memory import MemoryStore, build_fts_query
+from memory_async import AsyncMemoryStore
+
+
+class TestConnectionPool:
+    """Thread-local connection pool"""
+
+    def test_same_thread_reuses_connection(self, store):
+        assert store._conn() is store._conn()
+        store.append_event("test", "{}")
+        store.add_conversation_turn("s1", "user", "hej")
+        stats = store.pool_stats()
+        assert stats["open_connections"] == 1
+        assert stats["connections_reused"] > 0
+
+    def test_threads_get_own_connections(self, store):
+        seen = []
+
+        def worker():
+            seen.append(store._conn())
+            store.append_event("thread", "{}")
+
+        threads = [threading.Thread(target=worker) for _ in range(3)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        assert len({id(c) for c in seen}) == 3
+        with store._conn() as c:
+            assert c.execute("SELECT COUNT(*) FROM events WHERE topic='thread'").fetchone()[0] == 3
+
+    def test_reuse_counts_are_per_thread_and_survive_close(self, store):
+        base = store.pool_stats()["connections_reused"]
+
+        def worker():
+            for _ in range(5):
+                store._conn()
+
+        threads = [threading.Thread(target=worker) for _ in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        # Första _conn() i varje tråd öppnar, resten återanvänder
+        assert store.pool_stats()["connections_reused"] == base + 16
+        store.close()
+        assert store.pool_stats()["connections_reused"] == base + 16
+
+    def test_close_and_reopen(self, store):
+        mem_id = store.upsert_text_memory_single("kalendermöte på fredag")
+        store.close()
+        assert store.pool_stats()["open_connections"] == 0
+        # Reopens lazily after close
+        assert store.ping()
+        rows = store.retrieve_text_memories("kalender")
+        assert [r["id"] for r in rows] == [mem_id]
+
+    def test_unpooled_mode(self, tmp_path):
+        s = MemoryStore(str(tmp_path / "legacy.db"), pooled=False)
+        assert s._conn() is not s._conn()
+        s.append_event("legacy", None)
+        assert s.pool_stats()["open_connections"] == 0
+
+
+class TestAsyncMemoryStore:
+    """AsyncMemoryStore facade"""
+
+    def test_awaitable_round_trip(self, store):
+        async def run():
+            amemory = AsyncMemoryStore(store, readers=2)
+            mem_id = await amemory.upsert_text_memory_single("spotify spelar musik")
+            await amemory.append_event("chat.in", "{}")
+            rows = await amemory.retrieve_text_memories("spotify")
+            stats = amemory.stats()
+            await amemory.aclose()
+            return mem_id, rows, stats
+
+        mem_id, rows, stats = asyncio.run(run())
+        assert [r["id"] for r in rows] == [mem_id]
+        assert stats["write"]["count"] == 2
+        assert stats["read"]["count"] == 1
+
+    def test_unknown_method_raises(self, store):
+        amemory = AsyncMemoryStore(store)
+        with pytest.raises(AttributeError):
+            amemory.not_a_method
+        amemory._writer.shutdown()
+        amemory._readers.shutdown()
+
+
+class TestTermRetrieval:
+    """Expanded-term FTS5 retrieval used by /api/chat"""
+
+    def test_build_fts_query(self):
+        assert build_fts_query(["Kalender", "agent core", "är", "kalender"]) == '"kalender"* OR "agent core"'
+        assert build_fts_query(["a", ""]) == ""
+
+    def test_single_query_ranks_by_bm25(self, store):
+        weak = store.upsert_text_memory_single("Ett möte om något helt annat")
+        strong = store.upsert_text_memory_single("Kalendern: boka möte i kalendern på måndag")
+        store.upsert_text_memory_single("Spotify spelar jazz")
+        rows = store.retrieve_text_terms(["kalender", "möte", "boka"], limit=5)
+        assert [r["id"] for r in rows] == [strong, weak]
+
+    def test_phrase_terms(self, store):
+        hit = store.upsert_text_memory_single("Agent Core v1 kör autonoma workflows")
+        store.upsert_text_memory_single("Core dump från en annan agent")
+        rows = store.retrieve_text_terms(["agent core v1"])
+        assert [r["id"] for r in rows] == [hit]
+
+
+class TestExactDeletionLookup:
+    """find_memory_ids_exact: what the privacy 'forget' path deletes"""
+
+    def test_phrase_and_keywords_are_exact(self, store):
+        hit = store.upsert_text_memory_single("Flytta mötet i min kalender till fredag")
+        store.upsert_text_memory_single("Det där om min kod var hemligt")
+        store.upsert_text_memory_single("Kalendern är full, min vän")
+        store.upsert_text_memory_single("Mina kalenderinbjudningar")
+        assert store.find_memory_ids_exact("min kalender") == [hit]
+        assert store.find_memory_ids_exact(None, ["kalender", "fredag"]) == [hit]
+        # Inga prefix: "kalend" matchar inte "kalender"
+        assert store.find_memory_ids_exact(None, ["kalend"]) == []
+        assert store.find_memory_ids_exact("", []) == []
+
+    def test_no_limit_and_no_hot_tier(self, store):
+        ids = [store.upsert_text_memory_single(f"hemlig anteckning {i}") for i in range(1500)]
+        store.hot_tier = object()  # skulle krascha om den användes
+        assert store.find_memory_ids_exact("hemlig anteckning") == ids
+
+
+class TestHybridRetrieval:
+    """BM25 + vector fused with RRF, used by /api/chat and the agent bridge"""
+
+    def test_text_only(self, store):
+        hit = store.upsert_text_memory_single("Boka möte i kalendern")
+        store.upsert_text_memory_single("Spotify spelar jazz")
+        rows = store.retrieve_hybrid("kalendern möte")
+        assert [r["id"] for r in rows] == [hit]
+        assert rows[0]["bm25_rank"] == 1 and rows[0]["vector_rank"] is None
+        assert "age_h" not in rows[0]
+
+    def test_fusion_prefers_items_in_both_lists(self, store):
+        text_only = store.upsert_text_memory_single("jazz jazz jazz")
+        both = store.upsert_text_memory_single("jazz på fredag")
+        vec_only = store.upsert_text_memory_single("saxofon")
+        store.upsert_embedding(text_only, "m", 2, [0.0, 1.0])
+        store.upsert_embedding(both, "m", 2, [0.9, 0.1])
+        store.upsert_embedding(vec_only, "m", 2, [1.0, 0.0])
+        rows = store.retrieve_hybrid("jazz", query_vector=[1.0, 0.0], model="m", limit=3, candidates=2)
+        assert rows[0]["id"] == both
+        assert {r["id"] for r in rows} == {text_only, both, vec_only}
+        assert rows[0]["hybrid_score"] >= rows[1]["hybrid_score"] >= rows[2]["hybrid_score"]
+
+    def test_recency_and_score_break_ties(self, store):
+        old = store.upsert_text_memory_single("väder i Göteborg")
+        new = store.upsert_text_memory_single("väder i Göteborg")
+        with store._conn() as c:
+            c.execute("UPDATE memories SET ts = '2020-01-01T00:00:00Z' WHERE id = ?", (old,))
+        assert store.retrieve_hybrid("väder", limit=1)[0]["id"] == new
+        store.update_memory_score(old, 5.0)
+        assert store.retrieve_hybrid("väder", limit=1, recency_weight=0.0)[0]["id"] == old
+
+    def test_bm25_recency_tiers_computed_in_sql(self, store):
+        old = store.upsert_text_memory_single("väder i Göteborg idag")
+        new = store.upsert_text_memory_single("väder i Göteborg imorgon")
+        bad = store.upsert_text_memory_single("väder i Göteborg ikväll")
+        with store._conn() as c:
+            c.execute("UPDATE memories SET ts = strftime('%Y-%m-%dT%H:%M:%fZ', 'now', '-30 days') WHERE id = ?", (old,))
+            c.execute("UPDATE memories SET ts = 'inte ett datum' WHERE id = ?", (bad,))
+        rows = store.retrieve_text_bm25_recency("väder", limit=3)
+        assert [r["id"] for r in rows] == [new, old, bad]
+        assert "base_score" not in rows[0] and "rank" in rows[0]
+
+    def test_no_terms(self, store):
+        store.upsert_text_memory_single("något")
+        assert store.retrieve_hybrid("a ö") == []
+
+
+class TestQueryCache:
+    """Retrieval cache with generation-counter invalidation"""
+
+    @pytest.fixture
+    def cached(self, tmp_path):
+        from metrics import Metrics
+        from query_cache import QueryCache
+        m = Metrics()
+        s = MemoryStore(str(tmp_path / "alice.db"), query_cache=QueryCache(metrics=m))
+        yield s, m
+        s.close()
+
+    def test_hit_on_normalized_query(self, cached):
+        store, m = cached
+        store.upsert_text_memory_single("Boka möte i kalendern")
+        first = store.retrieve_hybrid("Kalendern möte", limit=3)
+        again = store.retrieve_hybrid("  kalendern,  MÖTE ", limit=3)
+        assert again == first
+        assert (m.cache_hits, m.cache_misses) == (1, 1)
+        store.retrieve_hybrid("kalendern möte", limit=4)
+        assert m.cache_misses == 2
+        # Terms given as a set hit regardless of order
+        store.retrieve_text_terms({"möte", "kalendern"})
+        store.retrieve_text_terms(["kalendern", "möte"])
+        assert m.cache_hits == 2
+
+    def test_like_query_keys_on_exact_string(self, cached):
+        store, m = cached
+        store.upsert_text_memory_single("a  b")
+        assert len(store.retrieve_text_memories("a  b")) == 1
+        # LIKE '%a b%' matchar inte dubbla mellanslag: egen cachepost, eget resultat
+        assert store.retrieve_text_memories("a b") == []
+        assert m.cache_hits == 0
+
+    def test_writes_invalidate(self, cached):
+        store, m = cached
+        a = store.upsert_text_memory_single("jazz på fredag")
+        assert len(store.retrieve_text_memories("jazz")) == 1
+        b = store.upsert_text_memory_single("mer jazz")
+        assert len(store.retrieve_text_memories("jazz")) == 2
+        store.update_memory_score(b, 3.0)
+        assert store.retrieve_text_memories("jazz")[0]["score"] == 3.0
+        store.delete_memories([a, b])
+        assert store.retrieve_text_memories("jazz") == []
+        assert m.cache_hits == 0
+        assert store.query_cache.stats()["generation"] == 4
+
+    def test_callers_get_copies(self, cached):
+        store, _ = cached
+        store.upsert_text_memory_single("kaffe")
+        store.retrieve_text_memories("kaffe")[0]["text"] = "te"
+        assert store.retrieve_text_memories("kaffe")[0]["text"] == "kaffe"
+
+    def test_write_during_compute_is_not_cached(self, cached):
+        store, _ = cached
+        cache = store.query_cache
+
+        def compute():
+            cache.bump()
+            return ["stale"]
+
+        assert cache.get_or_compute("k", compute) == ["stale"]
+        assert cache.stats()["size"] == 0
+
+    def test_lru_and_ttl(self):
+        from query_cache import QueryCache
+        cache = QueryCache(max_entries=2, ttl_s=60)
+        for k in ("a", "b", "a", "c"):
+            cache.get_or_compute(k, lambda: [k])
+        assert cache.stats()["size"] == 2
+        assert cache.get_or_compute("b", lambda: ["new"]) == ["new"]
+        expired = QueryCache(ttl_s=0)
+        expired.get_or_compute("a", lambda: [1])
+        assert expired.get_or_compute("a", lambda: [2]) == [2]
@@ -0,0 +1,125 @@
+"""
+Tester för taggindexet (memory_tags) och taggfiltrerad retrieval i MemoryStore
+"""
+
+import json
+import os
+import sqlite3
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from memory import MemoryStore
+from vector_index import VectorIndex
+
+MODEL = "test-embed"
+
+
+def _tag_rows(store, mem_id):
+    cur = store._conn().execute("SELECT key, value FROM memory_tags WHERE mem_id = ? ORDER BY key", (mem_id,))
+    return cur.fetchall()
+
+
+@pytest.fixture
+def dedup():
+    return False
+
+
+@pytest.fixture
+def docs(store):
+    doc = json.dumps({"source": "document_upload", "filename": "rapport.pdf", "chunked": True})
+    other = json.dumps({"source": "document_upload", "filename": "budget.xlsx"})
+    chat = json.dumps({"source": "chat", "provider": "local"})
+    ids = {
+        "doc": store.upsert_text_memory_single("kalender möte rapport kvartal", tags_json=doc),
+        "other": store.upsert_text_memory_single("kalender möte budget siffror", tags_json=other),
+        "chat": store.upsert_text_memory_single("kalender möte imorgon", tags_json=chat),
+    }
+    return ids
+
+
+class TestTagIndex:
+
+    def test_triggers_keep_index_in_sync(self, store, docs):
+        assert _tag_rows(store, docs["doc"]) == [("chunked", 1), ("filename", "rapport.pdf"), ("source", "document_upload")]
+        with store._conn() as c:
+            c.execute("UPDATE memories SET tags = json_set(tags, '$.source', 'archive') WHERE id = ?", (docs["doc"],))
+        assert ("source", "archive") in _tag_rows(store, docs["doc"])
+        store.delete_memories([docs["doc"]])
+        assert _tag_rows(store, docs["doc"]) == []
+
+    def test_unindexed_keys_and_invalid_json_are_skipped(self, store):
+        mem_id = store.upsert_text_memory_single("hej", tags_json=json.dumps({"uploaded_at": "x", "source": "chat"}))
+        assert _tag_rows(store, mem_id) == [("source", "chat")]
+        bad = store.upsert_text_memory_single("trasig", tags_json="{not json")
+        assert _tag_rows(store, bad) == []
+
+    def test_existing_rows_are_indexed_on_open(self, tmp_path):
+        path = str(tmp_path / "old.db")
+        conn = sqlite3.connect(path)
+        conn.execute("CREATE TABLE memories (id INTEGER PRIMARY KEY AUTOINCREMENT, ts TEXT NOT NULL, kind TEXT NOT NULL, text TEXT, score REAL DEFAULT 0.0, tags TEXT)")
+        conn.execute("INSERT INTO memories (ts, kind, text, tags) VALUES ('2026-01-01T00:00:00Z', 'text', 'gammal', '{\"source\": \"chat\"}')")
+        conn.commit()
+        conn.close()
+        store = MemoryStore(path)
+        assert _tag_rows(store, 1) == [("source", "chat")]
+        store.close()
+
+
+class TestTagFilteredRetrieval:
+
+    def test_fts_honours_filters(self, store, docs):
+        hits = store.retrieve_text_terms(["kalender"], tags={"source": "document_upload"})
+        assert {h["id"] for h in hits} == {docs["doc"], docs["other"]}
+        hits = store.retrieve_text_terms(["kalender"], tags={"source": "document_upload", "chunked": True})
+        assert [h["id"] for h in hits] == [docs["doc"]]
+        hits = store.retrieve_text_terms(["kalender"], tags={"filename": ["budget.xlsx", "rapport.pdf"]})
+        assert len(hits) == 2
+
+    def test_recent_and_like_honour_filters(self, store, docs):
+        assert [h["id"] for h in store.get_recent_text_memories(tags={"source": "chat"})] == [docs["chat"]]
+        assert [h["id"] for h in store.retrieve_text_memories("möte", tags={"provider": "local"})] == [docs["chat"]]
+
+    def test_hybrid_filters_both_candidate_lists(self, store, docs):
+        rng = np.random.default_rng(0)
+        vecs = rng.standard_normal((3, 8)).astype(np.float32)
+        ids = [docs["doc"], docs["other"], docs["chat"]]
+        store.upsert_embeddings(MODEL, ids, vecs)
+        hits = store.retrieve_hybrid("kalender", query_vector=vecs[2], model=MODEL, tags={"filename": "rapport.pdf"})
+        assert [h["id"] for h in hits] == [docs["doc"]]
+        assert hits[0]["vector_rank"] == 1
+        assert [m for m, _ in store.search_embeddings(MODEL, vecs[2], limit=3, tags={"source": "chat"})] == [docs["chat"]]
+
+    def test_vector_filter_scales_with_k_not_tag_size(self, store, monkeypatch):
+        rng = np.random.default_rng(1)
+        vecs = rng.standard_normal((200, 8)).astype(np.float32)
+        vecs[150] = -vecs[3]
+        common = json.dumps({"source": "chat"})
+        rare = json.dumps({"source": "document_upload"})
+        ids = [store.upsert_text_memory_single(f"minne {i}", tags_json=rare if i == 150 else common) for i in range(200)]
+        store.upsert_embeddings(MODEL, ids, vecs)
+        calls = []
+        real = store._tagged_ids
+        monkeypatch.setattr(store, "_tagged_ids", lambda tags: calls.append(tags) or real(tags))
+        # Vanlig tagg: kandidaterna räcker, hela id-mängden läses aldrig
+        hits = store.search_embeddings(MODEL, vecs[3], limit=5, tags={"source": "chat"})
+        assert hits[0][0] == ids[3] and len(hits) == 5 and calls == []
+        # Selektiv tagg långt från frågan: exakt sökning över den lilla mängden
+        hits = store.search_embeddings(MODEL, vecs[3], limit=2, tags={"source": "document_upload"})
+        assert [m for m, _ in hits] == [ids[150]] and len(calls) == 1
+
+    def test_unknown_key_raises(self, store, docs):
+        with pytest.raises(ValueError):
+            store.retrieve_hybrid("kalender", tags={"uploaded_at": "x"})
+
+    def test_vector_index_restricted_search(self):
+        rng = np.random.default_rng(3)
+        data = rng.standard_normal((50, 16)).astype(np.float32)
+        index = VectorIndex(16)
+        index.add(range(50), data)
+        hits = index.search(data[7], k=3, ids=[7, 8, 9, 999])
+        assert hits[0][0] == 7 and {m for m, _ in hits} <= {7, 8, 9}
+        assert index.search(data[7], k=3, ids=[]) == []
@@ -0,0 +1,145 @@
+"""
+Tester för memory_tiers.py - het minnesnivå (in-memory SQLite) framför disken
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from memory_tiers import HotTier
+
+
+def _age(store, mem_id, days):
+    with store._conn() as c:
+        c.execute("UPDATE memories SET ts = strftime('%Y-%m-%dT%H:%M:%fZ', 'now', ?) WHERE id = ?", (f"-{days} days", mem_id))
+
+
+@pytest.fixture
+def tiered(store):
+    store.hot_tier = HotTier(store, recent_days=14, min_score=2.0, promote_hits=3)
+    if not store.hot_tier.fts:
+        pytest.skip("FTS5 saknas")
+    return store
+
+
+class TestHotTierSelection:
+
+    def test_new_writes_are_hot(self, tiered):
+        ids = tiered.upsert_text_memory("Mötet med tandläkaren flyttas till fredag", score=0.0)
+        assert ids[0] in tiered.hot_tier
+
+    def test_rebalance_demotes_old_low_score(self, tiered):
+        old = tiered.upsert_text_memory("Gammal anteckning om cykeln", score=0.0)[0]
+        kept = tiered.upsert_text_memory("Gammal men viktig anteckning om passet", score=5.0)[0]
+        _age(tiered, old, 60)
+        _age(tiered, kept, 60)
+        tiered.hot_tier.load()
+        tiered.hot_tier.rebalance()
+        assert old not in tiered.hot_tier
+        assert kept in tiered.hot_tier
+
+    def test_score_update_and_delete_sync(self, tiered):
+        mem_id = tiered.upsert_text_memory("Anteckning om garaget", score=0.0)[0]
+        _age(tiered, mem_id, 60)
+        tiered.hot_tier.load()
+        assert mem_id not in tiered.hot_tier
+        tiered.update_memory_score(mem_id, 3.0)
+        assert mem_id in tiered.hot_tier
+        tiered.delete_memories([mem_id])
+        assert mem_id not in tiered.hot_tier
+        assert tiered.hot_tier.search_ids('"garaget"', 5) == []
+
+    def test_updated_text_replaces_fts_entry(self, tiered):
+        mem_id = tiered.upsert_text_memory("Nyckeln ligger i lådan", score=0.0)[0]
+        with tiered._conn() as c:
+            c.execute("UPDATE memories SET text = 'Nyckeln ligger på hyllan' WHERE id = ?", (mem_id,))
+        tiered.update_memory_score(mem_id, 0.0)
+        assert tiered.hot_tier.search_ids('"lådan"', 5) == []
+        assert tiered.hot_tier.search_ids('"hyllan"', 5) == [mem_id]
+
+
+class TestTieredRetrieval:
+
+    def test_hot_hits_skip_disk(self, tiered):
+        for i in range(3):
+            tiered.upsert_text_memory(f"Kalenderpåminnelse nummer {i} om kalender", score=0.0)
+        out = tiered.retrieve_text_terms(["kalender"], limit=3)
+        assert len(out) == 3
+        stats = tiered.hot_tier.stats()
+        assert stats["hot_served"] == 1 and stats["cold_fallbacks"] == 0
+
+    def test_cold_fallback_when_hot_underdelivers(self, tiered):
+        old = tiered.upsert_text_memory("Semesterplaner för Gotland", score=0.0)[0]
+        tiered.upsert_text_memory("Semesterplaner för Åre", score=0.0)
+        _age(tiered, old, 60)
+        tiered.hot_tier.load()
+        out = tiered.retrieve_text_terms(["semesterplaner"], limit=2)
+        assert {it["id"] for it in out} >= {old}
+        assert tiered.hot_tier.stats()["cold_fallbacks"] == 1
+
+    def test_hybrid_matches_untiered(self, store, tmp_path):
+        for i in range(8):
+            store.upsert_text_memory(f"Recept på kanelbullar variant {i}", score=float(i % 3))
+        baseline = [it["id"] for it in store.retrieve_hybrid("kanelbullar recept", limit=5)]
+        store.hot_tier = HotTier(store)
+        store.hot_tier.load()
+        tiered = [it["id"] for it in store.retrieve_hybrid("kanelbullar recept", limit=5)]
+        assert tiered == baseline
+
+    def test_frequent_cold_access_promotes(self, tiered):
+        old = tiered.upsert_text_memory("Wifi-lösenordet till stugan", score=0.0)[0]
+        _age(tiered, old, 60)
+        tiered.hot_tier.load()
+        for _ in range(3):
+            tiered.retrieve_text_terms(["lösenordet"], limit=1)
+        assert old in tiered.hot_tier
+        assert tiered.hot_tier.stats()["promotions"] == 1
+        # Befordrade minnen överlever ombalansering så länge de används
+        tiered.hot_tier.rebalance()
+        assert old in tiered.hot_tier
+        assert tiered.retrieve_text_terms(["lösenordet"], limit=1)[0]["id"] == old
+        assert tiered.hot_tier.stats()["hot_served"] >= 1
+
+    def test_cache_hits_count_toward_promotion(self, tiered):
+        from query_cache import QueryCache
+
+        tiered.query_cache = QueryCache()
+        old = tiered.upsert_text_memory("Wifi-lösenordet till stugan", score=0.0)[0]
+        _age(tiered, old, 60)
+        tiered.hot_tier.load()
+        for _ in range(3):
+            tiered.retrieve_hybrid("lösenordet", limit=1)
+        assert tiered.query_cache.stats()["hits"] == 2
+        assert old in tiered.hot_tier and tiered.hot_tier.stats()["promotions"] == 1
+
+    def test_tag_filtered_queries_go_to_disk(self, tiered):
+        tiered.upsert_text_memory("Faktura från elbolaget", tags_json='{"source": "document_upload"}')
+        out = tiered.retrieve_text_terms(["faktura"], limit=1, tags={"source": "document_upload"})
+        assert len(out) == 1
+        stats = tiered.hot_tier.stats()
+        assert stats["hot_served"] == 0 and stats["cold_fallbacks"] == 0
+
+    def test_stats_report_tier_percentiles(self, tiered):
+        tiered.upsert_text_memory("Träningspass på tisdag", score=0.0)
+        tiered.retrieve_text_terms(["träningspass"], limit=1)
+        tiered.retrieve_text_terms(["saknas"], limit=1)
+        lat = tiered.hot_tier.stats()["latency_ms"]
+        assert lat["hot"]["count"] == 1 and lat["cold"]["count"] == 1
+        assert lat["hot"]["p99"] >= lat["hot"]["p50"] >= 0.0
+
+
+def test_background_rebalance_loads(store):
+    store.upsert_text_memory("Något att minnas", score=0.0)
+    tier = HotTier(store, rebalance_interval_s=60).start()
+    try:
+        import time
+        deadline = time.time() + 5
+        while not tier.loaded and time.time() < deadline:
+            time.sleep(0.01)
+        assert tier.loaded and len(tier) == 1
+    finally:
+        tier.close()
+    assert not tier.stats()["running"]
@@ -0,0 +1,113 @@
+"""
+Tester för partitions.py - månadspartitionerade events/conversations
+"""
+
+import os
+import sqlite3
+import sys
+from datetime import datetime
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from memory import MemoryStore
+from partitions import month_bounds, month_key
+
+CURRENT = datetime.utcnow().strftime("%Y%m")
+
+
+def _legacy_db(path):
+    """Database created before partitioning (plain tables)"""
+    c = sqlite3.connect(path)
+    c.execute("CREATE TABLE events (id INTEGER PRIMARY KEY AUTOINCREMENT, ts TEXT NOT NULL, topic TEXT NOT NULL, payload TEXT)")
+    c.execute("CREATE INDEX idx_events_topic_ts ON events(topic, ts)")
+    c.execute(
+        "CREATE TABLE conversations (id INTEGER PRIMARY KEY AUTOINCREMENT, session_id TEXT, ts TEXT NOT NULL, "
+        "role TEXT NOT NULL, content TEXT NOT NULL, memory_id INTEGER)"
+    )
+    for i, month in enumerate(["2024-01", "2024-01", "2024-02", "2024-03"]):
+        c.execute("INSERT INTO events (ts, topic, payload) VALUES (?, 'ws_in', ?)", (f"{month}-10T12:00:00Z", str(i)))
+        c.execute(
+            "INSERT INTO conversations (session_id, ts, role, content) VALUES ('s1', ?, 'user', ?)",
+            (f"{month}-10T12:00:0{i}Z", f"turn {i}"),
+        )
+    c.commit()
+    c.close()
+
+
+def _schema(store, name):
+    return store._conn().execute("SELECT type FROM sqlite_master WHERE name = ?", (name,)).fetchone()[0]
+
+
+class TestMonthKeys:
+
+    def test_month_key_and_bounds(self):
+        assert month_key("2026-10-16T08:00:00Z") == "202610"
+        assert month_key("garbage") == CURRENT
+        assert month_bounds("202612") == ("2026-12", "2027-01")
+
+
+class TestPartitionedStore:
+
+    def test_fresh_store_uses_views(self, store):
+        assert _schema(store, "events") == "view"
+        assert _schema(store, "conversations") == "view"
+        assert store.partition_stats() == {"events": [CURRENT], "conversations": [CURRENT]}
+        store.append_event("ws_in", "{}")
+        rows = store._conn().execute("SELECT ts, topic, payload FROM events ORDER BY ts ASC").fetchall()
+        assert [r[1] for r in rows] == ["ws_in"]
+
+    def test_write_events_routes_by_month(self, store):
+        store.append_event("now", None)
+        store.write_events([("2025-01-05T00:00:00Z", "old", None), ("2025-02-05T00:00:00Z", "older", None)])
+        assert store.partition_stats()["events"] == ["202501", "202502", CURRENT]
+        c = store._conn()
+        assert c.execute("SELECT topic FROM events_202501").fetchall() == [("old",)]
+        ids = [r[0] for r in c.execute("SELECT id FROM events")]
+        # Late writes into older months still get globally unique ids
+        assert len(set(ids)) == 3 and min(ids[:2]) > ids[2]
+
+    def test_late_write_before_current_month_keeps_ids_unique(self, store):
+        store.write_events([("2025-01-05T00:00:00Z", "old", None), ("2025-02-05T00:00:00Z", "older", None)])
+        store.append_event("now", None)
+        store.write_events([("2025-01-06T00:00:00Z", "old2", None)])
+        store.append_event("now2", None)
+        ids = [r[0] for r in store._conn().execute("SELECT id FROM events ORDER BY id")]
+        assert ids == [1, 2, 3, 4, 5]
+
+    def test_migrates_legacy_tables(self, tmp_path):
+        path = str(tmp_path / "legacy.db")
+        _legacy_db(path)
+        store = MemoryStore(path)
+        c = store._conn()
+        assert _schema(store, "events") == "view"
+        assert store.partition_stats()["events"] == ["202401", "202402", "202403", CURRENT]
+        assert c.execute("SELECT id, payload FROM events ORDER BY id").fetchall() == [(1, "0"), (2, "1"), (3, "2"), (4, "3")]
+        assert c.execute("SELECT COUNT(*) FROM events_202401").fetchone()[0] == 2
+        assert store.add_conversation_turn("s1", "assistant", "ny") == 5
+        turns = store.get_conversation_context("s1", limit=3)
+        assert [t["content"] for t in turns] == ["turn 2", "turn 3", "ny"]
+        store.close()
+        # Reopening is a no-op
+        store = MemoryStore(path)
+        assert store._conn().execute("SELECT COUNT(*) FROM conversations").fetchone()[0] == 5
+        store.close()
+
+    def test_context_reads_only_hot_partition_when_enough(self, store):
+        for i in range(3):
+            store.add_conversation_turn("s1", "user", f"hej {i}")
+        store._conn().execute("DROP VIEW conversations")  # no fallback through the view
+        assert [t["content"] for t in store.get_conversation_context("s1", limit=2)] == ["hej 1", "hej 2"]
+
+    def test_retention_drops_whole_months(self, tmp_path):
+        path = str(tmp_path / "legacy.db")
+        _legacy_db(path)
+        store = MemoryStore(path)
+        store.add_conversation_turn("s1", "user", "idag")
+        assert store.cleanup_old_conversations(days=30) == 4
+        assert store.partition_stats()["conversations"] == [CURRENT]
+        assert store._conn().execute("SELECT content FROM conversations").fetchall() == [("idag",)]
+        assert store.drop_partitions_before("events", "2024-02-15T00:00:00Z") == 2
+        assert store.partition_stats()["events"] == ["202402", "202403", CURRENT]
+        store.close()
@@ -0,0 +1,111 @@
+"""
+Tester för telemetry.py - sensor-rollups och nedsamplade intervallfrågor
+"""
+
+import os
+import random
+import sys
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from memory import MemoryStore
+from telemetry import aggregate, choose_resolution, iso_utc, parse_time
+
+T0 = 1_790_000_000 - 1_790_000_000 % 86400  # midnatt UTC
+
+
+def _readings(n, seconds, seed=0, sensor="temp"):
+    rnd = random.Random(seed)
+    return [(sensor, round(rnd.uniform(15, 25), 2), None, T0 + rnd.uniform(0, seconds)) for _ in range(n)]
+
+
+class TestHelpers:
+
+    def test_parse_time(self):
+        assert parse_time("2026-10-16T08:00:00Z") == parse_time("2026-10-16T08:00:00") == parse_time(1792137600)
+        assert parse_time(None, default=5.0) == 5.0
+        assert parse_time("1792137600.5") == 1792137600.5
+        with pytest.raises(ValueError):
+            parse_time("igår")
+
+    def test_iso_utc_matches_store_format(self):
+        assert iso_utc(T0).endswith("T00:00:00Z")
+        assert parse_time(iso_utc(T0 + 1.25)) == T0 + 1.25
+
+    def test_aggregate(self):
+        rows = aggregate([("a", 1.0, T0), ("a", 3.0, T0 + 30), ("a", 5.0, T0 + 90), ("b", None, T0)])
+        assert sorted(rows["1m"]) == [("a", T0, 2, 4.0, 1.0, 3.0), ("a", T0 + 60, 1, 5.0, 5.0, 5.0)]
+        assert rows["1d"] == [("a", T0, 3, 9.0, 1.0, 5.0)]
+
+    @pytest.mark.parametrize("span,expected", [
+        (3600, ("raw", 8)),
+        (86400, ("1m", 180)),
+        (30 * 86400, ("1h", 7200)),
+        (730 * 86400, ("1d", 172800)),
+    ])
+    def test_choose_coarsest_resolution(self, span, expected):
+        assert choose_resolution(T0, T0 + span, 500) == expected
+
+    def test_explicit_resolution(self):
+        assert choose_resolution(T0, T0 + 86400, 500, "1h") == ("1h", 3600)
+        with pytest.raises(ValueError):
+            choose_resolution(T0, T0 + 60, 10, "5m")
+
+
+class TestSensorRollups:
+
+    def test_batch_ingest_returns_ids_and_updates_rollups(self, store):
+        ids = store.add_sensor_telemetry_batch(_readings(100, 7200))
+        assert ids == list(range(ids[0], ids[0] + 100))
+        c = store._conn()
+        assert c.execute("SELECT SUM(count) FROM sensor_rollup_1m").fetchone()[0] == 100
+        assert c.execute("SELECT COUNT(*) FROM sensor_rollup_1h").fetchone()[0] == 2
+
+    def test_incremental_rollups_match_raw(self, store):
+        readings = _readings(2000, 3 * 86400)
+        for i in range(0, len(readings), 150):  # flera batcher träffar samma hinkar
+            store.add_sensor_telemetry_batch(readings[i:i + 150])
+        store.add_sensor_telemetry("temp", 20.0)
+        start, end = T0, T0 + 3 * 86400
+        for resolution in ("raw", "1m", "1h", "1d"):
+            result = store.query_sensor_telemetry("temp", start, end, max_points=100, resolution=resolution)
+            step = result["step_s"]
+            assert result["source"] == resolution
+            expected = {}
+            for _, value, _, t in readings:
+                expected.setdefault(int(t // step) * step, []).append(value)
+            assert [p["t"] for p in result["points"]] == sorted(expected)
+            for p in result["points"]:
+                values = expected[p["t"]]
+                assert (p["count"], p["min"], p["max"]) == (len(values), min(values), max(values))
+                assert p["mean"] == pytest.approx(sum(values) / len(values))
+
+    def test_range_query_picks_coarsest_source(self, store):
+        store.add_sensor_telemetry_batch(_readings(500, 20 * 86400))
+        week = store.query_sensor_telemetry("temp", iso_utc(T0), iso_utc(T0 + 7 * 86400), max_points=100)
+        assert week["source"] == "1h" and week["step_s"] == 7200
+        assert sum(p["count"] for p in week["points"]) == sum(
+            1 for r in _readings(500, 20 * 86400) if r[3] < T0 + 7 * 86400
+        )
+        assert store.query_sensor_telemetry("other", T0, T0 + 60)["points"] == []
+        with pytest.raises(ValueError):
+            store.query_sensor_telemetry("temp", T0 + 60, T0)
+
+    def test_rollups_built_for_existing_rows(self, tmp_path):
+        path = str(tmp_path / "old.db")
+        store = MemoryStore(path)
+        store.add_sensor_telemetry_batch(_readings(50, 600))
+        for name in ("1m", "1h", "1d"):
+            store._conn().execute(f"DROP TABLE sensor_rollup_{name}")
+        store.close()
+        store = MemoryStore(path)
+        assert store._conn().execute("SELECT SUM(count) FROM sensor_rollup_1m").fetchone()[0] == 50
+        store.close()
+
+    def test_prune_keeps_daily(self, store):
+        store.add_sensor_telemetry_batch(_readings(10, 60))
+        removed = store.prune_sensor_rollups(now_s=T0 + 500 * 86400)
+        assert removed["1m"] > 0 and removed["1h"] == 1
+        assert store._conn().execute("SELECT COUNT(*) FROM sensor_rollup_1d").fetchone()[0] == 1
@@ -0,0 +1,150 @@
+"""
+Tester för text_chunker.py - byte-identisk mot den tidigare chunkern
+"""
+
+import json
+import os
+import random
+import sys
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from memory import MemoryStore
+from text_chunker import iter_paragraphs, iter_semantic_chunks
+
+
+def legacy_chunk_text_semantically(text, max_chunk_size=600):
+    """MemoryStore._chunk_text_semantically as it was before the streaming chunker"""
+    if len(text) <= max_chunk_size:
+        return [text]
+    chunks = []
+    overlap_size = max_chunk_size // 5
+    current_headers = []
+    paragraphs = text.split('\n\n')
+    current_chunk = ""
+    for paragraph in paragraphs:
+        for line in paragraph.split('\n'):
+            line = line.strip()
+            if (line.startswith('#') or
+                line.startswith('<h') or
+                (line.isupper() and len(line.split()) <= 10)):
+                if line not in current_headers:
+                    current_headers.append(line)
+        header_context = '\n'.join(current_headers[-3:]) if current_headers else ""
+        chunk_prefix = header_context + '\n\n' if header_context and header_context not in current_chunk else ""
+        if len(paragraph) > max_chunk_size:
+            sentences = []
+            for delimiter in ['. ', '! ', '? ', '.\n', '!\n', '?\n']:
+                if delimiter in paragraph:
+                    parts = paragraph.split(delimiter)
+                    for i, part in enumerate(parts[:-1]):
+                        sentences.append(part + delimiter.strip())
+                    if parts[-1].strip():
+                        sentences.append(parts[-1])
+                    break
+            else:
+                sentences = []
+                for i in range(0, len(paragraph), max_chunk_size - overlap_size):
+                    chunk_end = min(i + max_chunk_size, len(paragraph))
+                    sentences.append(paragraph[i:chunk_end])
+            for sentence in sentences:
+                full_content = chunk_prefix + current_chunk + (' ' if current_chunk else '') + sentence
+                if len(full_content) > max_chunk_size:
+                    if current_chunk.strip():
+                        chunks.append((chunk_prefix + current_chunk).strip())
+                    if current_chunk and len(current_chunk) > overlap_size:
+                        current_chunk = current_chunk[-overlap_size:] + ' ' + sentence
+                    else:
+                        current_chunk = chunk_prefix + sentence
+                else:
+                    current_chunk += (' ' if current_chunk else '') + sentence
+        else:
+            full_content = chunk_prefix + current_chunk + ('\n\n' if current_chunk else '') + paragraph
+            if len(full_content) > max_chunk_size:
+                if current_chunk.strip():
+                    chunks.append((chunk_prefix + current_chunk).strip())
+                if current_chunk and len(current_chunk) > overlap_size:
+                    current_chunk = current_chunk[-overlap_size:] + '\n\n' + paragraph
+                else:
+                    current_chunk = chunk_prefix + paragraph
+            else:
+                current_chunk += ('\n\n' if current_chunk else '') + paragraph
+    if current_chunk.strip():
+        final_chunk = (header_context + '\n\n' if header_context and header_context not in current_chunk else "") + current_chunk
+        chunks.append(final_chunk.strip())
+    return chunks if chunks else [text]
+
+
+WORDS = "alice minne kalender möte dokument sida rapport projekt musik vecka".split()
+
+
+def _document(seed, paragraphs=60):
+    rnd = random.Random(seed)
+    out = []
+    for _ in range(paragraphs):
+        kind = rnd.random()
+        if kind < 0.1:
+            out.append("# " + " ".join(rnd.choices(WORDS, k=3)).title())
+        elif kind < 0.15:
+            out.append(" ".join(rnd.choices(WORDS, k=2)).upper())
+        elif kind < 0.18:
+            out.append("<h2>" + rnd.choice(WORDS) + "</h2>")
+        elif kind < 0.25:
+            # Lång text utan meningsslut
+            out.append("".join(rnd.choices("abcdefghij ", k=rnd.randint(700, 2000))))
+        else:
+            sentences = [
+                " ".join(rnd.choices(WORDS, k=rnd.randint(3, 25))).capitalize() + rnd.choice(".!?")
+                for _ in range(rnd.randint(1, 20))
+            ]
+            out.append(rnd.choice([" ", "\n"]).join(sentences))
+    return rnd.choice(["\n\n", "\n\n\n", "\n"]).join(out)
+
+
+def _random_pieces(text, rnd):
+    cuts = sorted(rnd.sample(range(1, len(text)), min(len(text) - 1, rnd.randint(1, 40))))
+    return [text[a:b] for a, b in zip([0] + cuts, cuts + [len(text)])]
+
+
+class TestStreamingChunker:
+
+    @pytest.mark.parametrize("seed", range(25))
+    def test_byte_identical_to_legacy(self, seed):
+        text = _document(seed)
+        expected = legacy_chunk_text_semantically(text)
+        assert MemoryStore._chunk_text_semantically(None, text) == expected
+        # Same output when the text arrives in arbitrary pieces (e.g. pages)
+        pieces = _random_pieces(text, random.Random(seed))
+        assert list(iter_semantic_chunks(pieces)) == expected
+
+    @pytest.mark.parametrize("text", [
+        "kort", "", "a" * 601, "\n\n" * 400, "MENING. " * 200, "# Rubrik\n\n" + "ord " * 300,
+    ])
+    def test_edge_cases(self, text):
+        assert MemoryStore._chunk_text_semantically(None, text) == legacy_chunk_text_semantically(text)
+
+    def test_paragraph_split_across_pieces(self):
+        text = "a\n\n\nb\n\nc\n\n"
+        for pieces in (["a\n", "\n\nb"], ["a\n", "\n", "\nb\n", "\nc\n\n"], list(text)):
+            joined = "".join(pieces)
+            assert list(iter_paragraphs(pieces)) == joined.split("\n\n")
+
+    def test_stream_upsert_matches_upsert(self, tmp_path):
+        # Utan dedup: samma text läses in två gånger och ska ge två uppsättningar rader
+        store = MemoryStore(str(tmp_path / "alice.db"), dedup=False)
+        text = _document(7)
+        tags = json.dumps({"source": "document_upload"})
+        a = store.upsert_text_memory(text, score=2.0, tags_json=tags)
+        b = store.upsert_text_memory_stream(_random_pieces(text, random.Random(1)), score=2.0, tags_json=tags, batch_size=7)
+        assert len(a) == len(b) and b == list(range(b[0], b[0] + len(b)))
+        rows = store._conn().execute("SELECT id, text, score, tags FROM memories ORDER BY id").fetchall()
+        by_id = {r[0]: r for r in rows}
+        for x, y in zip(a, b):
+            assert by_id[x][1:3] == by_id[y][1:3]
+            assert json.loads(by_id[x][3]) == json.loads(by_id[y][3])
+        # Short input falls back to the single-memory path
+        (short,) = store.upsert_text_memory_stream(["hej ", "alice"])
+        assert store.get_texts_for_mem_ids([short]) == {short: "hej alice"}
+        store.close()
@@ -0,0 +1,106 @@
+"""
+Tester för tool_stats.py - minnesresidenta verktygsräknare med periodisk flush
+"""
+
+import asyncio
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from decision import EpsilonGreedyBandit
+from memory import MemoryStore
+from memory_async import AsyncMemoryStore
+from tool_stats import ToolStatsCounters
+
+
+def _db_rows(store):
+    return {t: (s, f) for t, s, f in store.read_tool_stats()}
+
+
+class TestToolStatsCounters:
+
+    def test_loads_existing_rows(self, store):
+        store.update_tool_stats("calendar", True)
+        store.update_tool_stats("calendar", False)
+        store.tool_counters = ToolStatsCounters(store)
+        assert store.get_tool_stats("calendar") == (1, 1)
+        assert store.get_tool_stats("missing") == (0, 0)
+
+    def test_updates_are_in_memory_until_flush(self, store):
+        store.update_tool_stats("gmail", True)
+        store.tool_counters = ToolStatsCounters(store)
+        for _ in range(3):
+            store.update_tool_stats("gmail", True)
+        store.update_tool_stats("spotify", False)
+        assert store.get_tool_stats("gmail") == (4, 0)
+        assert _db_rows(store) == {"gmail": (1, 0)}
+        assert store.tool_counters.flush() == 2
+        assert _db_rows(store) == {"gmail": (4, 0), "spotify": (0, 1)}
+        assert store.tool_counters.flush() == 0
+
+    def test_get_all_matches_sql_order(self, store):
+        for tool, ok in [("b", True), ("a", True), ("c", True), ("c", False)]:
+            store.update_tool_stats(tool, ok)
+        expected = store.get_all_tool_stats()
+        store.tool_counters = ToolStatsCounters(store)
+        assert store.get_all_tool_stats() == expected
+        assert [r["tool"] for r in expected] == ["c", "a", "b"]
+
+    def test_failed_flush_keeps_deltas(self, store, monkeypatch):
+        counters = ToolStatsCounters(store)
+        store.tool_counters = counters
+        store.update_tool_stats("weather", True)
+
+        def boom(rows):
+            raise RuntimeError("disk full")
+
+        monkeypatch.setattr(store, "write_tool_stats", boom)
+        with pytest.raises(RuntimeError):
+            counters.flush()
+        store.update_tool_stats("weather", True)
+        monkeypatch.undo()
+        counters.flush()
+        assert _db_rows(store) == {"weather": (2, 0)}
+        assert counters.stats()["errors"] == 1
+
+    def test_background_flush_and_close(self, store):
+        counters = ToolStatsCounters(store, flush_interval_s=0.01, batch_size=10).start()
+        store.tool_counters = counters
+        for i in range(100):
+            store.update_tool_stats("timer", i % 4 != 0)
+        deadline = time.time() + 5
+        while _db_rows(store).get("timer") != (75, 25) and time.time() < deadline:
+            time.sleep(0.01)
+        assert _db_rows(store)["timer"] == (75, 25)
+        store.update_tool_stats("timer", True)
+        counters.close()
+        assert _db_rows(store)["timer"] == (76, 25)
+        assert not counters.stats()["running"]
+
+    def test_bandit_picks_from_counters(self, store):
+        store.tool_counters = ToolStatsCounters(store)
+        for _ in range(5):
+            store.update_tool_stats("good", True)
+        store.update_tool_stats("bad", False)
+        bandit = EpsilonGreedyBandit(store, epsilon=0.0)
+        assert bandit.pick(["bad", "good", "new"]) == "good"
+
+    def test_async_facade_skips_threads(self, store):
+        store.tool_counters = ToolStatsCounters(store)
+        amemory = AsyncMemoryStore(store)
+
+        async def scenario():
+            await amemory.update_tool_stats("notes", success=True)
+            stats = await amemory.get_tool_stats("notes")
+            items = await amemory.get_all_tool_stats()
+            await amemory.aclose()
+            return stats, items
+
+        stats, items = asyncio.run(scenario())
+        assert stats == (1, 0)
+        assert items == [{"tool": "notes", "success": 1, "fail": 0}]
+        assert amemory.stats()["write"]["count"] == 0
@@ -0,0 +1,122 @@
+"""
+Tester för training.py - inkrementell, komprimerad och återupptagbar export
+"""
+
+import io
+import json
+import os
+import sys
+import zlib
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from memory import MemoryStore
+from training import ZSTD_AVAILABLE, decode_cursor, encode_cursor, stream_dataset
+
+
+@pytest.fixture
+def db(tmp_path):
+    path = str(tmp_path / "alice.db")
+    store = MemoryStore(path, dedup=False)
+    for i in range(25):
+        store.append_event("chat.in" if i % 2 else "ws_in", json.dumps({"i": i}))
+    for i in range(12):
+        store.upsert_text_memory_single(f"minne nummer {i}", score=float(i % 4))
+    with store._conn() as c:
+        c.execute("INSERT INTO lessons (ts, text, score) VALUES ('2026-01-01T00:00:00Z', 'lektion', 1.0)")
+    store.update_tool_stats("calendar", True)
+    yield path, store
+    store.close()
+
+
+def _records(chunks):
+    return [json.loads(line) for line in b"".join(chunks).decode("utf-8").splitlines()]
+
+
+def _data(records):
+    return [r for r in records if r["kind"] != "cursor"]
+
+
+class TestTrainingExport:
+
+    def test_full_export_shape(self, db):
+        path, _ = db
+        records = _data(_records(stream_dataset(path, batch_size=10)))
+        kinds = [r["kind"] for r in records]
+        assert kinds.count("event") == 25 and kinds.count("memory") == 12
+        assert kinds.count("lesson") == 1 and kinds[-1] == "tool_stats"
+        memory = next(r for r in records if r["kind"] == "memory")
+        assert set(memory) == {"kind", "id", "ts", "type", "text", "score", "tags"} and memory["type"] == "text"
+
+    def test_since_cursor_is_incremental(self, db):
+        path, store = db
+        records = _records(stream_dataset(path, tables=["events", "memories"]))
+        cursor = [r for r in records if r["kind"] == "cursor"][-1]["cursor"]
+        assert decode_cursor(cursor)["events"] == max(r["id"] for r in records if r["kind"] == "event")
+        store.append_event("chat.out", "{}")
+        store.upsert_text_memory_single("ett nytt minne", score=1.0)
+        fresh = _data(_records(stream_dataset(path, tables=["events", "memories"], cursor=cursor)))
+        assert [(r["kind"], r.get("topic") or r.get("text")) for r in fresh] == [
+            ("event", "chat.out"), ("memory", "ett nytt minne"),
+        ]
+
+    def test_resume_after_interrupted_stream(self, db):
+        path, _ = db
+        full = _data(_records(stream_dataset(path, batch_size=7)))
+        it = stream_dataset(path, batch_size=7)
+        received = [next(it), next(it), next(it)]  # anslutningen bryts här
+        first = _records(received)
+        cursor = [r for r in first if r["kind"] == "cursor"][-1]["cursor"]
+        rest = _data(_records(stream_dataset(path, cursor=cursor, batch_size=7)))
+        assert _data(first) + rest == full
+
+    def test_filters(self, db):
+        path, _ = db
+        events = _data(_records(stream_dataset(path, tables=["events"], topics=["chat.*"])))
+        assert len(events) == 12 and {r["topic"] for r in events} == {"chat.in"}
+        memories = _data(_records(stream_dataset(path, tables=["memories"], min_score=3.0)))
+        assert len(memories) == 3 and all(r["score"] >= 3.0 for r in memories)
+
+    def test_gzip_is_decodable_up_to_each_cursor(self, db):
+        path, _ = db
+        chunks = list(stream_dataset(path, compression="gzip", batch_size=5))
+        assert _records([zlib.decompress(b"".join(chunks), 31)]) == _records(stream_dataset(path, batch_size=5))
+        # Avbruten överföring: det som kommit fram går att packa upp
+        partial = zlib.decompressobj(31).decompress(b"".join(chunks[:2]))
+        assert _records([partial])[-1]["kind"] == "cursor"
+
+    @pytest.mark.skipif(not ZSTD_AVAILABLE, reason="zstandard not installed")
+    def test_zstd(self, db):
+        import zstandard
+        path, _ = db
+        data = b"".join(stream_dataset(path, compression="zstd"))
+        plain = zstandard.ZstdDecompressor().decompressobj().decompress(data)
+        assert _records([plain]) == _records(stream_dataset(path))
+
+    @pytest.mark.parametrize("fmt", ["arrow", "parquet"])
+    def test_columnar(self, db, fmt):
+        pa = pytest.importorskip("pyarrow")
+        path, _ = db
+        data = b"".join(stream_dataset(path, tables=["events"], fmt=fmt, batch_size=10))
+        if fmt == "arrow":
+            table = pa.ipc.open_stream(data).read_all()
+        else:
+            import pyarrow.parquet as pq
+            table = pq.read_table(io.BytesIO(data))
+        assert table.num_rows == 25 and table.column_names == ["id", "ts", "topic", "payload"]
+
+    @pytest.mark.parametrize("kwargs", [
+        {"tables": ["secrets"]},
+        {"fmt": "csv"},
+        {"compression": "brotli"},
+        {"cursor": "not-a-cursor"},
+    ])
+    def test_invalid_arguments_fail_eagerly(self, db, kwargs):
+        with pytest.raises(ValueError):
+            stream_dataset(db[0], **kwargs)
+
+    def test_cursor_roundtrip(self):
+        assert decode_cursor(encode_cursor({"events": 5, "memories": 9})) == {"events": 5, "memories": 9}
+        assert decode_cursor(None) == {}
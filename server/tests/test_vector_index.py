@@ -0,0 +1,111 @@
+"""
+Tester för vector_index.py och embedding-lagring i MemoryStore
+"""
+
+import json
+import os
+import sqlite3
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from memory import MemoryStore
+from vector_index import VectorIndex, as_float32, encode_vector
+
+
+def _brute_force(data, ids, q, k):
+    norm = data / np.linalg.norm(data, axis=1, keepdims=True)
+    scores = norm @ (q / np.linalg.norm(q))
+    order = np.argsort(-scores)[:k]
+    return [int(ids[i]) for i in order]
+
+
+class TestVectorIndex:
+
+    def test_search_matches_brute_force(self):
+        rng = np.random.default_rng(1)
+        data = rng.standard_normal((500, 32)).astype(np.float32)
+        ids = np.arange(10, 510)
+        index = VectorIndex(32, capacity=8)  # forces growth
+        index.add(ids, data)
+        q = rng.standard_normal(32).astype(np.float32)
+        assert [m for m, _ in index.search(q, 5)] == _brute_force(data, ids, q, 5)
+
+    def test_int8_quantization_close_to_exact(self):
+        rng = np.random.default_rng(2)
+        data = rng.standard_normal((300, 64)).astype(np.float32)
+        ids = np.arange(300)
+        exact = VectorIndex(64)
+        quant = VectorIndex(64, quantize="int8")
+        exact.add(ids, data)
+        quant.add(ids, data)
+        q = data[42]
+        assert quant.search(q, 1)[0][0] == 42
+        e, qz = exact.search(q, 10), quant.search(q, 10)
+        assert abs(e[0][1] - qz[0][1]) < 0.02
+        assert quant.stats()["bytes"] < exact.stats()["bytes"]
+
+    def test_replace_and_remove(self):
+        index = VectorIndex(2)
+        index.add([1, 2, 3], [[1, 0], [0, 1], [1, 1]])
+        index.add([1], [[0, 1]])
+        assert len(index) == 3
+        assert index.remove([1, 99]) == 1
+        assert 1 not in index and 3 in index
+        assert [m for m, _ in index.search([0, 1], 3)] == [2, 3]
+
+    def test_dim_mismatch(self):
+        index = VectorIndex(3)
+        with pytest.raises(ValueError):
+            index.add([1], [[1.0, 2.0]])
+
+    def test_encoding_round_trip(self):
+        vec = [0.25, -1.5, 3.0]
+        assert as_float32(encode_vector(vec)).tolist() == vec
+        assert as_float32(json.dumps(vec)).tolist() == vec
+
+
+class TestMemoryStoreEmbeddings:
+
+    def test_blob_storage_and_incremental_index(self, tmp_path):
+        store = MemoryStore(str(tmp_path / "alice.db"))
+        a = store.upsert_text_memory_single("katter")
+        b = store.upsert_text_memory_single("hundar")
+        store.upsert_embedding(a, "m", 3, [1.0, 0.0, 0.0])
+        assert store.search_embeddings("m", [1.0, 0.1, 0.0], limit=2)[0][0] == a
+        # Index is loaded now; new rows must be visible without reload
+        store.upsert_embedding(b, "m", 3, [0.0, 1.0, 0.0])
+        assert store.search_embeddings("m", [0.0, 1.0, 0.0], limit=1)[0][0] == b
+        with store._conn() as c:
+            assert c.execute("SELECT typeof(vector) FROM embeddings LIMIT 1").fetchone()[0] == "blob"
+        assert store.search_embeddings("other-model", [1.0, 0.0, 0.0]) == []
+        store.close()
+
+    def test_delete_memories_updates_index(self, tmp_path):
+        store = MemoryStore(str(tmp_path / "alice.db"))
+        a = store.upsert_text_memory_single("katter")
+        b = store.upsert_text_memory_single("hundar")
+        store.upsert_embedding(a, "m", 2, [1.0, 0.0])
+        store.upsert_embedding(b, "m", 2, [0.9, 0.1])
+        store.vector_index("m")
+        assert store.delete_memories([a]) == 1
+        assert [m for m, _ in store.search_embeddings("m", [1.0, 0.0], limit=5)] == [b]
+        assert store.retrieve_text_memories("katter") == []
+        store.close()
+
+    def test_legacy_json_vectors_are_migrated(self, tmp_path):
+        path = str(tmp_path / "legacy.db")
+        MemoryStore(path).close()
+        conn = sqlite3.connect(path)
+        conn.execute(
+            "INSERT INTO embeddings (mem_id, ts, model, dim, vector) VALUES (7, 'x', 'm', 2, ?)",
+            (json.dumps([0.0, 2.0]),),
+        )
+        conn.commit()
+        conn.close()
+        store = MemoryStore(path)
+        assert store.search_embeddings("m", [0.0, 1.0], limit=1)[0][0] == 7
+        store.close()
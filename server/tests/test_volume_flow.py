@@ -10,15 +10,6 @@ import asyncio
 import httpx
 from typing import Dict, Any, Optional
 
-# Sätt upp loggning
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s [%(levelname)s] %(message)s',
-    handlers=[
-        logging.StreamHandler(),
-        logging.FileHandler('volume_test.log')
-    ]
-)
 logger = logging.getLogger(__name__)
 
 # Test cases med förväntade resultat
@@ -161,4 +152,13 @@ async def run_tests():
     logger.info(f"Test Summary: {passed}/{total} passed ({passed/total*100:.1f}%)")
 
 if __name__ == "__main__":
+    # Loggfilen skapas bara vid manuell körning, inte när pytest samlar in modulen
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s [%(levelname)s] %(message)s',
+        handlers=[
+            logging.StreamHandler(),
+            logging.FileHandler('volume_test.log')
+        ]
+    )
     asyncio.run(run_tests())
@@ -0,0 +1,109 @@
+"""
+Strömmande semantisk chunkning i linjär tid.
+
+``iter_semantic_chunks`` tar emot text i bitar (t.ex. en sida i taget från
+PDF-läsaren) och ger samma chunkar, byte för byte, som den tidigare
+``MemoryStore._chunk_text_semantically``: styckesgränser på ``\\n\\n``,
+meningsdelning av långa stycken, 20 % överlapp och upp till tre rubriker
+som kontext. Rubriker hålls i en mängd (tidigare en linjär listsökning per
+rubrik) och inga mellanliggande strängar byggs bara för att mäta längd.
+"""
+
+from __future__ import annotations
+
+from typing import Iterable, Iterator, List, Set
+
+SENTENCE_DELIMITERS = ('. ', '! ', '? ', '.\n', '!\n', '?\n')
+
+
+def iter_paragraphs(pieces: Iterable[str]) -> Iterator[str]:
+    """Yield ``"".join(pieces).split("\\n\\n")`` without joining the pieces"""
+    pending: List[str] = []
+    tail_newline = False
+    for piece in pieces:
+        if not piece:
+            continue
+        if tail_newline and piece[0] == '\n':
+            # Avgränsaren går över en bitgräns: sista '\n' i föregående bit + första här
+            pending[-1] = pending[-1][:-1]
+            yield "".join(pending)
+            pending = []
+            piece = piece[1:]
+        pos = 0
+        idx = piece.find('\n\n')
+        while idx != -1:
+            pending.append(piece[pos:idx])
+            yield "".join(pending)
+            pending = []
+            pos = idx + 2
+            idx = piece.find('\n\n', pos)
+        rest = piece[pos:]
+        pending.append(rest)
+        tail_newline = rest.endswith('\n')
+    yield "".join(pending)
+
+
+def _split_sentences(paragraph: str, max_chunk_size: int, overlap_size: int) -> List[str]:
+    for delimiter in SENTENCE_DELIMITERS:
+        if delimiter in paragraph:
+            parts = paragraph.split(delimiter)
+            sentences = [part + delimiter.strip() for part in parts[:-1]]
+            if parts[-1].strip():
+                sentences.append(parts[-1])
+            return sentences
+    # Inga meningsslut: fasta fönster med överlapp
+    step = max_chunk_size - overlap_size
+    return [paragraph[i:i + max_chunk_size] for i in range(0, len(paragraph), step)]
+
+
+def iter_semantic_chunks(pieces: Iterable[str], max_chunk_size: int = 600) -> Iterator[str]:
+    """Chunk streamed text with header context and overlap in O(n).
+
+    Whitespace-only input yields nothing; callers that need the old
+    ``[text]`` fallback (and the short-text shortcut) add it themselves.
+    """
+    overlap_size = max_chunk_size // 5
+    headers: List[str] = []
+    seen_headers: Set[str] = set()
+    header_context = ""
+    current_chunk = ""
+
+    for paragraph in iter_paragraphs(pieces):
+        for line in paragraph.split('\n'):
+            line = line.strip()
+            if (line.startswith('#') or
+                    line.startswith('<h') or
+                    (line.isupper() and len(line.split()) <= 10)):
+                if line not in seen_headers:
+                    seen_headers.add(line)
+                    headers.append(line)
+        header_context = '\n'.join(headers[-3:])
+        chunk_prefix = header_context + '\n\n' if header_context and header_context not in current_chunk else ""
+
+        if len(paragraph) > max_chunk_size:
+            for sentence in _split_sentences(paragraph, max_chunk_size, overlap_size):
+                size = len(chunk_prefix) + len(current_chunk) + (1 if current_chunk else 0) + len(sentence)
+                if size > max_chunk_size:
+                    if current_chunk.strip():
+                        yield (chunk_prefix + current_chunk).strip()
+                    if current_chunk and len(current_chunk) > overlap_size:
+                        current_chunk = current_chunk[-overlap_size:] + ' ' + sentence
+                    else:
+                        current_chunk = chunk_prefix + sentence
+                else:
+                    current_chunk += (' ' if current_chunk else '') + sentence
+        else:
+            size = len(chunk_prefix) + len(current_chunk) + (2 if current_chunk else 0) + len(paragraph)
+            if size > max_chunk_size:
+                if current_chunk.strip():
+                    yield (chunk_prefix + current_chunk).strip()
+                if current_chunk and len(current_chunk) > overlap_size:
+                    current_chunk = current_chunk[-overlap_size:] + '\n\n' + paragraph
+                else:
+                    current_chunk = chunk_prefix + paragraph
+            else:
+                current_chunk += ('\n\n' if current_chunk else '') + paragraph
+
+    if current_chunk.strip():
+        prefix = header_context + '\n\n' if header_context and header_context not in current_chunk else ""
+        yield (prefix + current_chunk).strip()
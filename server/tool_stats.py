@@ -0,0 +1,161 @@
+"""
+Minnesresidenta verktygsräknare för bandit och /api/tools/stats.
+
+``ToolStatsCounters`` läser in ``tool_stats`` en gång vid start och håller
+sedan ``success``/``fail`` per verktyg i ett dict. ``record`` ökar räknarna
+atomärt (ett lås, ingen SQLite) och noterar ökningen som en väntande delta.
+En bakgrundstråd skriver deltan var ``flush_interval_s`` sekund, eller så
+fort ``batch_size`` uppdateringar väntar, som en enda ``executemany``-upsert.
+
+Läsningar (``get``, ``get_many``, ``all``) är rena dict-uppslag. Deltan som
+ännu inte skrivits går förlorade vid en hård krasch; vid normal avstängning
+töms de av ``close()``.
+"""
+
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger("alice.memory")
+
+ToolDelta = Tuple[str, int, int]
+
+
+class ToolStatsCounters:
+    """In-process ``tool_stats`` table with write-behind flush to SQLite"""
+
+    def __init__(
+        self,
+        store: Any,
+        flush_interval_s: float = 5.0,
+        batch_size: int = 256,
+    ) -> None:
+        self.store = store
+        self.flush_interval_s = flush_interval_s
+        self.batch_size = max(1, batch_size)
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._counts: Dict[str, List[int]] = {}
+        self._pending: Dict[str, List[int]] = {}
+        self._pending_updates = 0
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.recorded = 0
+        self.flushed = 0
+        self.flushes = 0
+        self.errors = 0
+        # Tid (epoch) för senaste skrivning till SQLite, så att repliker vet om de är inaktuella
+        self.last_flush_at: Optional[float] = None
+        self.load()
+
+    def load(self) -> int:
+        """(Re)load counters from ``tool_stats``; pending deltas stay on top"""
+        rows = self.store.read_tool_stats()
+        with self._lock:
+            self._counts = {tool: [s, f] for tool, s, f in rows}
+            for tool, (s, f) in self._pending.items():
+                counts = self._counts.setdefault(tool, [0, 0])
+                counts[0] += s
+                counts[1] += f
+        return len(rows)
+
+    def start(self) -> "ToolStatsCounters":
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="tool-stats-flush", daemon=True)
+            self._thread.start()
+        return self
+
+    def record(self, tool: str, success: bool) -> None:
+        """Count one success/failure for ``tool``; O(1), never touches SQLite"""
+        idx = 0 if success else 1
+        with self._lock:
+            self._counts.setdefault(tool, [0, 0])[idx] += 1
+            self._pending.setdefault(tool, [0, 0])[idx] += 1
+            self._pending_updates += 1
+            self.recorded += 1
+            wake = self._pending_updates >= self.batch_size
+        if wake:
+            self._wake.set()
+
+    def get(self, tool: str) -> Tuple[int, int]:
+        counts = self._counts.get(tool)
+        if counts is None:
+            return 0, 0
+        return counts[0], counts[1]
+
+    def get_many(self, tools: Iterable[str]) -> Dict[str, Tuple[int, int]]:
+        with self._lock:
+            return {tool: tuple(self._counts.get(tool, (0, 0))) for tool in tools}
+
+    def all(self) -> List[Dict[str, Any]]:
+        """Same shape and order as ``MemoryStore.get_all_tool_stats``"""
+        with self._lock:
+            items = [(tool, s, f) for tool, (s, f) in self._counts.items()]
+        items.sort(key=lambda r: (-(r[1] + r[2]), r[0]))
+        return [{"tool": t, "success": s, "fail": f} for t, s, f in items]
+
+    def flush(self) -> int:
+        """Write pending deltas in one transaction; returns the number of tools written"""
+        with self._flush_lock:
+            with self._lock:
+                if not self._pending:
+                    return 0
+                pending, self._pending = self._pending, {}
+                updates, self._pending_updates = self._pending_updates, 0
+            rows: List[ToolDelta] = [(tool, s, f) for tool, (s, f) in pending.items()]
+            try:
+                self.store.write_tool_stats(rows)
+            except Exception:
+                # Lägg tillbaka deltan så att nästa flush försöker igen
+                with self._lock:
+                    for tool, s, f in rows:
+                        merged = self._pending.setdefault(tool, [0, 0])
+                        merged[0] += s
+                        merged[1] += f
+                    self._pending_updates += updates
+                self.errors += 1
+                raise
+            self.flushes += 1
+            self.flushed += updates
+            self.last_flush_at = time.time()
+            return len(rows)
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self._wake.wait(self.flush_interval_s)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                logger.warning(f"Tool stats flush failed: {e}")
+                self._stop.wait(max(self.flush_interval_s, 1.0))
+
+    def close(self, timeout: float = 10.0) -> int:
+        """Stop the flusher and write what is still pending (call from on_shutdown)"""
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        return self.flush()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            tools = len(self._counts)
+            pending = self._pending_updates
+        return {
+            "running": self._thread is not None and self._thread.is_alive(),
+            "flush_interval_s": self.flush_interval_s,
+            "batch_size": self.batch_size,
+            "tools": tools,
+            "pending": pending,
+            "recorded": self.recorded,
+            "flushed": self.flushed,
+            "flushes": self.flushes,
+            "errors": self.errors,
+        }
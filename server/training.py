@@ -1,59 +1,250 @@
+"""
+Export av träningsdata för offline-träning (/api/training/dump).
+
+Tabellerna läses med keyset-paginering på id (``WHERE id > ? ORDER BY id``),
+så en export kan börja från en markör i stället för att skanna allt igen.
+NDJSON-exporten skriver en ``{"kind": "cursor", "cursor": ...}``-rad efter
+varje batch; en avbruten nedladdning återupptas med den senaste markören
+(``since``) utan dubbletter. Kolumnformaten (Arrow IPC, Parquet) kräver
+pyarrow och exporterar en tabell åt gången; där är nästa markör största id.
+
+Komprimering (gzip, eller zstd om zstandard finns) sker strömmande och
+töms (sync flush) efter varje batch, så allt fram till senaste markör går
+att packa upp även om överföringen bryts.
+"""
+
 from __future__ import annotations
 
-import io
+import base64
 import json
 import sqlite3
-from typing import Iterable
-
-
-def stream_dataset(db_path: str) -> Iterable[bytes]:
-    conn = sqlite3.connect(db_path)
-    conn.row_factory = sqlite3.Row
-    cur = conn.cursor()
-
-    # Events
-    for row in cur.execute("SELECT ts, topic, payload FROM events ORDER BY ts ASC"):
-        record = {
-            "kind": "event",
-            "ts": row["ts"],
-            "topic": row["topic"],
-            "payload": row["payload"],
-        }
-        yield (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
-
-    # Memories
-    for row in cur.execute("SELECT ts, kind, text, score, tags FROM memories ORDER BY ts ASC"):
-        record = {
-            "kind": "memory",
-            "ts": row["ts"],
-            "type": row["kind"],
-            "text": row["text"],
-            "score": row["score"],
-            "tags": row["tags"],
-        }
-        yield (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
-
-    # Lessons
-    for row in cur.execute("SELECT ts, text, score, tags FROM lessons ORDER BY ts ASC"):
-        record = {
-            "kind": "lesson",
-            "ts": row["ts"],
-            "text": row["text"],
-            "score": row["score"],
-            "tags": row["tags"],
-        }
-        yield (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
-
-    # Tool stats (single summary line)
-    for row in cur.execute("SELECT tool, success, fail FROM tool_stats ORDER BY tool ASC"):
-        record = {
-            "kind": "tool_stats",
-            "tool": row["tool"],
-            "success": row["success"],
-            "fail": row["fail"],
-        }
-        yield (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
-
-    conn.close()
+import zlib
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+# Valfria beroenden: snabbare JSON, zstd-komprimering och kolumnformat
+try:
+    import orjson
+
+    def _dumps(obj: Any) -> bytes:
+        return orjson.dumps(obj)
+except ImportError:
+    def _dumps(obj: Any) -> bytes:
+        return json.dumps(obj, ensure_ascii=False).encode("utf-8")
+
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc
+    import pyarrow.parquet
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+
+# tabell -> (record-kind, kolumner i exportordning, SELECT utan WHERE)
+EXPORT_TABLES: Dict[str, Tuple[str, List[str], str]] = {
+    "events": ("event", ["id", "ts", "topic", "payload"], "SELECT id, ts, topic, payload FROM events"),
+    "memories": ("memory", ["id", "ts", "type", "text", "score", "tags"],
+                 "SELECT id, ts, kind AS type, text, score, tags FROM memories"),
+    "lessons": ("lesson", ["id", "ts", "text", "score", "tags"], "SELECT id, ts, text, score, tags FROM lessons"),
+    # Liten ögonblicksbild utan id: exporteras alltid i sin helhet
+    "tool_stats": ("tool_stats", ["tool", "success", "fail"], "SELECT tool, success, fail FROM tool_stats"),
+}
+
+FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "arrow": "application/vnd.apache.arrow.stream",
+    "parquet": "application/vnd.apache.parquet",
+}
+COMPRESSIONS = ("none", "gzip", "zstd")
+
+
+def encode_cursor(positions: Dict[str, int]) -> str:
+    """Opaque resume token: last exported id per table"""
+    raw = json.dumps(positions, separators=(",", ":"), sort_keys=True).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(token: Optional[str]) -> Dict[str, int]:
+    if not token:
+        return {}
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        positions = json.loads(raw)
+        return {str(k): int(v) for k, v in positions.items() if k in EXPORT_TABLES}
+    except Exception:
+        raise ValueError(f"invalid cursor token: {token!r}")
+
+
+def _where(table: str, topics: Optional[Sequence[str]], min_score: Optional[float]) -> Tuple[str, List[Any]]:
+    clauses, params = ["id > ?"], []
+    if table == "events" and topics:
+        # Globmönster, t.ex. "chat.*"
+        clauses.append("(" + " OR ".join(["topic GLOB ?"] * len(topics)) + ")")
+        params.extend(topics)
+    if table in ("memories", "lessons") and min_score is not None:
+        clauses.append("score >= ?")
+        params.append(min_score)
+    return " AND ".join(clauses), params
+
+
+def _batches(
+    conn: sqlite3.Connection,
+    table: str,
+    after: int,
+    topics: Optional[Sequence[str]],
+    min_score: Optional[float],
+    batch_size: int,
+) -> Iterator[List[Tuple[Any, ...]]]:
+    _, _, select = EXPORT_TABLES[table]
+    if table == "tool_stats":
+        rows = conn.execute(select + " ORDER BY tool ASC").fetchall()
+        if rows:
+            yield rows
+        return
+    where, params = _where(table, topics, min_score)
+    while True:
+        rows = conn.execute(f"{select} WHERE {where} ORDER BY id LIMIT ?", [after] + params + [batch_size]).fetchall()
+        if not rows:
+            return
+        yield rows
+        after = rows[-1][0]
+        if len(rows) < batch_size:
+            return
+
+
+def _ndjson(conn, tables, positions, topics, min_score, batch_size) -> Iterator[bytes]:
+    for table in tables:
+        kind, columns, _ = EXPORT_TABLES[table]
+        for rows in _batches(conn, table, positions.get(table, 0), topics, min_score, batch_size):
+            lines = [_dumps({"kind": kind, **dict(zip(columns, r))}) for r in rows]
+            if table != "tool_stats":
+                positions[table] = rows[-1][0]
+                lines.append(_dumps({"kind": "cursor", "cursor": encode_cursor(positions)}))
+            lines.append(b"")
+            yield b"\n".join(lines)
+
+
+class _Sink:
+    """Write-only file for pyarrow that hands out what has been written so far"""
+
+    def __init__(self) -> None:
+        self._chunks: List[bytes] = []
+        self._pos = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._pos += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._pos
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.closed = True
+
+    def writable(self) -> bool:
+        return True
+
+    def drain(self) -> bytes:
+        out = b"".join(self._chunks)
+        self._chunks.clear()
+        return out
+
+
+def _arrow_schema(table: str):
+    _, columns, _ = EXPORT_TABLES[table]
+    types = {"id": pa.int64(), "score": pa.float64(), "success": pa.int64(), "fail": pa.int64()}
+    return pa.schema([(c, types.get(c, pa.string())) for c in columns])
+
+
+def _columnar(conn, table, positions, topics, min_score, batch_size, fmt) -> Iterator[bytes]:
+    schema = _arrow_schema(table)
+    sink = _Sink()
+    if fmt == "arrow":
+        writer = pa.ipc.new_stream(sink, schema)
+    else:
+        writer = pa.parquet.ParquetWriter(sink, schema, compression="zstd")
+    try:
+        for rows in _batches(conn, table, positions.get(table, 0), topics, min_score, batch_size):
+            arrays = [pa.array(col, type=field.type) for col, field in zip(zip(*rows), schema)]
+            writer.write_batch(pa.RecordBatch.from_arrays(arrays, schema=schema))
+            chunk = sink.drain()
+            if chunk:
+                yield chunk
+    finally:
+        writer.close()
+    tail = sink.drain()
+    if tail:
+        yield tail
+
+
+def _compressed(chunks: Iterable[bytes], compression: str) -> Iterator[bytes]:
+    if compression == "none":
+        yield from chunks
+        return
+    if compression == "gzip":
+        z = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits 31 = gzip-header
+        compress, sync, end = z.compress, (lambda: z.flush(zlib.Z_SYNC_FLUSH)), z.flush
+    else:
+        z = zstandard.ZstdCompressor(level=3).compressobj()
+        compress, sync, end = z.compress, (lambda: z.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)), z.flush
+    for chunk in chunks:
+        out = compress(chunk) + sync()
+        if out:
+            yield out
+    yield end()
+
+
+def stream_dataset(
+    db_path: str,
+    tables: Optional[Sequence[str]] = None,
+    cursor: Optional[str] = None,
+    topics: Optional[Sequence[str]] = None,
+    min_score: Optional[float] = None,
+    fmt: str = "ndjson",
+    compression: Optional[str] = None,
+    batch_size: int = 1000,
+) -> Iterator[bytes]:
+    """Export events, memories, lessons and tool_stats as a stream of byte chunks.
+
+    Arguments are validated eagerly (``ValueError``) so callers can reject a
+    request before the response starts; the returned iterator does the I/O.
+    """
+    tables = list(tables) if tables else list(EXPORT_TABLES)
+    unknown = [t for t in tables if t not in EXPORT_TABLES]
+    if unknown:
+        raise ValueError(f"unknown tables {unknown}, expected some of {list(EXPORT_TABLES)}")
+    if fmt not in FORMATS:
+        raise ValueError(f"format must be one of {list(FORMATS)}, got {fmt!r}")
+    compression = compression or "none"
+    if compression not in COMPRESSIONS:
+        raise ValueError(f"compression must be one of {list(COMPRESSIONS)}, got {compression!r}")
+    if compression == "zstd" and not ZSTD_AVAILABLE:
+        raise ValueError("zstd compression requires the zstandard package")
+    if fmt != "ndjson":
+        if not PYARROW_AVAILABLE:
+            raise ValueError(f"{fmt} output requires pyarrow")
+        if len(tables) != 1:
+            raise ValueError(f"{fmt} output exports one table at a time")
+    positions = decode_cursor(cursor)
 
+    def generate() -> Iterator[bytes]:
+        conn = sqlite3.connect(db_path)
+        try:
+            if fmt == "ndjson":
+                yield from _ndjson(conn, tables, positions, topics, min_score, batch_size)
+            else:
+                yield from _columnar(conn, tables[0], positions, topics, min_score, batch_size, fmt)
+        finally:
+            conn.close()
 
+    return _compressed(generate(), compression)
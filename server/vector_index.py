@@ -0,0 +1,179 @@
+"""
+VectorIndex - minnesresident embedding-matris för semantisk retrieval.
+
+Vektorer normaliseras en gång vid insättning och lagras radvis i en
+NumPy-matris (float32, eller int8 med per-rad skalfaktor). En fråga blir
+en matris-vektor-produkt plus ``argpartition`` för top-k.
+"""
+
+from __future__ import annotations
+
+import json
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+VectorLike = Union[Sequence[float], np.ndarray, bytes, str]
+
+
+def encode_vector(vector: VectorLike) -> bytes:
+    """Serialize a vector to the float32 BLOB format used in ``embeddings.vector``"""
+    return as_float32(vector).tobytes()
+
+
+def as_float32(vector: VectorLike) -> np.ndarray:
+    """Decode a vector from a BLOB, legacy JSON text or a plain sequence"""
+    if isinstance(vector, (bytes, bytearray, memoryview)):
+        return np.frombuffer(bytes(vector), dtype=np.float32)
+    if isinstance(vector, str):
+        return np.asarray(json.loads(vector), dtype=np.float32)
+    return np.asarray(vector, dtype=np.float32).reshape(-1)
+
+
+def _normalize(mat: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(mat, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return mat / norms
+
+
+class VectorIndex:
+    """Exact cosine top-k over pre-normalized vectors.
+
+    ``quantize="int8"`` keeps rows as int8 plus a float32 scale per row
+    (4x less RAM, ~1e-2 cosine error), otherwise rows are float32.
+    """
+
+    BLOCK_ROWS = 65536
+
+    def __init__(self, dim: int, quantize: Optional[str] = None, capacity: int = 1024) -> None:
+        if quantize not in (None, "none", "int8"):
+            raise ValueError(f"Unknown quantization: {quantize}")
+        self.dim = dim
+        self.quantize = "int8" if quantize == "int8" else None
+        self._lock = threading.RLock()
+        self._size = 0
+        self._ids = np.zeros(capacity, dtype=np.int64)
+        self._row_of: Dict[int, int] = {}
+        dtype = np.int8 if self.quantize else np.float32
+        self._mat = np.zeros((capacity, dim), dtype=dtype)
+        self._scale = np.ones(capacity, dtype=np.float32)
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __contains__(self, mem_id: int) -> bool:
+        return int(mem_id) in self._row_of
+
+    def _grow(self, needed: int) -> None:
+        cap = self._mat.shape[0]
+        if needed <= cap:
+            return
+        new_cap = max(needed, cap * 2)
+        mat = np.zeros((new_cap, self.dim), dtype=self._mat.dtype)
+        mat[: self._size] = self._mat[: self._size]
+        ids = np.zeros(new_cap, dtype=np.int64)
+        ids[: self._size] = self._ids[: self._size]
+        scale = np.ones(new_cap, dtype=np.float32)
+        scale[: self._size] = self._scale[: self._size]
+        self._mat, self._ids, self._scale = mat, ids, scale
+
+    def _encode_rows(self, vecs: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        vecs = _normalize(vecs.astype(np.float32, copy=False))
+        if not self.quantize:
+            return vecs, np.ones(len(vecs), dtype=np.float32)
+        scale = np.abs(vecs).max(axis=1) / 127.0
+        scale[scale == 0] = 1.0
+        q = np.clip(np.rint(vecs / scale[:, None]), -127, 127).astype(np.int8)
+        return q, scale.astype(np.float32)
+
+    def add(self, ids: Iterable[int], vectors: Union[np.ndarray, Sequence[VectorLike]]) -> None:
+        """Insert or replace vectors (incremental, amortized O(1) per row)"""
+        ids = [int(i) for i in ids]
+        if not ids:
+            return
+        if isinstance(vectors, np.ndarray) and vectors.ndim == 2:
+            mat = vectors
+        else:
+            mat = np.stack([as_float32(v) for v in vectors])
+        if mat.shape[1] != self.dim:
+            raise ValueError(f"Vector dim {mat.shape[1]} != index dim {self.dim}")
+        rows, scales = self._encode_rows(mat)
+        with self._lock:
+            self._grow(self._size + len(ids))
+            for mem_id, row, scale in zip(ids, rows, scales):
+                pos = self._row_of.get(mem_id)
+                if pos is None:
+                    pos = self._size
+                    self._size += 1
+                    self._row_of[mem_id] = pos
+                    self._ids[pos] = mem_id
+                self._mat[pos] = row
+                self._scale[pos] = scale
+
+    def remove(self, ids: Iterable[int]) -> int:
+        """Drop vectors by moving the last row into the freed slot"""
+        removed = 0
+        with self._lock:
+            for mem_id in ids:
+                pos = self._row_of.pop(int(mem_id), None)
+                if pos is None:
+                    continue
+                last = self._size - 1
+                if pos != last:
+                    moved = int(self._ids[last])
+                    self._mat[pos] = self._mat[last]
+                    self._scale[pos] = self._scale[last]
+                    self._ids[pos] = moved
+                    self._row_of[moved] = pos
+                self._size -= 1
+                removed += 1
+        return removed
+
+    def search(self, query: VectorLike, k: int = 5, ids: Optional[Iterable[int]] = None) -> List[Tuple[int, float]]:
+        """Return up to k ``(mem_id, cosine)`` pairs, best first.
+
+        ``ids`` restricts the search to those memories (e.g. a tag filter).
+        """
+        q = as_float32(query)
+        if q.shape[0] != self.dim:
+            raise ValueError(f"Query dim {q.shape[0]} != index dim {self.dim}")
+        norm = float(np.linalg.norm(q))
+        if norm == 0:
+            return []
+        q = q / norm
+        with self._lock:
+            n = self._size
+            if n == 0 or k <= 0:
+                return []
+            if ids is not None:
+                rows = np.fromiter((p for p in (self._row_of.get(int(i)) for i in ids) if p is not None), np.int64)
+                if len(rows) == 0:
+                    return []
+                scores = (self._mat[rows] @ q).astype(np.float32, copy=False) * self._scale[rows]
+                k = min(k, len(rows))
+                top = np.argpartition(-scores, k - 1)[:k] if k < len(rows) else np.arange(len(rows))
+                top = top[np.argsort(-scores[top])]
+                return [(int(self._ids[rows[i]]), float(scores[i])) for i in top]
+            if self.quantize:
+                # Blockvis så att int8->float-konverteringen inte kopierar hela matrisen
+                scores = np.empty(n, dtype=np.float32)
+                for start in range(0, n, self.BLOCK_ROWS):
+                    end = min(n, start + self.BLOCK_ROWS)
+                    scores[start:end] = (self._mat[start:end] @ q) * self._scale[start:end]
+            else:
+                scores = self._mat[:n] @ q
+            k = min(k, n)
+            top = np.argpartition(-scores, k - 1)[:k] if k < n else np.arange(n)
+            top = top[np.argsort(-scores[top])]
+            return [(int(self._ids[i]), float(scores[i])) for i in top]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "mode": "exact",
+                "vectors": self._size,
+                "dim": self.dim,
+                "quantize": self.quantize or "none",
+                "bytes": int(self._mat[: self._size].nbytes + self._scale[: self._size].nbytes),
+            }